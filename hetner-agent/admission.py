@@ -0,0 +1,150 @@
+"""
+Local job admission — a small lookahead buffer of claimed jobs, served shortest-expected-work-first.
+
+/api/jobs/claim hands out jobs in id order, so one long 4K encode can hold a pool slot while a
+batch of short vertical clips waits behind it. The agent claims a few jobs ahead, estimates each
+one's encode work (duration × pixels × CRF/preset cost, see encode_scheduler.encode_weight) and
+starts the cheapest first. Aging keeps long jobs from starving: every second a job waits in the
+buffer discounts its priority, and a job held longer than max_hold goes next regardless.
+Turnaround (claim → finished) and buffer wait are tracked as p50/p95 for logs, heartbeat and metrics.
+"""
+import math
+import threading
+import time
+from typing import Dict, List, Optional
+
+from encode_scheduler import encode_weight
+
+# Output pixels per quality (landscape; orientation doesn't change the count)
+QUALITY_PIXELS = {'720p': 1280 * 720, '1080p': 1920 * 1080, '2k': 2560 * 1440, '4k': 3840 * 2160}
+DEFAULT_PIXELS = 1920 * 1080
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def estimate_cost(job: Dict, meta: Optional[Dict] = None, crf: Optional[int] = None,
+                  preset: str = 'slow', assumed_kbps: int = 8000) -> float:
+    """
+    Expected encode work in "1080p CRF 18 -preset slow seconds".
+    meta: cached probe (duration_sec/width/height) when available; else claim metadata
+    (duration, resolution, quality, file_size_input — duration guessed from size at assumed_kbps).
+    """
+    meta = meta or {}
+    duration = float(meta.get('duration_sec') or job.get('duration_sec') or job.get('duration') or 0)
+    if duration <= 0:
+        size = int(job.get('file_size_input') or 0)
+        duration = size * 8 / (assumed_kbps * 1000) if size > 0 else 60.0
+    src_pixels = 0
+    if meta.get('width') and meta.get('height'):
+        src_pixels = int(meta['width']) * int(meta['height'])
+    else:
+        try:
+            w, h = (int(x) for x in str(job.get('resolution') or '').lower().split('x', 1))
+            src_pixels = w * h
+        except ValueError:
+            src_pixels = 0
+    src_pixels = src_pixels or DEFAULT_PIXELS
+    qualities = [q.strip().lower() for q in str(job.get('quality') or '').split(',') if q.strip()]
+    out_pixels = sum(QUALITY_PIXELS.get(q, src_pixels) for q in qualities) or src_pixels
+    return duration * encode_weight(src_pixels, out_pixels, crf, preset)
+
+
+class AdmissionQueue:
+    """Thread-safe lookahead buffer of claimed jobs + turnaround statistics."""
+
+    def __init__(self, lookahead: int = 2, aging: float = 2.0, max_hold: float = 600.0,
+                 history: int = 500):
+        self.lookahead = max(0, lookahead)
+        self.aging = aging
+        self.max_hold = max_hold
+        self.history = history
+        self._lock = threading.Lock()
+        self._buffer: Dict[int, Dict] = {}  # job_id → {'job', 'cost', 'claimed_at'}
+        self._claimed_at: Dict[int, float] = {}  # every job claimed and not yet finished
+        self._turnaround: List[float] = []
+        self._wait: List[float] = []
+        self.stats = {'claimed': 0, 'finished': 0, 'reordered': 0, 'handed_back': 0}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def room(self, running: int, pool_size: int) -> int:
+        """How many more jobs to claim so buffered + running covers the pool plus the lookahead."""
+        with self._lock:
+            return max(0, pool_size + self.lookahead - running - len(self._buffer))
+
+    def add(self, job: Dict, cost: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._buffer[job['id']] = {'job': job, 'cost': cost, 'claimed_at': now}
+            self._claimed_at[job['id']] = now
+            self.stats['claimed'] += 1
+
+    def _priority(self, entry: Dict, now: float) -> float:
+        waited = now - entry['claimed_at']
+        if waited >= self.max_hold:
+            return float('-inf')
+        return entry['cost'] - self.aging * waited
+
+    def pop(self) -> Optional[Dict]:
+        """Next job to start (lowest aged cost); None when the buffer is empty."""
+        now = time.monotonic()
+        with self._lock:
+            if not self._buffer:
+                return None
+            job_id = min(self._buffer, key=lambda j: (self._priority(self._buffer[j], now), j))
+            if job_id != min(self._buffer):
+                self.stats['reordered'] += 1
+            entry = self._buffer.pop(job_id)
+            self._wait.append(now - entry['claimed_at'])
+            del self._wait[:-self.history]
+        entry['job']['_admission'] = {'cost': round(entry['cost'], 1),
+                                      'waited_sec': round(now - entry['claimed_at'], 1)}
+        return entry['job']
+
+    def drain(self) -> List[Dict]:
+        """Remove and return every buffered (not started) job — for hand-back on pause/shutdown."""
+        with self._lock:
+            jobs = [e['job'] for e in self._buffer.values()]
+            for job in jobs:
+                self._claimed_at.pop(job['id'], None)
+            self._buffer.clear()
+            self.stats['handed_back'] += len(jobs)
+        return jobs
+
+    def finish(self, job_id: int) -> Optional[float]:
+        """Record a started job's end; returns its turnaround (claim → now) in seconds."""
+        with self._lock:
+            claimed_at = self._claimed_at.pop(job_id, None)
+            if claimed_at is None:
+                return None
+            turnaround = time.monotonic() - claimed_at
+            self._turnaround.append(turnaround)
+            del self._turnaround[:-self.history]
+            self.stats['finished'] += 1
+        return turnaround
+
+    def forget(self, job_id: int) -> None:
+        """Drop a started job without recording turnaround (handed back to the API)."""
+        with self._lock:
+            self._claimed_at.pop(job_id, None)
+            self.stats['handed_back'] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats,
+                'buffered': len(self._buffer),
+                'turnaround_p50_sec': round(percentile(self._turnaround, 50), 1),
+                'turnaround_p95_sec': round(percentile(self._turnaround, 95), 1),
+                'admission_wait_p50_sec': round(percentile(self._wait, 50), 1),
+                'admission_wait_p95_sec': round(percentile(self._wait, 95), 1),
+            }
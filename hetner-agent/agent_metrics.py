@@ -0,0 +1,143 @@
+"""
+Prometheus text exposition (format 0.0.4) for the agent's GET /metrics — no prometheus_client dependency.
+
+Counters and histograms are updated in place by the worker threads (one lock, a dict lookup and a
+bucket scan per event). Gauges come from collector callbacks (component snapshots, host RAM/CPU/disk)
+that run only while a scrape renders, so scraping every 15 s costs the worker threads nothing beyond
+the brief lock each snapshot() already takes.
+"""
+import bisect
+import logging
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds: API round trips / slot waits; whole stages (a 4K encode runs for hours)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+STAGE_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400)
+# Bytes/second of one transfer: 100 KB/s .. 1 GB/s
+THROUGHPUT_BUCKETS = (1e5, 5e5, 1e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8, 5e8, 1e9)
+FPS_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 45, 60, 90, 120, 240, 480)
+SPEED_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 25)
+
+# (labels, value) samples of one gauge/counter family
+Samples = List[Tuple[Dict[str, str], float]]
+# Collector → [(name, 'gauge' | 'counter', help, samples)]
+Family = Tuple[str, str, str, Samples]
+
+
+def _fmt(v: float) -> str:
+    if math.isinf(v):
+        return '+Inf' if v > 0 else '-Inf'
+    if math.isnan(v):
+        return 'NaN'
+    return str(int(v)) if float(v).is_integer() and abs(v) < 1e15 else repr(float(v))
+
+
+def _escape(v: str) -> str:
+    return str(v).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    body = ','.join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return '{' + body + '}' if body else ''
+
+
+def _key(labels: Dict) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class _Family:
+    def __init__(self, kind: str, help_text: str, buckets: Sequence[float] = ()):
+        self.kind = kind
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # counter: key → value; histogram: key → [bucket counts..., sum, count]
+        self.series: Dict[Tuple, list] = {}
+
+
+class MetricsRegistry:
+    """Counters/histograms fed by the agent's threads + gauge collectors evaluated on scrape."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families: Dict[str, _Family] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def counter(self, name: str, help_text: str) -> None:
+        self._families[name] = _Family('counter', help_text)
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float]) -> None:
+        self._families[name] = _Family('histogram', help_text, buckets)
+
+    def add_collector(self, fn: Callable[[], Iterable[Family]]) -> None:
+        self._collectors.append(fn)
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        fam = self._families[name]
+        key = _key(labels)
+        with self._lock:
+            row = fam.series.get(key)
+            if row is None:
+                row = fam.series[key] = [0.0]
+            row[0] += value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        fam = self._families[name]
+        key = _key(labels)
+        idx = bisect.bisect_left(fam.buckets, value)  # first bucket with le >= value
+        with self._lock:
+            row = fam.series.get(key)
+            if row is None:
+                row = fam.series[key] = [0] * len(fam.buckets) + [0.0, 0]
+            if idx < len(fam.buckets):
+                row[idx] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> str:
+        with self._lock:
+            state = [(name, fam, {k: list(v) for k, v in fam.series.items()})
+                     for name, fam in self._families.items()]
+        lines: List[str] = []
+        for name, fam, series in state:
+            lines.append(f"# HELP {name} {fam.help}")
+            lines.append(f"# TYPE {name} {fam.kind}")
+            for key, row in sorted(series.items()):
+                if fam.kind == 'counter':
+                    lines.append(f"{name}{_labels(key)} {_fmt(row[0])}")
+                    continue
+                cumulative = 0
+                for le, n in zip(fam.buckets, row):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels(key + (('le', _fmt(le)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(key + (('le', '+Inf'),))} {row[-1]}")
+                lines.append(f"{name}_sum{_labels(key)} {_fmt(row[-2])}")
+                lines.append(f"{name}_count{_labels(key)} {row[-1]}")
+        for collect in self._collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                logger.debug(f"[Metrics] collector {getattr(collect, '__name__', collect)} failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(sorted((k, str(v)) for k, v in labels.items()))} {_fmt(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def snapshot_samples(component: str, snap: Optional[Dict]) -> Samples:
+    """Numeric fields of a component snapshot() as {component, stat} samples (bools as 0/1)."""
+    out: Samples = []
+    for k, v in (snap or {}).items():
+        if isinstance(v, bool):
+            v = int(v)
+        if isinstance(v, (int, float)):
+            out.append(({'component': component, 'stat': k}, v))
+    return out
@@ -0,0 +1,264 @@
+"""
+Worker API client — one pooled keep-alive requests.Session for every agent → Worker call
+(status, checkpoint, heartbeat, claim, mark-zombies, ...), instead of a fresh TLS handshake per call.
+
+- Bounded exponential-backoff retries (with jitter) for idempotent endpoints only.
+- Circuit breaker: after N consecutive transport/5xx failures the client stops calling the API
+  for a cooldown (doubling up to a max); one half-open probe decides whether to close again.
+- Critical-status alerts (401/500) are rate-limited per status and muted while the breaker is open.
+- on_request(endpoint, status, seconds) after every HTTP attempt (status 0 = transport error) for metrics.
+"""
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Safe to resend: repeating the call leaves the same server state. Not /api/jobs/interrupt: it clears
+# worker_id, so a resend after a lost response finds no job of this worker and reports a failure.
+IDEMPOTENT_ENDPOINTS = (
+    '/api/jobs/status',
+    '/api/jobs/status-batch',
+    '/api/jobs/checkpoint',
+    '/api/jobs/url-import-done',
+    '/api/jobs/release',
+    '/api/jobs/mark-zombies',
+    '/api/jobs/release-stale-startup',
+    '/api/heartbeat',
+)
+RETRY_STATUSES = (429, 502, 503, 504)
+BREAKER_STATUSES = (500, 502, 503, 504)
+SENSITIVE_KEYS = ('bearer_token', 'token', 'authorization', 'password')
+
+
+class CircuitBreaker:
+    """closed → open after `threshold` consecutive failures → half-open after cooldown (one probe)."""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0, max_cooldown: float = 600.0):
+        self.threshold = max(1, threshold)
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.failures = 0
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.time() - self.opened_at >= self.cooldown:
+                self.state = 'half_open'
+                self._probe_in_flight = False
+            if self.state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> bool:
+        """Returns True if this success closed an open breaker."""
+        with self._lock:
+            was_open = self.state != 'closed'
+            self.state = 'closed'
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+            self._probe_in_flight = False
+            return was_open
+
+    def record_failure(self) -> bool:
+        """Returns True if this failure (re)opened the breaker."""
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open':
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            elif self.failures < self.threshold or self.state == 'open':
+                return False
+            self.state = 'open'
+            self.opened_at = time.time()
+            self._probe_in_flight = False
+            return True
+
+    def release_probe(self) -> None:
+        """A half-open probe ended without telling anything about the API (local error): allow the next one."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != 'closed'
+
+
+class WorkerApiClient:
+    """Pooled, retrying, circuit-broken client for the Cloudflare Worker /api/* endpoints."""
+
+    def __init__(self, base_url: str, bearer_token: str, worker_id: str, pool_maxsize: int = 10,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 breaker: Optional[CircuitBreaker] = None, alert_interval: float = 600.0,
+                 on_critical: Optional[Callable[[str, str, int], None]] = None,
+                 on_breaker_change: Optional[Callable[[bool], None]] = None,
+                 on_request: Optional[Callable[[str, int, float], None]] = None):
+        self.base_url = base_url.rstrip('/')
+        self.worker_id = worker_id
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.alert_interval = alert_interval
+        self.on_critical = on_critical
+        self.on_breaker_change = on_breaker_change
+        self.on_request = on_request
+        self._last_alert: Dict[int, float] = {}
+        self._alert_lock = threading.Lock()
+        self._outage = False
+        self.last_status: Dict[str, int] = {}  # endpoint path → last HTTP status (feature detection)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max(1, pool_maxsize), max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {bearer_token}',
+            'Content-Type': 'application/json',
+            'User-Agent': f'BK-VF-Agent/{worker_id}',
+            'x-worker-id': worker_id,
+        })
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _is_idempotent(self, method: str, endpoint: str, data: Optional[Dict]) -> bool:
+        if method != 'POST':
+            return True
+        path = endpoint.split('?', 1)[0]
+        if path == '/api/jobs/presigned-upload':
+            # Re-signing is idempotent; creating a multipart upload is not
+            return not (isinstance(data, dict) and data.get('multipart') and not data.get('upload_id'))
+        return path in IDEMPOTENT_ENDPOINTS
+
+    def _alert(self, method: str, endpoint: str, status_code: int) -> None:
+        now = time.time()
+        with self._alert_lock:
+            muted = (self.on_critical is None or self.breaker.is_open
+                     or now - self._last_alert.get(status_code, 0.0) < self.alert_interval)
+            if not muted:
+                self._last_alert[status_code] = now
+        if muted:
+            logger.error(f"API {method} {endpoint}: critical status {status_code} (alert muted)")
+            return
+        self.on_critical(method, endpoint, status_code)
+
+    def _record(self, ok: bool) -> None:
+        changed = self.breaker.record_success() if ok else self.breaker.record_failure()
+        if not changed:
+            return
+        if ok:
+            logger.info("[API] Circuit breaker closed — Worker API reachable again")
+        else:
+            logger.error(f"[API] Circuit breaker open — pausing API calls for {self.breaker.cooldown:.0f}s")
+        # One notification per outage: half-open probes that fail again only extend the cooldown
+        with self._alert_lock:
+            if ok == (not self._outage):
+                return
+            self._outage = not ok
+        if self.on_breaker_change:
+            try:
+                self.on_breaker_change(not ok)
+            except Exception as e:
+                logger.debug(f"[API] breaker callback failed: {e}")
+
+    def _observe(self, endpoint: str, status: int, t0: float) -> None:
+        if self.on_request:
+            try:
+                self.on_request(endpoint.split('?', 1)[0], status, time.monotonic() - t0)
+            except Exception as e:
+                logger.debug(f"[API] request callback failed: {e}")
+
+    def _backoff(self, attempt: int) -> None:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        time.sleep(delay * (0.5 + random.random() / 2))
+
+    def request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Optional[Dict]:
+        """Same contract as the old _make_api_request: parsed JSON, or None on any failure/204."""
+        url = f"{self.base_url}{endpoint}"
+        if isinstance(data, dict):
+            safe = {k: ('***' if k.lower() in SENSITIVE_KEYS else v) for k, v in data.items()}
+            logger.debug(f"API request: {method} {url} body={str(safe)[:300]}")
+        else:
+            logger.debug(f"API request: {method} {url}")
+        attempts = 1 + (self.max_retries if self._is_idempotent(method, endpoint, data) else 0)
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                logger.debug(f"API {method} {endpoint}: skipped (circuit open)")
+                return None
+            t0 = time.monotonic()
+            try:
+                if method == 'POST':
+                    r = self.session.post(url, json=data, timeout=60, allow_redirects=False)
+                else:
+                    r = self.session.get(url, timeout=30, allow_redirects=False)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._observe(endpoint, 0, t0)
+                self._record(False)
+                if attempt + 1 < attempts:
+                    logger.debug(f"API {method} {endpoint}: {e} — retry {attempt + 1}/{attempts - 1}")
+                    self._backoff(attempt)
+                    continue
+                logger.error(f"API {method} {endpoint}: {e}")
+                return None
+            except requests.RequestException as e:
+                # Broken response (ChunkedEncodingError, ...): the call reached the API and failed
+                self._observe(endpoint, 0, t0)
+                self._record(False)
+                logger.error(f"API {method} {endpoint}: {e}")
+                return None
+            except Exception as e:
+                # Local error before/while sending (e.g. body not JSON-serialisable): the API was never asked,
+                # but a half-open probe must not stay in flight forever
+                self.breaker.release_probe()
+                logger.error(f"API {method} {endpoint}: {e}")
+                return None
+            logger.debug(f"API response: {method} {endpoint} status={r.status_code}")
+            self._observe(endpoint, r.status_code, t0)
+            self.last_status[endpoint.split('?', 1)[0]] = r.status_code
+            self._record(r.status_code not in BREAKER_STATUSES)
+            if r.status_code in RETRY_STATUSES and attempt + 1 < attempts:
+                self._backoff(attempt)
+                continue
+            return self._parse(method, endpoint, r)
+        return None
+
+    def _parse(self, method: str, endpoint: str, r: requests.Response) -> Optional[Dict]:
+        if r.status_code == 302:
+            logger.error(
+                f"API {method} {endpoint}: 302 redirect. v.bilgekarga.tr must NOT redirect /api/* to another domain. "
+                "Fix: Cloudflare/domain rule: exclude /api from redirect to bilgekarga.com.tr"
+            )
+            return None
+        if r.status_code in (401, 500):
+            self._alert(method, endpoint, r.status_code)
+            return None
+        if r.status_code == 204:
+            return None
+        try:
+            r.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"API {method} {endpoint}: {e}")
+            return None
+        ct = (r.headers.get('Content-Type') or '').lower()
+        if 'application/json' not in ct and r.content:
+            logger.error(
+                f"API {method} {endpoint}: response is not JSON (Content-Type: {ct}). "
+                "Check that v.bilgekarga.tr/api is served by the Worker, not redirected."
+            )
+            return None
+        try:
+            return r.json() if r.content else None
+        except ValueError as e:
+            logger.error(f"API {method} {endpoint}: invalid JSON: {e}")
+            return None
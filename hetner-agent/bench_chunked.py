@@ -0,0 +1,124 @@
+"""
+Wall-time benchmark: one libx264 process vs. the keyframe-chunked encode (chunked_encode.py).
+
+    python bench_chunked.py --duration 600 --size 1920x1080 --parallel 4
+    python bench_chunked.py --input long.mp4 --crf 14 --chunk-seconds 120
+
+Without --input a testsrc2 clip (GOP 2 s) is generated first. Both runs use the agent's x264 flags
+(-preset slow, High@4.1, yuv420p); the single run gets every core as -threads, each chunk gets
+cores/parallel. Prints one JSON object: wall times, speedup and the frame count of both outputs
+(they must match — a chunked output with fewer frames has a visible jump at a join).
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from chunked_encode import (chunk_seconds, concat_args, count_packets, packet_list_args, read_segments, split_args,
+                            write_concat_list)
+from encode_cmd import x264_cmd
+
+
+def _x264(ffmpeg: str, src: Path, out: Path, crf: int, preset: str, threads: int, faststart: bool) -> list:
+    """The agent's own x264 command (encode_cmd.x264_cmd), quiet."""
+    cmd = x264_cmd(ffmpeg, str(src), [None], [out], crf, ['-threads', str(threads)], faststart, preset)
+    cmd[1:1] = ['-v', 'error']
+    return cmd
+
+
+def _run(cmd: list) -> float:
+    t0 = time.monotonic()
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    return time.monotonic() - t0
+
+
+def _frames(ffmpeg: str, path: Path) -> int:
+    out = subprocess.run(packet_list_args(ffmpeg, path), capture_output=True, text=True, check=True).stdout
+    return count_packets(out)
+
+
+def _duration(ffmpeg: str, path: Path) -> float:
+    """Container duration from the input banner (no ffprobe needed)."""
+    banner = subprocess.run([ffmpeg, '-i', str(path)], capture_output=True, text=True).stderr
+    m = re.search(r"Duration: (\d+):(\d+):([\d.]+)", banner)
+    return int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3)) if m else 0.0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    ap.add_argument('--input', help='source file (default: generated testsrc2 clip)')
+    ap.add_argument('--duration', type=int, default=300, help='generated clip length in seconds')
+    ap.add_argument('--size', default='1920x1080', help='generated clip size')
+    ap.add_argument('--crf', type=int, default=14)
+    ap.add_argument('--preset', default='slow')
+    ap.add_argument('--chunk-seconds', type=int, default=120)
+    ap.add_argument('--parallel', type=int, default=4)
+    ap.add_argument('--ffmpeg', default=os.getenv('FFMPEG_PATH', 'ffmpeg'))
+    ap.add_argument('--keep', action='store_true', help='keep the work dir')
+    a = ap.parse_args()
+
+    cores = os.cpu_count() or 1
+    work = Path(tempfile.mkdtemp(prefix='bench-chunked-'))
+    try:
+        src = Path(a.input) if a.input else work / 'source.mp4'
+        if not a.input:
+            _run([a.ffmpeg, '-v', 'error', '-f', 'lavfi', '-i', f"testsrc2=size={a.size}:rate=25",
+                  '-t', str(a.duration), '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '50',
+                  '-pix_fmt', 'yuv420p', '-y', str(src)])
+
+        single_out = work / 'single.mp4'
+        single_sec = _run(_x264(a.ffmpeg, src, single_out, a.crf, a.preset, cores, True))
+
+        chunk_dir = work / 'chunks'
+        chunk_dir.mkdir()
+        t0 = time.monotonic()
+        duration = _duration(a.ffmpeg, src) or float(a.duration)
+        seg = chunk_seconds(duration, a.chunk_seconds, a.parallel)
+        split_sec = _run(split_args(a.ffmpeg, src, seg, chunk_dir))
+        segments = read_segments(chunk_dir)
+        outs = [chunk_dir / f"out-{i:04d}.mp4" for i in range(len(segments))]
+        threads = max(1, cores // a.parallel)
+        with ThreadPoolExecutor(max_workers=a.parallel) as pool:
+            list(pool.map(lambda i: _run(_x264(a.ffmpeg, segments[i][0], outs[i], a.crf, a.preset, threads, False)),
+                          range(len(segments))))
+        encode_sec = time.monotonic() - t0 - split_sec
+        chunked_out = work / 'chunked.mp4'
+        lst = write_concat_list(chunk_dir / 'out.ffconcat', outs)
+        join = concat_args(a.ffmpeg, [lst], [chunked_out])
+        join[1:1] = ['-v', 'error']
+        concat_sec = _run(join)
+        chunked_sec = time.monotonic() - t0
+
+        print(json.dumps({
+            'source': str(src), 'duration_sec': round(duration, 2), 'cores': cores,
+            'crf': a.crf, 'preset': a.preset, 'chunks': len(segments), 'chunk_seconds': seg,
+            'parallel': a.parallel, 'threads_per_chunk': threads,
+            'single_sec': round(single_sec, 2),
+            'chunked_sec': round(chunked_sec, 2),
+            'split_sec': round(split_sec, 2), 'encode_sec': round(encode_sec, 2), 'concat_sec': round(concat_sec, 2),
+            'speedup': round(single_sec / chunked_sec, 2) if chunked_sec > 0 else None,
+            'frames_single': _frames(a.ffmpeg, single_out),
+            'frames_chunked': _frames(a.ffmpeg, chunked_out),
+            'bytes_single': single_out.stat().st_size,
+            'bytes_chunked': chunked_out.stat().st_size,
+        }, indent=2))
+        return 0
+    except subprocess.CalledProcessError as e:
+        sys.stderr.write((e.stderr or b'').decode('utf-8', errors='replace')[-2000:])
+        return 1
+    finally:
+        if a.keep:
+            print(f"work dir: {work}", file=sys.stderr)
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
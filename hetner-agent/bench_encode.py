@@ -0,0 +1,273 @@
+"""
+Encoder benchmark grid: which MAX_PARALLEL_ENCODE × FFMPEG_THREADS (× preset/CRF) gets the most out of
+this box, measured with the agent's own FFmpeg command lines (encode_cmd.py).
+
+    python bench_encode.py --sizes 720p,1080p --concurrency 1,2,4 --threads 0,2,4 --out run-a.json
+    python bench_encode.py --presets slow,medium --crfs 12,14 --profiles single,ladder --out run-b.json
+    python bench_encode.py --compare run-a.json run-b.json
+    python bench_encode.py --concurrency 2 --threads 2 --out run-c.json --compare run-a.json
+
+Sources are deterministic testsrc2 clips (lavfi, GOP 2 s) per size and orientation (horizontal
+1280x720 / vertical 720x1280, …), generated once into --clips-dir and reused by later runs. Profiles:
+single = one output at the clip's quality (scale filter like a "1080p" job), ladder = every rung from
+720p up to it through one split-filter decode, copy = web_opt stream copy. Each grid cell runs --jobs
+encodes (default: the concurrency level) with at most `concurrency` at once, like the encode
+scheduler's slots, and records wall time, aggregate fps (frames of all jobs / wall), CPU utilisation
+(children's user+sys / (wall × cores)), the largest peak RSS of one FFmpeg process, and output size.
+Results go to --out (JSON: host info + one row per cell) and the same rows as CSV next to it.
+--compare prints the fps / wall / size change per matching cell between two result files.
+Linux/macOS only (per-process CPU and RSS come from os.wait4); needs nothing but FFmpeg.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from encode_cmd import RESOLUTIONS, SCALE_FILTERS, copy_cmd, x264_cmd
+from ffmpeg_stats import ProgressParser
+
+QUALITIES = ('720p', '1080p', '2k', '4k')
+PROFILES = ('single', 'ladder', 'copy')
+KEY_FIELDS = ('quality', 'orientation', 'profile', 'crf', 'preset', 'threads', 'concurrency')
+
+
+def _csv_list(raw: str, cast=str) -> list:
+    return [cast(x.strip()) for x in raw.split(',') if x.strip()]
+
+
+def clip_path(clips_dir: Path, quality: str, vertical: bool, duration: int, fps: int) -> Path:
+    res = RESOLUTIONS[quality][0 if vertical else 1]
+    return clips_dir / f"testsrc2-{res}-{fps}fps-{duration}s.mp4"
+
+
+def make_clip(ffmpeg: str, path: Path, duration: int, fps: int) -> None:
+    """testsrc2 is frame-exact; single-threaded ultrafast x264 keeps the file identical between runs."""
+    if path.exists() and path.stat().st_size > 0:
+        return
+    size = path.name.split('-')[1]
+    tmp = path.with_suffix('.tmp.mp4')
+    subprocess.run([ffmpeg, '-v', 'error', '-f', 'lavfi', '-i', f"testsrc2=size={size}:rate={fps}",
+                    '-t', str(duration), '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '16', '-threads', '1',
+                    '-g', str(fps * 2), '-pix_fmt', 'yuv420p', '-y', str(tmp)], check=True)
+    os.replace(tmp, path)
+
+
+def cell_cmd(ffmpeg: str, src: Path, quality: str, vertical: bool, profile: str, crf: Optional[int],
+             preset: Optional[str], threads: int, out_dir: Path) -> Optional[List[str]]:
+    """The agent's command for one job of this cell; None = profile does not apply (ladder of one rung)."""
+    threads_opt = ['-threads', str(threads)] if threads > 0 else []
+    side = 0 if vertical else 1
+    if profile == 'copy':
+        return copy_cmd(ffmpeg, str(src), out_dir / 'out.mp4', threads_opt)
+    rungs = [quality] if profile == 'single' else list(QUALITIES[:QUALITIES.index(quality) + 1])
+    if profile == 'ladder' and len(rungs) < 2:
+        return None
+    scales = [SCALE_FILTERS[q][side] for q in rungs]
+    outputs = [out_dir / f"out-{q}.mp4" for q in rungs]
+    return x264_cmd(ffmpeg, str(src), scales, outputs, crf, threads_opt, preset=preset)
+
+
+def run_ffmpeg(cmd: List[str]) -> Dict:
+    """One FFmpeg process: frames (from -progress), CPU seconds and peak RSS (os.wait4 rusage)."""
+    cmd = cmd[:1] + ['-v', 'error', '-progress', 'pipe:1', '-nostats'] + cmd[1:]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    err: List[str] = []
+    reader = threading.Thread(target=lambda: err.append(proc.stderr.read()), daemon=True)
+    reader.start()
+    parser = ProgressParser()
+    for line in proc.stdout:
+        parser.feed_line(line)
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    reader.join()
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg exit {proc.returncode}: {''.join(err).strip()[-500:]}")
+    # ru_maxrss: KiB on Linux, bytes on macOS
+    rss = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return {'frames': parser.last.get('frame', 0), 'cpu_sec': usage.ru_utime + usage.ru_stime, 'rss': rss}
+
+
+def run_cell(ffmpeg: str, src: Path, quality: str, vertical: bool, profile: str, crf: Optional[int],
+             preset: Optional[str], threads: int, concurrency: int, jobs: int, media_sec: float,
+             clip_frames: int, work: Path, cores: int) -> Optional[Dict]:
+    dirs = [work / f"job{i}" for i in range(jobs)]
+    cmds = []
+    for d in dirs:
+        shutil.rmtree(d, ignore_errors=True)
+        d.mkdir(parents=True)
+        cmd = cell_cmd(ffmpeg, src, quality, vertical, profile, crf, preset, threads, d)
+        if cmd is None:
+            return None
+        cmds.append(cmd)
+    t0 = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        runs = list(pool.map(run_ffmpeg, cmds))
+    wall = time.monotonic() - t0
+    out_bytes = sum(p.stat().st_size for d in dirs for p in d.glob('*.mp4'))
+    for d in dirs:
+        shutil.rmtree(d, ignore_errors=True)
+    frames = sum(r['frames'] or clip_frames for r in runs)  # stream copy reports no frame count
+    cpu = sum(r['cpu_sec'] for r in runs)
+    return {
+        'quality': quality, 'orientation': 'vertical' if vertical else 'horizontal', 'profile': profile,
+        'crf': crf, 'preset': preset, 'threads': threads, 'concurrency': concurrency, 'jobs': jobs,
+        'wall_sec': round(wall, 3),
+        'fps': round(frames / wall, 2) if wall > 0 else 0.0,
+        'speed': round(media_sec * jobs / wall, 3) if wall > 0 else 0.0,  # media seconds per wall second
+        'jobs_per_hour': round(jobs * 3600 / wall, 1) if wall > 0 else 0.0,
+        'cpu_util_pct': round(100 * cpu / (wall * cores), 1) if wall > 0 else 0.0,
+        'cpu_sec': round(cpu, 2),
+        'peak_rss_mb': round(max(r['rss'] for r in runs) / 2 ** 20, 1),
+        'output_bytes': out_bytes // jobs,
+        'frames': frames // jobs,
+    }
+
+
+def grid(a) -> List[Tuple]:
+    """(quality, vertical, profile, crf, preset, threads, concurrency); copy ignores CRF and preset."""
+    cells = []
+    for quality, orient, profile in itertools.product(a.sizes, a.orientations, a.profiles):
+        vertical = orient.startswith('v')
+        crfs, presets = ([None], [None]) if profile == 'copy' else (a.crfs, a.presets)
+        for crf, preset, threads, conc in itertools.product(crfs, presets, a.threads, a.concurrency):
+            cells.append((quality, vertical, profile, crf, preset, threads, conc))
+    return cells
+
+
+def _ffmpeg_version(ffmpeg: str) -> str:
+    try:
+        return subprocess.run([ffmpeg, '-version'], capture_output=True, text=True).stdout.split('\n', 1)[0]
+    except OSError:
+        return 'unknown'
+
+
+def write_results(path: Path, doc: Dict) -> None:
+    path.write_text(json.dumps(doc, indent=2), encoding='utf-8')
+    rows = doc['results']
+    if rows:
+        with open(path.with_suffix('.csv'), 'w', newline='', encoding='utf-8') as f:
+            w = csv.DictWriter(f, fieldnames=list(rows[0]))
+            w.writeheader()
+            w.writerows(rows)
+
+
+def compare(base_path: Path, new_path: Path) -> int:
+    """Per-cell change of fps, wall time and output size; cells present in only one run are listed."""
+    base, new = (json.loads(p.read_text(encoding='utf-8')) for p in (base_path, new_path))
+    key = lambda r: tuple(r.get(k) for k in KEY_FIELDS)
+    old = {key(r): r for r in base['results']}
+    print(f"base: {base_path} ({base['host'].get('cpu')}, {base['host'].get('cores')} cores)")
+    print(f"new:  {new_path} ({new['host'].get('cpu')}, {new['host'].get('cores')} cores)")
+    print(f"{'quality':<6} {'orient':<10} {'profile':<7} {'crf':>4} {'preset':<8} {'thr':>3} {'conc':>4} "
+          f"{'fps':>9} {'Δfps':>7} {'wall':>8} {'Δwall':>7} {'Δsize':>7}")
+    pct = lambda n, o: f"{100 * (n - o) / o:+.1f}%" if o else 'n/a'
+    seen = set()
+    for r in new['results']:
+        k = key(r)
+        o = old.get(k)
+        seen.add(k)
+        head = (f"{r['quality']:<6} {r['orientation']:<10} {r['profile']:<7} {str(r['crf'] or '-'):>4} "
+                f"{str(r['preset'] or '-'):<8} {r['threads']:>3} {r['concurrency']:>4} {r['fps']:>9.1f}")
+        if o is None:
+            print(f"{head}   (new cell)")
+            continue
+        print(f"{head} {pct(r['fps'], o['fps']):>7} {r['wall_sec']:>8.2f} {pct(r['wall_sec'], o['wall_sec']):>7} "
+              f"{pct(r['output_bytes'], o['output_bytes']):>7}")
+    missing = [k for k in old if k not in seen]
+    if missing:
+        print(f"{len(missing)} cell(s) only in base, e.g. {dict(zip(KEY_FIELDS, missing[0]))}")
+    return 0
+
+
+def summarize(rows: List[Dict]) -> None:
+    """Fastest cell (aggregate fps) per clip and profile — the settings to copy into CONFIG."""
+    best: Dict[Tuple, Dict] = {}
+    for r in rows:
+        k = (r['quality'], r['orientation'], r['profile'])
+        if k not in best or r['fps'] > best[k]['fps']:
+            best[k] = r
+    for (quality, orient, profile), r in sorted(best.items()):
+        print(f"best {quality} {orient} {profile}: concurrency={r['concurrency']} threads={r['threads']} "
+              f"crf={r['crf']} preset={r['preset']} → {r['fps']} fps, {r['jobs_per_hour']} jobs/h, "
+              f"cpu {r['cpu_util_pct']}%, peak rss {r['peak_rss_mb']} MB")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    ap.add_argument('--sizes', default='720p,1080p', help=f"clip qualities ({','.join(QUALITIES)})")
+    ap.add_argument('--orientations', default='horizontal,vertical')
+    ap.add_argument('--profiles', default='single', help=f"{','.join(PROFILES)}")
+    ap.add_argument('--crfs', default='14')
+    ap.add_argument('--presets', default='slow')
+    ap.add_argument('--threads', default='0,2', help='-threads per FFmpeg (0 = FFmpeg default)')
+    ap.add_argument('--concurrency', default='1,2', help='FFmpeg processes at once')
+    ap.add_argument('--jobs', type=int, default=0, help='encodes per cell (0 = the concurrency level)')
+    ap.add_argument('--duration', type=int, default=10, help='clip length in seconds')
+    ap.add_argument('--fps', type=int, default=30)
+    ap.add_argument('--clips-dir', help='generated clips are kept and reused here (default: temp dir)')
+    ap.add_argument('--out', default='bench-encode.json', help='results JSON (CSV written next to it)')
+    ap.add_argument('--compare', nargs='+', metavar='RESULTS',
+                    help='BASE NEW: compare two result files; BASE alone: run the grid, then compare with it')
+    ap.add_argument('--ffmpeg', default=os.getenv('FFMPEG_PATH', 'ffmpeg'))
+    a = ap.parse_args()
+
+    if a.compare and len(a.compare) == 2:
+        return compare(Path(a.compare[0]), Path(a.compare[1]))
+
+    a.sizes = [q for q in _csv_list(a.sizes) if q in QUALITIES]
+    a.orientations = _csv_list(a.orientations)
+    a.profiles = [p for p in _csv_list(a.profiles) if p in PROFILES]
+    a.crfs = _csv_list(a.crfs, int)
+    a.presets = _csv_list(a.presets)
+    a.threads = _csv_list(a.threads, int)
+    a.concurrency = _csv_list(a.concurrency, int)
+    cores = os.cpu_count() or 1
+    work = Path(tempfile.mkdtemp(prefix='bench-encode-'))
+    clips_dir = Path(a.clips_dir) if a.clips_dir else work / 'clips'
+    clips_dir.mkdir(parents=True, exist_ok=True)
+    doc = {
+        'host': {'node': platform.node(), 'cpu': platform.processor() or platform.machine(), 'cores': cores,
+                 'platform': platform.platform(), 'ffmpeg': _ffmpeg_version(a.ffmpeg)},
+        'args': {k: v for k, v in vars(a).items() if k not in ('compare',)},
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': [],
+    }
+    try:
+        cells = grid(a)
+        for n, (quality, vertical, profile, crf, preset, threads, conc) in enumerate(cells, 1):
+            src = clip_path(clips_dir, quality, vertical, a.duration, a.fps)
+            make_clip(a.ffmpeg, src, a.duration, a.fps)
+            row = run_cell(a.ffmpeg, src, quality, vertical, profile, crf, preset, threads, conc,
+                           a.jobs or conc, float(a.duration), a.duration * a.fps, work / 'out', cores)
+            if row is None:
+                continue
+            doc['results'].append(row)
+            print(f"[{n}/{len(cells)}] {quality} {row['orientation']} {profile} crf={crf} preset={preset} "
+                  f"threads={threads} x{conc}: {row['fps']} fps, wall {row['wall_sec']}s, "
+                  f"cpu {row['cpu_util_pct']}%, rss {row['peak_rss_mb']} MB", file=sys.stderr)
+            write_results(Path(a.out), doc)  # partial results survive an interrupted grid
+        write_results(Path(a.out), doc)
+        summarize(doc['results'])
+        if a.compare:
+            compare(Path(a.compare[0]), Path(a.out))
+        return 0
+    except (subprocess.CalledProcessError, RuntimeError) as e:
+        sys.stderr.write(f"{e}\n")
+        return 1
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
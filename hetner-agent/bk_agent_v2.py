@@ -4,13 +4,13 @@ BK-VF Hetner Agent v2 — Unified Python Agent (Ultra-HQ v4)
 4 parallel render, state machine, kademeli derin uyku (hibernasyon).
 
 Features:
-- Real worker pool: ThreadPoolExecutor(max_workers=3), main loop never blocked by download/FFmpeg
+- Stage pipeline: fetch / encode / publish pools with bounded queues, main loop never blocked by download/FFmpeg
 - Kademeli derin uyku: idle 3600s -> 2 cevapsız heartbeat 21600s -> 86400s
 - Active gear: wakeup/job triggers 300s window, claim every 60 seconds (never 1s)
 - Wakeup server 8080
 - FFmpeg Native: CRF 14 -preset slow, scale lanczos, -pix_fmt yuv420p, -movflags +faststart
-- Thumbnail: -ss 00:00:05, -vf scale=360:-2
-- Output suffix: -1080.mp4 / -720.mp4
+- Thumbnail: frame at 5s, scale=360:-2 — extra output of the main encode (optional storyboard sprites + WebVTT)
+- Output suffix: -1080.mp4 / -720.mp4 (ladder "720p,1080p": one decode, one file per quality)
 - SSRF protection on download URLs
 - Google Drive URL import: set GOOGLE_DRIVE_API_KEY in env for API-first download; gdown used as fallback
 """
@@ -26,7 +26,7 @@ import requests
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Callable, Optional, Dict, List, Tuple
 import tempfile
 import socket
 import ipaddress
@@ -35,7 +35,8 @@ import re
 import signal
 import threading
 from concurrent.futures import ThreadPoolExecutor
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from requests.adapters import HTTPAdapter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 
 try:
     import psutil
@@ -48,6 +49,27 @@ except ImportError:
     gdown = None
 
 from video_config import VIDEO_CONSTANTS
+from stream_tee import StreamTee, StreamAborted
+from segmented_download import SegmentedDownload, RangeNotSupported, probe_range_support
+from r2_multipart import plan_parts, upload_parts, upload_stream
+from api_client import CircuitBreaker, WorkerApiClient
+from status_outbox import StatusOutbox
+from probe_cache import ProbeCache, probe_cache_key
+from chunked_encode import (ChunkProgress, chunk_seconds, concat_args, count_packets, packet_list_args,
+                            read_segments, split_args, write_concat_list)
+from content_index import OutputIndex, StreamHasher, output_cache_key, rekey_output
+from raw_cache import RawInputCache, raw_cache_key
+from encode_resume import CHECKPOINT_PREFIX, ResumeManifest, prune_resume_dirs, resume_dir
+from remux_policy import parse_res, remux_reject_reason
+from encode_governor import PresetGovernor, parse_ladder
+from encode_cmd import RESOLUTIONS, SCALE_FILTERS, copy_cmd, x264_cmd
+from ffmpeg_stats import ProgressParser, StderrBuffer, output_meta, parse_encode_stats
+from admission import AdmissionQueue, estimate_cost
+from stage_pipeline import StagePipeline
+from encode_scheduler import EncodeScheduler, encode_weight, thread_cap
+from agent_metrics import (CONTENT_TYPE, FPS_BUCKETS, LATENCY_BUCKETS, SPEED_BUCKETS, STAGE_BUCKETS,
+                           THROUGHPUT_BUCKETS, MetricsRegistry, snapshot_samples)
+from storyboard import build_vtt, storyboard_args, thumbnail_args, thumbnail_time, tile_size, vtt_sheet_names
 
 # ─── Cross-platform hardware telemetry (Windows 10 + Linux) ───────────────────
 def get_system_health(temp_dir: Optional[Path] = None) -> Dict:
@@ -121,6 +143,21 @@ def _wrap_io_priority(cmd: List[str]) -> List[str]:
     return cmd
 
 
+def _dir_bytes(path: Path) -> int:
+    """Bytes currently stored under path (0 if it is gone)."""
+    total = 0
+    try:
+        for p in path.rglob('*'):
+            try:
+                if p.is_file():
+                    total += p.stat().st_size
+            except OSError:
+                pass
+    except OSError:
+        pass
+    return total
+
+
 def _apply_windows_priority(pid: int) -> None:
     """Windows-only: lower CPU to BELOW_NORMAL and I/O to IOPRIO_LOW via psutil. No-op on Linux/missing psutil."""
     if sys.platform != 'win32' or not psutil:
@@ -143,10 +180,54 @@ CONFIG = {
 
     # Parallel processing — real worker pool size (main loop dispatches, workers claim+process)
     'worker_pool_size': int(os.getenv('WORKER_POOL_SIZE', '3')),
+    # Stage pools (0 = default): fetch/publish = worker_pool_size, encode = max_parallel_encode.
+    # STAGE_QUEUE_SIZE bounds the jobs waiting between stages (downloaded-but-not-encoded on disk)
+    'fetch_workers': int(os.getenv('FETCH_WORKERS', '0')),
+    'encode_workers': int(os.getenv('ENCODE_WORKERS', '0')),
+    'publish_workers': int(os.getenv('PUBLISH_WORKERS', '0')),
+    'stage_queue_size': int(os.getenv('STAGE_QUEUE_SIZE', '2')),
+    # Prefetch: inputs fetched (or fetching) ahead of the encoder beyond the free encode slots
+    'prefetch_depth': int(os.getenv('PREFETCH_DEPTH', '2')),
+    # Claim: fill the lookahead with one /api/jobs/claim-batch call (single-claim fallback on old Workers)
+    'claim_batch': os.getenv('CLAIM_BATCH', '1').lower() in ('1', 'true', 'yes'),
+    'mark_zombies_interval': int(os.getenv('MARK_ZOMBIES_INTERVAL', '300')),
     # Encode: kaç paralel FFmpeg (CPU yükü); 2 = daha düşük %100 vurma
     'max_parallel_encode': int(os.getenv('MAX_PARALLEL_ENCODE', '4')),
     # Her FFmpeg kaç thread kullansın (0 = sınırsız); 2 = 4 işlem × 2 = 8 çekirdek (12 çekirdekli CPU'da makul)
     'ffmpeg_threads': int(os.getenv('FFMPEG_THREADS', '2')),
+    # Adaptive scheduler: thread budget per job from resolution/duration/profile + CPU headroom.
+    # 0 = static mode (fixed FFMPEG_THREADS, MAX_PARALLEL_ENCODE slots) for throughput comparison
+    'adaptive_encode': os.getenv('ADAPTIVE_ENCODE', '1').lower() in ('1', 'true', 'yes'),
+    'encode_busy_cpu_percent': float(os.getenv('ENCODE_BUSY_CPU_PERCENT', '92')),
+    # Chunked encode: inputs of at least CHUNKED_ENCODE_MIN_SEC (0 = off) are cut at keyframes into
+    # ~CHUNK_SECONDS pieces encoded by parallel FFmpeg processes (CHUNK_PARALLEL, 0 = MAX_PARALLEL_ENCODE)
+    'chunked_encode_min_sec': int(os.getenv('CHUNKED_ENCODE_MIN_SEC', '900')),
+    'chunk_seconds': int(os.getenv('CHUNK_SECONDS', '120')),
+    'chunk_parallel': int(os.getenv('CHUNK_PARALLEL', '0')),
+    # Segment fan-out: chunks are also published as Worker API tasks; other agents with SEGMENT_FANOUT
+    # claim them when they have a free encode slot (sources/outputs pass through the raw bucket)
+    'segment_fanout': os.getenv('SEGMENT_FANOUT', '').lower() in ('1', 'true', 'yes'),
+    'segment_poll_interval': float(os.getenv('SEGMENT_POLL_INTERVAL', '5')),
+    # Resumable chunked encodes: finished chunks + manifest kept under <temp_dir>/encode-resume/<job> until
+    # the join, so a retry after an interrupt encodes only the missing chunks (dirs idle > MAX_AGE_H pruned)
+    'resumable_encode': os.getenv('RESUMABLE_ENCODE', '1').lower() in ('1', 'true', 'yes'),
+    'resumable_encode_max_age_h': float(os.getenv('RESUMABLE_ENCODE_MAX_AGE_H', '48')),
+    # Remux fast path: H.264 High yuv420p sources within the target size/fps and below
+    # REMUX_MAX_BITRATE_RATIO × reference bitrate are stream-copied (+faststart) instead of re-encoded
+    'remux_fast_path': os.getenv('REMUX_FAST_PATH', '1').lower() in ('1', 'true', 'yes'),
+    'remux_max_bitrate_ratio': float(os.getenv('REMUX_MAX_BITRATE_RATIO', '1.5')),
+    # Preset governor: step down GOVERNOR_PRESETS (+ GOVERNOR_CRF_OFFSETS per step) while the backlog would
+    # take longer than GOVERNOR_TARGET_DRAIN_SEC to encode (0 = always the first preset), back up when shallow
+    'governor_presets': os.getenv('GOVERNOR_PRESETS', 'slow,medium,fast'),
+    'governor_crf_offsets': os.getenv('GOVERNOR_CRF_OFFSETS', '0,0,1'),
+    'governor_target_drain_sec': float(os.getenv('GOVERNOR_TARGET_DRAIN_SEC', '3600')),
+    'governor_hysteresis': float(os.getenv('GOVERNOR_HYSTERESIS', '0.7')),
+    'governor_min_hold_sec': float(os.getenv('GOVERNOR_MIN_HOLD_SEC', '120')),
+    # Admission: claim this many jobs beyond the pool and start the cheapest (est. encode work) first.
+    # Aging: each waited second discounts ADMISSION_AGING work-seconds; held > MAX_HOLD s = next in line
+    'admission_lookahead': int(os.getenv('ADMISSION_LOOKAHEAD', '2')),
+    'admission_aging': float(os.getenv('ADMISSION_AGING', '2.0')),
+    'admission_max_hold': float(os.getenv('ADMISSION_MAX_HOLD', '600')),
 
     # Polling kademeleri (saniye) — hiçbir koşulda 1 saniye yok
     # 1. Active: /wakeup veya son 5 dk içinde iş; main loop wakes every active_loop_interval to drain/fill pool
@@ -163,6 +244,40 @@ CONFIG = {
     'deep2_wait': int(os.getenv('DEEP2_WAIT', '86400')),
 
     'wakeup_port': int(os.getenv('WAKEUP_PORT', '8080')),
+    # GET /metrics (Prometheus text format) on the wakeup port; Bearer auth like /wakeup
+    'metrics_enabled': os.getenv('METRICS_ENABLED', '1').lower() in ('1', 'true', 'yes'),
+
+    # Segmented download: parallel HTTP Range GETs into a preallocated .part (1 = single stream)
+    'download_segments': int(os.getenv('DOWNLOAD_SEGMENTS', '4')),
+    'download_segment_bytes': int(os.getenv('DOWNLOAD_SEGMENT_MB', '32')) * 1024 * 1024,
+    'download_segment_min_bytes': int(os.getenv('DOWNLOAD_SEGMENT_MIN_MB', '64')) * 1024 * 1024,
+    # Max concurrent connections per source host (shared by all jobs; throttled CDNs ban wide fan-out)
+    'download_host_concurrency': int(os.getenv('DOWNLOAD_HOST_CONCURRENCY', '8')),
+
+    # R2 multipart upload: files ≥ threshold go up as concurrent parts; smaller (thumbnails) keep single PUT
+    'multipart_threshold_bytes': int(os.getenv('MULTIPART_THRESHOLD_MB', '100')) * 1024 * 1024,
+    'multipart_part_bytes': int(os.getenv('MULTIPART_PART_MB', '64')) * 1024 * 1024,
+    'multipart_concurrency': int(os.getenv('MULTIPART_CONCURRENCY', '4')),
+    # Retry rounds: each round re-signs and re-sends only the parts that failed
+    'multipart_max_rounds': int(os.getenv('MULTIPART_MAX_ROUNDS', '3')),
+
+    # Worker API client: pooled keep-alive session; retries only for idempotent endpoints
+    'api_max_retries': int(os.getenv('API_MAX_RETRIES', '3')),
+    'api_backoff_max': float(os.getenv('API_BACKOFF_MAX', '8')),
+    # Circuit breaker: N consecutive transport/5xx failures → stop calling the API for cooldown (doubles up to max)
+    'api_breaker_threshold': int(os.getenv('API_BREAKER_THRESHOLD', '5')),
+    'api_breaker_cooldown': int(os.getenv('API_BREAKER_COOLDOWN', '30')),
+    'api_breaker_max_cooldown': int(os.getenv('API_BREAKER_MAX_COOLDOWN', '600')),
+    # Same 401/500 Telegram alert at most once per interval
+    'api_alert_interval': int(os.getenv('API_ALERT_INTERVAL', '600')),
+
+    # FFmpeg -progress: CONVERTING updates at most every N seconds; stderr kept to the last N KB (+16 KB head)
+    'encode_progress_interval': float(os.getenv('ENCODE_PROGRESS_INTERVAL', '10')),
+    'ffmpeg_stderr_tail_kb': int(os.getenv('FFMPEG_STDERR_TAIL_KB', '64')),
+
+    # Status outbox: progress/checkpoints coalesced per job, flushed every N seconds or at batch size
+    'status_flush_interval': float(os.getenv('STATUS_FLUSH_INTERVAL', '2')),
+    'status_batch_size': int(os.getenv('STATUS_BATCH_SIZE', '50')),
 
     # Stealth heartbeat: every 10 minutes, no log on success
     'stealth_heartbeat_interval': int(os.getenv('STEALTH_HEARTBEAT_INTERVAL', '600')),
@@ -181,6 +296,14 @@ CONFIG = {
         'kucuk_dosya': 18,
     },
     'thumbnail_scale': VIDEO_CONSTANTS['THUMBNAIL_SCALE'],
+    # Storyboard sprites + WebVTT for player scrubbing (off by default; a job can ask with storyboard=true)
+    'storyboard': os.getenv('STORYBOARD', '').lower() in ('1', 'true', 'yes'),
+    'storyboard_interval': int(os.getenv('STORYBOARD_INTERVAL', '10')),
+    'storyboard_tile_width': int(os.getenv('STORYBOARD_TILE_WIDTH', '160')),
+    'storyboard_cols': int(os.getenv('STORYBOARD_COLS', '10')),
+    'storyboard_rows': int(os.getenv('STORYBOARD_ROWS', '10')),
+    # Parallel R2 uploads of one job's outputs (video, renditions, thumbnail, storyboard)
+    'output_upload_concurrency': int(os.getenv('OUTPUT_UPLOAD_CONCURRENCY', '4')),
     'cdn_base_url': os.getenv('CDN_BASE_URL', 'https://cdn.bilgekarga.tr'),
 
     # Samaritan: Wakeup, Status (6h), Ping (5min)
@@ -193,6 +316,20 @@ CONFIG = {
     # Shadow channel: when Telegram fails, send same message here (e.g. Discord webhook)
     'fallback_webhook_url': os.getenv('FALLBACK_WEBHOOK_URL', '') or os.getenv('DISCORD_WEBHOOK_URL', ''),
 
+    # Streaming encode: FFmpeg reads the download via stdin while it is still arriving (moov-at-end → full-file fallback)
+    'stream_encode': os.getenv('STREAM_ENCODE', '').lower() in ('1', 'true', 'yes'),
+    # URL import: upload the raw source to R2 (multipart) while it downloads; encode doesn't wait for it
+    'raw_tee_upload': os.getenv('RAW_TEE_UPLOAD', '1').lower() in ('1', 'true', 'yes'),
+
+    # Output dedupe: SHA-256 of the download + encode settings → reuse an identical earlier output (Worker-side copy)
+    'output_dedupe': os.getenv('OUTPUT_DEDUPE', '1').lower() in ('1', 'true', 'yes'),
+    'output_dedupe_api': os.getenv('OUTPUT_DEDUPE_API', '1').lower() in ('1', 'true', 'yes'),  # ask the Worker on a local miss
+    'output_index_max_entries': int(os.getenv('OUTPUT_INDEX_MAX_ENTRIES', '5000')),
+
+    # Raw-input cache: finished downloads kept by r2_raw_key so retries/resumes skip the download (0 = off)
+    'raw_cache_max_bytes': int(float(os.getenv('RAW_CACHE_MAX_GB', '20')) * 1024 ** 3),
+    'raw_cache_verify': os.getenv('RAW_CACHE_VERIFY', '1').lower() in ('1', 'true', 'yes'),  # SHA-256 check on hit
+
     # Job recovery: on startup, retry interrupted jobs if set
     'auto_resume_interrupted': os.getenv('AUTO_RESUME_INTERRUPTED', '').lower() in ('1', 'true', 'yes'),
 
@@ -212,6 +349,10 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+class JobHandedBack(Exception):
+    """A claimed job went back to the API before its encode started (pause, RAM critical, shutdown)."""
+
+
 class BKVFAgentV2:
     """BK-VF Hetner Agent v2 — stealth idle, active gear, web-optimized FFmpeg."""
 
@@ -224,8 +365,15 @@ class BKVFAgentV2:
         self.temp_dir.mkdir(parents=True, exist_ok=True)
 
         self.pool_size = CONFIG.get('worker_pool_size', 3)
-        self.executor = ThreadPoolExecutor(max_workers=self.pool_size)
-        self._active_futures = set()
+        # fetch (network) → encode (CPU) → publish (network), each on its own bounded pool
+        self.pipeline = StagePipeline([
+            ('fetch', CONFIG['fetch_workers'] or self.pool_size, CONFIG['stage_queue_size'],
+             lambda ctx: self._run_stage('fetch', ctx)),
+            ('encode', CONFIG['encode_workers'] or CONFIG['max_parallel_encode'], CONFIG['stage_queue_size'],
+             lambda ctx: self._run_stage('encode', ctx)),
+            ('publish', CONFIG['publish_workers'] or self.pool_size, CONFIG['stage_queue_size'],
+             lambda ctx: self._run_stage('publish', ctx)),
+        ])
         self.active_jobs = {}
         self.lock = threading.Lock()
         self.mode = 'idle'
@@ -237,12 +385,73 @@ class BKVFAgentV2:
         self.running = True
         self.heartbeat_no_response_count = 0
         self._url_download_semaphore = threading.Semaphore(99)  # Paralel indirme sınırı yok (ağ hızında çeker)
-        self._encode_semaphore = threading.Semaphore(CONFIG['max_parallel_encode'])
+        # Encode admission + per-job thread budgets from probed size/duration/profile and live CPU load
+        self.encode_scheduler = EncodeScheduler(
+            cores=psutil.cpu_count(logical=True) if psutil else os.cpu_count(),
+            max_jobs=CONFIG['max_parallel_encode'],
+            adaptive=CONFIG['adaptive_encode'],
+            static_threads=CONFIG['ffmpeg_threads'],
+            cpu_percent=(lambda: psutil.cpu_percent(interval=None)) if psutil else None,
+            busy_cpu_percent=CONFIG['encode_busy_cpu_percent'],
+        )
+        # x264 preset (+ CRF offset) per encode from backlog depth and measured encode speed
+        self.governor = PresetGovernor(
+            parse_ladder(CONFIG['governor_presets'], CONFIG['governor_crf_offsets']),
+            target_drain_sec=CONFIG['governor_target_drain_sec'],
+            parallel=CONFIG['max_parallel_encode'],
+            hysteresis=CONFIG['governor_hysteresis'],
+            min_hold_sec=CONFIG['governor_min_hold_sec'],
+        )
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}  # per-host Range GET limit
+        self.probe_cache = ProbeCache(self.temp_dir / 'probe-cache')  # ffprobe results keyed by raw object
+        # Finished outputs keyed by source SHA-256 + encode settings (duplicate imports skip the encode)
+        self.output_index = OutputIndex(self.temp_dir / 'output-index', CONFIG['output_index_max_entries'])
+        # Downloaded inputs outlive the attempt: retries and download_done resumes link them back in
+        self.raw_cache = RawInputCache(self.temp_dir / 'raw-cache', CONFIG['raw_cache_max_bytes'],
+                                       CONFIG['raw_cache_verify'])
+        self.resume_root = self.temp_dir / 'encode-resume'  # chunk outputs of interrupted chunked encodes
         self._active_procs = {}  # {job_id: Popen} — FFmpeg handles for RAM watchdog kill
         self._ram_critical = False
         self._ram_critical_time = 0.0
         self._start_time = time.time()
         self._paused = False  # C2: when True, do not claim new jobs (current/queue continue)
+        # Lookahead buffer of claimed jobs, started shortest-expected-work-first (with aging)
+        self.admission = AdmissionQueue(
+            lookahead=CONFIG['admission_lookahead'],
+            aging=CONFIG['admission_aging'],
+            max_hold=CONFIG['admission_max_hold'],
+        )
+        self._admission_lock = threading.Lock()
+        self._batch_claim: Optional[bool] = None  # None = not probed yet; False = Worker lacks claim-batch
+        self._last_mark_zombies = 0.0
+        # Prefetch gate: job_ids fetching/fetched but not yet admitted by the encode scheduler
+        self._prefetch_cond = threading.Condition()
+        self._ahead = set()
+        self._disk_reserved: Dict[int, tuple] = {}  # job_id → (bytes reserved, work_dir)
+        self._handback_reason: Optional[str] = None  # set → claimed jobs not yet encoding go back to the API
+        # Counters/histograms for GET /metrics; gauges are read from the components above on scrape
+        self.metrics = self._build_metrics()
+        # Pool: per job fetch/raw-upload/encode threads + main loop, heartbeat, Telegram, wakeup handlers
+        self.api = WorkerApiClient(
+            self.api_base_url, self.bearer_token, self.worker_id,
+            pool_maxsize=self.pool_size * 3 + 4,
+            max_retries=CONFIG['api_max_retries'],
+            backoff_max=CONFIG['api_backoff_max'],
+            breaker=CircuitBreaker(
+                CONFIG['api_breaker_threshold'], CONFIG['api_breaker_cooldown'], CONFIG['api_breaker_max_cooldown']
+            ),
+            alert_interval=CONFIG['api_alert_interval'],
+            on_critical=self._notify_critical_api_error,
+            on_breaker_change=self._on_api_breaker,
+            on_request=self._observe_api_request,
+        )
+        # Status/progress/checkpoint reports leave the data path through a coalescing outbox
+        self.outbox = StatusOutbox(
+            self._make_api_request, self.worker_id,
+            flush_interval=CONFIG['status_flush_interval'], max_batch=CONFIG['status_batch_size'],
+            last_status=self.api.last_status,
+        )
+        self.outbox.start()
 
         self._validate_config()
         self._cleanup_orphan_files()
@@ -265,6 +474,8 @@ class BKVFAgentV2:
         removed = 0
         try:
             for p in self.temp_dir.rglob('*'):
+                if self.raw_cache.cache_dir in p.parents or self.resume_root in p.parents:
+                    continue  # raw cache has its own budget and LRU eviction; resume dirs are pruned by age
                 if p.is_file() and p.suffix.lower() in allowed:
                     try:
                         if p.stat().st_mtime < cutoff:
@@ -284,6 +495,9 @@ class BKVFAgentV2:
             logger.warning(f"Orphan cleanup error: {e}")
         if removed:
             logger.info(f"Orphan cleanup: removed {removed} stale files from temp/")
+        pruned = prune_resume_dirs(self.resume_root, CONFIG['resumable_encode_max_age_h'] * 3600)
+        if pruned:
+            logger.info(f"[Resume] removed {pruned} encode resume dir(s) idle > {CONFIG['resumable_encode_max_age_h']:g}h")
 
     def _validate_config(self):
         if not self.bearer_token:
@@ -306,65 +520,24 @@ class BKVFAgentV2:
         logger.error(f"API {method} {endpoint}: critical status {status_code}")
         self._send_telegram("Kritik Bağlantı Hatası: Token Geçersiz")
 
+    def _on_api_breaker(self, is_open: bool) -> None:
+        """One alert per API outage (circuit open) and one on recovery — not one per failed call."""
+        if is_open:
+            self._send_telegram("Kritik Bağlantı Hatası: Worker API erişilemiyor (istekler geçici olarak durduruldu)")
+        else:
+            self._send_telegram("Worker API bağlantısı yeniden kuruldu")
+
+    def _observe_api_request(self, endpoint: str, status: int, seconds: float) -> None:
+        self.metrics.observe('bkvf_api_request_duration_seconds', seconds, endpoint=endpoint)
+        self.metrics.inc('bkvf_api_requests_total', endpoint=endpoint, code=str(status))
+
     def _make_api_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Optional[Dict]:
-        url = f"{self.api_base_url}{endpoint}"
-        headers = {
-            'Authorization': f'Bearer {self.bearer_token}',
-            'Content-Type': 'application/json',
-            'User-Agent': f'BK-VF-Agent/{self.worker_id}',
-            'x-worker-id': self.worker_id,
-        }
-        body_summary = ''
-        if isinstance(data, dict):
-            safe = {k: ('***' if k.lower() in ('bearer_token', 'token', 'authorization', 'password') else v)
-                    for k, v in data.items()}
-            body_summary = str(safe)[:300]
-        logger.debug(f"API request: {method} {url} body={body_summary}")
-        try:
-            if method == 'POST':
-                r = requests.post(url, headers=headers, json=data, timeout=60, allow_redirects=False)
-            else:
-                r = requests.get(url, headers=headers, timeout=30, allow_redirects=False)
-            logger.debug(f"API response: {method} {endpoint} status={r.status_code}")
-            if r.status_code == 302:
-                logger.error(
-                    f"API {method} {endpoint}: 302 redirect. v.bilgekarga.tr must NOT redirect /api/* to another domain. "
-                    "Fix: Cloudflare/domain rule: exclude /api from redirect to bilgekarga.com.tr"
-                )
-                return None
-            if r.status_code in (401, 500):
-                self._notify_critical_api_error(method, endpoint, r.status_code)
-                return None
-            if r.status_code == 204:
-                return None
-            r.raise_for_status()
-            ct = (r.headers.get('Content-Type') or '').lower()
-            if 'application/json' not in ct and r.content:
-                logger.error(
-                    f"API {method} {endpoint}: response is not JSON (Content-Type: {ct}). "
-                    "Check that v.bilgekarga.tr/api is served by the Worker, not redirected."
-                )
-                return None
-            return r.json() if r.content else None
-        except requests.exceptions.HTTPError as e:
-            if e.response is not None and e.response.status_code == 302:
-                logger.error(
-                    "API redirect (302). v.bilgekarga.tr must not redirect /api requests. "
-                    "Configure domain so /api/* goes to the Worker."
-                )
-            else:
-                if e.response is not None and e.response.status_code in (401, 500):
-                    self._notify_critical_api_error(method, endpoint, e.response.status_code)
-                else:
-                    logger.error(f"API {method} {endpoint}: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"API {method} {endpoint}: {e}")
-            return None
+        """Worker API call via the pooled client (keep-alive, idempotent retries, circuit breaker)."""
+        return self.api.request(method, endpoint, data)
 
     def _update_job_status(self, job_id: int, status: str) -> bool:
         data = {'job_id': job_id, 'worker_id': self.worker_id, 'status': status}
-        return self._make_api_request('POST', '/api/jobs/status', data) is not None
+        return self.outbox.enqueue('status', job_id, data)
 
     def fail_job(self, job_id: int, error_message: str, stage: str = '', ffmpeg_output: str = '') -> bool:
         data = {
@@ -376,7 +549,7 @@ class BKVFAgentV2:
             'stage': stage,
             'ffmpeg_output': ffmpeg_output[:4000] if ffmpeg_output else '',
         }
-        return self._make_api_request('POST', '/api/jobs/fail', data) is not None
+        return self.outbox.deliver('/api/jobs/fail', data, job_id) is not None
 
     def _cleanup_zombies(self, job_id: int) -> None:
         """ZOM_01: Fiziksel olarak FFmpeg subprocess'ini öldür; işlem bittiğinde veya hata aldığında mutlaka çağrılmalı."""
@@ -547,14 +720,150 @@ class BKVFAgentV2:
             'download_total': total or 0,
             'download_progress': pct,
         }
-        self._make_api_request('POST', '/api/jobs/status', data)
+        self.outbox.enqueue('status', job_id, data)
+
+    def _stream_to_part(self, r, part_path: Path, job_id: int, total: int, tee: Optional[StreamTee] = None,
+                        hasher: Optional[StreamHasher] = None) -> bool:
+        """Write response body to .part in 1MB chunks with 5GB limit and 10% progress reports.
+        With a tee: flush + advance per chunk so streaming readers see the bytes; stop if a reader cancelled.
+        With a hasher: every written chunk is hashed on the way (SHA-256 ready when the file is)."""
+        max_bytes = CONFIG['max_url_download_bytes']
+        if tee is not None:
+            tee.set_total(total)
+        downloaded = 0
+        last_pct = -1
+        cancelled = False
+        with open(part_path, 'wb') as f:
+            for chunk in r.iter_content(chunk_size=1024 * 1024):
+                if not chunk:
+                    continue
+                if tee is not None and tee.cancelled:
+                    cancelled = True
+                    break
+                downloaded += len(chunk)
+                if downloaded > max_bytes:
+                    cancelled = True
+                    break
+                f.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+                if tee is not None:
+                    f.flush()
+                    tee.advance(downloaded)
+                pct = round((downloaded / total * 100) if total and total > 0 else 0, 1)
+                # Once FFmpeg reads the stream the job is CONVERTING; don't flip it back to DOWNLOADING
+                if pct != last_pct and (int(pct) % 10 == 0 or pct >= 99) and not (tee is not None and tee.attached):
+                    self._update_download_progress(job_id, downloaded, total)
+                    last_pct = pct
+        if cancelled:
+            part_path.unlink(missing_ok=True)
+            if downloaded > max_bytes:
+                self.fail_job(job_id, "5 GB limit aşıldı", stage='download')
+            return False
+        return True
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = (urlparse(url).hostname or '').lower()
+        with self.lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(max(1, CONFIG['download_host_concurrency']))
+                self._host_slots[host] = slot
+            return slot
+
+    def _segmented_total(self, url: str, content_length: Optional[int], accept_ranges: bool) -> Optional[int]:
+        """Size to download in parallel ranges, or None → single stream (disabled, small file, no Range support).
+        HEAD Accept-Ranges is trusted; otherwise a bytes=0-0 probe (presigned GET URLs reject HEAD)."""
+        if CONFIG.get('download_segments', 1) <= 1:
+            return None
+        min_bytes = CONFIG['download_segment_min_bytes']
+        if content_length is not None and content_length < min_bytes:
+            return None
+        if accept_ranges and content_length:
+            return content_length
+        with requests.Session() as sess:
+            total = probe_range_support(sess, url)
+        if not total or total < min_bytes:
+            return None
+        return total
+
+    def _download_segmented(self, url: str, part_path: Path, job_id: int, total: int,
+                            tee: Optional[StreamTee] = None, hasher: Optional[StreamHasher] = None) -> Optional[bool]:
+        """Parallel Range download into .part. True ok, False cancelled by a stream reader,
+        None → server ignored Range (caller falls back to a single stream). Piece errors raise."""
+        workers = CONFIG['download_segments']
+        progress_lock = threading.Lock()
+        last = {'pct': -1.0}
+
+        def _progress(downloaded: int) -> None:
+            pct = round(downloaded / total * 100, 1)
+            with progress_lock:
+                if pct == last['pct'] or not (int(pct) % 10 == 0 or pct >= 99) or (tee is not None and tee.attached):
+                    return
+                last['pct'] = pct
+            self._update_download_progress(job_id, downloaded, total)
+
+        if tee is not None:
+            tee.set_total(total)
+        logger.info(f"[Segmented] Job {job_id}: {total} bytes, {workers} parallel ranges")
+        with requests.Session() as sess:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+            sess.mount('http://', adapter)
+            sess.mount('https://', adapter)
+            dl = SegmentedDownload(
+                sess, url, part_path, total, workers, CONFIG['download_segment_bytes'],
+                self._host_slot(url), on_progress=_progress, tee=tee, hasher=hasher,
+            )
+            try:
+                ok = dl.run()
+            except RangeNotSupported as e:
+                logger.info(f"[Segmented] Job {job_id}: {e}; falling back to single stream")
+                if tee is not None and tee.written:
+                    tee.abort()
+                if hasher is not None:
+                    hasher.reset()
+                part_path.unlink(missing_ok=True)
+                return None
+        if not ok:
+            part_path.unlink(missing_ok=True)
+            return False
+        return True
+
+    def _finalize_part(self, part_path: Path, dest: Path, tee: Optional[StreamTee] = None) -> None:
+        if tee is not None:
+            tee.rename()
+        else:
+            part_path.rename(dest)
 
-    def _download(self, url: str, dest: Path, job_id: int) -> bool:
+    def _observe_transfer(self, direction: str, size: int, t0: float) -> None:
+        elapsed = time.monotonic() - t0
+        self.metrics.inc('bkvf_transfer_bytes_total', size, direction=direction)
+        if elapsed > 0 and size:
+            self.metrics.observe('bkvf_transfer_throughput_bytes_per_second', size / elapsed, direction=direction)
+
+    def _download(self, url: str, dest: Path, job_id: int, tee: Optional[StreamTee] = None,
+                  hasher: Optional[StreamHasher] = None) -> bool:
+        """Fetch url into dest (see _download_source); finished downloads feed the transfer metrics."""
+        t0 = time.monotonic()
+        ok = self._download_source(url, dest, job_id, tee, hasher)
+        if ok:
+            try:
+                self._observe_transfer('download', dest.stat().st_size, t0)
+            except OSError:
+                pass
+        return ok
+
+    def _download_source(self, url: str, dest: Path, job_id: int, tee: Optional[StreamTee] = None,
+                         hasher: Optional[StreamHasher] = None) -> bool:
         """HEAD pre-check, disk quota 2x file size, 5GB limit, chunk 1MB, .part file, progress API.
-        Google Drive: try Drive API first (if GOOGLE_DRIVE_API_KEY), then gdown fallback."""
+        Range-capable sources ≥ DOWNLOAD_SEGMENT_MIN_MB are fetched as parallel segments.
+        Google Drive: try Drive API first (if GOOGLE_DRIVE_API_KEY), then gdown fallback.
+        tee: streaming mode — readers consume the .part file while it is being written.
+        hasher: SHA-256 of the bytes as they are written (gdown writes the file itself → no hash)."""
         part_path = dest.parent / (dest.name + '.part')
         max_bytes = CONFIG['max_url_download_bytes']
-        chunk_size = 1024 * 1024
+        if hasher is not None:
+            hasher.reset()
         try:
             if not self._validate_download_url(url):
                 self.fail_job(job_id, "SSRF: blocked URL", stage='download')
@@ -570,6 +879,17 @@ class BKVFAgentV2:
                     try:
                         api_url = f"https://www.googleapis.com/drive/v3/files/{file_id}?alt=media&key={api_key}"
                         self._update_job_status(job_id, 'DOWNLOADING')
+                        seg_total = self._segmented_total(api_url, None, False)
+                        if seg_total:
+                            if seg_total > max_bytes:
+                                self.fail_job(job_id, "5 GB limit aşıldı", stage='download')
+                                return False
+                            seg = self._download_segmented(api_url, part_path, job_id, seg_total, tee, hasher)
+                            if seg is False:
+                                return False
+                            if seg:
+                                self._finalize_part(part_path, dest, tee)
+                                return True
                         r = requests.get(api_url, stream=True, timeout=120)
                         if r.status_code == 200:
                             ct = (r.headers.get('Content-Type') or '').lower()
@@ -579,32 +899,22 @@ class BKVFAgentV2:
                             if total and total > max_bytes:
                                 self.fail_job(job_id, "5 GB limit aşıldı", stage='download')
                                 return False
-                            downloaded = 0
-                            last_pct = -1
-                            with open(part_path, 'wb') as f:
-                                for chunk in r.iter_content(chunk_size=chunk_size):
-                                    if not chunk:
-                                        continue
-                                    downloaded += len(chunk)
-                                    if downloaded > max_bytes:
-                                        part_path.unlink(missing_ok=True)
-                                        self.fail_job(job_id, "5 GB limit aşıldı", stage='download')
-                                        return False
-                                    f.write(chunk)
-                                    pct = round((downloaded / total * 100) if total and total > 0 else 0, 1)
-                                    if pct != last_pct and (int(pct) % 10 == 0 or pct >= 99):
-                                        self._update_download_progress(job_id, downloaded, total)
-                                        last_pct = pct
+                            if not self._stream_to_part(r, part_path, job_id, total, tee, hasher):
+                                return False
                             if part_path.exists() and part_path.stat().st_size > 0:
-                                part_path.rename(dest)
+                                self._finalize_part(part_path, dest, tee)
                                 return True
                         else:
                             raise RuntimeError(f"Drive API HTTP {r.status_code}")
                     except Exception as e:
                         logger.warning(f"Drive API download failed: {e}, trying gdown")
+                        if tee is not None and tee.written:
+                            tee.abort()
                         part_path.unlink(missing_ok=True)
 
                 if gdown:
+                    if hasher is not None:
+                        hasher.invalidate()
                     try:
                         self._update_job_status(job_id, 'DOWNLOADING')
                         gdown.download(id=file_id, output=str(part_path), quiet=True)
@@ -621,9 +931,11 @@ class BKVFAgentV2:
             # --- Generic URL (non–Drive) ---
             transformed = self._transform_url(url)
             content_length = None
+            accept_ranges = False
             try:
                 head = requests.head(transformed, timeout=30, allow_redirects=True)
                 if head.status_code == 200:
+                    accept_ranges = (head.headers.get('Accept-Ranges') or '').lower() == 'bytes'
                     cl = head.headers.get('Content-Length')
                     if cl:
                         content_length = int(cl)
@@ -645,29 +957,26 @@ class BKVFAgentV2:
             except Exception as e:
                 logger.warning(f"[Disk] disk_usage check failed: {e}")
             self._update_job_status(job_id, 'DOWNLOADING')
+            seg_total = self._segmented_total(transformed, content_length, accept_ranges)
+            if seg_total:
+                if seg_total > max_bytes:
+                    self.fail_job(job_id, "5 GB limit aşıldı", stage='download')
+                    return False
+                seg = self._download_segmented(transformed, part_path, job_id, seg_total, tee, hasher)
+                if seg is False:
+                    return False
+                if seg:
+                    self._finalize_part(part_path, dest, tee)
+                    return True
             r = requests.get(transformed, stream=True, timeout=120)
             r.raise_for_status()
             total = content_length or int(r.headers.get('Content-Length', 0) or 0)
             if total and total > max_bytes:
                 self.fail_job(job_id, "5 GB limit aşıldı", stage='download')
                 return False
-            downloaded = 0
-            last_pct = -1
-            with open(part_path, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=chunk_size):
-                    if not chunk:
-                        continue
-                    downloaded += len(chunk)
-                    if downloaded > max_bytes:
-                        part_path.unlink(missing_ok=True)
-                        self.fail_job(job_id, "5 GB limit aşıldı", stage='download')
-                        return False
-                    f.write(chunk)
-                    pct = round((downloaded / total * 100) if total and total > 0 else 0, 1)
-                    if pct != last_pct and (int(pct) % 10 == 0 or pct >= 99):
-                        self._update_download_progress(job_id, downloaded, total)
-                        last_pct = pct
-            part_path.rename(dest)
+            if not self._stream_to_part(r, part_path, job_id, total, tee, hasher):
+                return False
+            self._finalize_part(part_path, dest, tee)
             return True
         except Exception as e:
             part_path.unlink(missing_ok=True)
@@ -678,32 +987,207 @@ class BKVFAgentV2:
         data = {'job_id': job_id, 'worker_id': self.worker_id, 'r2_raw_key': r2_raw_key, 'file_size_input': file_size}
         return self._make_api_request('POST', '/api/jobs/url-import-done', data) is not None
 
-    def _upload_to_r2(self, path: Path, job_id: int, bucket: str, key: str, content_type: str = 'video/mp4') -> Optional[str]:
+    def _public_url(self, key: str) -> str:
+        cdn_base = CONFIG['cdn_base_url'].rstrip('/')
+        # Ensure absolute HTTPS URL — never write a relative path or bare domain to DB
+        if not cdn_base.startswith('https://') and not cdn_base.startswith('http://'):
+            cdn_base = 'https://' + cdn_base
+        return f"{cdn_base}/{key.lstrip('/')}"
+
+    def _upload_to_r2(self, path: Path, job_id: int, bucket: str, key: str, content_type: str = 'video/mp4',
+                      metadata: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """metadata: stored as x-amz-meta-* on the object (signed by the Worker; extra PUT headers come back in 'headers')."""
         payload = {'job_id': job_id, 'worker_id': self.worker_id, 'bucket': bucket, 'key': key, 'content_type': content_type}
-        resp = self._make_api_request('POST', '/api/jobs/presigned-upload', payload)
+        if metadata:
+            payload['metadata'] = metadata
+        size = path.stat().st_size
+        t0 = time.monotonic()
+        if size >= CONFIG['multipart_threshold_bytes']:
+            parts = plan_parts(size, CONFIG['multipart_part_bytes'])
+            resp = self._make_api_request('POST', '/api/jobs/presigned-upload',
+                                          {**payload, 'multipart': True, 'part_count': len(parts)})
+            if resp and resp.get('upload_id'):
+                if not self._upload_multipart(path, payload, parts, resp):
+                    return None
+                self._observe_transfer('upload', size, t0)
+                return self._public_url(key)
+            # Worker without multipart support answers with a single upload_url — use it below
+        else:
+            resp = self._make_api_request('POST', '/api/jobs/presigned-upload', payload)
         if not resp or 'upload_url' not in resp:
             return None
         try:
             with open(path, 'rb') as f:
-                r = requests.put(resp['upload_url'], data=f, timeout=600)
+                r = requests.put(resp['upload_url'], data=f, headers=resp.get('headers') or None, timeout=600)
             r.raise_for_status()
-            cdn_base = CONFIG['cdn_base_url'].rstrip('/')
-            # Ensure absolute HTTPS URL — never write a relative path or bare domain to DB
-            if not cdn_base.startswith('https://') and not cdn_base.startswith('http://'):
-                cdn_base = 'https://' + cdn_base
-            public_url = f"{cdn_base}/{key.lstrip('/')}"
-            return public_url
+            self._observe_transfer('upload', size, t0)
+            return self._public_url(key)
         except Exception as e:
             logger.error(f"R2 upload failed: {e}")
             return None
 
-    def _process_video(self, job: Dict, input_path: Path, work_dir: Path) -> Optional[Dict]:
+    def _upload_outputs(self, job_id: int, uploads: List,
+                        metadata: Optional[Dict[str, str]] = None) -> Dict[str, Optional[str]]:
+        """Upload [(key, path, content_type)] to the public bucket concurrently → {key: public_url or None}."""
+        if len(uploads) == 1:
+            key, path, ctype = uploads[0]
+            return {key: self._upload_to_r2(path, job_id, 'public', key, ctype, metadata)}
+        workers = max(1, min(CONFIG['output_upload_concurrency'], len(uploads)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"Upload-{job_id}") as pool:
+            futures = {key: pool.submit(self._upload_to_r2, path, job_id, 'public', key, ctype, metadata)
+                       for key, path, ctype in uploads}
+        return {key: fut.result() for key, fut in futures.items()}
+
+    def _upload_multipart(self, path: Path, payload: Dict, parts: List, resp: Dict) -> bool:
+        """Concurrent part upload; failed parts are re-signed and retried alone, then CompleteMultipartUpload.
+        Aborts the upload on final failure so R2 doesn't keep orphan parts."""
+        upload_id = resp['upload_id']
+        urls = {int(p['part_number']): p['url'] for p in resp.get('part_urls') or []}
+        etags: Dict[int, str] = {}
+        pending = parts
+        max_rounds = max(1, CONFIG['multipart_max_rounds'])
+        with requests.Session() as sess:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, CONFIG['multipart_concurrency']))
+            sess.mount('http://', adapter)
+            sess.mount('https://', adapter)
+            for attempt in range(max_rounds):
+                done, failed = upload_parts(sess, path, pending, urls, CONFIG['multipart_concurrency'])
+                etags.update(done)
+                if not failed:
+                    break
+                logger.warning(f"[Multipart] {payload['key']}: {len(failed)}/{len(parts)} part(s) failed (round {attempt + 1}/{max_rounds})")
+                pending = [p for p in parts if p[0] in failed]
+                if attempt + 1 < max_rounds:
+                    time.sleep(2 ** attempt)
+                    fresh = self._make_api_request('POST', '/api/jobs/presigned-upload', {
+                        **payload, 'multipart': True, 'upload_id': upload_id, 'part_numbers': failed,
+                    })
+                    if fresh and fresh.get('part_urls'):
+                        urls.update({int(p['part_number']): p['url'] for p in fresh['part_urls']})
+        if len(etags) != len(parts):
+            self._make_api_request('POST', '/api/jobs/multipart-abort', {**payload, 'upload_id': upload_id})
+            logger.error(f"R2 multipart upload failed: {payload['key']} ({len(parts) - len(etags)} part(s) missing)")
+            return False
+        done = self._make_api_request('POST', '/api/jobs/multipart-complete', {
+            **payload,
+            'upload_id': upload_id,
+            'parts': [{'part_number': n, 'etag': etags[n]} for n in sorted(etags)],
+        })
+        if not done or not done.get('ok'):
+            logger.error(f"R2 multipart complete failed: {payload['key']}")
+            return False
+        return True
+
+    def _probe_media(self, path: Path, timeout: int = 15) -> Dict:
+        """ffprobe input → meta dict (duration_sec, file_bytes, width, height, vertical, bitrate kbps, fps,
+        codec, profile, pix_fmt)."""
+        meta = {}
+        try:
+            probe = subprocess.run(
+                _wrap_io_priority(['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', str(path)]),
+                capture_output=True, text=True, timeout=timeout
+            )
+            if probe.returncode == 0:
+                d = json.loads(probe.stdout)
+                fmt = d.get('format', {})
+                dur_sec = float(fmt.get('duration', 0) or 0)
+                file_bytes = int(fmt.get('size', 0) or 0) or path.stat().st_size
+                meta['duration_sec'] = dur_sec
+                meta['file_bytes'] = file_bytes
+                for s in d.get('streams', []):
+                    if s.get('codec_type') == 'video':
+                        w = int(s.get('width', 0) or 0)
+                        h = int(s.get('height', 0) or 0)
+                        meta['width'] = w
+                        meta['height'] = h
+                        meta['vertical'] = h > w
+                        raw_br = int(s.get('bit_rate', 0) or fmt.get('bit_rate', 0) or 0)
+                        meta['bitrate'] = raw_br // 1000 if raw_br else 0
+                        meta['fps'] = self._parse_fps(s.get('r_frame_rate', '30'))
+                        meta['codec'] = s.get('codec_name') or ''
+                        meta['profile'] = s.get('profile') or ''
+                        meta['pix_fmt'] = s.get('pix_fmt') or ''
+                        break
+        except Exception:
+            pass
+        return meta
+
+    def _run_ffmpeg(self, proc: subprocess.Popen, job_id: int, timeout: float,
+                    stream: Optional[StreamTee] = None, duration_sec: float = 0.0,
+                    on_progress: Optional[Callable[[Dict], None]] = None):
+        """
+        Wait for an FFmpeg started with `-progress pipe:1 -nostats`, reading stdout/stderr incrementally:
+        progress blocks → throttled CONVERTING updates (time, fps, speed, ETA); stderr → bounded buffer.
+        stream: a feeder thread pumps the growing download into stdin; if the download aborts, FFmpeg is
+        killed instead of seeing a clean EOF (no truncated output). on_progress replaces the job status
+        update (chunked encodes combine several processes). Returns (last progress snapshot, StderrBuffer).
+        """
+        parser = ProgressParser(duration_sec)
+        err_buf = StderrBuffer(tail_bytes=CONFIG['ffmpeg_stderr_tail_kb'] * 1024)
+        interval = CONFIG['encode_progress_interval']
+        last_report = [time.monotonic()]
+        report = on_progress or (lambda snap: self._update_encode_progress(job_id, snap))
+
+        def _feed():
+            if not stream.pump(proc.stdin):
+                try:
+                    proc.kill()
+                except Exception:
+                    pass
+
+        def _read_progress():
+            for raw in iter(proc.stdout.readline, b''):
+                snap = parser.feed_line(raw.decode('utf-8', errors='replace'))
+                if snap and not snap['done'] and time.monotonic() - last_report[0] >= interval:
+                    last_report[0] = time.monotonic()
+                    report(snap)
+
+        def _read_stderr():
+            for block in iter(lambda: proc.stderr.read1(65536), b''):
+                err_buf.write(block)
+
+        threads = [
+            threading.Thread(target=_read_progress, name=f"FFProgress-{job_id}", daemon=True),
+            threading.Thread(target=_read_stderr, name=f"FFStderr-{job_id}", daemon=True),
+        ]
+        if stream is not None:
+            threads.append(threading.Thread(target=_feed, name=f"StreamFeed-{proc.pid}", daemon=True))
+        for t in threads:
+            t.start()
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            if stream is not None:
+                stream.cancel()
+            raise
+        for t in threads:
+            t.join(timeout=10)
+        return parser.last, err_buf
+
+    def _update_encode_progress(self, job_id: int, snap: Dict) -> None:
+        """Live encode progress (coalesced by the status outbox like download progress)."""
+        data = {'job_id': job_id, 'worker_id': self.worker_id, 'status': 'CONVERTING'}
+        for src, dst in (('percent', 'encode_progress'), ('fps', 'encode_fps'),
+                         ('speed', 'encode_speed'), ('eta_sec', 'encode_eta_seconds')):
+            if snap.get(src) is not None:
+                data[dst] = snap[src]
+        logger.debug(f"[Encode] job={job_id} t={snap.get('out_time_sec')}s {snap.get('percent', '?')}% "
+                     f"fps={snap.get('fps')} speed={snap.get('speed')}x eta={snap.get('eta_sec')}s")
+        self.outbox.enqueue('status', job_id, data)
+
+    def _encode_video(self, job: Dict, input_path: Path, work_dir: Path, stream: Optional[StreamTee] = None) -> Optional[Dict]:
         """
         Process video based on processing_profile. Native: no bitrate/FPS override; only CRF + preset.
         web_opt/web_optimize = -c:v copy -an; crf_10..crf_18 = -crf N -preset slow (scale from quality).
+        stream: input is still downloading — probe the buffered head and feed FFmpeg via stdin (pipe:0).
+        Ladder jobs (quality "720p,1080p" or a renditions list): one decode, split filter, one output per
+        quality; the highest rendition is the primary public_url, every rendition goes into 'renditions'.
+        Long re-encodes of a finished download (>= CHUNKED_ENCODE_MIN_SEC) run as parallel keyframe chunks.
+        Returns the local outputs + encode stats for _publish_outputs (nothing is uploaded here).
         """
         job_id = job['id']
-        quality = job.get('quality', '720p')
+        ladder = self._ladder_qualities(job)
+        quality = ladder[-1] if ladder else job.get('quality', '720p')
         profile = job.get('processing_profile', '12')
         crf_int = job.get('crf') if job.get('crf') is not None else (job.get('bk') or {}).get('crf')
         qmap = {'original': 'original', '720p': '720', '1080p': '1080', '2k': '2k', '4k': '4k'}
@@ -715,32 +1199,19 @@ class BKVFAgentV2:
         try:
             self._update_job_status(job_id, 'CONVERTING')
 
-            meta = {}
-            try:
-                probe = subprocess.run(
-                    _wrap_io_priority(['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', str(input_path)]),
-                    capture_output=True, text=True, timeout=15
+            # One input probe per raw object: retries/resumes hit the on-disk cache
+            if stream is not None:
+                probe_key = probe_cache_key(job.get('r2_raw_key'), stream.total)
+                meta, probe_hit = self.probe_cache.probe(
+                    probe_key, lambda: self._probe_media(stream.write_probe_head(work_dir / 'probe-head'))
                 )
-                if probe.returncode == 0:
-                    d = json.loads(probe.stdout)
-                    fmt = d.get('format', {})
-                    dur_sec = float(fmt.get('duration', 0) or 0)
-                    file_bytes = int(fmt.get('size', 0) or 0) or input_path.stat().st_size
-                    meta['duration_sec'] = dur_sec
-                    meta['file_bytes'] = file_bytes
-                    for s in d.get('streams', []):
-                        if s.get('codec_type') == 'video':
-                            w = int(s.get('width', 0) or 0)
-                            h = int(s.get('height', 0) or 0)
-                            meta['width'] = w
-                            meta['height'] = h
-                            meta['vertical'] = h > w
-                            raw_br = int(s.get('bit_rate', 0) or fmt.get('bit_rate', 0) or 0)
-                            meta['bitrate'] = raw_br // 1000 if raw_br else 0
-                            meta['fps'] = self._parse_fps(s.get('r_frame_rate', '30'))
-                            break
-            except Exception:
-                pass
+                if stream.total:
+                    meta['file_bytes'] = stream.total
+                ffmpeg_input = 'pipe:0'
+            else:
+                probe_key = probe_cache_key(job.get('r2_raw_key'), input_path.stat().st_size)
+                meta, probe_hit = self.probe_cache.probe(probe_key, lambda: self._probe_media(input_path))
+                ffmpeg_input = str(input_path)
             meta.setdefault('bitrate', 0)
             meta.setdefault('fps', 30)
             meta.setdefault('vertical', False)
@@ -754,14 +1225,7 @@ class BKVFAgentV2:
 
             # Scale filter: original / web_opt = no scale; else quality-based
             vert = meta['vertical']
-            scale_map = {
-                '720p': ('scale=720:-2:flags=lanczos', 'scale=-2:720:flags=lanczos'),
-                '1080p': ('scale=1080:-2:flags=lanczos', 'scale=-2:1080:flags=lanczos'),
-                '2k': ('scale=1440:-2:flags=lanczos', 'scale=-2:1440:flags=lanczos'),
-                '4k': ('scale=2160:-2:flags=lanczos', 'scale=-2:2160:flags=lanczos'),
-            }
-            res_map = {'720p': ('720x1280', '1280x720'), '1080p': ('1080x1920', '1920x1080'),
-                       '2k': ('1440x2560', '2560x1440'), '4k': ('2160x3840', '3840x2160')}
+            scale_map, res_map = SCALE_FILTERS, RESOLUTIONS
             if quality in scale_map and quality != 'original':
                 sc_vert, sc_hor = scale_map[quality]
                 scale_str = sc_vert if vert else sc_hor
@@ -769,159 +1233,822 @@ class BKVFAgentV2:
             else:
                 scale_str = None
                 target_res = f"{meta['width']}x{meta['height']}"
+            # Ladder: (quality, scale filter, target resolution, output file) per rendition, lowest first
+            renditions = [
+                (q, scale_map[q][0] if vert else scale_map[q][1], res_map[q][0] if vert else res_map[q][1],
+                 work_dir / f"{base_clean}-{qmap[q]}.mp4")
+                for q in ladder
+            ]
 
             # Build FFmpeg cmd — no -b:v, -maxrate, -minrate, -bufsize, -r, -vsync (Bitrate/FPS: source preserved)
-            threads_opt = (['-threads', str(CONFIG['ffmpeg_threads'])] if CONFIG.get('ffmpeg_threads', 0) > 0 else [])
-            if profile in ('web_opt', 'web_optimize'):
-                cmd = [
-                    self.ffmpeg_path, '-i', str(input_path),
-                ] + threads_opt + [
-                    '-c:v', 'copy', '-an', '-movflags', '+faststart',
-                    '-y', str(output_file),
-                ]
-            else:
-                # Priority: integer crf from D1 (6, 8, 10, 12, 14). Fallback: parse processing_profile or legacy map.
-                VALID_CRF = (6, 8, 10, 12, 14)
-                if crf_int is not None and int(crf_int) in VALID_CRF:
-                    crf = int(crf_int)
-                elif profile.startswith('crf_'):
-                    try:
-                        crf = int(profile.split('_')[1])
-                    except (ValueError, IndexError):
-                        crf = 12
+            copy_only = profile in ('web_opt', 'web_optimize')
+            if copy_only and renditions:
+                logger.info(f"[Ladder] Job {job_id}: {profile} is a stream copy — single output {quality}")
+                renditions = []
+            remux = False
+            if not copy_only and not renditions and stream is None and CONFIG['remux_fast_path']:
+                reason = remux_reject_reason(meta, target_res, CONFIG['remux_max_bitrate_ratio'])
+                if reason is None:
+                    remux = copy_only = True
+                    target_res = f"{meta['width']}x{meta['height']}"
+                    logger.info(f"[Remux] Job {job_id}: source is H.264 {meta.get('profile')} {meta.get('pix_fmt')} "
+                                f"{target_res} @ {meta['bitrate']} kbps — remux instead of re-encode")
                 else:
-                    crf_map = CONFIG.get('ffmpeg_crf_map', {'native': 14, 'ultra': 16, 'dengeli': 14, 'kucuk_dosya': 18})
-                    crf = crf_map.get(profile, 12)
-                if scale_str:
-                    cmd = [
-                        self.ffmpeg_path, '-i', str(input_path),
-                    ] + threads_opt + [
-                        '-vf', scale_str,
-                        '-c:v', 'libx264', '-crf', str(crf), '-preset', 'slow', '-an',
-                        '-movflags', '+faststart',
-                        '-profile:v', 'high', '-level', '4.1', '-pix_fmt', 'yuv420p',
-                        '-y', str(output_file),
-                    ]
+                    logger.debug(f"[Remux] Job {job_id}: re-encode ({reason})")
+            crf = requested_crf = None if copy_only else self._resolve_crf(profile, crf_int)
+            preset = None
+            if not copy_only:
+                preset, crf = self._choose_preset(job_id, crf)
+            outputs = [r[3] for r in renditions] or [output_file]
+            scales = [r[1] for r in renditions] or [scale_str]
+            out_res = [r[2] for r in renditions] or [target_res]
+            # Poster (+ optional storyboard sprites) as extra outputs of this pass — no second decode
+            thumb_filename = output_filename.replace('.mp4', '-thumb.jpg')
+            thumb_file = work_dir / thumb_filename
+            extra = thumbnail_args(0, thumbnail_time(meta['duration_sec']),
+                                   CONFIG.get('thumbnail_scale', '360:-2'), thumb_file)
+            storyboard = None
+            if (CONFIG.get('storyboard') or job.get('storyboard')) and meta['duration_sec'] > 0:
+                tile_w, tile_h = tile_size(target_res, CONFIG['storyboard_tile_width'])
+                cols, rows = CONFIG['storyboard_cols'], CONFIG['storyboard_rows']
+                sb_base = output_filename.replace('.mp4', '-storyboard')
+                storyboard = (tile_w, tile_h, cols, rows, sb_base)
+                extra += storyboard_args(0, CONFIG['storyboard_interval'], tile_w, tile_h, cols, rows,
+                                         work_dir / f"{sb_base}-%03d.jpg")
+            start = ffmpeg_start = time.time()
+            chunked = None
+            min_chunked = CONFIG['chunked_encode_min_sec']
+            if not copy_only and stream is None and 0 < min_chunked <= meta['duration_sec']:
+                chunked = self._encode_chunked(job_id, meta, input_path, work_dir, scales, outputs, out_res,
+                                               crf, extra, preset, resume_sig={'raw': probe_key,
+                                                                               'crf': requested_crf,
+                                                                               'scales': scales, 'out_res': out_res})
+            if chunked is not None:
+                progress, err_buf, cmd_str, returncode = chunked
+            else:
+                # Scheduler admits the encode and sizes its thread pool (replaces the fixed semaphore/-threads)
+                threads = self._acquire_encode_slot(job_id, meta, out_res, crf, preset or 'copy')
+                ffmpeg_start = time.time()
+                threads_opt = ['-threads', str(threads)] if threads > 0 else []
+                if copy_only:
+                    cmd = copy_cmd(self.ffmpeg_path, ffmpeg_input, output_file, threads_opt)
                 else:
-                    cmd = [
-                        self.ffmpeg_path, '-i', str(input_path),
-                    ] + threads_opt + [
-                        '-c:v', 'libx264', '-crf', str(crf), '-preset', 'slow', '-an',
-                        '-movflags', '+faststart',
-                        '-profile:v', 'high', '-level', '4.1', '-pix_fmt', 'yuv420p',
-                        '-y', str(output_file),
-                    ]
-            cmd_str = ' '.join(cmd)
-            start = time.time()
-            _popen_flags = subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform == 'win32' else 0
-            with self._encode_semaphore:
-                _ffmpeg_proc = subprocess.Popen(
-                    _wrap_io_priority(cmd),
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    creationflags=_popen_flags,
-                )
-                _apply_windows_priority(_ffmpeg_proc.pid)
-                self._active_procs[job_id] = _ffmpeg_proc
+                    cmd = self._x264_cmd(ffmpeg_input, scales, outputs, crf, threads_opt, preset=preset)
+                cmd += extra
+                # Machine-readable progress on stdout; stderr keeps only headers/warnings (bounded buffer)
+                cmd[1:1] = ['-progress', 'pipe:1', '-nostats']
+                cmd_str = ' '.join(cmd)
+                _popen_flags = subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform == 'win32' else 0
                 try:
-                    _ffmpeg_stdout, _ffmpeg_stderr = _ffmpeg_proc.communicate(
-                        timeout=CONFIG['timeout_minutes'] * 60
+                    _ffmpeg_proc = subprocess.Popen(
+                        _wrap_io_priority(cmd),
+                        stdin=subprocess.PIPE if stream is not None else None,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE,
+                        creationflags=_popen_flags,
                     )
-                except subprocess.TimeoutExpired:
-                    _ffmpeg_proc.kill()
-                    _ffmpeg_proc.wait()
-                    self.fail_job(job_id, "FFmpeg timeout", stage='convert')
-                    return None
+                    _apply_windows_priority(_ffmpeg_proc.pid)
+                    self._active_procs[job_id] = _ffmpeg_proc
+                    try:
+                        progress, err_buf = self._run_ffmpeg(
+                            _ffmpeg_proc, job_id, CONFIG['timeout_minutes'] * 60, stream, meta['duration_sec']
+                        )
+                    except subprocess.TimeoutExpired:
+                        _ffmpeg_proc.kill()
+                        _ffmpeg_proc.wait()
+                        self.fail_job(job_id, "FFmpeg timeout", stage='convert')
+                        return None
+                    finally:
+                        self._cleanup_zombies(job_id)
                 finally:
-                    self._cleanup_zombies(job_id)
+                    self.encode_scheduler.release(job_id)
+                returncode = _ffmpeg_proc.returncode
             elapsed = int(time.time() - start)
 
-            if _ffmpeg_proc.returncode != 0:
-                ffmpeg_err = _ffmpeg_stderr or _ffmpeg_stdout or ''
+            if returncode != 0:
+                if stream is not None and stream.aborted:
+                    # Download failed/restarted under FFmpeg; caller falls back to the finished file
+                    logger.warning(f"[Stream] Job {job_id}: input stream aborted, streaming encode discarded")
+                    return None
+                ffmpeg_err = err_buf.text()[-4000:]  # fail_job keeps 4000 chars: send the tail, where the error is
                 logger.debug(f"FFmpeg stderr: {ffmpeg_err}")
                 self.fail_job(job_id, "FFmpeg failed", stage='convert', ffmpeg_output=ffmpeg_err)
                 return None
 
-            self._update_job_status(job_id, 'UPLOADING')
-            r2_key = f"videos/{datetime.now().year}/{datetime.now().month:02d}/{job_id}_{output_filename}"
-            public_url = self._upload_to_r2(output_file, job_id, 'public', r2_key)
-            if not public_url:
-                self.fail_job(job_id, "R2 upload failed", stage='upload')
-                return None
+            # Output metadata from FFmpeg's own stats (Output #N stream lines + final frame count), no ffprobe
+            enc_stats = parse_encode_stats(err_buf.head_text())
+            if progress.get('frame'):
+                enc_stats['frames'] = progress['frame']
+            if progress.get('out_time_sec'):
+                enc_stats['time_sec'] = progress['out_time_sec']
+            meta_out = output_meta(enc_stats, len(renditions) - 1 if renditions else 0)
+            self.probe_cache.output_probe_avoided()
+            wall = time.time() - ffmpeg_start  # chunked: whole chunk fan-out incl. chunk slot waits
+            if wall > 0:
+                if enc_stats.get('frames'):
+                    self.metrics.observe('bkvf_encode_fps', enc_stats['frames'] / wall, preset=preset or 'copy')
+                if meta.get('duration_sec'):
+                    self.metrics.observe('bkvf_encode_speed_ratio', meta['duration_sec'] / wall,
+                                         preset=preset or 'copy')
+            if preset:
+                out_pixels = sum(w * h for w, h in filter(None, map(parse_res, out_res)))
+                self.governor.observe_job(meta['duration_sec'], out_pixels)
+                if chunked is None and stream is None:  # chunks report per process; streams run at download speed
+                    self.governor.observe_encode(preset, meta['duration_sec'], out_pixels, time.time() - start)
 
-            meta_out = {}
+            return {
+                'job_id': job_id,
+                'work_dir': work_dir,
+                'meta': meta,
+                'probe_hit': probe_hit,
+                'target_res': target_res,
+                'output_file': output_file,
+                'output_filename': output_filename,
+                'renditions': renditions,
+                'thumb_file': thumb_file,
+                'thumb_filename': thumb_filename,
+                'storyboard': storyboard,
+                'enc_stats': enc_stats,
+                'meta_out': meta_out,
+                'elapsed': elapsed,
+                'cmd_str': cmd_str,
+                'encode_path': 'remux' if remux else 'copy' if copy_only else 'chunked' if chunked else 'x264',
+                'ffmpeg_output': err_buf.text(),
+            }
+        except subprocess.TimeoutExpired:
+            self.fail_job(job_id, "FFmpeg timeout", stage='convert')
+            return None
+        except StreamAborted:
+            logger.warning(f"[Stream] Job {job_id}: input stream aborted before encode")
+            return None
+        except JobHandedBack:
+            raise
+        except Exception as e:
+            self.fail_job(job_id, str(e), stage='convert')
+            return None
+        finally:
+            self.encode_scheduler.release(job_id)
+            self._leave_prefetch(job_id)
+            self._cleanup_zombies(job_id)
+
+    def _x264_cmd(self, src: str, scales: List[Optional[str]], outputs: List[Path], crf: int,
+                  threads_opt: List[str], faststart: bool = True, preset: str = 'slow') -> List[str]:
+        """libx264 encode of src into outputs (one per scale; several = decode once, split filter)."""
+        return x264_cmd(self.ffmpeg_path, src, scales, outputs, crf, threads_opt, faststart, preset)
+
+    def _encode_chunked(self, job_id: int, meta: Dict, input_path: Path, work_dir: Path,
+                        scales: List[Optional[str]], outputs: List[Path], out_res: List[str], crf: int,
+                        extra: List[str], preset: str = 'slow', resume_sig: Optional[Dict] = None):
+        """
+        Long inputs: cut the video stream at keyframes, encode the chunks as separate FFmpeg processes
+        (each admitted by the encode scheduler), join each output with the concat demuxer (+faststart,
+        thumbnail/storyboard as extra outputs of the join). Returns (progress, StderrBuffer, cmd_str,
+        returncode) like the single pass, or None to encode in one pass (too short to split, no room
+        for the split copy, a chunk came out shorter than its slice).
+        SEGMENT_FANOUT: the chunks are also published as segment tasks; local encodes claim them from the
+        front, peer agents from the back, and the owner downloads what peers finished before the join.
+        RESUMABLE_ENCODE (resume_sig given): the chunk dir outlives the attempt with a manifest of finished
+        chunks; a retry with the same signature encodes only the missing ones, with the preset/CRF recorded
+        in the manifest rather than the governor's current choice (encode_resume.py).
+        """
+        deadline = time.monotonic() + CONFIG['timeout_minutes'] * 60
+        parallel = CONFIG['chunk_parallel'] or self.encode_scheduler.max_jobs
+        seg_sec = chunk_seconds(meta['duration_sec'], CONFIG['chunk_seconds'], parallel)
+        manifest, resumed = None, None
+        if CONFIG['resumable_encode'] and resume_sig is not None:
+            chunk_dir = resume_dir(self.resume_root, job_id)
+            manifest = ResumeManifest.open(chunk_dir, {**resume_sig, 'seg_sec': seg_sec, 'outputs': len(outputs)},
+                                           {'preset': preset, 'crf': crf})
+            if manifest.resumed:
+                resumed = manifest.usable(lambda i: [chunk_dir / f"out{k}-{i:04d}.mp4" for k in range(len(outputs))])
+                if resumed is None:
+                    logger.info(f"[Resume] Job {job_id}: chunk sources gone — splitting again")
+                    shutil.rmtree(chunk_dir, ignore_errors=True)
+                    chunk_dir.mkdir(parents=True)
+                elif (manifest.settings.get('preset'), manifest.settings.get('crf')) != (preset, crf):
+                    logger.info(f"[Resume] Job {job_id}: keeping preset={manifest.settings.get('preset')} "
+                                f"crf={manifest.settings.get('crf')} of the finished chunks "
+                                f"(governor now {preset}/{crf})")
+                    preset = manifest.settings.get('preset') or preset
+                    crf = manifest.settings.get('crf', crf)
+        else:
+            chunk_dir = work_dir / 'chunks'
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+            chunk_dir.mkdir()
+        t0 = time.monotonic()
+        if resumed is not None:
+            segments = manifest.segments()
+            logger.info(f"[Resume] Job {job_id}: {len(resumed)}/{len(segments)} chunks already encoded "
+                        f"— encoding the rest")
+        else:
             try:
-                probe2 = subprocess.run(
-                    _wrap_io_priority(['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', str(output_file)]),
-                    capture_output=True, text=True, timeout=10
-                )
-                if probe2.returncode == 0:
-                    d2 = json.loads(probe2.stdout)
-                    for s in d2.get('streams', []):
-                        if s.get('codec_type') == 'video':
-                            meta_out['resolution'] = f"{s.get('width', 0)}x{s.get('height', 0)}"
-                            meta_out['frame_rate'] = self._parse_fps(s.get('r_frame_rate', '30'))
-                            break
-                    if 'format' in d2 and 'duration' in d2['format']:
-                        meta_out['duration'] = int(float(d2['format']['duration']))
-            except Exception:
-                pass
+                if shutil.disk_usage(str(chunk_dir)).free < input_path.stat().st_size * 1.2:
+                    logger.warning(f"[Chunked] Job {job_id}: no disk room for the split copy — single-pass encode")
+                    shutil.rmtree(chunk_dir, ignore_errors=True)
+                    return None
+            except OSError:
+                return None
+            split = subprocess.run(_wrap_io_priority(split_args(self.ffmpeg_path, input_path, seg_sec, chunk_dir)),
+                                   capture_output=True, text=True, timeout=max(1.0, deadline - time.monotonic()))
+            segments = read_segments(chunk_dir)
+            if split.returncode != 0 or len(segments) < 2:
+                logger.warning(f"[Chunked] Job {job_id}: split gave {len(segments)} chunk(s) "
+                               f"(rc={split.returncode} {split.stderr.strip()[-200:]}) — single-pass encode")
+                shutil.rmtree(chunk_dir, ignore_errors=True)
+                return None
+            if manifest is not None:
+                manifest.set_cuts(segments, {'preset': preset, 'crf': crf})
+            resumed = {}
+        logger.info(f"[Chunked] Job {job_id}: {len(segments)} keyframe chunks of ~{seg_sec}s "
+                    f"(split {time.monotonic() - t0:.1f}s), up to {parallel} encodes in parallel")
+
+        agg = ChunkProgress([end - begin for _, begin, end in segments])
+        for i, frames in resumed.items():
+            agg.update(i, {'out_time_sec': segments[i][2] - segments[i][1], 'frame': frames, 'done': True})
+        todo = [i for i in range(len(segments)) if i not in resumed]
+        interval = CONFIG['encode_progress_interval']
+        last_report = [time.monotonic()]
+        failed = threading.Event()
+        packets = [0] * len(segments)
+        seams: List[str] = []
+        chunk_outs = [[chunk_dir / f"out{k}-{i:04d}.mp4" for i in range(len(segments))] for k in range(len(outputs))]
+        first_cmd: List[str] = []
+        out_pixels = sum(w * h for w, h in filter(None, map(parse_res, out_res)))  # governor speed samples
+        _popen_flags = subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform == 'win32' else 0
+
+        def _chunk_done(i: int) -> None:
+            if manifest is not None:
+                self._update_job_checkpoint(job_id, manifest.mark_done(i, agg.frames[i]))
+
+        def _report(i: int, snap: Dict) -> None:
+            combined = agg.update(i, snap)
+            if time.monotonic() - last_report[0] >= interval:
+                last_report[0] = time.monotonic()
+                self._update_encode_progress(job_id, combined)
+
+        def _encode_chunk(i: int) -> Optional[StderrBuffer]:
+            """None = chunk encoded; a StderrBuffer = FFmpeg failed (or skipped after another failure)."""
+            src, begin, end = segments[i]
+            if failed.is_set():
+                return StderrBuffer()
+            try:
+                if not packets[i]:
+                    listed = subprocess.run(_wrap_io_priority(packet_list_args(self.ffmpeg_path, src)),
+                                            capture_output=True, text=True,
+                                            timeout=max(1.0, deadline - time.monotonic()))
+                    packets[i] = count_packets(listed.stdout)
+            except subprocess.TimeoutExpired:
+                failed.set()
+                raise
+            slot = f"{job_id}:c{i}"
+            try:
+                threads = self._acquire_encode_slot(job_id, meta, out_res, crf, preset, slot=slot,
+                                                    duration_sec=end - begin)
+            except JobHandedBack:
+                failed.set()
+                raise
+            try:
+                if failed.is_set():
+                    return StderrBuffer()
+                cmd = self._x264_cmd(str(src), scales, [outs[i] for outs in chunk_outs], crf,
+                                     ['-threads', str(threads)] if threads > 0 else [], faststart=False,
+                                     preset=preset)
+                cmd[1:1] = ['-progress', 'pipe:1', '-nostats']
+                if i == todo[0]:  # first chunk this attempt encodes (earlier ones may be resumed)
+                    first_cmd.extend(cmd)
+                t_chunk = time.monotonic()
+                proc = subprocess.Popen(_wrap_io_priority(cmd), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                        creationflags=_popen_flags)
+                _apply_windows_priority(proc.pid)
+                self._active_procs[slot] = proc
+                try:
+                    last, err_buf = self._run_ffmpeg(proc, job_id, max(1.0, deadline - time.monotonic()), None,
+                                                     end - begin, on_progress=lambda snap: _report(i, snap))
+                except subprocess.TimeoutExpired:
+                    failed.set()
+                    raise
+                finally:
+                    self._cleanup_zombies(slot)
+                if proc.returncode != 0:
+                    failed.set()
+                    self._kill_chunks(job_id)
+                    return err_buf
+                agg.update(i, last)
+                self.governor.observe_encode(preset, end - begin, out_pixels, time.monotonic() - t_chunk)
+                if not fanout:
+                    src.unlink(missing_ok=True)  # split copy no longer needed (fan-out may still upload it)
+                if packets[i] and agg.frames[i] < packets[i]:
+                    # Open GOP: frames before the cut's first keyframe did not decode — the join would jump
+                    seams.append(f"chunk {i} encoded {agg.frames[i]} of {packets[i]} frames")
+                    failed.set()
+                    self._kill_chunks(job_id)
+                    return None
+                _chunk_done(i)
+                return None
+            finally:
+                self.encode_scheduler.release(slot)
+
+        fanout = CONFIG['segment_fanout'] and len(todo) > 1 and self._publish_segments(
+            job_id, segments, todo, packets, deadline,
+            {'crf': crf, 'preset': preset, 'scales': scales, 'out_res': out_res,
+             'width': meta['width'], 'height': meta['height']},
+            len(outputs))
+        errors, raised = [], None
+        if fanout:
+            try:
+                errors = self._run_segment_tasks(job_id, segments, set(resumed), packets, chunk_outs, agg, parallel,
+                                                 deadline, failed, seams, _encode_chunk, _chunk_done)
+            except (JobHandedBack, subprocess.TimeoutExpired) as e:
+                raised = e
+                self._kill_chunks(job_id)
+            finally:
+                self._make_api_request('POST', '/api/jobs/segments/clear',
+                                       {'job_id': job_id, 'worker_id': self.worker_id})
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, min(parallel, len(todo))),
+                                    thread_name_prefix=f"Chunk-{job_id}") as pool:
+                futures = [pool.submit(_encode_chunk, i) for i in todo]
+                for fut in futures:
+                    try:
+                        err = fut.result()
+                    except (JobHandedBack, subprocess.TimeoutExpired) as e:
+                        raised = raised or e
+                        self._kill_chunks(job_id)
+                        continue
+                    if err is not None:
+                        errors.append(err)
+        if raised is not None:
+            if manifest is None:
+                shutil.rmtree(chunk_dir, ignore_errors=True)
+            raise raised
+        if seams:
+            logger.warning(f"[Chunked] Job {job_id}: {seams[0]} — re-encoding in a single pass")
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+            return None
+        if errors:
+            real = [e for e in errors if e.text()] or errors
+            return {}, real[0], ' '.join(first_cmd), 1
+        logger.info(f"[Chunked] Job {job_id}: {len(segments)} chunks ({agg.encoded_frames()} frames) encoded "
+                    f"in {time.monotonic() - t0:.1f}s, joining")
+
+        lists = [write_concat_list(chunk_dir / f"out{k}.ffconcat", outs) for k, outs in enumerate(chunk_outs)]
+        cmd = concat_args(self.ffmpeg_path, lists, outputs) + extra
+        cmd[1:1] = ['-progress', 'pipe:1', '-nostats']
+        cmd_str = f"chunked x{len(segments)} ({seg_sec}s): {' '.join(first_cmd)} | {' '.join(cmd)}"
+        proc = subprocess.Popen(_wrap_io_priority(cmd), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                creationflags=_popen_flags)
+        _apply_windows_priority(proc.pid)
+        self._active_procs[job_id] = proc
+        try:
+            progress, err_buf = self._run_ffmpeg(proc, job_id, max(1.0, deadline - time.monotonic()),
+                                                 on_progress=lambda snap: None)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            self._cleanup_zombies(job_id)
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+        return progress, err_buf, cmd_str, proc.returncode
+
+    def _segment_keys(self, job_id: int, i: int, n_outputs: int):
+        """Raw-bucket keys of chunk i: (source, [encoded output per rendition])."""
+        return (f"segments/{job_id}/src-{i:04d}.mkv",
+                [f"segments/{job_id}/out{k}-{i:04d}.mp4" for k in range(n_outputs)])
+
+    def _publish_segments(self, job_id: int, segments: List, todo: List[int], packets: List[int], deadline: float,
+                          params: Dict, n_outputs: int) -> bool:
+        """Count the packets of the chunks in todo and publish them as segment tasks; False = encode locally only."""
+        try:
+            for i in todo:
+                listed = subprocess.run(_wrap_io_priority(packet_list_args(self.ffmpeg_path, segments[i][0])),
+                                        capture_output=True, text=True, timeout=max(1.0, deadline - time.monotonic()))
+                packets[i] = count_packets(listed.stdout)
+        except subprocess.TimeoutExpired:
+            return False
+        tasks = []
+        for i in todo:
+            _, begin, end = segments[i]
+            src_key, out_keys = self._segment_keys(job_id, i, n_outputs)
+            tasks.append({'seq': i, 'src_key': src_key, 'out_keys': out_keys, 'duration': round(end - begin, 3),
+                          'packets': packets[i]})
+        resp = self._make_api_request('POST', '/api/jobs/segments/publish', {
+            'job_id': job_id, 'worker_id': self.worker_id, 'params': params, 'segments': tasks,
+        })
+        if not resp or not resp.get('ok'):
+            logger.warning(f"[Segments] Job {job_id}: publish failed — chunks stay local")
+            return False
+        logger.info(f"[Segments] Job {job_id}: {len(tasks)} segment tasks published for peer agents")
+        return True
+
+    def _run_segment_tasks(self, job_id: int, segments: List, already_done: set, packets: List[int],
+                           chunk_outs: List[List[Path]], agg: ChunkProgress, parallel: int, deadline: float,
+                           failed: threading.Event, seams: List[str],
+                           encode_chunk: Callable[[int], Optional[StderrBuffer]],
+                           on_fetched: Callable[[int], None]) -> List:
+        """
+        Owner side of a published chunked encode. Local workers claim the job's tasks lowest seq first while
+        an uploader puts the unclaimed sources in the raw bucket highest seq first (peers claim those).
+        Then poll until every chunk is done: peer outputs are downloaded and checked against the chunk's
+        packet count; tasks peers gave up on (or all of them, while the API is unreachable) are encoded
+        here. already_done: chunks finished by an earlier attempt (not published). Returns the StderrBuffers
+        of failed local encodes.
+        """
+        n = len(segments)
+        n_outputs = len(chunk_outs)
+        claim_lock = threading.Lock()
+        local_claimed = set(already_done)
+        done = set(already_done)
+        fetched = set()  # encoded by peers
+        stop = threading.Event()
+
+        def _claim():
+            resp = self._make_api_request('POST', '/api/jobs/segments/claim',
+                                          {'job_id': job_id, 'worker_id': self.worker_id})
+            task = (resp or {}).get('task')
+            if task:
+                with claim_lock:
+                    local_claimed.add(task['seq'])
+            return task
+
+        def _encode_task(task: Dict) -> Optional[StderrBuffer]:
+            i = task['seq']
+            err = encode_chunk(i)
+            self._finish_segment(task['id'], err is None, agg.frames[i], err.text()[-1000:] if err else None)
+            if err is None:
+                done.add(i)
+            return err
+
+        def _local_worker() -> Optional[StderrBuffer]:
+            while not failed.is_set():
+                task = _claim()
+                if not task:
+                    return None
+                err = _encode_task(task)
+                if err is not None:
+                    return err
+            return None
+
+        def _upload_sources() -> None:
+            for i in reversed(range(n)):
+                with claim_lock:
+                    if stop.is_set() or i in local_claimed:
+                        continue
+                src_key, _ = self._segment_keys(job_id, i, n_outputs)
+                if not self._upload_to_r2(segments[i][0], job_id, 'raw', src_key, 'video/x-matroska'):
+                    logger.warning(f"[Segments] Job {job_id}: source upload of chunk {i} failed, uploader stops")
+                    return
+                self._make_api_request('POST', '/api/jobs/segments/ready',
+                                       {'job_id': job_id, 'worker_id': self.worker_id, 'seqs': [i]})
+
+        uploader = threading.Thread(target=_upload_sources, name=f"SegUpload-{job_id}", daemon=True)
+        uploader.start()
+        errors = []
+        workers = max(1, min(parallel, n - len(done)))
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"Chunk-{job_id}") as pool:
+                futures = [pool.submit(_local_worker) for _ in range(workers)]
+                for fut in futures:
+                    err = fut.result()
+                    if err is not None:
+                        errors.append(err)
+            stop.set()
+            misses = 0
+            while not errors and not failed.is_set() and len(done) < n:
+                if time.monotonic() > deadline:
+                    raise subprocess.TimeoutExpired('segment fan-out', CONFIG['timeout_minutes'] * 60)
+                task = _claim()  # peer failures and stale peer claims come back here
+                if task:
+                    err = _encode_task(task)
+                    if err is not None:
+                        errors.append(err)
+                    continue
+                resp = self._make_api_request('POST', '/api/jobs/segments/status',
+                                              {'job_id': job_id, 'worker_id': self.worker_id})
+                if resp is None:
+                    misses += 1
+                    orphans = [i for i in range(n) if i not in done] if misses >= 3 else []
+                else:
+                    misses = 0
+                    tasks = {t['seq']: t for t in resp.get('tasks') or []}
+                    orphans = [i for i in range(n) if i not in done and i not in tasks]
+                    for i, t in sorted(tasks.items()):
+                        if i in done:
+                            continue
+                        if t['status'] == 'FAILED':
+                            orphans.append(i)
+                        elif t['status'] == 'DONE' and t.get('download_urls'):
+                            got = self._fetch_segment_outputs(job_id, t, [outs[i] for outs in chunk_outs],
+                                                              packets[i], deadline)
+                            if got is None:
+                                orphans.append(i)
+                            elif got < packets[i]:
+                                seams.append(f"chunk {i} encoded {got} of {packets[i]} frames (peer {t['worker_id']})")
+                                failed.set()
+                            else:
+                                agg.update(i, {'out_time_sec': segments[i][2] - segments[i][1], 'frame': got,
+                                               'done': True})
+                                done.add(i)
+                                fetched.add(i)
+                                on_fetched(i)
+                for i in sorted(set(orphans)):
+                    if failed.is_set():
+                        break
+                    logger.info(f"[Segments] Job {job_id}: encoding chunk {i} here (peer failed or API unreachable)")
+                    err = encode_chunk(i)
+                    if err is not None:
+                        errors.append(err)
+                        break
+                    done.add(i)
+                if not orphans and len(done) < n:
+                    time.sleep(CONFIG['segment_poll_interval'])
+            if not errors and not seams:
+                logger.info(f"[Segments] Job {job_id}: {len(fetched)}/{n - len(already_done)} chunks encoded by peer agents")
+        finally:
+            stop.set()
+            uploader.join(timeout=60)
+        return errors
+
+    def _finish_segment(self, task_id: int, ok: bool, frames: int, error: Optional[str] = None) -> None:
+        endpoint = '/api/jobs/segments/complete' if ok else '/api/jobs/segments/fail'
+        self._make_api_request('POST', endpoint, {'task_id': task_id, 'worker_id': self.worker_id,
+                                                  'frames': frames, 'error': error})
+
+    def _fetch_segment_outputs(self, job_id: int, task: Dict, dests: List[Path], packets: int,
+                               deadline: float) -> Optional[int]:
+        """Download a peer-encoded chunk; returns its smallest per-output frame count, None if unusable."""
+        frames = []
+        try:
+            for url, dest in zip(task['download_urls'], dests):
+                with requests.get(url, stream=True, timeout=60) as r:
+                    r.raise_for_status()
+                    with open(dest, 'wb') as f:
+                        for block in r.iter_content(1024 * 1024):
+                            f.write(block)
+                listed = subprocess.run(_wrap_io_priority(packet_list_args(self.ffmpeg_path, dest)),
+                                        capture_output=True, text=True, timeout=max(1.0, deadline - time.monotonic()))
+                frames.append(count_packets(listed.stdout))
+        except (requests.RequestException, OSError, subprocess.TimeoutExpired, KeyError, TypeError) as e:
+            logger.warning(f"[Segments] Job {job_id}: chunk {task['seq']} download failed: {e}")
+            return None
+        if len(frames) != len(dests) or min(frames) == 0:
+            return None
+        return min(frames)
 
-            thumbnail_key = None
+    def _segment_peer_loop(self) -> None:
+        """
+        Peer side: while this agent has a free encode slot and no claimed job of its own waiting, claim
+        segment tasks published by other agents and encode them (download source → x264 → PUT outputs).
+        """
+        pending = set()  # claimed here, not yet admitted by the scheduler
+        pool = ThreadPoolExecutor(max_workers=self.encode_scheduler.max_jobs, thread_name_prefix="SegPeer")
+        while self.running:
+            busy = self.encode_scheduler.snapshot()['running'] + len(pending)
+            if (self._paused or self._ram_critical or self._hand_back_requested() or len(self.admission)
+                    or busy >= self.encode_scheduler.max_jobs):
+                time.sleep(CONFIG['segment_poll_interval'])
+                continue
+            resp = self._make_api_request('POST', '/api/jobs/segments/claim', {'worker_id': self.worker_id})
+            task = (resp or {}).get('task')
+            if not task:
+                time.sleep(CONFIG['segment_poll_interval'])
+                continue
+            pending.add(task['id'])
+            pool.submit(self._encode_peer_segment, task, pending)
+        pool.shutdown(wait=True)
+
+    def _encode_peer_segment(self, task: Dict, pending: set) -> None:
+        job_id, seq = task['job_id'], task['seq']
+        slot = f"seg{task['id']}"
+        params = task.get('params') or {}
+        seg_dir = self.temp_dir / f"segment-{task['id']}"
+        shutil.rmtree(seg_dir, ignore_errors=True)
+        seg_dir.mkdir(parents=True)
+        src = seg_dir / 'src.mkv'
+        outs = [seg_dir / f"out{k}.mp4" for k in range(len(task['out_keys']))]
+        admitted = False
+        error = None
+        frames = 0
+        try:
+            with requests.get(task['download_url'], stream=True, timeout=60) as r:
+                r.raise_for_status()
+                with open(src, 'wb') as f:
+                    for block in r.iter_content(1024 * 1024):
+                        f.write(block)
+            meta = {'width': int(params.get('width') or 1920), 'height': int(params.get('height') or 1080),
+                    'duration_sec': float(task.get('duration') or 0)}
+            crf = int(params['crf'])
+            preset = params.get('preset') or 'slow'  # owner's governor step, so every chunk of the join matches
             try:
-                thumb_filename = output_filename.replace('.mp4', '-thumb.jpg')
-                thumb_file = work_dir / thumb_filename
-                thumb_scale = CONFIG.get('thumbnail_scale', '360:-2')
-                thumb_cmd = [
-                    self.ffmpeg_path,
-                    '-ss', '00:00:05',
-                    '-i', str(output_file),
-                    '-vframes', '1',
-                    '-vf', f'scale={thumb_scale}',
-                    '-q:v', '3',
-                    '-y', str(thumb_file),
-                ]
-                thumb_result = subprocess.run(
-                    _wrap_io_priority(thumb_cmd),
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
-                if thumb_result.returncode == 0 and thumb_file.exists():
-                    thumb_r2_key = f"thumbnails/{job_id}/{thumb_filename}"
-                    thumb_url = self._upload_to_r2(thumb_file, job_id, 'public', thumb_r2_key, 'image/jpeg')
-                    if thumb_url:
-                        thumbnail_key = thumb_r2_key
-                        logger.info(f"Thumbnail generated and uploaded: {thumbnail_key}")
-            except Exception as thumb_err:
-                logger.warning("Thumbnail step skipped: %s", thumb_err)
+                threads = self._acquire_encode_slot(job_id, meta, params.get('out_res') or [], crf, preset, slot=slot)
+            finally:
+                pending.discard(task['id'])
+            admitted = True
+            cmd = self._x264_cmd(str(src), params.get('scales') or [None], outs, crf,
+                                 ['-threads', str(threads)] if threads > 0 else [], faststart=False, preset=preset)
+            cmd[1:1] = ['-progress', 'pipe:1', '-nostats']
+            t_encode = time.monotonic()
+            proc = subprocess.Popen(_wrap_io_priority(cmd), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform == 'win32' else 0)
+            _apply_windows_priority(proc.pid)
+            self._active_procs[slot] = proc
+            try:
+                last, err_buf = self._run_ffmpeg(proc, job_id, CONFIG['timeout_minutes'] * 60, None, meta['duration_sec'],
+                                                 on_progress=lambda snap: None)
+            finally:
+                self._cleanup_zombies(slot)
+            self.encode_scheduler.release(slot)
+            admitted = False
+            if proc.returncode != 0:
+                error = err_buf.text()[-1000:] or f"ffmpeg exit {proc.returncode}"
+            else:
+                frames = last.get('frame') or 0
+                self.governor.observe_encode(
+                    preset, meta['duration_sec'],
+                    sum(w * h for w, h in filter(None, map(parse_res, params.get('out_res') or []))),
+                    time.monotonic() - t_encode)
+                for url, out in zip(task['upload_urls'], outs):
+                    t0 = time.monotonic()
+                    with open(out, 'rb') as f:
+                        requests.put(url, data=f, timeout=600).raise_for_status()
+                    self._observe_transfer('upload', out.stat().st_size, t0)
+        except JobHandedBack:
+            error = 'peer handed the segment back'
+        except Exception as e:
+            error = str(e)[:1000]
+        finally:
+            pending.discard(task['id'])
+            if admitted:
+                self.encode_scheduler.release(slot)
+            shutil.rmtree(seg_dir, ignore_errors=True)
+        self._finish_segment(task['id'], error is None, frames, error)
+        if error is None:
+            logger.info(f"[Segments] job={job_id} chunk {seq}: {frames} frames encoded and uploaded")
+        else:
+            logger.warning(f"[Segments] job={job_id} chunk {seq} failed: {error.strip()[-200:]}")
+
+    def _kill_chunks(self, job_id: int) -> None:
+        """Stop the other running chunk encodes of a job whose chunked encode already failed."""
+        prefix = f"{job_id}:c"
+        for slot in [k for k in list(self._active_procs) if isinstance(k, str) and k.startswith(prefix)]:
+            self._cleanup_zombies(slot)
 
+    def _publish_outputs(self, job: Dict, enc: Dict) -> Optional[Dict]:
+        """Upload everything _encode_video wrote (video, renditions, thumbnail, storyboard); complete_job payload."""
+        job_id = job['id']
+        work_dir, meta, target_res = enc['work_dir'], enc['meta'], enc['target_res']
+        output_file, output_filename = enc['output_file'], enc['output_filename']
+        renditions, storyboard, enc_stats, meta_out = enc['renditions'], enc['storyboard'], enc['enc_stats'], enc['meta_out']
+        thumb_file, thumb_filename = enc['thumb_file'], enc['thumb_filename']
+        try:
+            self._update_job_status(job_id, 'UPLOADING')
+            key_prefix = f"videos/{datetime.now().year}/{datetime.now().month:02d}/{job_id}_"
+            r2_key = f"{key_prefix}{output_filename}"
+            # (key, file, content type): video + renditions + thumbnail + storyboard go up concurrently
+            uploads = [(r2_key, output_file, 'video/mp4')]
+            uploads += [(f"{key_prefix}{r[3].name}", r[3], 'video/mp4') for r in renditions if r[3] != output_file]
+            thumb_r2_key = f"thumbnails/{job_id}/{thumb_filename}"
+            if thumb_file.exists():
+                uploads.append((thumb_r2_key, thumb_file, 'image/jpeg'))
+            storyboard_keys = []
+            if storyboard:
+                tile_w, tile_h, cols, rows, sb_base = storyboard
+                sheets = sorted(work_dir.glob(f"{sb_base}-*.jpg"))
+                if sheets:
+                    vtt_file = work_dir / f"{sb_base}.vtt"
+                    vtt_file.write_text(build_vtt(meta['duration_sec'], CONFIG['storyboard_interval'], tile_w, tile_h,
+                                                  cols, rows, [p.name for p in sheets]), encoding='utf-8')
+                    storyboard_keys = [f"thumbnails/{job_id}/{p.name}" for p in sheets + [vtt_file]]
+                    uploads += [(k, p, 'image/jpeg') for k, p in zip(storyboard_keys, sheets)]
+                    uploads.append((storyboard_keys[-1], vtt_file, 'text/vtt'))
+            source_hash = job.get('_source_sha256')
+            uploaded = self._upload_outputs(job_id, uploads, {'source-sha256': source_hash} if source_hash else None)
+            public_url = uploaded.get(r2_key)
+            if not public_url:
+                self.fail_job(job_id, "R2 upload failed", stage='upload')
+                return None
+            rendition_results = []
+            for i, (r_quality, _, r_res, r_file) in enumerate(renditions):
+                r_res = output_meta(enc_stats, i).get('resolution', r_res)
+                r_key = f"{key_prefix}{r_file.name}"
+                r_url = uploaded.get(r_key)
+                if not r_url:
+                    self.fail_job(job_id, f"R2 upload failed ({r_quality})", stage='upload')
+                    return None
+                r_size = r_file.stat().st_size
+                rendition_results.append({
+                    'quality': r_quality,
+                    'public_url': r_url,
+                    'r2_key': r_key,
+                    'resolution': r_res,
+                    'file_size_output': r_size,
+                    'bitrate': int(r_size * 8 / meta['duration_sec'] / 1000) if meta['duration_sec'] else 0,
+                })
+            if rendition_results:
+                logger.info(f"[Ladder] Job {job_id}: {len(rendition_results)} renditions from one decode "
+                            f"({', '.join(r['quality'] for r in rendition_results)})")
+            thumbnail_key = thumb_r2_key if uploaded.get(thumb_r2_key) else None
+            if thumbnail_key:
+                logger.info(f"Thumbnail generated and uploaded: {thumbnail_key}")
+            else:
+                logger.warning(f"Thumbnail step skipped: job {job_id} (no frame or upload failed)")
+            storyboard_key = None
+            if storyboard_keys and all(uploaded.get(k) for k in storyboard_keys):
+                storyboard_key = storyboard_keys[-1]
+                logger.info(f"[Storyboard] Job {job_id}: {len(storyboard_keys) - 1} sheet(s) + {storyboard_key}")
+
+            ps = self.probe_cache.snapshot()
+            logger.info(
+                f"[Probe] Job {job_id}: input {'cached' if enc['probe_hit'] else 'probed'}; "
+                f"totals probes={ps['probes']} ({ps['probe_seconds']:.2f}s) hits={ps['cache_hits']} "
+                f"output_probes_avoided={ps['output_probes_avoided']} saved≈{ps['saved_seconds']:.2f}s"
+            )
             logger.info("Bitrate/FPS: Kaynak Korundu")
             return {
                 'public_url': public_url,
                 'file_size_output': output_file.stat().st_size,
                 'duration': meta_out.get('duration', 0),
-                'processing_time_seconds': elapsed,
+                'processing_time_seconds': enc['elapsed'],
                 'resolution': meta_out.get('resolution', target_res),
                 'bitrate': meta_out.get('bitrate', meta['bitrate']),
                 'codec': 'h264',
                 'frame_rate': meta_out.get('frame_rate', meta['fps']),
                 'audio_codec': 'aac',
                 'audio_bitrate': 128,
-                'ffmpeg_command': cmd_str,
-                'ffmpeg_output': (_ffmpeg_stdout or '') + (_ffmpeg_stderr or ''),
+                'ffmpeg_command': enc['cmd_str'],
+                'encode_path': enc.get('encode_path'),  # remux = compliant source stream-copied (fast path)
+                'ffmpeg_output': enc['ffmpeg_output'],
                 'thumbnail_key': thumbnail_key,
+                'storyboard_key': storyboard_key,
                 'clean_name': output_filename,
+                'renditions': rendition_results,
+                'r2_keys': [k for k, _, _ in uploads if uploaded.get(k)],  # video first (output index)
             }
-        except subprocess.TimeoutExpired:
-            self.fail_job(job_id, "FFmpeg timeout", stage='convert')
-            return None
         except Exception as e:
-            self.fail_job(job_id, str(e), stage='convert')
+            self.fail_job(job_id, str(e), stage='upload')
             return None
-        finally:
-            self._cleanup_zombies(job_id)
+
+    def _resolve_crf(self, profile: str, crf_int) -> int:
+        """Priority: integer crf from D1 (6, 8, 10, 12, 14). Fallback: parse processing_profile or legacy map."""
+        VALID_CRF = (6, 8, 10, 12, 14)
+        if crf_int is not None and int(crf_int) in VALID_CRF:
+            return int(crf_int)
+        if profile.startswith('crf_'):
+            try:
+                return int(profile.split('_')[1])
+            except (ValueError, IndexError):
+                return 12
+        crf_map = CONFIG.get('ffmpeg_crf_map', {'native': 14, 'ultra': 16, 'dengeli': 14, 'kucuk_dosya': 18})
+        return crf_map.get(profile, 12)
+
+    def _choose_preset(self, job_id: int, crf: int) -> Tuple[str, int]:
+        """Governor step for this x264 encode: (preset, CRF + the step's offset, clamped to 0..51)."""
+        with self.lock:
+            local = len(self.active_jobs)
+        before = self.governor.snapshot()['preset']
+        preset, offset = self.governor.choose(local + len(self.admission))
+        if preset != before:
+            gs = self.governor.snapshot()
+            logger.info(f"[Governor] preset {before} → {preset} (crf {offset:+d}): backlog "
+                        f"{gs['remote_pending']} pending + {local + len(self.admission)} local, "
+                        f"est. drain {gs['drain_estimate_sec']}s vs target {gs['target_drain_sec']:.0f}s")
+        logger.debug(f"[Governor] job={job_id} preset={preset} crf={crf}{offset:+d}")
+        return preset, max(0, min(51, crf + offset))
+
+    def _acquire_encode_slot(self, job_id: int, meta: Dict, out_resolutions: List[str],
+                             crf: Optional[int], preset: str, slot: Optional[str] = None,
+                             duration_sec: Optional[float] = None) -> int:
+        """
+        Block until the scheduler admits this encode; returns its FFmpeg -threads value (0 = omit).
+        slot/duration_sec: one chunk of a chunked encode (scheduled as its own process).
+        """
+        duration = meta['duration_sec'] if duration_sec is None else duration_sec
+        out_pixels, out_height = 0, 0
+        for res in out_resolutions:
+            try:
+                w, h = (int(x) for x in res.lower().split('x', 1))
+            except (ValueError, AttributeError):
+                w, h = meta['width'], meta['height']
+            out_pixels += w * h
+            out_height = max(out_height, min(w, h))
+        weight = encode_weight(meta['width'] * meta['height'], out_pixels, crf, preset)
+        cap = thread_cap(out_height, duration, self.encode_scheduler.cores)
+        info = (f"src={meta['width']}x{meta['height']} out={','.join(out_resolutions)} "
+                f"dur={duration:.0f}s crf={crf} preset={preset}")
+        t0 = time.monotonic()
+        threads = self.encode_scheduler.acquire(slot or job_id, weight, cap, info, abort=self._hand_back_requested)
+        self.metrics.observe('bkvf_slot_wait_seconds', time.monotonic() - t0, slot='encode')
+        if threads is None:
+            raise JobHandedBack(job_id)
+        self._leave_prefetch(job_id)
+        return threads
+
+    def _ladder_qualities(self, job: Dict) -> List[str]:
+        """Qualities of a ladder job (renditions list or "720p,1080p"), lowest first; [] = single output."""
+        raw = job.get('renditions') or job.get('quality') or ''
+        wanted = {str(q).strip().lower() for q in (raw if isinstance(raw, list) else str(raw).split(','))}
+        ladder = [q for q in ('720p', '1080p', '2k', '4k') if q in wanted]
+        return ladder if len(ladder) > 1 else []
 
     def _parse_fps(self, raw: str) -> float:
         try:
@@ -951,86 +2078,580 @@ class BKVFAgentV2:
             'thumbnail_key': result.get('thumbnail_key'),
             'clean_name': result.get('clean_name'),
         }
-        return self._make_api_request('POST', '/api/jobs/complete', data) is not None
+        if result.get('renditions'):
+            data['renditions'] = result['renditions']
+        if result.get('storyboard_key'):
+            data['storyboard_key'] = result['storyboard_key']
+        if result.get('encode_path'):
+            data['encode_path'] = result['encode_path']
+        if result.get('source_sha256'):
+            data['source_sha256'] = result['source_sha256']
+            data['output_cache_key'] = result.get('output_cache_key')
+        return self.outbox.deliver('/api/jobs/complete', data, job_id) is not None
+
+    def _output_cache_key(self, job: Dict) -> Optional[str]:
+        """Source SHA-256 + the settings that decide the output bytes (scale follows from the source itself)."""
+        if not job.get('_source_sha256'):
+            return None
+        profile = job.get('processing_profile', '12')
+        copy_only = profile in ('web_opt', 'web_optimize')
+        crf_int = job.get('crf') if job.get('crf') is not None else (job.get('bk') or {}).get('crf')
+        try:
+            crf = None if copy_only else self._resolve_crf(profile, crf_int)
+        except (TypeError, ValueError):
+            return None
+        storyboard = bool(CONFIG.get('storyboard') or job.get('storyboard'))
+        settings = {
+            'mode': 'copy' if copy_only else 'x264',
+            'crf': crf,
+            'qualities': [] if copy_only else (self._ladder_qualities(job) or [job.get('quality', '720p')]),
+            'thumbnail_scale': CONFIG.get('thumbnail_scale', '360:-2'),
+            'storyboard': [CONFIG['storyboard_interval'], CONFIG['storyboard_tile_width'],
+                           CONFIG['storyboard_cols'], CONFIG['storyboard_rows']] if storyboard else None,
+        }
+        return output_cache_key(job['_source_sha256'], settings)
+
+    def _lookup_output(self, job: Dict, output_key: str) -> Optional[Dict]:
+        """Index entry for output_key: local index first, then the Worker (outputs completed by any agent)."""
+        entry = self.output_index.get(output_key)
+        if entry is not None or not CONFIG['output_dedupe_api']:
+            return entry
+        r = self._make_api_request('POST', '/api/jobs/output-lookup', {
+            'job_id': job['id'], 'worker_id': self.worker_id, 'output_cache_key': output_key,
+        })
+        if not r or not r.get('found') or not r.get('result', {}).get('public_url'):
+            return None
+        result = r['result']
+        cdn_prefix = self._public_url('')
+        if not result['public_url'].startswith(cdn_prefix):
+            return None
+        video_key = result['public_url'][len(cdn_prefix):]
+        keys = [video_key] + [x['r2_key'] for x in result.get('renditions') or [] if x.get('r2_key') != video_key]
+        if result.get('thumbnail_key'):
+            keys.append(result['thumbnail_key'])
+        if CONFIG.get('storyboard') or job.get('storyboard'):
+            sb_keys = self._remote_storyboard_keys(result.get('storyboard_key'))
+            if not sb_keys:
+                return None  # earlier job has no storyboard (or its index is unreadable): encode
+            keys += sb_keys
+        self.output_index.record('remote_hits')
+        return {'key': output_key, 'job_id': r.get('job_id'), 'keys': keys, 'result': result, 'remote': True}
+
+    def _remote_storyboard_keys(self, vtt_key: Optional[str]) -> List[str]:
+        """Sprite sheet keys + the VTT key of an earlier job's storyboard (the Worker stores only the VTT key;
+        the sheets are listed in the index itself and sit next to it)."""
+        if not vtt_key or '/' not in vtt_key:
+            return []
+        try:
+            r = requests.get(self._public_url(vtt_key), timeout=15)
+            r.raise_for_status()
+        except Exception as e:
+            logger.debug(f"[Dedupe] storyboard index {vtt_key} unreadable: {e}")
+            return []
+        folder = vtt_key.rsplit('/', 1)[0]
+        sheets = [f"{folder}/{name}" for name in vtt_sheet_names(r.text) if '/' not in name]
+        return sheets + [vtt_key] if sheets else []
 
-    def _process_single_job(self, job: Dict) -> bool:
+    def _try_reuse_output(self, ctx: Dict) -> bool:
+        """
+        Duplicate source (same SHA-256, same settings): have the Worker copy the earlier job's R2 objects
+        under this job's keys and finish without encoding. False → encode as usual.
+        """
+        job = ctx['job']
+        job_id = job['id']
+        output_key = self._output_cache_key(job)
+        entry = self._lookup_output(job, output_key) if output_key else None
+        if not entry or entry.get('job_id') == job_id:
+            return False
+        t0 = time.time()
+        video_prefix = f"videos/{datetime.now().year}/{datetime.now().month:02d}/{job_id}_"
+        moved = {k: rekey_output(k, job_id, video_prefix) for k in entry['keys']}
+        r = self._make_api_request('POST', '/api/jobs/copy-output', {
+            'job_id': job_id, 'worker_id': self.worker_id,
+            'copies': [{'from_key': k, 'to_key': v} for k, v in moved.items()],
+        })
+        if not r or not r.get('ok'):
+            if r and r.get('missing') and not entry.get('remote'):
+                self.output_index.forget(output_key)  # source video deleted since
+            logger.info(f"[Dedupe] Job {job_id}: outputs of job {entry.get('job_id')} not reusable "
+                        f"({(r or {}).get('missing') or 'copy failed'}) — encoding")
+            return False
+        src = entry['result']
+        result = dict(src)
+        result['public_url'] = self._public_url(moved[entry['keys'][0]])
+        result['thumbnail_key'] = moved.get(src.get('thumbnail_key'))
+        result['storyboard_key'] = moved.get(src.get('storyboard_key'))
+        result['renditions'] = [{**x, 'r2_key': moved[x['r2_key']], 'public_url': self._public_url(moved[x['r2_key']])}
+                                for x in src.get('renditions') or [] if x.get('r2_key') in moved]
+        result['processing_time_seconds'] = int(time.time() - t0)
+        result['ffmpeg_command'] = f"reused output of job {entry.get('job_id')} (sha256 {job['_source_sha256'][:16]}…)"
+        result['ffmpeg_output'] = ''
+        result['clean_name'] = None  # copied file names belong to the earlier job; keep this job's name
+        result['r2_keys'] = list(moved.values())
+        ctx['result'] = result
+        self.output_index.record('reused', float(src.get('processing_time_seconds') or 0))
+        st = self.output_index.snapshot()
+        logger.info(
+            f"[Dedupe] Job {job_id}: same source + settings as job {entry.get('job_id')} "
+            f"({'api' if entry.get('remote') else 'local index'}) — {len(moved)} object(s) copied, encode skipped; "
+            f"totals reused={st['reused']} saved≈{st['saved_encode_seconds']:.0f}s"
+        )
+        return True
+
+    def _open_job(self, job: Dict) -> Dict:
+        """Job context carried through the stages: job, private work dir, input path, stage outputs."""
         job_id = job['id']
         with self.lock:
-            self.active_jobs[job_id] = threading.current_thread().name
-        try:
-            with tempfile.TemporaryDirectory(prefix=f"bk-{job_id}-", dir=str(self.temp_dir)) as tmp:
-                work_dir = Path(tmp)
-                temp_input = work_dir / "input.mp4"
-
-                checkpoint = (job.get('processing_checkpoint') or '').strip()
-                source_url = job.get('source_url')
-                download_url = job.get('download_url')
-                r2_raw_key = (job.get('r2_raw_key') or '').strip()
-
-                # Idempotent resume: if download_done checkpoint exists and raw is already in R2,
-                # skip re-downloading from external source.
-                can_resume = (
-                    checkpoint == 'download_done'
-                    and r2_raw_key
-                    and r2_raw_key != 'url-import-pending'
-                )
+            self.active_jobs[job_id] = 'fetch'
+        self.outbox.open_job(job_id)
+        work_dir = Path(tempfile.mkdtemp(prefix=f"bk-{job_id}-", dir=str(self.temp_dir)))
+        return {'job': job, 'work_dir': work_dir, 'temp_input': work_dir / "input.mp4",
+                'tee': None, 'encoded': None, 'result': None}
+
+    def _close_job(self, ctx: Dict, ok: bool, handed_back: bool = False) -> None:
+        """End of a job (any stage): stop the raw archive if still running, remove the work dir, stats."""
+        job = ctx['job']
+        job_id = job['id']
+        if ctx.get('tee') and not ok:
+            self._finish_tee_fetch(job, ctx['temp_input'], ctx['tee'], False)
+        self._cleanup_zombies(job_id)
+        self._keep_raw_input(ctx)
+        shutil.rmtree(ctx['work_dir'], ignore_errors=True)
+        with self.lock:
+            stage = self.active_jobs.pop(job_id, None) or 'unknown'
+            self._disk_reserved.pop(job_id, None)
+        self._leave_prefetch(job_id)
+        outcome = 'handed_back' if handed_back else 'completed' if ok else 'failed'
+        self.metrics.inc('bkvf_jobs_total', outcome=outcome, stage=stage.replace(' done', ''))
+        st = self.outbox.finish_job(job_id)
+        if handed_back:
+            self.admission.forget(job_id)
+            return
+        if st:
+            logger.info(
+                f"[Outbox] job={job_id} events={st['events']} coalesced={st['coalesced']} "
+                f"api_calls={st['api_calls']} blocked={st['blocked_seconds']:.2f}s"
+            )
+        turnaround = self.admission.finish(job_id)
+        if turnaround is not None:
+            snap = self.admission.snapshot()
+            logger.info(
+                f"[Admission] job={job_id} turnaround={turnaround:.0f}s "
+                f"p50={snap['turnaround_p50_sec']}s p95={snap['turnaround_p95_sec']}s (n={snap['finished']})"
+            )
 
-                if source_url:
-                    if can_resume and download_url:
-                        # Raw already in R2; use presigned URL from claim response (faster, internal)
-                        logger.info(f"[Checkpoint] Job {job_id}: download_done — downloading from R2 (key={r2_raw_key})")
-                        with self._url_download_semaphore:
-                            if not self._download(download_url, temp_input, job_id):
-                                return False
-                    else:
-                        # Normal: fetch from external source → upload to R2 raw bucket
-                        with self._url_download_semaphore:
-                            if not self._download(source_url, temp_input, job_id):
-                                return False
-                        file_size = temp_input.stat().st_size
-                        r2_raw = f"raw-uploads/{int(time.time())}-{job_id}-{job['clean_name']}"
-                        if not self._upload_to_r2(temp_input, job_id, 'raw', r2_raw):
-                            self.fail_job(job_id, "Failed to upload raw to R2", stage='upload')
-                            return False
-                        if not self._url_import_done(job_id, r2_raw, file_size):
-                            self.fail_job(job_id, "url-import-done failed", stage='upload')
-                            return False
-                        self._update_job_checkpoint(job_id, 'download_done')
-                else:
-                    if can_resume and download_url:
-                        # Direct upload already in R2; re-download from presigned URL
-                        logger.info(f"[Checkpoint] Job {job_id}: download_done — re-downloading from R2 presigned URL")
-                        with self._url_download_semaphore:
-                            if not self._download(download_url, temp_input, job_id):
-                                return False
-                    else:
-                        if not download_url:
-                            self.fail_job(job_id, "Missing download_url", stage='download')
-                            return False
-                        with self._url_download_semaphore:
-                            if not self._download(download_url, temp_input, job_id):
-                                return False
-                        self._update_job_checkpoint(job_id, 'download_done')
+    def _keep_raw_input(self, ctx: Dict) -> None:
+        """Hand a completely downloaded input to the raw cache before the work dir is removed."""
+        job = ctx['job']
+        key = raw_cache_key(job.get('_r2_raw_archived') or job.get('r2_raw_key'))
+        temp_input = ctx['temp_input']
+        if not key or not temp_input.exists():
+            return  # no R2 copy to key it by, or the download never finished (.part)
+        expected = int(job.get('file_size_input') or 0)
+        if expected and temp_input.stat().st_size != expected:
+            return
+        if self.raw_cache.store(key, temp_input, job.get('_source_sha256')):
+            logger.debug(f"[RawCache] Job {job['id']}: input kept ({key})")
 
-                result = self._process_video(job, temp_input, work_dir)
-                if not result:
-                    return False
-                if not self._complete_job(job_id, result):
-                    self.fail_job(job_id, "complete_job failed", stage='complete')
+    def _set_job_stage(self, job_id: int, stage: str) -> None:
+        with self.lock:
+            if job_id in self.active_jobs:
+                self.active_jobs[job_id] = stage
+
+    def _stage_fetch(self, ctx: Dict) -> bool:
+        """Network stage: download the source (+ raw archive to R2). Streaming encodes defer to the encode stage."""
+        job = ctx['job']
+        job_id = job['id']
+        temp_input = ctx['temp_input']
+        self._wait_prefetch_slot(job_id)
+        while not self._ensure_disk_space_for_job(job, ctx['work_dir']):
+            with self.lock:
+                others = len(self._disk_reserved)
+            if not others:
+                self.fail_job(job_id, "Yetersiz disk alanı (en az 2× dosya boyutu gerekli)", stage='claim')
+                return False
+            # Space is held by jobs already in flight: wait for one of them to finish
+            with self._prefetch_cond:
+                self._prefetch_cond.wait(timeout=10.0)
+            if self._hand_back_requested():
+                raise JobHandedBack(job_id)
+        with self.lock:
+            self.last_job_time = time.time()
+            self.active_gear_until = time.time() + CONFIG['active_gear_duration']
+
+        checkpoint = (job.get('processing_checkpoint') or '').strip()
+        source_url = job.get('source_url')
+        download_url = job.get('download_url')
+        r2_raw_key = (job.get('r2_raw_key') or '').strip()
+
+        # Idempotent resume: if download_done checkpoint exists and raw is already in R2,
+        # skip re-downloading from external source.
+        can_resume = (
+            (checkpoint == 'download_done' or checkpoint.startswith(CHECKPOINT_PREFIX))
+            and r2_raw_key
+            and r2_raw_key != 'url-import-pending'
+        )
+
+        # after_download: runs once the local copy is complete (checkpoint)
+        after_download = None
+        archive_raw = False
+        if source_url:
+            if can_resume and download_url:
+                # Raw already in R2; use presigned URL from claim response (faster, internal)
+                logger.info(f"[Checkpoint] Job {job_id}: download_done — downloading from R2 (key={r2_raw_key})")
+                fetch_url = download_url
+            else:
+                # Normal: fetch from external source → upload to R2 raw bucket
+                fetch_url = source_url
+                archive_raw = True
+        else:
+            if can_resume and download_url:
+                # Direct upload already in R2; re-download from presigned URL
+                logger.info(f"[Checkpoint] Job {job_id}: download_done — re-downloading from R2 presigned URL")
+                fetch_url = download_url
+            else:
+                if not download_url:
+                    self.fail_job(job_id, "Missing download_url", stage='download')
                     return False
-                self._send_asset_preview_telegram(job, result)
-                logger.info(f"Job {job_id} completed")
+                fetch_url = download_url
+                after_download = lambda: self._update_job_checkpoint(job_id, 'download_done') or True
+
+        # Retry / resume on this node: the input is still in the raw cache
+        cached = self.raw_cache.fetch(raw_cache_key(r2_raw_key), temp_input, int(job.get('file_size_input') or 0))
+        if cached:
+            logger.info(f"[RawCache] Job {job_id}: input from local cache ({cached['size']} bytes, key={r2_raw_key}) "
+                        f"— download skipped")
+            if cached.get('sha256'):
+                job['_source_sha256'] = cached['sha256']
+            if self._try_reuse_output(ctx):
                 return True
-        except Exception as e:
-            self.fail_job(job_id, str(e), stage='unknown')
+            return not after_download or bool(after_download())  # raw already in R2: no archive
+
+        # SHA-256 computed while the bytes arrive; an identical earlier output skips the encode
+        hasher = StreamHasher() if CONFIG['output_dedupe'] else None
+        ctx['hasher'] = hasher
+        if CONFIG.get('stream_encode'):
+            # FFmpeg reads while downloading: fetch and encode run together in the encode stage
+            # (the hash is ready only after the encode started: recorded for later duplicates, no reuse)
+            ctx['stream'] = (fetch_url, after_download, archive_raw)
+            return True
+        if archive_raw and CONFIG.get('raw_tee_upload'):
+            # Raw goes to R2 while downloading; the archive may still be running when the encode starts
+            tee = self._start_tee_fetch(job, fetch_url, temp_input, after_download, archive_raw, hasher)
+            tee['fetch_t'].join()
+            if tee['fetched']['ok'] and self._try_reuse_output(ctx):
+                self._finish_tee_fetch(job, temp_input, tee, False)  # raw archive not needed any more
+                return True
+            ctx['tee'] = tee
+            return tee['fetched']['ok']
+        with self._url_download_semaphore:
+            if not self._download(fetch_url, temp_input, job_id, hasher=hasher):
+                return False
+        if hasher is not None:
+            job['_source_sha256'] = hasher.hexdigest(temp_input.stat().st_size)
+        if self._try_reuse_output(ctx):
+            return True
+        if archive_raw:
+            after_download = lambda: self._archive_raw_input(job, temp_input)
+        return not after_download or bool(after_download())
+
+    def _stage_encode(self, ctx: Dict) -> bool:
+        """CPU stage: FFmpeg (input probe, encode, thumbnail/storyboard outputs) into the work dir."""
+        job = ctx['job']
+        if ctx.get('stream'):
+            fetch_url, after_download, archive_raw = ctx['stream']
+            ctx['encoded'] = self._tee_download_and_process(job, fetch_url, ctx['temp_input'], ctx['work_dir'],
+                                                            after_download, archive_raw, hasher=ctx.get('hasher'))
+        elif ctx.get('result'):
+            return True  # finished from an identical earlier output in the fetch stage
+        else:
+            ctx['encoded'] = self._encode_video(job, ctx['temp_input'], ctx['work_dir'])
+        return ctx['encoded'] is not None
+
+    def _stage_publish(self, ctx: Dict) -> bool:
+        """Network stage: upload outputs, wait for the raw archive, complete the job."""
+        job = ctx['job']
+        job_id = job['id']
+        result = ctx.get('result') or self._publish_outputs(job, ctx['encoded'])
+        if ctx.get('tee'):
+            tee, ctx['tee'] = ctx['tee'], None
+            if not self._finish_tee_fetch(job, ctx['temp_input'], tee, result is not None):
+                return False
+        if not result:
             return False
+        output_key = self._output_cache_key(job)
+        if output_key:
+            result['source_sha256'] = job['_source_sha256']
+            result['output_cache_key'] = output_key
+        if not self._complete_job(job_id, result):
+            self.fail_job(job_id, "complete_job failed", stage='complete')
+            return False
+        if output_key and result.get('r2_keys'):
+            self.output_index.put(output_key, job_id, result['r2_keys'],
+                                  {k: v for k, v in result.items() if k not in ('ffmpeg_output', 'r2_keys')})
+        self._send_asset_preview_telegram(job, result)
+        logger.info(f"Job {job_id} completed")
+        return True
+
+    def _run_stage(self, name: str, ctx: Dict) -> Optional[Dict]:
+        """Pipeline adapter: ctx for the next stage, or None once the job is finished (success or failure)."""
+        job_id = ctx['job']['id']
+        self._set_job_stage(job_id, name)
+        stage_fn = {'fetch': self._stage_fetch, 'encode': self._stage_encode, 'publish': self._stage_publish}[name]
+        ok = False
+        t0 = time.monotonic()
+        try:
+            if name != 'publish' and self._hand_back_requested():
+                raise JobHandedBack(job_id)
+            ok = stage_fn(ctx)
+        except JobHandedBack:
+            self._release_job(job_id, self._handback_reason or 'shutdown')
+            self._close_job(ctx, False, handed_back=True)
+            return None
+        except Exception as e:
+            self.fail_job(job_id, str(e), stage=name)
         finally:
-            self._cleanup_zombies(job_id)
-            with self.lock:
-                self.active_jobs.pop(job_id, None)
+            self.metrics.observe('bkvf_stage_duration_seconds', time.monotonic() - t0, stage=name)
+        if ok and name != 'publish':
+            self._set_job_stage(job_id, f"{name} done")
+            return ctx
+        self._close_job(ctx, ok)
+        return None
+
 
-    def _ensure_disk_space_for_job(self, job: Dict) -> bool:
-        """Guard Protocol: require at least 2× file size free before accepting job. Return False if insufficient."""
+    def _hand_back_requested(self) -> bool:
+        return self._handback_reason is not None or not self.running
+
+    def _request_hand_back(self, reason: str) -> None:
+        """Pause / RAM critical / shutdown: every claimed job whose encode hasn't started goes back to the API."""
+        self._handback_reason = reason
+        for job in self.admission.drain():
+            self._release_job(job['id'], reason)
+        for stage in ('fetch', 'encode'):
+            for ctx in self.pipeline.drain(stage):
+                self._release_job(ctx['job']['id'], reason)
+                self._close_job(ctx, False, handed_back=True)
+        # Jobs at the prefetch gate, mid-download or waiting for an encode slot release themselves
+        with self._prefetch_cond:
+            self._prefetch_cond.notify_all()
+        self.encode_scheduler.wake()
+
+    def _release_job(self, job_id: int, reason: str) -> bool:
+        """Return a claimed job to the queue; Workers without /api/jobs/release get an interrupt instead."""
+        data = {'job_id': job_id, 'worker_id': self.worker_id, 'reason': reason}
+        r = self.outbox.deliver('/api/jobs/release', data, job_id)
+        if r is None:
+            r = self.outbox.deliver('/api/jobs/interrupt',
+                                    {'job_id': job_id, 'worker_id': self.worker_id, 'stage': f'handback:{reason}'},
+                                    job_id)
+        logger.info(f"[Prefetch] job={job_id} handed back ({reason}){'' if r is not None else ' — API call failed'}")
+        return r is not None
+
+    def _wait_prefetch_slot(self, job_id: int) -> None:
+        """Start a fetch only while jobs ahead of the encoder < free encode slots + PREFETCH_DEPTH."""
+        t0 = time.monotonic()
+        with self._prefetch_cond:
+            while True:
+                if self._hand_back_requested():
+                    raise JobHandedBack(job_id)
+                sched = self.encode_scheduler.snapshot()
+                free = max(0, self.encode_scheduler.max_jobs - sched['running'])
+                if len(self._ahead) < free + CONFIG['prefetch_depth']:
+                    self._ahead.add(job_id)
+                    if len(self._ahead) > free:
+                        logger.info(f"[Prefetch] job={job_id} fetching ahead of the encoder "
+                                    f"({len(self._ahead)} ahead, {free} free encode slot(s))")
+                    self.metrics.observe('bkvf_slot_wait_seconds', time.monotonic() - t0, slot='prefetch')
+                    return
+                self._prefetch_cond.wait(timeout=2.0)
+
+    def _leave_prefetch(self, job_id: int) -> None:
+        """Job left the prefetch window (encode admitted, or finished): let the next fetch start."""
+        with self._prefetch_cond:
+            self._ahead.discard(job_id)
+            self._prefetch_cond.notify_all()
+
+    def _archive_raw_input(self, job: Dict, temp_input: Path) -> bool:
+        """URL import: upload downloaded source to R2 raw bucket, notify url-import-done, checkpoint."""
+        job_id = job['id']
+        file_size = temp_input.stat().st_size
+        r2_raw = f"raw-uploads/{int(time.time())}-{job_id}-{job['clean_name']}"
+        source_hash = job.get('_source_sha256')
+        if not self._upload_to_r2(temp_input, job_id, 'raw', r2_raw,
+                                  metadata={'sha256': source_hash} if source_hash else None):
+            self.fail_job(job_id, "Failed to upload raw to R2", stage='upload')
+            return False
+        if not self._url_import_done(job_id, r2_raw, file_size):
+            self.fail_job(job_id, "url-import-done failed", stage='upload')
+            return False
+        job['_r2_raw_archived'] = r2_raw
+        self._update_job_checkpoint(job_id, 'download_done')
+        return True
+
+    def _archive_raw_stream(self, job: Dict, tee: StreamTee, stop: threading.Event) -> Optional[bool]:
+        """
+        URL import raw archival as a concurrent stream: bytes go to R2 (multipart) as they arrive.
+        After the last part: complete → url-import-done → download_done checkpoint.
+        True ok; False failed (job failed here unless stopped); None → Worker has no multipart or the
+        stream aborted (e.g. Drive API → gdown), caller archives the finished file serially.
+        """
+        job_id = job['id']
+        r2_raw = f"raw-uploads/{int(time.time())}-{job_id}-{job['clean_name']}"
+        payload = {'job_id': job_id, 'worker_id': self.worker_id, 'bucket': 'raw', 'key': r2_raw, 'content_type': 'video/mp4'}
+        resp = self._make_api_request('POST', '/api/jobs/presigned-upload', {**payload, 'multipart': True, 'part_count': 1})
+        if not resp or not resp.get('upload_id'):
+            return None
+        upload_id = resp['upload_id']
+        urls = {int(p['part_number']): p['url'] for p in resp.get('part_urls') or []}
+
+        def _sign(numbers: List[int]) -> Dict[int, str]:
+            missing = [n for n in numbers if n not in urls]
+            if missing:
+                fresh = self._make_api_request('POST', '/api/jobs/presigned-upload', {
+                    **payload, 'multipart': True, 'upload_id': upload_id, 'part_numbers': missing,
+                })
+                urls.update({int(p['part_number']): p['url'] for p in (fresh or {}).get('part_urls') or []})
+            return {n: urls[n] for n in numbers if n in urls}
+
+        t0 = time.monotonic()
+        try:
+            with requests.Session() as sess:
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, CONFIG['multipart_concurrency']))
+                sess.mount('http://', adapter)
+                sess.mount('https://', adapter)
+                etags = upload_stream(sess, tee, CONFIG['multipart_part_bytes'], CONFIG['multipart_concurrency'], _sign, stop)
+        except Exception as e:
+            self._make_api_request('POST', '/api/jobs/multipart-abort', {**payload, 'upload_id': upload_id})
+            if tee.aborted and not stop.is_set():
+                logger.info(f"[RawTee] Job {job_id}: stream aborted ({e}); raw will be archived after download")
+                return None
+            if not stop.is_set():
+                logger.error(f"[RawTee] Job {job_id}: raw stream upload failed: {e}")
+                self.fail_job(job_id, "Failed to upload raw to R2", stage='upload')
+            return False
+        done = self._make_api_request('POST', '/api/jobs/multipart-complete', {
+            **payload,
+            'upload_id': upload_id,
+            'parts': [{'part_number': n, 'etag': etags[n]} for n in sorted(etags)],
+        })
+        if not done or not done.get('ok'):
+            self.fail_job(job_id, "Failed to upload raw to R2", stage='upload')
+            return False
+        if not self._url_import_done(job_id, r2_raw, tee.written):
+            self.fail_job(job_id, "url-import-done failed", stage='upload')
+            return False
+        job['_r2_raw_archived'] = r2_raw
+        self._observe_transfer('upload', tee.written, t0)
+        self._update_job_checkpoint(job_id, 'download_done')
+        logger.info(f"[RawTee] Job {job_id}: raw archived concurrently ({len(etags)} parts)")
+        return True
+
+    def _start_tee_fetch(self, job: Dict, url: str, temp_input: Path, after_download=None,
+                         archive_raw: bool = False, hasher: Optional[StreamHasher] = None) -> Dict:
+        """
+        Start the download in a side thread through a StreamTee (+ raw R2 archive thread if archive_raw).
+        Returns a handle: tee, fetch_t / fetched (download done + after_download ok), raw_t / raw / raw_stop.
+        """
+        job_id = job['id']
+        if archive_raw and not CONFIG.get('raw_tee_upload'):
+            # Serial raw archival, but still off the encode path (runs in the fetch thread)
+            after_download = lambda: self._archive_raw_input(job, temp_input)
+            archive_raw = False
+        h = {
+            'tee': StreamTee(temp_input.parent / (temp_input.name + '.part'), temp_input),
+            'fetched': {'ok': False},
+            'raw': {'ok': None},
+            'raw_stop': threading.Event(),
+            'raw_t': None,
+        }
+        tee = h['tee']
+
+        def _fetch():
+            ok = False
+            try:
+                with self._url_download_semaphore:
+                    ok = self._download(url, temp_input, job_id, tee=tee, hasher=hasher)
+            except Exception as e:
+                self.fail_job(job_id, str(e), stage='download')
+            finally:
+                tee.finish(ok)
+            if ok and hasher is not None:
+                job['_source_sha256'] = hasher.hexdigest(tee.written)
+            if ok and after_download:
+                ok = bool(after_download())
+            h['fetched']['ok'] = ok
+            if not ok:
+                h['raw_stop'].set()
+
+        def _archive():
+            h['raw']['ok'] = self._archive_raw_stream(job, tee, h['raw_stop'])
+
+        h['fetch_t'] = threading.Thread(target=_fetch, name=f"Fetch-{job_id}", daemon=True)
+        h['fetch_t'].start()
+        if archive_raw:
+            h['raw_t'] = threading.Thread(target=_archive, name=f"RawTee-{job_id}", daemon=True)
+            h['raw_t'].start()
+        return h
+
+    def _finish_tee_fetch(self, job: Dict, temp_input: Path, h: Dict, ok: bool) -> bool:
+        """Wait for the raw archive of a tee fetch (stopped when ok is False); True if the raw is safely in R2."""
+        h['fetch_t'].join()
+        raw_t = h['raw_t']
+        if raw_t is None:
+            return ok
+        if not ok:
+            h['raw_stop'].set()
+        raw_t.join()
+        if not ok:
+            return False
+        if h['raw']['ok'] is None:
+            # No multipart on the Worker or the stream restarted: archive the finished file now
+            return self._archive_raw_input(job, temp_input)
+        return bool(h['raw']['ok'])
+
+    def _tee_download_and_process(self, job: Dict, url: str, temp_input: Path, work_dir: Path,
+                                  after_download=None, archive_raw: bool = False,
+                                  hasher: Optional[StreamHasher] = None) -> Optional[Dict]:
+        """
+        Download in a side thread through a StreamTee with optional concurrent consumers:
+        - STREAM_ENCODE: FFmpeg reads the growing file via stdin, wall clock ≈ max(download, encode).
+          moov-at-end MP4/MOV, gdown downloads and aborted streams fall back to the finished file.
+        - archive_raw (RAW_TEE_UPLOAD): raw source goes to R2 while downloading; encoding starts as
+          soon as the local copy is complete and only the end of this call waits for the raw archive.
+        Returns the _encode_video result (publishing is the pipeline's next stage).
+        """
+        job_id = job['id']
+        h = self._start_tee_fetch(job, url, temp_input, after_download, archive_raw, hasher)
+        tee = h['tee']
+        result = None
+        try:
+            streamed = bool(CONFIG.get('stream_encode')) and tee.wait_streamable()
+            if streamed:
+                logger.info(f"[Stream] Job {job_id}: encoding while downloading ({tee.written} bytes buffered)")
+                result = self._encode_video(job, temp_input, work_dir, stream=tee)
+                if result is None and not tee.aborted:
+                    tee.cancel()  # encode failed (job already failed) — stop the download
+            h['fetch_t'].join()
+            if not h['fetched']['ok']:
+                return None
+            if result is None and (not streamed or tee.aborted):
+                if streamed:
+                    logger.info(f"[Stream] Job {job_id}: falling back to full-file encode")
+                result = self._encode_video(job, temp_input, work_dir)
+        except JobHandedBack:
+            tee.cancel()
+            self._finish_tee_fetch(job, temp_input, h, False)
+            raise
+        if not self._finish_tee_fetch(job, temp_input, h, result is not None):
+            return None
+        return result
+
+    def _ensure_disk_space_for_job(self, job: Dict, work_dir: Optional[Path] = None) -> bool:
+        """
+        Guard Protocol: require at least 2× file size free before accepting job. Return False if insufficient.
+        Space still to be written by other in-flight jobs (their 2× reservation minus what is already in
+        their work dir) counts as used. With work_dir, the job's own reservation is recorded.
+        """
         file_size = job.get('file_size_input')
         if file_size is not None and isinstance(file_size, (int, float)):
             file_size = int(file_size)
@@ -1050,24 +2671,31 @@ class BKVFAgentV2:
                 file_size = CONFIG['max_url_download_bytes']
         try:
             usage = shutil.disk_usage(str(self.temp_dir))
-            if usage.free < 2 * file_size:
-                logger.warning("[Guard] Insufficient disk: free=%s, required 2×=%s", usage.free, 2 * file_size)
+            with self.lock:
+                others = [v for k, v in self._disk_reserved.items() if k != job['id']]
+            pending = sum(max(0, reserved - _dir_bytes(d)) for reserved, d in others)
+            short = 2 * file_size - (usage.free - pending)
+            if short > 0 and self.raw_cache.evict(short):
+                usage = shutil.disk_usage(str(self.temp_dir))  # cached raw inputs give way to new jobs
+            if usage.free - pending < 2 * file_size:
+                logger.warning("[Guard] Insufficient disk: free=%s (in-flight pending=%s), required 2×=%s",
+                               usage.free, pending, 2 * file_size)
                 return False
+            if work_dir is not None:
+                with self.lock:
+                    self._disk_reserved[job['id']] = (2 * file_size, work_dir)
             return True
         except Exception as e:
             logger.warning(f"[Guard] disk_usage check failed: {e}")
             return False
 
     def _update_job_checkpoint(self, job_id: int, checkpoint: str) -> None:
-        """Persist processing_checkpoint to D1 via Worker API (fire-and-forget; non-fatal on failure)."""
-        try:
-            self._make_api_request('POST', '/api/jobs/checkpoint', {
-                'job_id': job_id,
-                'worker_id': self.worker_id,
-                'checkpoint': checkpoint,
-            })
-        except Exception as e:
-            logger.debug(f"[Checkpoint] update failed job={job_id} checkpoint={checkpoint}: {e}")
+        """Persist processing_checkpoint to D1 via the status outbox (fire-and-forget; non-fatal on failure)."""
+        self.outbox.enqueue('checkpoint', job_id, {
+            'job_id': job_id,
+            'worker_id': self.worker_id,
+            'checkpoint': checkpoint,
+        })
 
     def claim_job(self) -> Optional[Dict]:
         r = self._make_api_request('POST', '/api/jobs/claim', {'worker_id': self.worker_id})
@@ -1075,22 +2703,80 @@ class BKVFAgentV2:
             return r
         return None
 
-    def _claim_and_process_one(self) -> None:
-        """Single task for worker pool: claim one job from D1, then process it. Backend claim is atomic."""
-        job = self.claim_job()
-        if not job:
-            return
-        if not self._ensure_disk_space_for_job(job):
-            self.fail_job(
-                job['id'],
-                "Yetersiz disk alanı (en az 2× dosya boyutu gerekli)",
-                stage='claim'
-            )
+    def claim_jobs(self, n: int) -> List[Dict]:
+        """
+        Claim up to n jobs in one round trip (POST /api/jobs/claim-batch). Workers without the route
+        (404/405) switch the agent to single claims for good; other failures fall back for this call only.
+        """
+        if n <= 0:
+            return []
+        if n > 1 and self._batch_claim is not False and CONFIG['claim_batch']:
+            r = self._make_api_request('POST', '/api/jobs/claim-batch', {'worker_id': self.worker_id, 'max_jobs': n})
+            if r is not None and isinstance(r.get('jobs'), list):
+                if self._batch_claim is None:
+                    logger.info("[Claim] batch claim supported by the Worker")
+                self._batch_claim = True
+                self.governor.observe_backlog(r.get('pending'))
+                return [j for j in r['jobs'] if j.get('id')]
+            if self.api.last_status.get('/api/jobs/claim-batch') in (404, 405):
+                logger.info("[Claim] Worker has no /api/jobs/claim-batch — using single claims")
+                self._batch_claim = False
+        jobs = []
+        while len(jobs) < n:
+            job = self.claim_job()
+            if not job:
+                break
+            jobs.append(job)
+        return jobs
+
+    def _estimate_job_cost(self, job: Dict) -> float:
+        """Expected encode work from the cached probe of the raw object (if any) or the claim metadata."""
+        profile = job.get('processing_profile', '12')
+        copy_only = profile in ('web_opt', 'web_optimize')
+        crf_int = job.get('crf') if job.get('crf') is not None else (job.get('bk') or {}).get('crf')
+        try:
+            crf = None if copy_only else self._resolve_crf(profile, crf_int)
+        except (TypeError, ValueError):
+            crf = None
+        meta = self.probe_cache.get(probe_cache_key(job.get('r2_raw_key'), int(job.get('file_size_input') or 0)))
+        return estimate_cost(job, meta, crf, 'copy' if copy_only else 'slow')
+
+    def _fill_admission_buffer(self) -> None:
+        """Claim ahead until running + buffered covers the pool plus the lookahead (one claimer at a time)."""
+        if not self._admission_lock.acquire(blocking=False):
             return
-        with self.lock:
-            self.last_job_time = time.time()
-            self.active_gear_until = time.time() + CONFIG['active_gear_duration']
-        self._process_single_job(job)
+        try:
+            while self.running and not self._paused and not self._ram_critical:
+                room = self.admission.room(self.pipeline.entry_load, self.pipeline.entry_capacity)
+                if room <= 0:
+                    break
+                jobs = self.claim_jobs(room)
+                for job in jobs:
+                    cost = self._estimate_job_cost(job)
+                    self.admission.add(job, cost)
+                    logger.info(f"[Admission] claimed job={job['id']} est_cost={cost:.0f} buffered={len(self.admission)}")
+                if len(jobs) < room:
+                    break  # queue on the Worker is empty
+        finally:
+            self._admission_lock.release()
+
+    def _feed_pipeline(self) -> None:
+        """Top up the lookahead buffer and move the cheapest buffered jobs into the fetch stage while it has room."""
+        while self.running and not self._paused and not self._ram_critical:
+            self._fill_admission_buffer()
+            if not self.pipeline.has_room():
+                break
+            job = self.admission.pop()
+            if not job:
+                break
+            adm = job.get('_admission') or {}
+            logger.info(f"[Admission] start job={job['id']} est_cost={adm.get('cost')} "
+                        f"waited={adm.get('waited_sec')}s buffered={len(self.admission)}")
+            ctx = self._open_job(job)
+            if not self.pipeline.offer(ctx):
+                self._close_job(ctx, False)
+                self.admission.add(job, adm.get('cost') or 0.0)
+                break
 
     def send_heartbeat(self, status: str = 'ACTIVE') -> bool:
         with self.lock:
@@ -1099,10 +2785,15 @@ class BKVFAgentV2:
             'status': status,
             'current_job_id': list(self.active_jobs.keys())[0] if self.active_jobs else None,
             'active_jobs': active,
-            'queue_size': len(self._active_futures),
+            'queue_size': self.pipeline.depths(),
             'ip_address': self._get_ip(),
             'version': '2.0',
         }
+        adm = self.admission.snapshot()
+        data.update({k: adm[k] for k in ('buffered', 'turnaround_p50_sec', 'turnaround_p95_sec')})
+        gov = self.governor.snapshot()
+        data.update({'encode_preset': gov['preset'], 'encode_crf_offset': gov['crf_offset'],
+                     'backlog_drain_est_sec': gov['drain_estimate_sec']})
         ok = self._make_api_request('POST', '/api/heartbeat', data) is not None
         if ok:
             self.last_heartbeat = datetime.now()
@@ -1290,7 +2981,7 @@ class BKVFAgentV2:
         for job_id in job_ids:
             try:
                 data = {'job_id': job_id, 'worker_id': self.worker_id, 'stage': stage}
-                self._make_api_request('POST', '/api/jobs/interrupt', data)
+                self.outbox.deliver('/api/jobs/interrupt', data, job_id)
             except Exception as e:
                 logger.warning(f"[RAM] Interrupt job {job_id} failed: {e}")
 
@@ -1314,6 +3005,7 @@ class BKVFAgentV2:
                     msg_critical = '🔺 RAM CRITICAL — graceful shutdown (finish current jobs, then stop)'
                     logger.critical(f"[RAM] {msg_critical} ({ram_used_gb:.1f} GB >= {ram_critical_gb} GB)")
                     self._ram_critical = True
+                    self._request_hand_back('ram_critical')
                     self._report_system_alert('critical', msg_critical)
                     self._send_telegram(msg_critical)
                     self.wakeup_event.set()
@@ -1338,6 +3030,78 @@ class BKVFAgentV2:
             if not ok:
                 logger.error("[STEALTH] Heartbeat failed")
 
+    def _build_metrics(self) -> MetricsRegistry:
+        m = MetricsRegistry()
+        m.counter('bkvf_jobs_total', 'Jobs finished on this agent by outcome and the stage they ended in')
+        m.histogram('bkvf_stage_duration_seconds', 'Wall time of one job stage', STAGE_BUCKETS)
+        m.counter('bkvf_transfer_bytes_total', 'Bytes downloaded (sources) / uploaded (outputs, raw archive)')
+        m.histogram('bkvf_transfer_throughput_bytes_per_second', 'Throughput of one finished transfer',
+                    THROUGHPUT_BUCKETS)
+        m.histogram('bkvf_encode_fps', 'Frames per second of one finished FFmpeg encode', FPS_BUCKETS)
+        m.histogram('bkvf_encode_speed_ratio', 'Media seconds encoded per wall second', SPEED_BUCKETS)
+        m.histogram('bkvf_slot_wait_seconds', 'Time waiting for a prefetch or encode slot', LATENCY_BUCKETS)
+        m.histogram('bkvf_api_request_duration_seconds', 'Worker API round trip per attempt', LATENCY_BUCKETS)
+        m.counter('bkvf_api_requests_total', 'Worker API attempts by endpoint and HTTP status (0 = transport error)')
+        m.add_collector(self._collect_metrics)
+        return m
+
+    def _collect_metrics(self) -> List[Tuple]:
+        """Gauges read on scrape: queues, component counters, host RAM/CPU/disk."""
+        with self.lock:
+            stages: Dict[str, int] = {}
+            for stage in self.active_jobs.values():
+                stages[stage] = stages.get(stage, 0) + 1
+            mode = self.mode
+        pipe = self.pipeline.snapshot()
+        adm = self.admission.snapshot()
+        gov = self.governor.snapshot()
+        fams = [
+            ('bkvf_up', 'gauge', 'Agent process is running', [({'worker_id': self.worker_id, 'mode': mode}, 1)]),
+            ('bkvf_uptime_seconds', 'gauge', 'Seconds since the agent started', [({}, time.time() - self._start_time)]),
+            ('bkvf_active_jobs', 'gauge', 'Claimed jobs in flight by current stage',
+             [({'stage': k}, v) for k, v in stages.items()]),
+            ('bkvf_stage_queue_depth', 'gauge', 'Jobs waiting in a stage queue',
+             [({'stage': k}, v['queued']) for k, v in pipe.items()]),
+            ('bkvf_stage_busy_workers', 'gauge', 'Stage workers running a job',
+             [({'stage': k}, v['busy']) for k, v in pipe.items()]),
+            ('bkvf_admission_buffered', 'gauge', 'Claimed jobs held in the admission lookahead',
+             [({}, adm['buffered'])]),
+            ('bkvf_remote_pending', 'gauge', 'Claimable jobs the Worker reported on the last claim',
+             [({}, gov['remote_pending'] or 0)]),
+            ('bkvf_encode_preset', 'gauge', 'x264 preset currently chosen by the governor',
+             [({'preset': gov['preset']}, 1)]),
+            ('bkvf_api_circuit_open', 'gauge', 'Worker API circuit breaker open', [({}, int(self.api.breaker.is_open))]),
+            ('bkvf_component_stat', 'gauge', 'Numeric snapshot() fields of the agent components',
+             snapshot_samples('encode_scheduler', self.encode_scheduler.snapshot())
+             + snapshot_samples('admission', adm)
+             + snapshot_samples('governor', gov)
+             + snapshot_samples('outbox', self.outbox.snapshot())
+             + snapshot_samples('probe_cache', self.probe_cache.snapshot())
+             + snapshot_samples('output_index', self.output_index.snapshot())
+             + snapshot_samples('raw_cache', self.raw_cache.snapshot())),
+        ]
+        try:
+            disk = shutil.disk_usage(str(self.temp_dir))
+            fams.append(('bkvf_disk_bytes', 'gauge', 'TEMP_DIR filesystem size',
+                         [({'kind': 'total'}, disk.total), ({'kind': 'free'}, disk.free)]))
+        except OSError:
+            pass
+        if hasattr(os, 'getloadavg'):
+            fams.append(('bkvf_load1', 'gauge', '1-minute load average', [({}, os.getloadavg()[0])]))
+        if psutil:
+            mem = psutil.virtual_memory()
+            fams.append(('bkvf_memory_bytes', 'gauge', 'Host RAM',
+                         [({'kind': 'total'}, mem.total), ({'kind': 'available'}, mem.available),
+                          ({'kind': 'used'}, mem.used)]))
+            fams.append(('bkvf_process_resident_bytes', 'gauge', 'Agent process RSS (FFmpeg not included)',
+                         [({}, psutil.Process().memory_info().rss)]))
+            # Counter, not cpu_percent(): a scrape must not move the scheduler's CPU sampling window
+            cpu = psutil.cpu_times()._asdict()
+            fams.append(('bkvf_cpu_seconds_total', 'counter', 'Host CPU time by mode (all cores)',
+                         [({'mode': k}, v) for k, v in cpu.items()]))
+            fams.append(('bkvf_cpu_cores', 'gauge', 'Logical CPU cores', [({}, self.encode_scheduler.cores)]))
+        return fams
+
     def _start_wakeup_server(self):
         agent = self
         expected_token = (self.bearer_token or '').strip()
@@ -1349,6 +3113,25 @@ class BKVFAgentV2:
                 except (ConnectionResetError, BrokenPipeError):
                     pass
 
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics' or not CONFIG['metrics_enabled']:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                if expected_token:
+                    auth = self.headers.get('Authorization', '').strip()
+                    if not auth.startswith('Bearer ') or auth[7:].strip() != expected_token:
+                        self.send_response(401)
+                        self.end_headers()
+                        self.wfile.write(b'Unauthorized')
+                        return
+                body = agent.metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
             def do_POST(self):
                 if self.path == '/wakeup':
                     if expected_token:
@@ -1432,7 +3215,9 @@ class BKVFAgentV2:
             def log_message(self, format, *args):
                 logger.debug("Wakeup server request: %s", args[2] if len(args) >= 3 else args)
 
-        srv = HTTPServer(('0.0.0.0', CONFIG['wakeup_port']), WakeupHandler)
+        # One thread per request: a scrape never waits behind a slow /drive-list
+        srv = ThreadingHTTPServer(('0.0.0.0', CONFIG['wakeup_port']), WakeupHandler)
+        srv.daemon_threads = True
         t = threading.Thread(target=srv.serve_forever, daemon=True)
         t.start()
         logger.info(f"Wakeup server on port {CONFIG['wakeup_port']}")
@@ -1482,7 +3267,7 @@ class BKVFAgentV2:
                         health = get_system_health(self.temp_dir)
                         with self.lock:
                             active_ids = list(self.active_jobs.keys())
-                            queue_size = len(self._active_futures)
+                            queue_size = ' '.join(f"{k}={v}" for k, v in self.pipeline.depths().items())
                         uptime_h = (time.time() - self._start_time) / 3600
                         paused_str = 'PAUSED' if self._paused else 'ACTIVE'
                         lines = [
@@ -1501,9 +3286,11 @@ class BKVFAgentV2:
                         self._send_alert('\n'.join(lines))
                     elif text == '/pause':
                         self._paused = True
+                        self._request_hand_back('pause')
                         self._send_alert('⏸ <b>PAUSE</b> — New jobs disabled. Current work and queue will finish.')
                     elif text == '/resume':
                         self._paused = False
+                        self._handback_reason = None
                         self._send_alert('▶ <b>RESUME</b> — Accepting new jobs again.')
             except Exception as e:
                 logger.debug(f"[C2] getUpdates error: {e}")
@@ -1545,6 +3332,7 @@ class BKVFAgentV2:
         self._samaritan_wakeup()
         self._start_wakeup_server()
         self._recover_interrupted_jobs()
+        self.pipeline.start()
 
         stealth_t = threading.Thread(target=self._stealth_heartbeat_loop, name="StealthHeartbeat", daemon=True)
         stealth_t.start()
@@ -1563,6 +3351,10 @@ class BKVFAgentV2:
             c2_t = threading.Thread(target=self._telegram_c2_loop, name="TelegramC2", daemon=True)
             c2_t.start()
 
+        if CONFIG['segment_fanout']:
+            seg_t = threading.Thread(target=self._segment_peer_loop, name="SegmentPeer", daemon=True)
+            seg_t.start()
+
         last_hb = 0
         try:
             while self.running:
@@ -1581,7 +3373,14 @@ class BKVFAgentV2:
                     mode = self.mode
                     gear_until = self.active_gear_until
 
-                if self._ram_critical and active == 0 and len(self._active_futures) == 0:
+                if len(self.admission) and mode != 'active':
+                    # Claimed-but-not-started jobs keep the active gear until the buffer is empty
+                    with self.lock:
+                        self.mode = 'active'
+                        self.active_gear_until = now + CONFIG['active_gear_duration']
+                        mode, gear_until = self.mode, self.active_gear_until
+
+                if self._ram_critical and active == 0 and self.pipeline.inflight == 0:
                     logger.info("[RAM] Graceful shutdown: no active jobs left, stopping.")
                     self.running = False
                     self.wakeup_event.set()
@@ -1592,20 +3391,12 @@ class BKVFAgentV2:
                     if now - last_hb >= 30:
                         if self.send_heartbeat():
                             last_hb = now
-                    # Drain completed futures
-                    for f in list(self._active_futures):
-                        if f.done():
-                            self._active_futures.discard(f)
-                            try:
-                                f.result()
-                            except Exception as e:
-                                logger.error(f"[Pool] Worker task error: {e}")
-                    # Fill slots: submit claim+process until pool full
+                    # Fill the fetch stage (claim → lookahead buffer → cheapest first)
                     if not self._ram_critical and not self._paused:
-                        self._make_api_request('POST', '/api/jobs/mark-zombies', {})
-                        while len(self._active_futures) < self.pool_size:
-                            future = self.executor.submit(self._claim_and_process_one)
-                            self._active_futures.add(future)
+                        if now - self._last_mark_zombies >= CONFIG['mark_zombies_interval']:
+                            self._make_api_request('POST', '/api/jobs/mark-zombies', {})
+                            self._last_mark_zombies = now
+                        self._feed_pipeline()
                 elif self.heartbeat_no_response_count >= 3:
                     wait = CONFIG['deep2_wait']
                     if now - last_hb >= CONFIG['idle_heartbeat_interval']:
@@ -1649,7 +3440,25 @@ class BKVFAgentV2:
             pass
         finally:
             self.running = False
-            self.executor.shutdown(wait=True)
+            # Claimed jobs whose encode hasn't started go back to the API; running encodes finish
+            self._request_hand_back(self._handback_reason or 'shutdown')
+            self.pipeline.shutdown(wait=True)
+            self.outbox.close()
+            logger.info(
+                f"[Outbox] total api_calls={self.outbox.api_calls} blocked={self.outbox.blocked_seconds:.2f}s"
+            )
+            adm = self.admission.snapshot()
+            logger.info(
+                f"[Admission] total claimed={adm['claimed']} finished={adm['finished']} "
+                f"reordered={adm['reordered']} turnaround p50={adm['turnaround_p50_sec']}s "
+                f"p95={adm['turnaround_p95_sec']}s"
+            )
+            sched = self.encode_scheduler.snapshot()
+            logger.info(
+                f"[Sched] total admitted={sched['admitted']} wait={sched['wait_seconds']:.1f}s "
+                f"threads_granted={sched['threads_granted']} "
+                f"mode={'adaptive' if self.encode_scheduler.adaptive else 'static'}"
+            )
             logger.info("BK-VF Agent v2 stopped")
 
 
@@ -1659,6 +3468,7 @@ def main():
     def _on_sigterm(*_):
         logger.info("SIGTERM received. Stopping agent gracefully.")
         agent.running = False
+        agent.wakeup_event.set()
 
     if hasattr(signal, 'SIGTERM'):
         try:
@@ -0,0 +1,118 @@
+"""
+Keyframe-chunked encoding — one long input becomes several FFmpeg encodes running side by side.
+
+A single libx264 process stops scaling well past a handful of threads, so a 90-minute 1080p/4K source
+keeps most cores idle for hours. Above CHUNKED_ENCODE_MIN_SEC the input's video stream is cut with the
+segment muxer in stream-copy mode, which can only cut on keyframes: every chunk starts on a GOP
+boundary and the chunks tile the source without overlap. Each chunk is encoded by its own FFmpeg under
+the encode scheduler (same filters and x264 flags as the single pass, chunk starts become IDR frames),
+then the concat demuxer joins the encoded chunks with -c copy and writes the final MP4 with +faststart.
+Outputs are video-only (-an), so there are no audio priming gaps at the joins. Each chunk's encoded
+frame count is checked against its packet count: open-GOP sources lose the leading B-frames after a
+cut (a visible jump at the join), and such inputs go back to the single-pass encode.
+"""
+import csv
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+def chunk_seconds(duration_sec: float, target_sec: int, parallel: int) -> int:
+    """Chunk length: target_sec, shortened so every parallel slot gets at least two chunks (load balance)."""
+    if duration_sec <= 0:
+        return max(1, target_sec)
+    per_slot = duration_sec / max(1, 2 * parallel)
+    return max(10, int(min(target_sec, per_slot)))
+
+
+def split_args(ffmpeg_path: str, src: Path, segment_sec: int, chunk_dir: Path) -> List[str]:
+    """Stream-copy the first video stream into keyframe-aligned chunk_dir/src-NNNN.mkv + segments.csv."""
+    return [
+        ffmpeg_path, '-v', 'error', '-i', str(src),
+        '-map', '0:v:0', '-c', 'copy', '-an', '-sn', '-dn',
+        '-f', 'segment', '-segment_time', str(segment_sec), '-reset_timestamps', '1',
+        '-segment_list', str(chunk_dir / 'segments.csv'), '-segment_list_type', 'csv',
+        '-y', str(chunk_dir / 'src-%04d.mkv'),
+    ]
+
+
+def read_segments(chunk_dir: Path) -> List[Tuple[Path, float, float]]:
+    """(chunk file, start, end) in source order, from the segment muxer's CSV list."""
+    out = []
+    try:
+        with open(chunk_dir / 'segments.csv', newline='', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if len(row) < 3:
+                    continue
+                try:
+                    out.append((chunk_dir / row[0], float(row[1]), float(row[2])))
+                except ValueError:
+                    continue
+    except OSError:
+        return []
+    return out
+
+
+def packet_list_args(ffmpeg_path: str, src: Path) -> List[str]:
+    """One framecrc line per video packet of a chunk (stream copy: reads the file once, no decode)."""
+    return [ffmpeg_path, '-v', 'error', '-i', str(src), '-map', '0:v:0', '-c', 'copy', '-f', 'framecrc', '-']
+
+
+def count_packets(framecrc: str) -> int:
+    return sum(1 for line in (framecrc or '').splitlines() if line and not line.startswith('#'))
+
+
+def write_concat_list(path: Path, files: List[Path]) -> Path:
+    """Concat demuxer script listing files in order (single quotes escaped as the demuxer expects)."""
+    lines = ['ffconcat version 1.0']
+    for p in files:
+        lines.append("file '" + str(p.resolve()).replace("'", "'\\''") + "'")
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return path
+
+
+def concat_args(ffmpeg_path: str, lists: List[Path], outputs: List[Path]) -> List[str]:
+    """Join the encoded chunks of each output (one concat input per output file) without re-encoding."""
+    cmd = [ffmpeg_path]
+    for lst in lists:
+        cmd += ['-f', 'concat', '-safe', '0', '-i', str(lst)]
+    for i, out in enumerate(outputs):
+        cmd += ['-map', f'{i}:v:0', '-c', 'copy', '-movflags', '+faststart', '-y', str(out)]
+    return cmd
+
+
+class ChunkProgress:
+    """Combines the -progress snapshots of concurrently running chunk encodes into one job snapshot."""
+
+    def __init__(self, durations: List[float]):
+        self.durations = durations
+        self.total = sum(durations)
+        self._lock = threading.Lock()
+        self._done_sec = [0.0] * len(durations)
+        self._fps = [0.0] * len(durations)
+        self._speed = [0.0] * len(durations)
+        self.frames = [0] * len(durations)
+
+    def update(self, index: int, snap: Dict) -> Dict:
+        with self._lock:
+            if snap.get('out_time_sec') is not None:
+                self._done_sec[index] = min(self.durations[index], snap['out_time_sec'])
+            if snap.get('frame'):
+                self.frames[index] = snap['frame']
+            running = not snap.get('done')
+            self._fps[index] = (snap.get('fps') or 0.0) if running else 0.0
+            self._speed[index] = (snap.get('speed') or 0.0) if running else 0.0
+            done = sum(self._done_sec)
+            speed = sum(self._speed)
+            out: Dict = {'done': False, 'out_time_sec': round(done, 2), 'fps': round(sum(self._fps), 2),
+                         'speed': round(speed, 3)}
+        if self.total > 0:
+            out['percent'] = min(100, int(done * 100 / self.total))
+            if speed > 0:
+                out['eta_sec'] = max(0, int((self.total - done) / speed))
+        return out
+
+    def encoded_frames(self) -> int:
+        with self._lock:
+            return sum(self.frames)
+
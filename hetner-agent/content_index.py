@@ -0,0 +1,169 @@
+"""
+Content-addressed output index — the same source bytes encoded with the same settings are done once.
+
+The download loop feeds every chunk into a StreamHasher, so the SHA-256 of the source is known the
+moment the file is complete (no second pass over it). The hash plus the effective encode settings
+(profile, CRF, output qualities, thumbnail/storyboard options) form the output cache key. The index
+maps that key to the finished job's outputs (R2 keys + complete payload), one JSON file per key under
+<temp_dir>/output-index. A hit lets the agent copy those outputs to the new job instead of encoding again.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when the encoder output for identical settings changes (new filters, codec flags, ...)
+OUTPUT_FORMAT_VERSION = 1
+_FOLLOW_READ_BYTES = 4 * 1024 * 1024
+
+
+class StreamHasher:
+    """
+    Incremental SHA-256 of a download.
+    update(): sequential writers hand over each chunk. follow(): positional writers (segmented
+    download) report the contiguous prefix and the newly completed bytes are read back right behind
+    the writer, while they are still in the page cache. reset() after a restart, invalidate() when the
+    bytes bypass the hasher (gdown); hexdigest() is None unless every byte went through.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._sha = hashlib.sha256()
+            self.hashed = 0
+            self.valid = True
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.valid = False
+
+    def update(self, chunk: bytes) -> None:
+        with self._lock:
+            self._sha.update(chunk)
+            self.hashed += len(chunk)
+
+    def follow(self, path: Path, prefix: int) -> None:
+        with self._lock:
+            if prefix <= self.hashed or not self.valid:
+                return
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(self.hashed)
+                    while self.hashed < prefix:
+                        data = f.read(min(_FOLLOW_READ_BYTES, prefix - self.hashed))
+                        if not data:
+                            break
+                        self._sha.update(data)
+                        self.hashed += len(data)
+            except OSError as e:
+                logger.debug(f"[Dedupe] hash follow failed: {e}")
+                self.valid = False
+
+    def hexdigest(self, expected_size: Optional[int] = None) -> Optional[str]:
+        with self._lock:
+            if not self.valid or self.hashed <= 0:
+                return None
+            if expected_size is not None and expected_size != self.hashed:
+                return None
+            return self._sha.hexdigest()
+
+
+def output_cache_key(content_hash: Optional[str], settings: Dict) -> Optional[str]:
+    """Stable key of (source bytes, encode settings); None when the hash is unknown."""
+    if not content_hash:
+        return None
+    blob = json.dumps({'v': OUTPUT_FORMAT_VERSION, **settings}, sort_keys=True, separators=(',', ':'))
+    return 'out:' + hashlib.sha256(f"{content_hash}|{blob}".encode('utf-8')).hexdigest()
+
+
+class OutputIndex:
+    """On-disk LRU-by-mtime map: output cache key → {'job_id', 'keys', 'result'} of a completed job."""
+
+    def __init__(self, index_dir: Path, max_entries: int = 5000):
+        self.index_dir = index_dir
+        self.max_entries = max(1, max_entries)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.stats = {'lookups': 0, 'hits': 0, 'remote_hits': 0, 'reused': 0, 'stale': 0,
+                      'saved_encode_seconds': 0.0}
+
+    def _path(self, key: str) -> Path:
+        return self.index_dir / (hashlib.sha256(key.encode('utf-8')).hexdigest()[:32] + '.json')
+
+    def get(self, key: Optional[str]) -> Optional[Dict]:
+        if not key:
+            return None
+        with self._lock:
+            self.stats['lookups'] += 1
+        p = self._path(key)
+        try:
+            with open(p, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if entry.get('key') != key:
+                return None
+            os.utime(p, None)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self.stats['hits'] += 1
+        return entry
+
+    def put(self, key: Optional[str], job_id: int, keys, result: Dict) -> None:
+        if not key or not keys:
+            return
+        p = self._path(key)
+        tmp = p.with_suffix('.tmp')
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'job_id': job_id, 'keys': list(keys), 'result': result,
+                           'created_at': time.time()}, f)
+            os.replace(tmp, p)
+        except OSError as e:
+            logger.debug(f"[Dedupe] index write failed: {e}")
+            return
+        self._prune()
+
+    def forget(self, key: Optional[str]) -> None:
+        """Drop an entry whose outputs are gone (deleted video, failed copy)."""
+        if not key:
+            return
+        self._path(key).unlink(missing_ok=True)
+        with self._lock:
+            self.stats['stale'] += 1
+
+    def record(self, name: str, saved_seconds: float = 0.0) -> None:
+        with self._lock:
+            self.stats[name] += 1
+            self.stats['saved_encode_seconds'] += saved_seconds
+
+    def _prune(self) -> None:
+        try:
+            entries = list(self.index_dir.glob('*.json'))
+            if len(entries) <= self.max_entries:
+                return
+            entries.sort(key=lambda q: q.stat().st_mtime)
+            for q in entries[:len(entries) - self.max_entries]:
+                q.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return dict(self.stats)
+
+
+def rekey_output(key: str, job_id: int, video_prefix: str) -> str:
+    """R2 key of a copied output for job_id: thumbnails/<src>/<name> → thumbnails/<job>/<name>,
+    videos/<y>/<m>/<src>_<name> → <video_prefix><name> (file names, and so VTT sheet links, stay intact)."""
+    if key.startswith('thumbnails/'):
+        return f"thumbnails/{job_id}/{key.split('/', 2)[2]}"
+    return video_prefix + key.rsplit('/', 1)[-1].split('_', 1)[-1]
@@ -0,0 +1,44 @@
+"""
+FFmpeg command lines of the agent's encodes — shared by bk_agent_v2 (_encode_video, chunks, peer
+segments) and bench_encode.py, so the benchmark measures exactly what production runs.
+
+Output quality → (vertical, horizontal) scale filter / resolution; the x264 flags are the agent's:
+-crf N -preset P, High@4.1, yuv420p, no audio, +faststart on whole-file outputs. Several outputs =
+one decode, split filter, one mapped encode per output (ladder).
+"""
+from pathlib import Path
+from typing import List, Optional
+
+SCALE_FILTERS = {
+    '720p': ('scale=720:-2:flags=lanczos', 'scale=-2:720:flags=lanczos'),
+    '1080p': ('scale=1080:-2:flags=lanczos', 'scale=-2:1080:flags=lanczos'),
+    '2k': ('scale=1440:-2:flags=lanczos', 'scale=-2:1440:flags=lanczos'),
+    '4k': ('scale=2160:-2:flags=lanczos', 'scale=-2:2160:flags=lanczos'),
+}
+RESOLUTIONS = {'720p': ('720x1280', '1280x720'), '1080p': ('1080x1920', '1920x1080'),
+               '2k': ('1440x2560', '2560x1440'), '4k': ('2160x3840', '3840x2160')}
+
+
+def x264_cmd(ffmpeg: str, src: str, scales: List[Optional[str]], outputs: List[Path], crf: int,
+             threads_opt: List[str], faststart: bool = True, preset: str = 'slow') -> List[str]:
+    """libx264 encode of src into outputs (one per scale; several = decode once, split filter)."""
+    x264 = ['-c:v', 'libx264', '-crf', str(crf), '-preset', preset, '-an']
+    if faststart:
+        x264 += ['-movflags', '+faststart']
+    x264 += ['-profile:v', 'high', '-level', '4.1', '-pix_fmt', 'yuv420p']
+    if len(outputs) > 1:
+        n = len(outputs)
+        graph = f"[0:v]split={n}" + ''.join(f"[s{i}]" for i in range(n)) + ''.join(
+            f";[s{i}]{sc}[v{i}]" for i, sc in enumerate(scales)
+        )
+        cmd = [ffmpeg, '-i', src, '-filter_complex', graph]
+        for i, out in enumerate(outputs):
+            cmd += ['-map', f'[v{i}]'] + threads_opt + x264 + ['-y', str(out)]
+        return cmd
+    vf = ['-vf', scales[0]] if scales[0] else []
+    return [ffmpeg, '-i', src] + threads_opt + vf + x264 + ['-y', str(outputs[0])]
+
+
+def copy_cmd(ffmpeg: str, src: str, output: Path, threads_opt: List[str]) -> List[str]:
+    """web_opt / remux: video stream copied as is, moov atom up front."""
+    return [ffmpeg, '-i', src] + threads_opt + ['-c:v', 'copy', '-an', '-movflags', '+faststart', '-y', str(output)]
@@ -0,0 +1,138 @@
+"""
+Backlog-aware preset governor — trade encode quality for throughput only while the queue needs it.
+
+Every x264 encode ran with -preset slow, whether one job was waiting or five hundred. The governor
+walks a ladder of presets (GOVERNOR_PRESETS, default slow → medium → fast) with optional CRF offsets
+per step, picking for each new encode the slowest step whose estimated drain time for the backlog
+stays within GOVERNOR_TARGET_DRAIN_SEC:
+
+    drain ≈ backlog jobs × avg job work / measured throughput of that step
+
+Backlog = jobs still pending on the Worker (claim-batch responses carry the count) + jobs claimed
+here and not finished. Work is counted in output pixel-seconds (media duration × output pixels) so
+a 4K job weighs more than a 720p one; throughput per step is an EWMA of finished encodes, and steps
+without a measurement are extrapolated from the nearest measured one with the scheduler's relative
+preset costs (encode_scheduler.PRESET_COST). Moving to a slower step needs the estimate under
+GOVERNOR_HYSTERESIS × target, and the step changes at most every GOVERNOR_MIN_HOLD_SEC, so the preset
+does not flap between jobs.
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from encode_scheduler import PRESET_COST
+
+
+def parse_ladder(presets: str, crf_offsets: str) -> List[Tuple[str, int]]:
+    """"slow,medium,fast" + "0,0,1" → [('slow', 0), ('medium', 0), ('fast', 1)] (unknown presets dropped)."""
+    names = [p for p in (x.strip().lower() for x in (presets or '').split(',')) if p in PRESET_COST and p != 'copy']
+    offsets = []
+    for raw in (crf_offsets or '').split(','):
+        try:
+            offsets.append(int(raw))
+        except ValueError:
+            offsets.append(0)
+    return [(p, offsets[i] if i < len(offsets) else 0) for i, p in enumerate(names)] or [('slow', 0)]
+
+
+class PresetGovernor:
+    """Chooses (preset, crf offset) per encode from backlog depth and measured throughput; thread-safe."""
+
+    def __init__(self, ladder: List[Tuple[str, int]], target_drain_sec: float, parallel: int,
+                 hysteresis: float = 0.7, min_hold_sec: float = 60.0, alpha: float = 0.3,
+                 default_job_work: float = 600.0 * 1280 * 720, enabled: bool = True):
+        self.ladder = ladder
+        self.target_drain_sec = target_drain_sec
+        self.parallel = max(1, parallel)
+        self.hysteresis = hysteresis
+        self.min_hold_sec = min_hold_sec
+        self.alpha = alpha
+        self.enabled = enabled and len(ladder) > 1 and target_drain_sec > 0
+        self._lock = threading.Lock()
+        self._step = 0
+        self._changed_at = 0.0
+        self._remote_pending = 0
+        self._job_work = default_job_work  # EWMA output pixel-seconds per job (prior until the first job)
+        self._jobs_seen = 0
+        self._throughput: Dict[str, float] = {}  # preset → EWMA output pixel-seconds per wall second
+        self._last_estimate: Optional[float] = None
+        self.stats = {'choices': {p: 0 for p, _ in ladder}, 'changes': 0}
+
+    def observe_backlog(self, remote_pending: Optional[int]) -> None:
+        """Pending job count from the Worker (claim responses); None = unknown, keep the last value."""
+        if remote_pending is None:
+            return
+        with self._lock:
+            self._remote_pending = max(0, int(remote_pending))
+
+    def observe_job(self, media_sec: float, out_pixels: int) -> None:
+        """A finished job's work (media duration × output pixels, all renditions) feeds the per-job average."""
+        if media_sec <= 0 or out_pixels <= 0:
+            return
+        with self._lock:
+            work = media_sec * out_pixels
+            self._job_work = work if not self._jobs_seen else self._job_work + self.alpha * (work - self._job_work)
+            self._jobs_seen += 1
+
+    def observe_encode(self, preset: str, media_sec: float, out_pixels: int, wall_sec: float) -> None:
+        """One FFmpeg process (whole job or one chunk) finished: media_sec × out_pixels in wall_sec."""
+        if media_sec <= 0 or out_pixels <= 0 or wall_sec <= 0 or preset not in PRESET_COST:
+            return
+        tp = media_sec * out_pixels / wall_sec
+        with self._lock:
+            old = self._throughput.get(preset)
+            self._throughput[preset] = tp if old is None else old + self.alpha * (tp - old)
+
+    def _step_throughput(self, preset: str) -> Optional[float]:
+        if preset in self._throughput:
+            return self._throughput[preset]
+        if not self._throughput:
+            return None
+        # Nearest measured preset, scaled by the relative x264 cost (encode_scheduler.PRESET_COST)
+        known = min(self._throughput, key=lambda p: abs(PRESET_COST[p] - PRESET_COST[preset]))
+        return self._throughput[known] * PRESET_COST[known] / PRESET_COST[preset]
+
+    def _drain_sec(self, step: int, local_jobs: int) -> Optional[float]:
+        tp = self._step_throughput(self.ladder[step][0])
+        if not tp:
+            return None
+        return (self._remote_pending + local_jobs) * self._job_work / (tp * self.parallel)
+
+    def choose(self, local_jobs: int) -> Tuple[str, int]:
+        """(preset, crf offset) for the encode about to start; local_jobs = claimed here, not finished."""
+        with self._lock:
+            if not self.enabled:
+                preset, offset = self.ladder[0]
+                self.stats['choices'][preset] += 1
+                return preset, offset
+            want = len(self.ladder) - 1
+            for step in range(len(self.ladder)):
+                est = self._drain_sec(step, local_jobs)
+                if est is None:
+                    want = self._step if self._throughput else 0  # nothing measured yet: stay put
+                    break
+                limit = self.target_drain_sec * (self.hysteresis if step < self._step else 1.0)
+                if est <= limit:
+                    want = step
+                    break
+            now = time.monotonic()
+            if want != self._step and now - self._changed_at >= self.min_hold_sec:
+                self._step = want
+                self._changed_at = now
+                self.stats['changes'] += 1
+            self._last_estimate = self._drain_sec(self._step, local_jobs)
+            preset, offset = self.ladder[self._step]
+            self.stats['choices'][preset] += 1
+            return preset, offset
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            preset, offset = self.ladder[self._step]
+            return {
+                'preset': preset, 'crf_offset': offset, 'step': self._step, 'enabled': self.enabled,
+                'remote_pending': self._remote_pending,
+                'drain_estimate_sec': None if self._last_estimate is None else int(self._last_estimate),
+                'target_drain_sec': self.target_drain_sec,
+                'throughput': {p: round(v / 1e6, 2) for p, v in self._throughput.items()},  # Mpx·s per s
+                **{k: (dict(v) if isinstance(v, dict) else v) for k, v in self.stats.items()},
+            }
@@ -0,0 +1,121 @@
+"""
+Resumable chunked encodes — chunks finished before an interrupt are not encoded again.
+
+The RAM watchdog and a SIGTERM/kill stop FFmpeg mid-encode, and the retry used to start the whole
+encode over. Chunked encodes (chunked_encode.py) already produce independently decodable pieces, so
+with RESUMABLE_ENCODE their chunk dir lives under <temp_dir>/encode-resume/<job_id> instead of the
+attempt's work dir, next to a manifest.json: the encode signature (raw key, requested CRF, filters,
+outputs, chunk length), the x264 settings the chunks were encoded with (governor preset and adjusted
+CRF), the keyframe cut points and the chunks already encoded with their frame counts. Each finished chunk is written to the manifest (atomic replace) and reported as the job
+checkpoint "encode_segments:<done>/<total>". The next attempt with the same signature skips the split
+when the sources of the missing chunks are still there, encodes only those, and joins as usual. A
+signature change (other CRF, ladder, input) starts over; a governor step between attempts does not —
+the missing chunks are encoded with the recorded settings so the joined output stays consistent.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+MANIFEST = 'manifest.json'
+CHECKPOINT_PREFIX = 'encode_segments:'
+
+
+def resume_dir(root: Path, job_id: int) -> Path:
+    return root / str(int(job_id))
+
+
+def prune_resume_dirs(root: Path, max_age_sec: float, keep: Tuple[int, ...] = ()) -> int:
+    """Remove resume dirs untouched for max_age_sec (job finished elsewhere or was deleted); returns count."""
+    if not root.exists():
+        return 0
+    cutoff = time.time() - max_age_sec
+    removed = 0
+    for d in root.iterdir():
+        if not d.is_dir() or d.name in {str(k) for k in keep}:
+            continue
+        try:
+            newest = max([p.stat().st_mtime for p in d.iterdir()] + [d.stat().st_mtime])
+        except OSError:
+            continue
+        if newest < cutoff:
+            shutil.rmtree(d, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+class ResumeManifest:
+    """Cut points + finished chunks of one job's chunked encode; thread-safe (chunks finish concurrently)."""
+
+    def __init__(self, chunk_dir: Path, signature: Dict, settings: Optional[Dict] = None):
+        self.chunk_dir = chunk_dir
+        self.signature = signature
+        self.settings: Dict = dict(settings or {})  # x264 preset/crf of the chunks in this dir
+        self.cuts: List[Tuple[str, float, float]] = []  # (source file name, start, end) per chunk
+        self.done: Dict[int, int] = {}  # seq → encoded frames
+        self.resumed = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, chunk_dir: Path, signature: Dict, settings: Optional[Dict] = None) -> 'ResumeManifest':
+        """Load the manifest when its signature matches (its settings win); anything else in chunk_dir is wiped."""
+        m = cls(chunk_dir, signature, settings)
+        try:
+            with open(chunk_dir / MANIFEST, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('signature') == signature and data.get('cuts'):
+                m.cuts = [(c[0], float(c[1]), float(c[2])) for c in data['cuts']]
+                m.done = {int(k): int(v) for k, v in (data.get('done') or {}).items()}
+                m.settings = dict(data.get('settings') or m.settings)
+                m.resumed = True
+                return m
+        except (OSError, ValueError, TypeError, IndexError):
+            pass
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+        chunk_dir.mkdir(parents=True, exist_ok=True)
+        return m
+
+    def _write(self) -> None:
+        tmp = self.chunk_dir / (MANIFEST + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'signature': self.signature, 'settings': self.settings, 'cuts': self.cuts,
+                       'done': {str(k): v for k, v in sorted(self.done.items())}, 'updated_at': time.time()}, f)
+        os.replace(tmp, self.chunk_dir / MANIFEST)
+
+    def set_cuts(self, segments: List[Tuple[Path, float, float]], settings: Optional[Dict] = None) -> None:
+        """Record a fresh split encoded with settings (drops finished chunks of an older split)."""
+        with self._lock:
+            if settings is not None:
+                self.settings = dict(settings)
+            self.cuts = [(p.name, begin, end) for p, begin, end in segments]
+            self.done = {}
+            self._write()
+
+    def segments(self) -> List[Tuple[Path, float, float]]:
+        return [(self.chunk_dir / name, begin, end) for name, begin, end in self.cuts]
+
+    def usable(self, outputs_of) -> Optional[Dict[int, int]]:
+        """
+        Finished chunks whose outputs are still on disk ({seq: frames}), or None when a missing chunk
+        has lost its source (the split has to run again). outputs_of(seq) → output paths of that chunk.
+        """
+        with self._lock:
+            if not self.cuts:
+                return None
+            done = {i: f for i, f in self.done.items()
+                    if i < len(self.cuts) and all(p.exists() and p.stat().st_size > 0 for p in outputs_of(i))}
+            missing = [i for i in range(len(self.cuts)) if i not in done]
+            if any(not (self.chunk_dir / self.cuts[i][0]).exists() for i in missing):
+                return None
+            self.done = done
+            return dict(done)
+
+    def mark_done(self, seq: int, frames: int) -> str:
+        """Persist one finished chunk; returns the job checkpoint string."""
+        with self._lock:
+            self.done[seq] = int(frames)
+            self._write()
+            return f"{CHECKPOINT_PREFIX}{len(self.done)}/{len(self.cuts)}"
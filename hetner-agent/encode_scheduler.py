@@ -0,0 +1,139 @@
+"""
+Load-aware encode scheduler — replaces the fixed encode semaphore and the global FFmpeg -threads.
+
+Each encode asks for a slot with its probed geometry, duration and quality settings. The scheduler
+weighs it against the encodes already running and the live CPU load, then hands back an x264
+thread budget. A lone job gets every core. Later arrivals get a weighted share, and new encodes
+wait while the machine is saturated. Running FFmpeg processes keep their thread count, so the split
+shows up as jobs overlap. Every decision is logged with its inputs so throughput can be compared
+against the static settings (ADAPTIVE_ENCODE=0: fixed FFMPEG_THREADS, MAX_PARALLEL_ENCODE slots).
+"""
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+REF_PIXELS = 1920 * 1080
+# Relative x264 cost per preset (slow = 1.0)
+PRESET_COST = {
+    'veryslow': 2.0, 'slower': 1.5, 'slow': 1.0, 'medium': 0.6, 'fast': 0.45,
+    'faster': 0.35, 'veryfast': 0.25, 'superfast': 0.15, 'ultrafast': 0.1, 'copy': 0.05,
+}
+
+
+def thread_cap(out_height: int, duration_sec: float, cores: int) -> int:
+    """x264 stops scaling past ~8 threads at 720p / ~16 at 1080p; short clips don't amortise big pools."""
+    if out_height <= 720:
+        cap = 8
+    elif out_height <= 1080:
+        cap = 16
+    elif out_height <= 1440:
+        cap = 24
+    else:
+        cap = cores
+    if 0 < duration_sec < 60:
+        cap = min(cap, 8)
+    return max(1, min(cap, cores))
+
+
+def encode_weight(src_pixels: int, out_pixels: int, crf: Optional[int], preset: str = 'slow') -> float:
+    """CPU weight of an encode relative to a 1080p CRF 18 -preset slow re-encode (decode counts ~10%)."""
+    crf_factor = 1.0 if crf is None else max(0.7, min(2.0, 1.0 + (18 - int(crf)) * 0.08))
+    enc = (out_pixels / REF_PIXELS) * crf_factor * PRESET_COST.get(preset, 1.0)
+    return max(0.05, enc + 0.1 * src_pixels / REF_PIXELS)
+
+
+class EncodeScheduler:
+    """Admission + thread budgets for concurrent FFmpeg encodes."""
+
+    def __init__(self, cores: Optional[int] = None, max_jobs: int = 4, adaptive: bool = True,
+                 static_threads: int = 0, cpu_percent: Optional[Callable[[], Optional[float]]] = None,
+                 busy_cpu_percent: float = 92.0, oversubscribe: float = 1.5):
+        self.cores = max(1, cores or os.cpu_count() or 1)
+        self.max_jobs = max(1, max_jobs)
+        self.adaptive = adaptive
+        self.static_threads = static_threads
+        self.cpu_percent = cpu_percent
+        self.busy_cpu_percent = busy_cpu_percent
+        self.oversubscribe = oversubscribe
+        self._cond = threading.Condition()
+        self.active: Dict[int, Dict] = {}  # job_id → {'weight', 'threads', 'started'}
+        self.stats = {'admitted': 0, 'wait_seconds': 0.0, 'threads_granted': 0}
+
+    def _cpu(self) -> Optional[float]:
+        try:
+            return self.cpu_percent() if self.cpu_percent else None
+        except Exception:
+            return None
+
+    def _budget(self, weight: float, cap: int) -> Tuple[int, int]:
+        """(threads, minimum acceptable): a weighted share of the cores, trimmed to the unallotted room."""
+        if not self.adaptive:
+            return self.static_threads, 0
+        if not self.active:
+            return cap, cap
+        total = weight + sum(a['weight'] for a in self.active.values())
+        share = max(1, min(cap, int(round(self.cores * weight / total))))
+        room = int(self.cores * self.oversubscribe) - sum(a['threads'] for a in self.active.values())
+        return max(0, min(share, room)), max(1, share // 2)
+
+    def _can_admit(self, threads: int, minimum: int, cpu: Optional[float]) -> bool:
+        if not self.active:
+            return True
+        if len(self.active) >= self.max_jobs:
+            return False
+        if not self.adaptive:
+            return True
+        return threads >= minimum and (cpu is None or cpu < self.busy_cpu_percent)
+
+    def acquire(self, job_id: int, weight: float, cap: int, info: str = '',
+                abort: Optional[Callable[[], bool]] = None) -> Optional[int]:
+        """
+        Block until the job may start; returns its -threads value (0 = let FFmpeg decide),
+        or None if abort() turned true while waiting.
+        """
+        t0 = time.monotonic()
+        cap = max(1, min(cap, self.cores))
+        with self._cond:
+            while True:
+                cpu = self._cpu()
+                threads, minimum = self._budget(weight, cap)
+                if self._can_admit(threads, minimum, cpu):
+                    break
+                if abort and abort():
+                    return None
+                self._cond.wait(timeout=2.0)
+            waited = time.monotonic() - t0
+            self.active[job_id] = {'weight': weight, 'threads': threads, 'started': time.monotonic()}
+            self.stats['admitted'] += 1
+            self.stats['wait_seconds'] += waited
+            self.stats['threads_granted'] += threads
+            running = len(self.active)
+        mode = 'adaptive' if self.adaptive else 'static'
+        logger.info(
+            f"[Sched] job={job_id} {info} weight={weight:.2f} cap={cap} → threads={threads} "
+            f"({mode}, running={running}, cores={self.cores}, cpu={'n/a' if cpu is None else f'{cpu:.0f}%'}, "
+            f"waited={waited:.1f}s)"
+        )
+        return threads
+
+    def wake(self) -> None:
+        """Re-evaluate waiting acquires now (e.g. after an abort condition changed)."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def release(self, job_id: int) -> None:
+        with self._cond:
+            slot = self.active.pop(job_id, None)
+            if slot is None:
+                return
+            self._cond.notify_all()
+        logger.debug(f"[Sched] job={job_id} released after {time.monotonic() - slot['started']:.1f}s")
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            return {**self.stats, 'running': len(self.active),
+                    'threads_allotted': sum(a['threads'] for a in self.active.values())}
@@ -0,0 +1,153 @@
+"""
+Parse FFmpeg's own encode statistics so the output file never has to be ffprobed again.
+
+From the stderr of a finished run: per-output video stream geometry/frame rate (the "Output #N"
+sections) and the final frame=/time= stats line → resolution, duration and fps of the result.
+While it runs: ProgressParser reads `-progress pipe:1` blocks (time, fps, speed, ETA) and
+StderrBuffer keeps stderr bounded (head for the stream lines, tail for failure reports).
+"""
+import re
+from typing import Dict, Optional
+
+_OUTPUT_RE = re.compile(r"^Output #(\d+),")
+_VIDEO_STREAM_RE = re.compile(r"Stream #\d+:\d+.*?: Video: .*?(\d{2,5})x(\d{2,5})")
+_FPS_RE = re.compile(r"([\d.]+) fps")
+_FRAME_RE = re.compile(r"frame=\s*(\d+)")
+_TIME_RE = re.compile(r"time=\s*(-?\d+):(\d+):([\d.]+)")
+
+
+def parse_timestamp(h: str, m: str, s: str) -> float:
+    return int(h) * 3600 + int(m) * 60 + float(s)
+
+
+def parse_encode_stats(stderr: str) -> Dict:
+    """
+    {'outputs': {n: {'resolution': 'WxH', 'frame_rate': float}}, 'frames': int, 'time_sec': float}
+    Missing pieces are simply absent (e.g. -v quiet runs).
+    """
+    outputs: Dict[int, Dict] = {}
+    current: Optional[int] = None
+    for line in stderr.splitlines():
+        m = _OUTPUT_RE.match(line)
+        if m:
+            current = int(m.group(1))
+            continue
+        if line.startswith('Input #'):
+            current = None
+            continue
+        if current is None or current in outputs:
+            continue
+        v = _VIDEO_STREAM_RE.search(line)
+        if v:
+            entry = {'resolution': f"{v.group(1)}x{v.group(2)}"}
+            f = _FPS_RE.search(line)
+            if f:
+                entry['frame_rate'] = round(float(f.group(1)), 2)
+            outputs[current] = entry
+    stats: Dict = {'outputs': outputs}
+    # Progress lines are \r-separated; the last one is the final total
+    tail = stderr[-4096:].replace('\r', '\n')
+    frames = _FRAME_RE.findall(tail)
+    times = _TIME_RE.findall(tail)
+    if frames:
+        stats['frames'] = int(frames[-1])
+    if times:
+        stats['time_sec'] = max(0.0, parse_timestamp(*times[-1]))
+    return stats
+
+
+def output_meta(stats: Dict, index: int = 0) -> Dict:
+    """resolution / frame_rate / duration for output #index (duration = frames / fps when both known)."""
+    out = dict(stats.get('outputs', {}).get(index) or {})
+    fps = out.get('frame_rate')
+    frames = stats.get('frames')
+    if frames and fps:
+        out['duration'] = int(round(frames / fps))
+    elif stats.get('time_sec'):
+        out['duration'] = int(round(stats['time_sec']))
+    return out
+
+
+class StderrBuffer:
+    """Bounded FFmpeg stderr: the first head_bytes (banner, Output #N stream lines) + the last tail_bytes."""
+
+    def __init__(self, head_bytes: int = 16 * 1024, tail_bytes: int = 64 * 1024):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self._head = bytearray()
+        self._tail = bytearray()
+        self.skipped = 0
+
+    def write(self, data: bytes) -> None:
+        room = self.head_bytes - len(self._head)
+        if room > 0:
+            self._head.extend(data[:room])
+            data = data[room:]
+        if not data:
+            return
+        self._tail.extend(data)
+        over = len(self._tail) - self.tail_bytes
+        if over > 0:
+            del self._tail[:over]
+            self.skipped += over
+
+    def head_text(self) -> str:
+        return self._head.decode('utf-8', errors='replace')
+
+    def text(self) -> str:
+        gap = f"\n... [{self.skipped} bytes skipped] ...\n" if self.skipped else ''
+        return self.head_text() + gap + self._tail.decode('utf-8', errors='replace')
+
+
+class ProgressParser:
+    """Incremental parser for `-progress pipe:1` key=value blocks (each block ends with progress=continue|end)."""
+
+    def __init__(self, duration_sec: float = 0.0):
+        self.duration_sec = duration_sec or 0.0
+        self._block: Dict[str, str] = {}
+        self.last: Dict = {}
+
+    def feed_line(self, line: str) -> Optional[Dict]:
+        """Returns a snapshot when a block completes, else None."""
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            return None
+        if key != 'progress':
+            self._block[key] = value.strip()
+            return None
+        snap = self._snapshot(self._block, value.strip() == 'end')
+        self._block = {}
+        self.last = snap
+        return snap
+
+    def _snapshot(self, b: Dict[str, str], done: bool) -> Dict:
+        snap: Dict = {'done': done}
+        try:
+            snap['frame'] = int(b.get('frame', 0) or 0)
+        except ValueError:
+            pass
+        try:
+            snap['fps'] = round(float(b.get('fps', 0) or 0), 2)
+        except ValueError:
+            pass
+        speed = (b.get('speed') or '').rstrip('x').strip()
+        try:
+            snap['speed'] = round(float(speed), 3)
+        except ValueError:
+            pass
+        out_us = b.get('out_time_us') or b.get('out_time_ms')
+        t = None
+        try:
+            t = int(out_us) / 1_000_000 if out_us not in (None, '', 'N/A') else None
+        except ValueError:
+            t = None
+        if t is None:
+            m = re.match(r"(-?\d+):(\d+):([\d.]+)", b.get('out_time') or '')
+            t = parse_timestamp(*m.groups()) if m else None
+        if t is not None and t >= 0:
+            snap['out_time_sec'] = round(t, 2)
+            if self.duration_sec > 0:
+                snap['percent'] = min(100, int(t * 100 / self.duration_sec))
+                if snap.get('speed'):
+                    snap['eta_sec'] = max(0, int((self.duration_sec - t) / snap['speed']))
+        return snap
@@ -0,0 +1,149 @@
+"""
+End-to-end load test: N real agent processes against the local stand-in Worker API + object store
+(mock_worker.py), full claim → download → encode → upload → complete loop, no Cloudflare or R2.
+
+    python load_test.py --agents 2 --jobs 20 --arrival poisson --rate 4 --seed-file clip.mp4
+    python load_test.py --agents 1 --jobs 10 --latency-ms 80 --jitter-ms 40 --error-rate 0.02 \
+        --agent-env MAX_PARALLEL_ENCODE=2 --agent-env CLAIM_BATCH=0 --out before.json
+
+Without --seed-file a --clip-seconds testsrc2 clip is generated with FFmpeg. Every agent gets its own
+BK_WORKER_ID, TEMP_DIR, WAKEUP_PORT and log file under the work dir; the mock POSTs /wakeup to all of
+them when jobs arrive, like the Worker. OUTPUT_DEDUPE and the raw cache are off (every seeded job
+has the same bytes, which would otherwise turn the run into cache hits); --agent-env KEY=VALUE sets
+any other agent setting. The run ends when every job is finished (or --duration runs out); the
+report — jobs/hour, queue wait, claim → start (first status event), claim → finish, API calls per
+job, injected faults — is printed as JSON and written to --out.
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from mock_worker import add_fault_args, mock_from_args, serve
+
+TOKEN = 'load-test'
+
+
+def run_agent(api_base: str) -> None:
+    """Agent process of the load test: bk_agent_v2 as is, except downloads from the mock's host are allowed
+    (the SSRF shield rejects loopback URLs)."""
+    import bk_agent_v2
+    mock_host = urlparse(api_base).netloc
+    shield = bk_agent_v2.BKVFAgentV2._validate_download_url
+    bk_agent_v2.BKVFAgentV2._validate_download_url = (
+        lambda self, url: urlparse(url).netloc == mock_host or shield(self, url))
+    bk_agent_v2.main()
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _make_clip(ffmpeg: str, path: Path, seconds: int, size: str) -> None:
+    subprocess.run([ffmpeg, '-v', 'error', '-f', 'lavfi', '-i', f"testsrc2=size={size}:rate=30", '-t', str(seconds),
+                    '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '18', '-g', '60', '-pix_fmt', 'yuv420p',
+                    '-y', str(path)], check=True)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    ap.add_argument('--agents', type=int, default=1)
+    ap.add_argument('--jobs', type=int, default=10)
+    ap.add_argument('--seed-file', help='raw video of every job (default: generated testsrc2 clip)')
+    ap.add_argument('--clip-seconds', type=int, default=20)
+    ap.add_argument('--clip-size', default='1920x1080')
+    ap.add_argument('--duration', type=float, default=3600, help='give up after this many seconds')
+    ap.add_argument('--report-interval', type=float, default=15)
+    ap.add_argument('--agent-env', action='append', default=[], metavar='KEY=VALUE')
+    ap.add_argument('--out', default='load-test.json')
+    ap.add_argument('--keep', action='store_true', help='keep the work dir (agent logs)')
+    ap.add_argument('--ffmpeg', default=os.getenv('FFMPEG_PATH', 'ffmpeg'))
+    ap.add_argument('--run-agent', metavar='API_BASE', help=argparse.SUPPRESS)
+    add_fault_args(ap)
+    a = ap.parse_args()
+    if a.run_agent:
+        run_agent(a.run_agent)
+        return 0
+
+    work = Path(tempfile.mkdtemp(prefix='load-test-'))
+    srv, mock = serve(port=0, mock=mock_from_args(a, wakeup_token=TOKEN))
+    procs = []
+    try:
+        src = Path(a.seed_file) if a.seed_file else work / 'clip.mp4'
+        if not a.seed_file:
+            _make_clip(a.ffmpeg, src, a.clip_seconds, a.clip_size)
+        data = src.read_bytes()
+        overrides = dict(kv.split('=', 1) for kv in a.agent_env if '=' in kv)
+        for i in range(a.agents):
+            port = _free_port()
+            agent_dir = work / f"agent{i}"
+            agent_dir.mkdir()
+            env = dict(os.environ, BK_API_BASE_URL=mock.base_url, BK_BEARER_TOKEN=TOKEN, BK_WORKER_ID=f"load-{i}",
+                       TEMP_DIR=str(agent_dir / 'tmp'), WAKEUP_PORT=str(port), LOG_FILE=str(agent_dir / 'agent.log'),
+                       OUTPUT_DEDUPE='0', RAW_CACHE_MAX_GB='0', TELEGRAM_BOT_TOKEN='',
+                       FFMPEG_PATH=a.ffmpeg)
+            env.update(overrides)
+            (agent_dir / 'tmp').mkdir()
+            out = open(agent_dir / 'stdout.log', 'wb')
+            procs.append((subprocess.Popen([sys.executable, os.path.abspath(__file__), '--run-agent', mock.base_url],
+                                           env=env, stdout=out, stderr=subprocess.STDOUT,
+                                           cwd=os.path.dirname(os.path.abspath(__file__))), out))
+            mock.wakeup_urls.append(f"http://127.0.0.1:{port}/wakeup")
+        # Agents are up once each has called the API (startup release / first claim / heartbeat)
+        deadline = time.time() + 30
+        while time.time() < deadline and sum(mock.calls.values()) < a.agents:
+            time.sleep(0.5)
+        t0 = time.time()
+        mock.start_arrivals(data, a.jobs, a.arrival, a.rate, a.burst_size,
+                            processing_profile=a.profile, quality=a.quality)
+        last_print = 0.0
+        while time.time() - t0 < a.duration:
+            r = mock.report()
+            if time.time() - last_print >= a.report_interval:
+                last_print = time.time()
+                print(f"[{time.time() - t0:6.0f}s] completed={r['completed']} failed={r['failed']} "
+                      f"interrupted={r['interrupted']} claimed={r['claimed']} pending={r['pending']}", file=sys.stderr)
+            if mock.arrivals_done.is_set() and r['completed'] + r['failed'] + r['interrupted'] >= a.jobs:
+                break
+            if any(p.poll() is not None for p, _ in procs):
+                print("an agent process exited — see its stdout.log", file=sys.stderr)
+                break
+            time.sleep(1)
+        report = mock.report()
+        report.update({
+            'agents': a.agents, 'arrival': a.arrival, 'rate_per_min': a.rate, 'seed_bytes': len(data),
+            'faults': {'latency_ms': a.latency_ms, 'jitter_ms': a.jitter_ms, 'error_rate': a.error_rate,
+                       'object_latency_ms': a.object_latency_ms, 'object_error_rate': a.object_error_rate,
+                       'part_fail_rate': a.part_fail_rate},
+            'agent_env': overrides, 'timed_out': time.time() - t0 >= a.duration,
+        })
+        Path(a.out).write_text(json.dumps(report, indent=2), encoding='utf-8')
+        print(json.dumps(report, indent=2))
+        return 0
+    finally:
+        for p, _ in procs:
+            p.terminate()
+        for p, out in procs:
+            try:
+                p.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                p.kill()
+            out.close()
+        srv.shutdown()
+        if a.keep:
+            print(f"work dir: {work}", file=sys.stderr)
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
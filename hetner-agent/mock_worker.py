@@ -0,0 +1,731 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Cloudflare Worker API + R2 — exercise bk_agent_v2 without production.
+
+In-memory object store served under /r2/<bucket>/<key> (PUT, GET with Range, multipart parts)
+and the agent-facing upload endpoints:
+  POST /api/jobs/presigned-upload   single PUT URL, or multipart {upload_id, part_urls}
+  POST /api/jobs/multipart-complete assemble parts in ETag order
+  POST /api/jobs/multipart-abort
+  POST /api/jobs/output-lookup      completed job with the same output_cache_key (output reuse)
+  POST /api/jobs/copy-output        copy public objects to the asking job's keys
+and a job queue for the claim lifecycle:
+  POST /api/jobs/claim              next pending job, or {"job": null}
+  POST /api/jobs/claim-batch        up to max_jobs pending jobs + pending count (404 with --no-batch-claim)
+  POST /api/jobs/release            claimed job back to the queue
+  POST /api/jobs/release-stale-startup  the asking agent's claims back to the queue
+  POST /api/jobs/status|status-batch|checkpoint  last status / progress per job, checkpoint kept on the job
+  POST /api/jobs/complete|fail      recorded per job
+  POST /api/jobs/interrupt          job parked as INTERRUPTED (GET /api/jobs/interrupted, POST …/interrupted/retry)
+  POST /api/jobs/mark-zombies       claims older than --zombie-sec fail unless their worker heartbeats
+  POST /api/heartbeat               last heartbeat per worker
+segment fan-out tasks (several agents sharing the keyframe chunks of one long job):
+  POST /api/jobs/segments/publish|ready|claim|complete|fail|status|clear
+Any other POST /api/* answers {"success": true}.
+
+Faults and load: --latency-ms/--jitter-ms delay every API answer, --error-rate answers that fraction of
+API calls (--error-paths prefixes, default all) with 503, --object-latency-ms/--object-error-rate do
+the same for object GET/PUT. Jobs arrive all at once (--arrival batch) or over time (steady, poisson,
+burst at --rate jobs/min); each arrival POSTs /wakeup to --wakeup-url agents like the Worker does.
+GET /mock/report returns the load report (jobs/hour, arrival → claim → start → finish latencies,
+API calls per job); load_test.py drives agent processes against it.
+
+Usage:
+  python mock_worker.py --port 8787 [--part-fail-rate 0.2] [--seed-file clip.mp4 --seed-jobs 20] [--no-batch-claim]
+  BK_API_BASE_URL=http://127.0.0.1:8787 python bk_agent_v2.py
+
+Several agents on one machine (segment fan-out): give each its own BK_WORKER_ID, TEMP_DIR and
+WAKEUP_PORT, e.g.
+  SEGMENT_FANOUT=1 CHUNKED_ENCODE_MIN_SEC=60 BK_WORKER_ID=a1 TEMP_DIR=/tmp/a1 WAKEUP_PORT=8081 python bk_agent_v2.py
+  SEGMENT_FANOUT=1 BK_WORKER_ID=a2 TEMP_DIR=/tmp/a2 WAKEUP_PORT=8082 python bk_agent_v2.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+ARRIVALS = ('batch', 'steady', 'poisson', 'burst')
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+
+class MockWorker:
+    """State for the stand-in: objects, in-flight multipart uploads and a call log."""
+
+    def __init__(self, part_fail_rate: float = 0.0, batch_claim: bool = True, latency_ms: float = 0.0,
+                 jitter_ms: float = 0.0, error_rate: float = 0.0, error_paths: Sequence[str] = (),
+                 object_latency_ms: float = 0.0, object_error_rate: float = 0.0, zombie_sec: float = 2700.0,
+                 wakeup_urls: Sequence[str] = (), wakeup_token: str = ''):
+        self.part_fail_rate = part_fail_rate
+        self.batch_claim = batch_claim
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_paths = tuple(error_paths)
+        self.object_latency_ms = object_latency_ms
+        self.object_error_rate = object_error_rate
+        self.zombie_sec = zombie_sec
+        self.wakeup_urls = list(wakeup_urls)
+        self.wakeup_token = wakeup_token
+        self.interrupted: Dict[int, Dict] = {}  # job_id → job parked by /api/jobs/interrupt
+        self.statuses: Dict[int, Dict] = {}  # job_id → last status event
+        self.heartbeats: Dict[str, Dict] = {}  # worker_id → last heartbeat body
+        # job_id → {'queued', 'claimed', 'started', 'finished'} (time.time()), 'claims', 'api_calls'
+        self.timeline: Dict[int, Dict] = {}
+        self.injected = {'api': 0, 'object': 0}
+        self.arrivals_done = threading.Event()
+        self.arrivals_done.set()
+        self.started_at = time.time()
+        self.pending: List[Dict] = []  # jobs waiting to be claimed, lowest id first
+        self.claimed: Dict[int, Dict] = {}  # job_id → job (with worker_id)
+        self.finished: Dict[int, Tuple[str, Dict]] = {}  # job_id → (endpoint name, last body)
+        self.objects: Dict[Tuple[str, str], bytes] = {}
+        self.object_meta: Dict[Tuple[str, str], Dict] = {}  # x-amz-meta-* requested at presign time
+        self.uploads: Dict[str, Dict] = {}  # upload_id → {'bucket', 'key', 'parts': {n: (etag, data)}}
+        self.segments: Dict[int, Dict] = {}  # task id → segment task (fields as in D1 segment_tasks)
+        self.segment_stale_sec = 1800
+        self.calls: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.base_url = ''
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def object_url(self, bucket: str, key: str) -> str:
+        return f"{self.base_url}/r2/{bucket}/{key}"
+
+    def add_jobs(self, jobs: List[Dict]) -> None:
+        now = time.time()
+        with self.lock:
+            self.pending.extend(jobs)
+            self.pending.sort(key=lambda j: j['id'])
+            for job in jobs:
+                self.timeline.setdefault(job['id'], {'queued': now, 'claims': 0, 'api_calls': 0})
+
+    def seed_jobs(self, data: bytes, count: int, **fields) -> List[Dict]:
+        """Store one raw object and queue `count` upload jobs that download it."""
+        self.objects[('raw', 'seed.mp4')] = data
+        with self.lock:
+            start = max([j['id'] for j in self.pending] + list(self.claimed) + list(self.finished) + [0]) + 1
+        jobs = [{
+            'id': start + i, 'r2_raw_key': 'seed.mp4', 'file_size_input': len(data),
+            'download_url': self.object_url('raw', 'seed.mp4'), 'clean_name': f"seed-{start + i}",
+            'processing_profile': 'native', 'quality': '720p', **fields,
+        } for i in range(count)]
+        self.add_jobs(jobs)
+        return jobs
+
+    def start_arrivals(self, data: bytes, count: int, pattern: str = 'batch', rate_per_min: float = 60.0,
+                       burst_size: int = 5, **fields) -> threading.Thread:
+        """Queue `count` jobs for data over time: batch = all now, steady = evenly at rate_per_min,
+        poisson = exponential gaps with that mean rate, burst = burst_size jobs at once, same mean rate."""
+        self.arrivals_done.clear()
+
+        def arrive():
+            sent = 0
+            gap = 60.0 / rate_per_min if rate_per_min > 0 else 0.0
+            while sent < count:
+                n = count - sent if pattern == 'batch' else min(burst_size if pattern == 'burst' else 1, count - sent)
+                self.seed_jobs(data, n, **fields)
+                self.wakeup()
+                sent += n
+                if sent < count:
+                    wait = random.expovariate(1.0 / gap) if pattern == 'poisson' and gap else gap * n
+                    time.sleep(wait)
+            self.arrivals_done.set()
+
+        t = threading.Thread(target=arrive, name="MockArrivals", daemon=True)
+        t.start()
+        return t
+
+    def wakeup(self) -> None:
+        """POST /wakeup to the registered agents (the Worker's routeWakeup), fire and forget."""
+        headers = {'Authorization': f"Bearer {self.wakeup_token}"} if self.wakeup_token else {}
+        for url in self.wakeup_urls:
+            threading.Thread(target=self._post_quietly, args=(url, headers), daemon=True).start()
+
+    @staticmethod
+    def _post_quietly(url: str, headers: Dict) -> None:
+        try:
+            requests.post(url, headers=headers, timeout=5)
+        except requests.RequestException:
+            pass
+
+    # ─── Load report ─────────────────────────────────────────────────────────
+
+    def _job_event(self, job_id, event: Optional[str] = None, api_call: bool = False) -> None:
+        """Caller holds self.lock. First occurrence of an event is kept (claims are counted)."""
+        t = self.timeline.get(job_id)
+        if t is None:
+            return
+        if api_call:
+            t['api_calls'] += 1
+        if event == 'claimed':
+            t['claims'] += 1
+            t['claimed'] = time.time()
+            t.pop('started', None)  # a re-claim (after release / zombie) starts over
+        elif event and event not in t:
+            t[event] = time.time()
+
+    def report(self) -> Dict:
+        """Throughput and latencies over the jobs seen so far (times in seconds)."""
+        with self.lock:
+            timeline = {k: dict(v) for k, v in self.timeline.items()}
+            finished = dict(self.finished)
+            calls = dict(self.calls)
+            injected = dict(self.injected)
+            queues = {'interrupted': len(self.interrupted), 'pending': len(self.pending), 'claimed': len(self.claimed)}
+        done = [j for j, (name, _) in finished.items() if name == 'complete' and j in timeline]
+        failed = [j for j, (name, _) in finished.items() if name == 'fail']
+        ends = [timeline[j]['finished'] for j in done if 'finished' in timeline[j]]
+        first = min((t['queued'] for t in timeline.values()), default=self.started_at)
+        window = (max(ends) - first) if ends else 0.0
+        api_total = sum(n for path, n in calls.items() if path.startswith('/api/'))
+
+        def lat(a: str, b: str, jobs) -> Dict:
+            vals = [timeline[j][b] - timeline[j][a] for j in jobs if a in timeline[j] and b in timeline[j]]
+            return {'p50': percentile(vals, 0.5), 'p95': percentile(vals, 0.95), 'max': percentile(vals, 1.0)}
+
+        return {
+            'jobs': len(timeline), 'completed': len(done), 'failed': len(failed), **queues,
+            'window_sec': round(window, 1),
+            'jobs_per_hour': round(len(done) * 3600 / window, 1) if window > 0 else 0.0,
+            'queue_wait_sec': lat('queued', 'claimed', timeline),
+            'claim_to_start_sec': lat('claimed', 'started', timeline),
+            'claim_to_finish_sec': lat('claimed', 'finished', done),
+            'end_to_end_sec': lat('queued', 'finished', done),
+            'reclaims': sum(max(0, t['claims'] - 1) for t in timeline.values()),
+            'api_calls': api_total,
+            'api_calls_per_job': round(api_total / len(done), 1) if done else None,
+            'job_api_calls_per_job': round(sum(timeline[j]['api_calls'] for j in done) / len(done), 1) if done else None,
+            'calls_by_path': dict(sorted(calls.items(), key=lambda kv: -kv[1])),
+            'injected_errors': injected,
+        }
+
+    # ─── API handlers (JSON in → JSON out) ───────────────────────────────────
+
+    def api_claim(self, body: Dict, limit: int) -> List[Dict]:
+        worker_id = body.get('worker_id') or 'unknown'
+        with self.lock:
+            jobs, self.pending = self.pending[:limit], self.pending[limit:]
+            for job in jobs:
+                job['worker_id'] = worker_id
+                self.claimed[job['id']] = job
+                self._job_event(job['id'], 'claimed')
+        return [dict(j) for j in jobs]
+
+    def api_release(self, body: Dict) -> Dict:
+        with self.lock:
+            job = self.claimed.get(body.get('job_id'))
+            if not job or job.get('worker_id') != body.get('worker_id'):
+                return {'success': True, 'released': False}
+            del self.claimed[job['id']]
+            job.pop('worker_id', None)
+            self.pending.append(job)
+            self.pending.sort(key=lambda j: j['id'])
+        return {'success': True, 'released': True, 'job_id': job['id'], 'status': 'PENDING'}
+
+    def api_release_stale(self, body: Dict) -> Dict:
+        worker_id = body.get('worker_id')
+        with self.lock:
+            mine = [j for j in self.claimed.values() if j.get('worker_id') == worker_id]
+        for job in mine:
+            self.api_release({'job_id': job['id'], 'worker_id': worker_id})
+        return {'released_count': len(mine)}
+
+    def api_finish(self, name: str, body: Dict) -> Dict:
+        with self.lock:
+            if self.claimed.pop(body.get('job_id'), None) is not None or name == 'complete':
+                self.finished[body.get('job_id')] = (name, body)
+                self._job_event(body.get('job_id'), 'finished')
+        return {'success': True}
+
+    def api_interrupt(self, body: Dict) -> Dict:
+        with self.lock:
+            job = self.claimed.get(body.get('job_id'))
+            if not job or job.get('worker_id') != body.get('worker_id'):
+                return {'success': True}
+            del self.claimed[job['id']]
+            job.pop('worker_id', None)
+            job['status'] = 'INTERRUPTED'
+            self.interrupted[job['id']] = job
+        return {'success': True, 'job_id': job['id'], 'status': 'INTERRUPTED'}
+
+    def api_retry_interrupted(self, body: Dict) -> Dict:
+        ids = {int(i) for i in body.get('job_ids') or []}
+        with self.lock:
+            jobs = [self.interrupted.pop(i) for i in list(self.interrupted) if i in ids]
+        for job in jobs:
+            job.pop('status', None)  # processing_checkpoint stays for the resume
+        self.add_jobs(jobs)
+        return {'success': True, 'retried': len(jobs)}
+
+    def api_status(self, body: Dict) -> Dict:
+        """One status event (also the items of status-batch); a checkpoint is kept on the claimed job."""
+        job_id = body.get('job_id')
+        with self.lock:
+            job = self.claimed.get(job_id)
+            if not job or job.get('worker_id') != body.get('worker_id'):
+                return {'job_id': job_id, 'ok': False}
+            if body.get('type') == 'checkpoint' or body.get('checkpoint'):
+                job['processing_checkpoint'] = body.get('checkpoint')
+            if body.get('type') != 'checkpoint':
+                self.statuses[job_id] = dict(body, at=time.time())
+                self._job_event(job_id, 'started')
+        return {'job_id': job_id, 'ok': True, 'status': body.get('status')}
+
+    def api_status_batch(self, body: Dict) -> Dict:
+        worker_id = body.get('worker_id')
+        results = [self.api_status(dict(ev, worker_id=worker_id)) for ev in (body.get('events') or [])[:100]]
+        return {'success': True, 'results': results}
+
+    def api_mark_zombies(self) -> Dict:
+        """Claims older than zombie_sec fail (the Worker's 45-minute PROCESSING cutoff) unless their worker
+        sent a heartbeat within the last 20 minutes."""
+        now = time.time()
+        cutoff = now - self.zombie_sec
+        with self.lock:
+            alive = {w for w, hb in self.heartbeats.items() if now - hb['at'] < 1200}
+            stale = [j for j, job in self.claimed.items()
+                     if self.timeline.get(j, {}).get('claimed', now) < cutoff and job.get('worker_id') not in alive]
+            for job_id in stale:
+                del self.claimed[job_id]
+                self.finished[job_id] = ('fail', {'job_id': job_id, 'error_message': 'zombie'})
+        return {'success': True, 'marked': len(stale)}
+
+    def api_presigned_upload(self, body: Dict) -> Dict:
+        bucket, key = body.get('bucket', 'public'), body.get('key', '')
+        if body.get('metadata'):
+            with self.lock:
+                self.object_meta[(bucket, key)] = dict(body['metadata'])
+        if not body.get('multipart'):
+            resp = {'upload_url': self.object_url(bucket, key) + '?sig=mock', 'expires_in': 3600}
+            if body.get('metadata'):
+                resp['headers'] = {f"x-amz-meta-{k}": str(v) for k, v in body['metadata'].items()}
+            return resp
+        upload_id = body.get('upload_id')
+        with self.lock:
+            if not upload_id:
+                upload_id = uuid.uuid4().hex
+                self.uploads[upload_id] = {'bucket': bucket, 'key': key, 'parts': {}}
+            elif upload_id not in self.uploads:
+                return {'error': 'NoSuchUpload'}
+        numbers = body.get('part_numbers') or list(range(1, int(body.get('part_count') or 0) + 1))
+        return {
+            'upload_id': upload_id,
+            'part_urls': [
+                {'part_number': int(n), 'url': f"{self.object_url(bucket, key)}?partNumber={int(n)}&uploadId={upload_id}"}
+                for n in numbers
+            ],
+            'expires_in': 3600,
+        }
+
+    def api_multipart_complete(self, body: Dict) -> Dict:
+        with self.lock:
+            up = self.uploads.pop(body.get('upload_id'), None)
+            if not up:
+                return {'error': 'NoSuchUpload'}
+            chunks = []
+            for p in sorted(body.get('parts') or [], key=lambda x: int(x['part_number'])):
+                etag, data = up['parts'].get(int(p['part_number']), (None, None))
+                if etag is None or etag.strip('"') != str(p.get('etag', '')).strip('"'):
+                    return {'error': f"InvalidPart {p.get('part_number')}"}
+                chunks.append(data)
+            self.objects[(up['bucket'], up['key'])] = b''.join(chunks)
+        return {'ok': True}
+
+    def api_multipart_abort(self, body: Dict) -> Dict:
+        with self.lock:
+            self.uploads.pop(body.get('upload_id'), None)
+        return {'ok': True}
+
+    def api_output_lookup(self, body: Dict) -> Dict:
+        key = body.get('output_cache_key')
+        with self.lock:
+            for job_id, (name, done) in sorted(self.finished.items(), reverse=True):
+                if name == 'complete' and key and done.get('output_cache_key') == key and job_id != body.get('job_id'):
+                    result = {k: v for k, v in done.items() if k not in ('job_id', 'worker_id', 'ffmpeg_output')}
+                    return {'found': True, 'job_id': job_id, 'result': result}
+        return {'found': False}
+
+    def api_copy_output(self, body: Dict) -> Dict:
+        with self.lock:
+            copies = body.get('copies') or []
+            missing = next((c['from_key'] for c in copies if ('public', c['from_key']) not in self.objects), None)
+            if missing:
+                return {'ok': False, 'copied': [], 'missing': missing}
+            for c in copies:
+                self.objects[('public', c['to_key'])] = self.objects[('public', c['from_key'])]
+        return {'ok': True, 'copied': [c['to_key'] for c in copies]}
+
+    # ─── Segment fan-out ─────────────────────────────────────────────────────
+
+    def _owns(self, body: Dict) -> bool:
+        job = self.claimed.get(body.get('job_id'))
+        return bool(job) and job.get('worker_id') == body.get('worker_id')
+
+    def api_segments_publish(self, body: Dict) -> Tuple[int, Dict]:
+        with self.lock:
+            if not self._owns(body):
+                return 409, {'error': 'job not claimed by this worker'}
+            job_id = body['job_id']
+            prefix = f"segments/{job_id}/"
+            segs = body.get('segments') or []
+            if not segs or any(not str(s.get('src_key', '')).startswith(prefix) or not s.get('out_keys')
+                               or any(not str(k).startswith(prefix) for k in s['out_keys']) for s in segs):
+                return 400, {'error': 'invalid segments'}
+            self.segments = {i: t for i, t in self.segments.items() if t['job_id'] != job_id}
+            next_id = max(self.segments, default=0) + 1
+            for n, s in enumerate(segs):
+                self.segments[next_id + n] = {
+                    'id': next_id + n, 'job_id': job_id, 'seq': int(s['seq']), 'owner_worker_id': body['worker_id'],
+                    'src_key': s['src_key'], 'out_keys': list(s['out_keys']), 'duration': s.get('duration') or 0,
+                    'packets': s.get('packets') or 0, 'params': body.get('params') or {}, 'src_ready': False,
+                    'status': 'PENDING', 'worker_id': None, 'attempts': 0, 'frames': None, 'error': None,
+                    'claimed_at': 0.0,
+                }
+        return 200, {'ok': True, 'count': len(segs)}
+
+    def api_segments_ready(self, body: Dict) -> Tuple[int, Dict]:
+        seqs = {int(n) for n in body.get('seqs') or []}
+        with self.lock:
+            if not self._owns(body):
+                return 409, {'error': 'job not claimed by this worker'}
+            for t in self.segments.values():
+                if t['job_id'] == body['job_id'] and t['seq'] in seqs:
+                    t['src_ready'] = True
+        return 200, {'ok': True}
+
+    def api_segment_claim(self, body: Dict) -> Tuple[int, Dict]:
+        worker_id, job_id = body.get('worker_id'), body.get('job_id')
+        now = time.monotonic()
+        with self.lock:
+            if job_id and not self._owns(body):
+                return 409, {'error': 'job not claimed by this worker'}
+
+            def claimable(t):
+                return t['status'] == 'PENDING' or (t['status'] == 'PROCESSING'
+                                                    and now - t['claimed_at'] > self.segment_stale_sec)
+            if job_id:
+                pool = sorted((t for t in self.segments.values() if t['job_id'] == job_id and claimable(t)),
+                              key=lambda t: t['seq'])
+            else:
+                pool = sorted((t for t in self.segments.values() if t['owner_worker_id'] != worker_id
+                               and t['src_ready'] and claimable(t)), key=lambda t: (t['job_id'], -t['seq']))
+            if not pool:
+                return 200, {'task': None}
+            t = pool[0]
+            t.update(status='PROCESSING', worker_id=worker_id, claimed_at=now, attempts=t['attempts'] + 1)
+            task = {k: t[k] for k in ('id', 'job_id', 'seq', 'duration', 'packets', 'attempts', 'src_key',
+                                      'out_keys', 'params')}
+        if not job_id:
+            task['download_url'] = self.object_url('raw', task['src_key'])
+            task['upload_urls'] = [self.object_url('raw', k) + '?sig=mock' for k in task['out_keys']]
+        return 200, {'task': task}
+
+    def api_segment_finish(self, ok: bool, body: Dict) -> Dict:
+        with self.lock:
+            t = self.segments.get(body.get('task_id'))
+            if not t or t['worker_id'] != body.get('worker_id') or t['status'] != 'PROCESSING':
+                return {'ok': False, 'status': None}
+            if ok:
+                t.update(status='DONE', frames=int(body.get('frames') or 0), error=None)
+            else:
+                t.update(status='FAILED' if t['attempts'] >= 3 else 'PENDING', worker_id=None,
+                         error=str(body.get('error') or '')[:1000])
+            return {'ok': True, 'status': t['status']}
+
+    def api_segments_status(self, body: Dict) -> Tuple[int, Dict]:
+        with self.lock:
+            if not self._owns(body):
+                return 409, {'error': 'job not claimed by this worker'}
+            tasks = []
+            for t in sorted((t for t in self.segments.values() if t['job_id'] == body['job_id']), key=lambda t: t['seq']):
+                row = {k: t[k] for k in ('id', 'seq', 'status', 'worker_id', 'attempts', 'frames', 'error')}
+                if t['status'] == 'DONE' and t['worker_id'] != t['owner_worker_id']:
+                    row['download_urls'] = [self.object_url('raw', k) for k in t['out_keys']]
+                tasks.append(row)
+        return 200, {'tasks': tasks}
+
+    def api_segments_clear(self, body: Dict) -> Tuple[int, Dict]:
+        with self.lock:
+            if not self._owns(body):
+                return 409, {'error': 'job not claimed by this worker'}
+            gone = [t for t in self.segments.values() if t['job_id'] == body['job_id']]
+            for t in gone:
+                for key in [t['src_key']] + t['out_keys']:
+                    self.objects.pop(('raw', key), None)
+                del self.segments[t['id']]
+        return 200, {'ok': True, 'deleted': sum(1 + len(t['out_keys']) for t in gone)}
+
+    def _fault(self, latency_ms: float, jitter_ms: float, rate: float, kind: str) -> bool:
+        """Injected delay; True = answer this request with an error."""
+        if latency_ms or jitter_ms:
+            time.sleep((latency_ms + random.uniform(0, jitter_ms)) / 1000)
+        if rate and random.random() < rate:
+            with self.lock:
+                self.injected[kind] += 1
+            return True
+        return False
+
+    def handle_api(self, path: str, body: Dict) -> Tuple[int, Optional[Dict]]:
+        self.count(path)
+        with self.lock:
+            for ev in body.get('events') or [{'job_id': body.get('job_id')}]:
+                self._job_event(ev.get('job_id'), api_call=True)
+        if self._fault(self.latency_ms, self.jitter_ms,
+                       self.error_rate if not self.error_paths or path.startswith(self.error_paths) else 0.0, 'api'):
+            return 503, {'error': 'injected fault'}
+        if path == '/api/jobs/presigned-upload':
+            return 200, self.api_presigned_upload(body)
+        if path == '/api/jobs/multipart-complete':
+            return 200, self.api_multipart_complete(body)
+        if path == '/api/jobs/multipart-abort':
+            return 200, self.api_multipart_abort(body)
+        if path == '/api/jobs/claim':
+            jobs = self.api_claim(body, 1)
+            return 200, (jobs[0] if jobs else {'job': None, 'message': 'No pending jobs available'})
+        if path == '/api/jobs/claim-batch':
+            if not self.batch_claim:
+                return 404, {'error': 'Not found'}
+            jobs = self.api_claim(body, min(max(int(body.get('max_jobs') or 1), 1), 20))
+            return 200, {'jobs': jobs, 'count': len(jobs), 'pending': len(self.pending)}
+        if path == '/api/jobs/release':
+            return 200, self.api_release(body)
+        if path == '/api/jobs/release-stale-startup':
+            return 200, self.api_release_stale(body)
+        if path == '/api/jobs/status':
+            return 200, dict(self.api_status(body), success=True)
+        if path == '/api/jobs/status-batch':
+            return 200, self.api_status_batch(body)
+        if path == '/api/jobs/checkpoint':
+            return 200, {'ok': self.api_status(dict(body, type='checkpoint'))['ok']}
+        if path == '/api/jobs/interrupt':
+            return 200, self.api_interrupt(body)
+        if path == '/api/jobs/interrupted':
+            with self.lock:
+                jobs = [dict(j) for j in self.interrupted.values()]
+            return 200, {'jobs': jobs, 'count': len(jobs)}
+        if path == '/api/jobs/interrupted/retry':
+            return 200, self.api_retry_interrupted(body)
+        if path == '/api/jobs/mark-zombies':
+            return 200, self.api_mark_zombies()
+        if path == '/api/heartbeat':
+            with self.lock:
+                self.heartbeats[body.get('worker_id') or 'unknown'] = dict(body, at=time.time())
+            return 200, {'success': True}
+        if path == '/api/jobs/output-lookup':
+            return 200, self.api_output_lookup(body)
+        if path == '/api/jobs/copy-output':
+            return 200, self.api_copy_output(body)
+        if path in ('/api/jobs/complete', '/api/jobs/fail'):
+            return 200, self.api_finish(path.rsplit('/', 1)[1], body)
+        if path == '/api/jobs/segments/publish':
+            return self.api_segments_publish(body)
+        if path == '/api/jobs/segments/ready':
+            return self.api_segments_ready(body)
+        if path == '/api/jobs/segments/claim':
+            return self.api_segment_claim(body)
+        if path in ('/api/jobs/segments/complete', '/api/jobs/segments/fail'):
+            return 200, self.api_segment_finish(path.endswith('complete'), body)
+        if path == '/api/jobs/segments/status':
+            return self.api_segments_status(body)
+        if path == '/api/jobs/segments/clear':
+            return self.api_segments_clear(body)
+        return 200, {'success': True}
+
+    # ─── Object store ────────────────────────────────────────────────────────
+
+    def put_object(self, bucket: str, key: str, query: Dict, data: bytes) -> Tuple[int, str]:
+        etag = '"' + hashlib.md5(data).hexdigest() + '"'
+        upload_id = (query.get('uploadId') or [None])[0]
+        if upload_id:
+            if self.part_fail_rate and random.random() < self.part_fail_rate:
+                return 500, ''
+            with self.lock:
+                up = self.uploads.get(upload_id)
+                if not up:
+                    return 404, ''
+                up['parts'][int(query['partNumber'][0])] = (etag, data)
+            return 200, etag
+        with self.lock:
+            self.objects[(bucket, key)] = data
+        return 200, etag
+
+    def get_object(self, bucket: str, key: str) -> Optional[bytes]:
+        with self.lock:
+            return self.objects.get((bucket, key))
+
+
+def make_handler(mock: MockWorker):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: bytes = b'', headers: Optional[Dict] = None) -> None:
+            self.send_response(status)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if body and self.command != 'HEAD':
+                self.wfile.write(body)
+
+        def _json(self, status: int, data: Optional[Dict]) -> None:
+            if data is None:
+                self._send(204)
+                return
+            self._send(status, json.dumps(data).encode('utf-8'), {'Content-Type': 'application/json'})
+
+        def _body(self) -> bytes:
+            n = int(self.headers.get('Content-Length') or 0)
+            return self.rfile.read(n) if n else b''
+
+        def _object_path(self) -> Optional[Tuple[str, str, Dict]]:
+            u = urlparse(self.path)
+            m = re.match(r'^/r2/([^/]+)/(.+)$', u.path)
+            if not m:
+                return None
+            return m.group(1), m.group(2), parse_qs(u.query)
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            raw = self._body()
+            if not path.startswith('/api/'):
+                self._send(404)
+                return
+            try:
+                body = json.loads(raw.decode('utf-8')) if raw else {}
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                self._json(400, {'error': 'invalid JSON'})
+                return
+            if isinstance(body, dict) and not body.get('worker_id') and self.headers.get('x-worker-id'):
+                body['worker_id'] = self.headers['x-worker-id']  # heartbeat: id only in the header
+            status, data = mock.handle_api(path, body)
+            self._json(status, data)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path.startswith('/api/'):
+                status, data = mock.handle_api(path, {})
+                self._json(status, data)
+                return
+            if path == '/mock/report':
+                self._json(200, mock.report())
+                return
+            if mock._fault(mock.object_latency_ms, 0.0, mock.object_error_rate, 'object'):
+                self._send(500)
+                return
+            loc = self._object_path()
+            data = mock.get_object(loc[0], loc[1]) if loc else None
+            if data is None:
+                self._send(404)
+                return
+            rng = re.match(r'^bytes=(\d+)-(\d*)$', self.headers.get('Range') or '')
+            if rng:
+                start = int(rng.group(1))
+                end = min(int(rng.group(2)) if rng.group(2) else len(data) - 1, len(data) - 1)
+                self._send(206, data[start:end + 1], {
+                    'Content-Range': f'bytes {start}-{end}/{len(data)}',
+                    'Accept-Ranges': 'bytes',
+                    'Content-Type': 'video/mp4',
+                })
+                return
+            self._send(200, data, {'Accept-Ranges': 'bytes', 'Content-Type': 'video/mp4'})
+
+        do_HEAD = do_GET
+
+        def do_PUT(self):
+            loc = self._object_path()
+            if not loc:
+                self._send(404)
+                return
+            if mock._fault(mock.object_latency_ms, 0.0, mock.object_error_rate, 'object'):
+                self._body()
+                self._send(503)
+                return
+            status, etag = mock.put_object(loc[0], loc[1], loc[2], self._body())
+            self._send(status, b'', {'ETag': etag} if etag else None)
+
+    return Handler
+
+
+def serve(host: str = '127.0.0.1', port: int = 8787, mock: Optional[MockWorker] = None) -> Tuple[ThreadingHTTPServer, MockWorker]:
+    """Start the stand-in in a daemon thread; returns (server, state)."""
+    mock = mock or MockWorker()
+    srv = ThreadingHTTPServer((host, port), make_handler(mock))
+    mock.base_url = f"http://{host}:{srv.server_port}"
+    threading.Thread(target=srv.serve_forever, name="MockWorker", daemon=True).start()
+    return srv, mock
+
+
+def add_fault_args(ap: argparse.ArgumentParser) -> None:
+    """Latency / fault / arrival options shared with load_test.py."""
+    ap.add_argument('--part-fail-rate', type=float, default=0.0, help='fraction of multipart part PUTs answered with 500')
+    ap.add_argument('--no-batch-claim', action='store_true', help='answer /api/jobs/claim-batch with 404 (old Worker)')
+    ap.add_argument('--latency-ms', type=float, default=0.0, help='delay before every API answer')
+    ap.add_argument('--jitter-ms', type=float, default=0.0, help='extra uniform random API delay')
+    ap.add_argument('--error-rate', type=float, default=0.0, help='fraction of API calls answered with 503')
+    ap.add_argument('--error-paths', default='', help='comma-separated API path prefixes for --error-rate (default all)')
+    ap.add_argument('--object-latency-ms', type=float, default=0.0, help='delay before object GET/PUT answers')
+    ap.add_argument('--object-error-rate', type=float, default=0.0, help='fraction of object GET/PUTs failed')
+    ap.add_argument('--zombie-sec', type=float, default=2700.0, help='mark-zombies fails claims older than this')
+    ap.add_argument('--arrival', choices=ARRIVALS, default='batch', help='job arrival pattern')
+    ap.add_argument('--rate', type=float, default=60.0, help='arrivals per minute (steady/poisson/burst)')
+    ap.add_argument('--burst-size', type=int, default=5)
+    ap.add_argument('--profile', default='native', help='processing_profile of seeded jobs')
+    ap.add_argument('--quality', default='720p', help='quality of seeded jobs')
+
+
+def mock_from_args(args, **extra) -> MockWorker:
+    return MockWorker(
+        part_fail_rate=args.part_fail_rate, batch_claim=not args.no_batch_claim,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        error_paths=[p.strip() for p in args.error_paths.split(',') if p.strip()],
+        object_latency_ms=args.object_latency_ms, object_error_rate=args.object_error_rate,
+        zombie_sec=args.zombie_sec, **extra,
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Local stand-in Worker API + R2 object store for bk_agent_v2')
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8787)
+    ap.add_argument('--wakeup-url', action='append', default=[], help='agent /wakeup URL notified on arrivals')
+    ap.add_argument('--wakeup-token', default='', help='bearer token for --wakeup-url (the agents\' BK_BEARER_TOKEN)')
+    ap.add_argument('--seed-file', help='raw video served to seeded jobs')
+    ap.add_argument('--seed-jobs', type=int, default=0, help='queue this many jobs for --seed-file')
+    add_fault_args(ap)
+    args = ap.parse_args()
+    srv, mock = serve(args.host, args.port,
+                      mock_from_args(args, wakeup_urls=args.wakeup_url, wakeup_token=args.wakeup_token))
+    if args.seed_file and args.seed_jobs:
+        with open(args.seed_file, 'rb') as f:
+            mock.start_arrivals(f.read(), args.seed_jobs, args.arrival, args.rate, args.burst_size,
+                                processing_profile=args.profile, quality=args.quality)
+    print(f"Mock Worker on {mock.base_url} ({args.seed_jobs if args.seed_file else 0} jobs, {args.arrival} arrival)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        srv.shutdown()
+
+
+if __name__ == '__main__':
+    main()
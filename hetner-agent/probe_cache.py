@@ -0,0 +1,118 @@
+"""
+Content-keyed ffprobe cache — one JSON file per probed input under <temp_dir>/probe-cache.
+
+Retries and resumes of the same raw object skip ffprobe entirely. Keys come from the raw R2 key
+plus size (or a content hash when one is known), never from the local temp path. Timing counters
+(probe seconds spent, hits, estimated seconds saved) are kept for logs/metrics.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def probe_cache_key(r2_raw_key: Optional[str] = None, size: int = 0, content_hash: Optional[str] = None) -> Optional[str]:
+    """Stable identity of an input: content hash if known, else raw R2 key + byte size; None = uncacheable."""
+    if content_hash:
+        return f"sha256:{content_hash}"
+    key = (r2_raw_key or '').strip()
+    if not key or key == 'url-import-pending' or size <= 0:
+        return None
+    return f"r2:{key}:{size}"
+
+
+class ProbeCache:
+    """Small on-disk LRU-by-mtime cache of ffprobe-derived metadata dicts."""
+
+    def __init__(self, cache_dir: Path, max_entries: int = 2000):
+        self.cache_dir = cache_dir
+        self.max_entries = max(1, max_entries)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.stats = {
+            'probes': 0,
+            'probe_seconds': 0.0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'saved_seconds': 0.0,
+            'output_probes_avoided': 0,
+        }
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / (hashlib.sha256(key.encode('utf-8')).hexdigest()[:32] + '.json')
+
+    def get(self, key: Optional[str]) -> Optional[Dict]:
+        if not key:
+            return None
+        p = self._path(key)
+        try:
+            with open(p, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if entry.get('key') != key:
+                return None
+            os.utime(p, None)
+            return entry.get('meta')
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: Optional[str], meta: Dict) -> None:
+        if not key or not meta:
+            return
+        p = self._path(key)
+        tmp = p.with_suffix('.tmp')
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'meta': meta, 'created_at': time.time()}, f)
+            os.replace(tmp, p)
+        except OSError as e:
+            logger.debug(f"[ProbeCache] write failed: {e}")
+            return
+        self._prune()
+
+    def _prune(self) -> None:
+        try:
+            entries = list(self.cache_dir.glob('*.json'))
+            if len(entries) <= self.max_entries:
+                return
+            entries.sort(key=lambda q: q.stat().st_mtime)
+            for q in entries[:len(entries) - self.max_entries]:
+                q.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+    def probe(self, key: Optional[str], run_probe: Callable[[], Dict]) -> Tuple[Dict, bool]:
+        """(meta, cache_hit): cached meta for key, else run_probe() (timed) and store a complete result."""
+        cached = self.get(key)
+        with self._lock:
+            if cached is not None:
+                self.stats['cache_hits'] += 1
+                probes = self.stats['probes']
+                self.stats['saved_seconds'] += (self.stats['probe_seconds'] / probes) if probes else 0.0
+                return dict(cached), True
+            if key:
+                self.stats['cache_misses'] += 1
+        t0 = time.monotonic()
+        meta = run_probe()
+        dt = time.monotonic() - t0
+        with self._lock:
+            self.stats['probes'] += 1
+            self.stats['probe_seconds'] += dt
+        if meta.get('duration_sec') and meta.get('width'):
+            self.put(key, meta)
+        return meta, False
+
+    def output_probe_avoided(self) -> None:
+        with self._lock:
+            self.stats['output_probes_avoided'] += 1
+            probes = self.stats['probes']
+            self.stats['saved_seconds'] += (self.stats['probe_seconds'] / probes) if probes else 0.0
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return dict(self.stats)
@@ -0,0 +1,167 @@
+"""
+R2 multipart upload helpers — fixed-size parts PUT concurrently to presigned UploadPart URLs.
+The Worker creates/completes the upload (/api/jobs/presigned-upload multipart, /api/jobs/multipart-complete);
+this module only moves bytes and reports which parts failed so the caller can retry just those.
+upload_stream() uploads a StreamTee while the download is still running (raw archival tee).
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# S3/R2: every part except the last must be ≥ 5 MiB; at most 10000 parts
+MIN_PART_BYTES = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+def plan_parts(size: int, part_size: int) -> List[Tuple[int, int, int]]:
+    """[(part_number, offset, length)] covering size bytes; part_size grows if it would exceed MAX_PARTS."""
+    part_size = max(part_size, MIN_PART_BYTES, -(-size // MAX_PARTS))
+    return [
+        (i + 1, offset, min(part_size, size - offset))
+        for i, offset in enumerate(range(0, size, part_size))
+    ]
+
+
+class FileSlice:
+    """Read-only window [offset, offset+length) of a file; lets requests stream a part without loading it."""
+
+    def __init__(self, path: Path, offset: int, length: int):
+        self._f = open(path, 'rb')
+        self._f.seek(offset)
+        self._remaining = length
+        self._length = length
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._f.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def put_part(session: requests.Session, url: str, path: Path, offset: int, length: int, timeout: int = 300) -> str:
+    """PUT one part; returns its ETag (raises on HTTP error or missing ETag)."""
+    with FileSlice(path, offset, length) as body:
+        r = session.put(url, data=body, headers={'Content-Length': str(length)}, timeout=timeout)
+    r.raise_for_status()
+    etag = (r.headers.get('ETag') or '').strip()
+    if not etag:
+        raise IOError("UploadPart response without ETag")
+    return etag
+
+
+def upload_parts(session: requests.Session, path: Path, parts: List[Tuple[int, int, int]],
+                 urls: Dict[int, str], concurrency: int) -> Tuple[Dict[int, str], List[int]]:
+    """Upload parts from a bounded pool. Returns ({part_number: etag}, [failed part numbers])."""
+    etags: Dict[int, str] = {}
+    failed: List[int] = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='R2Part') as pool:
+        futures = {
+            pool.submit(put_part, session, urls[n], path, offset, length): n
+            for n, offset, length in parts if n in urls
+        }
+        failed.extend(n for n, _, _ in parts if n not in urls)
+        for fut in as_completed(futures):
+            n = futures[fut]
+            try:
+                etags[n] = fut.result()
+            except Exception as e:
+                logger.warning(f"[Multipart] {os.path.basename(str(path))} part {n} failed: {e}")
+                failed.append(n)
+    return etags, sorted(failed)
+
+
+def _put_bytes(session: requests.Session, url: str, data: bytes, retries: int, timeout: int = 300) -> str:
+    """PUT an in-memory part, retrying this part only."""
+    last: Exception = IOError("no attempt")
+    for attempt in range(retries + 1):
+        try:
+            r = session.put(url, data=data, timeout=timeout)
+            r.raise_for_status()
+            etag = (r.headers.get('ETag') or '').strip()
+            if not etag:
+                raise IOError("UploadPart response without ETag")
+            return etag
+        except Exception as e:
+            last = e
+            logger.warning(f"[Multipart] stream part retry {attempt + 1}/{retries + 1}: {e}")
+            time.sleep(min(2 ** attempt, 10))
+    raise last
+
+
+def _read_part(tee, offset: int, size: int) -> bytes:
+    """Block on the tee until a full part (or the final short part at EOF) is available."""
+    buf = bytearray()
+    while len(buf) < size:
+        data = tee.read(offset + len(buf), size - len(buf))
+        if not data:
+            break
+        buf.extend(data)
+    return bytes(buf)
+
+
+def upload_stream(session: requests.Session, tee, part_size: int, concurrency: int,
+                  sign_parts: Callable[[List[int]], Dict[int, str]], stop: threading.Event,
+                  retries: int = 3) -> Dict[int, str]:
+    """
+    Upload a StreamTee as multipart parts while it is still downloading. Memory is bounded to
+    about (concurrency + 1) parts. sign_parts(numbers) returns presigned URLs, requested in batches.
+    Returns {part_number: etag}; raises StreamAborted/IOError on abort, stop or a part failing all retries.
+    """
+    part_size = max(part_size, MIN_PART_BYTES)
+    etags: Dict[int, str] = {}
+    urls: Dict[int, str] = {}
+    inflight: Dict = {}
+
+    def _collect(done) -> None:
+        for fut in done:
+            n = inflight.pop(fut)
+            etags[n] = fut.result()
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='R2StreamPart') as pool:
+        offset = 0
+        n = 0
+        while True:
+            if stop.is_set():
+                raise IOError("stream upload stopped")
+            data = _read_part(tee, offset, part_size)
+            if not data and n > 0:
+                break
+            n += 1
+            if n not in urls:
+                urls.update(sign_parts(list(range(n, n + 16))))
+                if n not in urls:
+                    raise IOError(f"no presigned URL for part {n}")
+            while len(inflight) >= max(1, concurrency):
+                done, _ = wait(list(inflight), return_when=FIRST_COMPLETED)
+                _collect(done)
+            inflight[pool.submit(_put_bytes, session, urls[n], data, retries)] = n
+            offset += len(data)
+            if len(data) < part_size:
+                break
+        if inflight:
+            done, _ = wait(list(inflight))
+            _collect(done)
+    return etags
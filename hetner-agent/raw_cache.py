@@ -0,0 +1,220 @@
+"""
+Persistent raw-input cache — retries and checkpoint resumes of a job start from the local copy.
+
+Every job downloads into a private work dir that is removed when the attempt ends, so a retry after
+an FFmpeg failure, RAM interrupt or upload error fetched the same raw object again. Finished inputs
+are now kept under <temp_dir>/raw-cache, keyed by r2_raw_key: <id>.raw holds the bytes (hard link of
+the downloaded file, no copy when on the same filesystem) and <id>.json its key, size and SHA-256.
+A lookup checks size (and the hash when known) before linking the file into the new work dir.
+The byte budget is enforced LRU-by-mtime; the disk guard may evict more when a job needs room.
+Entries still linked into a running job's work dir are never evicted (unlinking them frees nothing).
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_HASH_READ_BYTES = 4 * 1024 * 1024
+
+
+def raw_cache_key(r2_raw_key: Optional[str]) -> Optional[str]:
+    key = (r2_raw_key or '').strip()
+    if not key or key == 'url-import-pending':
+        return None
+    return key
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(_HASH_READ_BYTES)
+            if not data:
+                break
+            h.update(data)
+    return h.hexdigest()
+
+
+def _link_or_copy(src: Path, dest: Path) -> None:
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+class RawInputCache:
+    """Byte-budgeted LRU of downloaded raw inputs; thread-safe."""
+
+    def __init__(self, cache_dir: Path, max_bytes: int, verify_hash: bool = True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max(0, max_bytes)
+        self.verify_hash = verify_hash
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0, 'rejected': 0,
+                      'bytes_saved': 0, 'bytes_evicted': 0}
+        if self.enabled:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._recover()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        stem = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+        return self.cache_dir / f"{stem}.raw", self.cache_dir / f"{stem}.json"
+
+    def _recover(self) -> None:
+        """Drop half-written entries left by a crash (.tmp files, data without meta and vice versa)."""
+        for p in self.cache_dir.iterdir():
+            if p.suffix == '.tmp' or (p.suffix == '.raw' and not p.with_suffix('.json').exists()) \
+                    or (p.suffix == '.json' and not p.with_suffix('.raw').exists()):
+                p.unlink(missing_ok=True)
+
+    def _entries(self) -> List[Tuple[float, Path, Path, int, int]]:
+        """(last use, meta, data, size, links) oldest first."""
+        out = []
+        for meta in self.cache_dir.glob('*.json'):
+            data = meta.with_suffix('.raw')
+            try:
+                ms, ds = meta.stat(), data.stat()
+            except OSError:
+                continue
+            out.append((ms.st_mtime, meta, data, ds.st_size, ds.st_nlink))
+        out.sort(key=lambda e: e[0])
+        return out
+
+    def total_bytes(self) -> int:
+        if not self.enabled:
+            return 0
+        with self._lock:
+            return sum(e[3] for e in self._entries())
+
+    def _drop(self, key: str) -> None:
+        data, meta = self._paths(key)
+        meta.unlink(missing_ok=True)
+        data.unlink(missing_ok=True)
+
+    def fetch(self, key: Optional[str], dest: Path, expected_size: int = 0,
+              expected_sha256: Optional[str] = None) -> Optional[Dict]:
+        """
+        Link the cached input for key to dest. Returns the entry ({'key', 'size', 'sha256'}) or None
+        on a miss. Entries failing the size/hash check are removed.
+        """
+        if not self.enabled or not key:
+            return None
+        data, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            size = data.stat().st_size
+        except (OSError, ValueError):
+            return self._miss()
+        reason = None
+        if entry.get('key') != key:
+            reason = 'key mismatch'
+        elif size != entry.get('size') or (expected_size > 0 and size != expected_size):
+            reason = f"size {size} != {expected_size or entry.get('size')}"
+        elif expected_sha256 and entry.get('sha256') and entry['sha256'] != expected_sha256:
+            reason = 'sha256 differs from the expected hash'
+        elif self.verify_hash and entry.get('sha256'):
+            try:
+                if _file_sha256(data) != entry['sha256']:
+                    reason = 'sha256 mismatch'
+            except OSError:
+                return self._miss()  # evicted meanwhile
+        with self._lock:
+            if reason is not None:
+                logger.warning(f"[RawCache] {key}: dropped ({reason})")
+                self._drop(key)
+                self.stats['rejected'] += 1
+                self.stats['misses'] += 1
+                return None
+            try:
+                dest.unlink(missing_ok=True)
+                _link_or_copy(data, dest)
+                os.utime(meta_path, None)
+            except OSError:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            self.stats['bytes_saved'] += size
+        return entry
+
+    def _miss(self) -> None:
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def store(self, key: Optional[str], src: Path, sha256: Optional[str] = None) -> bool:
+        """Keep a complete input (hard link when possible) and evict old entries down to the budget."""
+        if not self.enabled or not key:
+            return False
+        try:
+            size = src.stat().st_size
+        except OSError:
+            return False
+        if size <= 0 or size > self.max_bytes:
+            return False
+        if sha256 is None and self.verify_hash:
+            try:
+                sha256 = _file_sha256(src)  # just written, still in the page cache
+            except OSError:
+                return False
+        data, meta = self._paths(key)
+        with self._lock:
+            try:
+                if data.exists() and data.stat().st_size == size and meta.exists():
+                    os.utime(meta, None)
+                    return True
+                tmp = data.with_name(data.name + '.tmp')
+                tmp.unlink(missing_ok=True)
+                _link_or_copy(src, tmp)
+                os.replace(tmp, data)
+                meta_tmp = meta.with_name(meta.name + '.tmp')
+                with open(meta_tmp, 'w', encoding='utf-8') as f:
+                    json.dump({'key': key, 'size': size, 'sha256': sha256, 'stored_at': time.time()}, f)
+                os.replace(meta_tmp, meta)
+            except OSError as e:
+                logger.warning(f"[RawCache] {key}: store failed: {e}")
+                self._drop(key)
+                return False
+            self.stats['stored'] += 1
+            self._evict_locked(max(0, sum(e[3] for e in self._entries()) - self.max_bytes), keep=meta)
+        return True
+
+    def evict(self, need_bytes: int) -> int:
+        """Free at least need_bytes (LRU first, entries in use skipped); returns bytes freed."""
+        if not self.enabled or need_bytes <= 0:
+            return 0
+        with self._lock:
+            return self._evict_locked(need_bytes)
+
+    def _evict_locked(self, need_bytes: int, keep: Optional[Path] = None) -> int:
+        freed = 0
+        for _, meta, data, size, links in self._entries():
+            if freed >= need_bytes:
+                break
+            if meta == keep or links > 1:
+                continue
+            meta.unlink(missing_ok=True)
+            data.unlink(missing_ok=True)
+            freed += size
+            self.stats['evicted'] += 1
+            self.stats['bytes_evicted'] += size
+        if freed:
+            logger.info(f"[RawCache] evicted {freed} bytes (wanted {need_bytes})")
+        return freed
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            entries = self._entries() if self.enabled else []
+            return {**self.stats, 'entries': len(entries), 'bytes': sum(e[3] for e in entries),
+                    'max_bytes': self.max_bytes}
@@ -0,0 +1,58 @@
+"""
+Remux fast path — sources that already meet the output spec are stream-copied instead of re-encoded.
+
+Phone uploads are mostly H.264 High, yuv420p, at or below the requested resolution; re-encoding them
+with libx264 -preset slow burns CPU for a file that plays everywhere already. remux_reject_reason()
+checks the probed meta (codec, profile, pixel format, size against the target, frame rate and
+bitrate); a compliant source goes through the web_opt path (-c:v copy -an -movflags +faststart).
+The bitrate bound is REMUX_MAX_BITRATE_RATIO × a reference of REF_BITS_PER_PIXEL per pixel per frame
+(≈12 Mbps at 1080p30): above it the encode is kept, since a re-encode would shrink the file a lot.
+"""
+from typing import Dict, Optional, Tuple
+
+REF_BITS_PER_PIXEL = 0.2
+MAX_FPS = 60.0
+PROFILES = ('high',)
+PIX_FMTS = ('yuv420p',)
+
+
+def parse_res(res: str) -> Optional[Tuple[int, int]]:
+    try:
+        w, h = (int(x) for x in str(res).lower().split('x', 1))
+    except (ValueError, AttributeError):
+        return None
+    return (w, h) if w > 0 and h > 0 else None
+
+
+def reference_kbps(width: int, height: int, fps: float) -> int:
+    return int(width * height * max(1.0, min(fps or 30.0, MAX_FPS)) * REF_BITS_PER_PIXEL / 1000)
+
+
+def remux_reject_reason(meta: Dict, target_res: str, max_bitrate_ratio: float) -> Optional[str]:
+    """None when the source can be remuxed as is; otherwise the first failed check (for the log)."""
+    codec = str(meta.get('codec') or '').lower()
+    if codec != 'h264':
+        return f"codec {codec or 'unknown'}"
+    profile = str(meta.get('profile') or '').lower()
+    if profile not in PROFILES:
+        return f"profile {profile or 'unknown'}"
+    pix_fmt = str(meta.get('pix_fmt') or '').lower()
+    if pix_fmt not in PIX_FMTS:
+        return f"pix_fmt {pix_fmt or 'unknown'}"
+    w, h = int(meta.get('width') or 0), int(meta.get('height') or 0)
+    target = parse_res(target_res)
+    if not w or not h or not target:
+        return 'size unknown'
+    if max(w, h) > max(target) or min(w, h) > min(target):
+        return f"{w}x{h} above target {target_res}"
+    fps = float(meta.get('fps') or 0)
+    if fps <= 0 or fps > MAX_FPS:
+        return f"fps {fps:g}"
+    if max_bitrate_ratio > 0:
+        kbps = int(meta.get('bitrate') or 0)
+        limit = int(reference_kbps(w, h, fps) * max_bitrate_ratio)
+        if kbps <= 0:
+            return 'bitrate unknown'
+        if kbps > limit:
+            return f"bitrate {kbps} kbps > {limit} kbps"
+    return None
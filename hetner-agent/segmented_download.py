@@ -0,0 +1,175 @@
+"""
+Parallel HTTP Range downloader — N workers fetch fixed-size pieces of one URL into a
+preallocated .part file with positional writes. Pieces are handed out in order, so the
+contiguous prefix keeps growing and streaming readers (StreamTee) and the content hasher can follow it.
+"""
+import logging
+import queue
+import threading
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class RangeNotSupported(Exception):
+    """Server answered a Range request with 200/other instead of 206 — use a single stream."""
+
+
+def probe_range_support(session: requests.Session, url: str, timeout: int = 30) -> Optional[int]:
+    """GET bytes=0-0: return total size if the server honours Range (206 + Content-Range), else None.
+    Works for presigned GET URLs where HEAD is not signed."""
+    try:
+        r = session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=timeout)
+        try:
+            if r.status_code != 206:
+                return None
+            content_range = r.headers.get('Content-Range') or ''
+            total = content_range.rsplit('/', 1)[-1]
+            return int(total) if total.isdigit() else None
+        finally:
+            r.close()
+    except Exception:
+        return None
+
+
+class SegmentedDownload:
+    """One URL, `workers` concurrent Range GETs, per-host slot limit, per-piece retry from last offset
+    (after retry_delay × attempt seconds, so a flaky origin is not hammered)."""
+
+    def __init__(self, session: requests.Session, url: str, part_path: Path, total: int,
+                 workers: int, piece_size: int, host_slot: threading.Semaphore,
+                 on_progress: Optional[Callable[[int], None]] = None, tee=None, hasher=None,
+                 max_retries: int = 3, retry_delay: float = 0.5):
+        self.session = session
+        self.url = url
+        self.part_path = part_path
+        self.total = total
+        self.workers = max(1, workers)
+        self.host_slot = host_slot
+        self.on_progress = on_progress
+        self.tee = tee
+        self.hasher = hasher
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        # pieces[i] = [start, end_exclusive, bytes_done]
+        self.pieces: List[List[int]] = [
+            [start, min(start + piece_size, total), 0] for start in range(0, total, piece_size)
+        ]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._downloaded = 0
+        self._prefix_idx = 0
+        self._report_lock = threading.Lock()  # prefix readers see a non-decreasing sequence
+        self._reported = 0
+
+    def run(self) -> bool:
+        """Download all pieces. True on success, False if a streaming reader cancelled.
+        Raises RangeNotSupported (caller falls back to one stream) or the last piece error."""
+        with open(self.part_path, 'wb') as f:
+            f.truncate(self.total)
+        todo: "queue.Queue[int]" = queue.Queue()
+        for i in range(len(self.pieces)):
+            todo.put(i)
+        threads = [
+            threading.Thread(target=self._worker, args=(todo,), name=f"Segment-{n}", daemon=True)
+            for n in range(min(self.workers, len(self.pieces)))
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if self._error is not None:
+            raise self._error
+        if self.tee is not None and self.tee.cancelled:
+            return False
+        return True
+
+    def _worker(self, todo: "queue.Queue[int]") -> None:
+        with open(self.part_path, 'r+b') as f:
+            while not self._stop.is_set():
+                try:
+                    idx = todo.get_nowait()
+                except queue.Empty:
+                    return
+                attempt = 0
+                while not self._stop.is_set():
+                    try:
+                        self._fetch_piece(f, idx)
+                        break
+                    except RangeNotSupported as e:
+                        self._fail(e)
+                        return
+                    except Exception as e:
+                        attempt += 1
+                        if attempt > self.max_retries:
+                            self._fail(RuntimeError(f"Segment {idx} failed after {self.max_retries} retries: {e}"))
+                            return
+                        logger.warning(f"[Segmented] piece {idx} retry {attempt}/{self.max_retries}: {e}")
+                        self._stop.wait(min(5.0, self.retry_delay * attempt))  # other pieces may fail meanwhile
+
+    def _fail(self, err: BaseException) -> None:
+        with self._lock:
+            if self._error is None:
+                self._error = err
+        self._stop.set()
+
+    def _fetch_piece(self, f, idx: int) -> None:
+        start, end, done = self.pieces[idx]
+        if start + done >= end:
+            return
+        with self.host_slot:
+            r = self.session.get(
+                self.url, headers={'Range': f'bytes={start + done}-{end - 1}'}, stream=True, timeout=120
+            )
+            try:
+                if r.status_code != 206:
+                    raise RangeNotSupported(f"HTTP {r.status_code} for Range request")
+                for chunk in r.iter_content(chunk_size=1024 * 1024):
+                    if self._stop.is_set() or (self.tee is not None and self.tee.cancelled):
+                        self._stop.set()
+                        return
+                    if not chunk:
+                        continue
+                    pos = start + self.pieces[idx][2]
+                    chunk = chunk[:end - pos]  # never write past the piece (misbehaving server)
+                    if not chunk:
+                        break
+                    f.seek(pos)
+                    f.write(chunk)
+                    if self.tee is not None or self.hasher is not None:
+                        f.flush()  # readers of the prefix use their own handles
+                    self._advance(idx, len(chunk))
+            finally:
+                r.close()
+        if start + self.pieces[idx][2] < end:
+            raise IOError(f"short read {self.pieces[idx][2]}/{end - start} bytes")
+
+    def _advance(self, idx: int, n: int) -> None:
+        with self._lock:
+            self.pieces[idx][2] += n
+            self._downloaded += n
+            downloaded = self._downloaded
+            while self._prefix_idx < len(self.pieces):
+                s, e, d = self.pieces[self._prefix_idx]
+                if s + d < e:
+                    break
+                self._prefix_idx += 1
+            if self._prefix_idx < len(self.pieces):
+                s, _, d = self.pieces[self._prefix_idx]
+                prefix = s + d
+            else:
+                prefix = self.total
+        if (self.tee is not None or self.hasher is not None) and prefix > self._reported:
+            with self._report_lock:
+                if prefix > self._reported:  # a later piece may have reported a longer prefix meanwhile
+                    self._reported = prefix
+                    if self.tee is not None:
+                        self.tee.advance(prefix)
+                    if self.hasher is not None:
+                        self.hasher.follow(self.part_path, prefix)
+        if self.on_progress:
+            self.on_progress(downloaded)
@@ -0,0 +1,138 @@
+"""
+Stage-pipelined executor — each job stage runs on its own bounded worker pool.
+
+A job used to occupy one pool thread from download to complete, so a slow download or upload
+kept an encode slot idle. Here every stage (fetch → encode → publish for the agent) has its own
+workers and a bounded input queue. A finished item is handed to the next stage's queue; when that
+queue is full the worker waits, which stops new work from piling up on disk (backpressure).
+Stage functions return the item for the next stage, or None when the job ended there.
+"""
+import logging
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class _Stage:
+    def __init__(self, name: str, workers: int, queue_size: int, fn: Callable[[Any], Any]):
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self.fn = fn
+        self.busy = 0
+        self.processed = 0
+        self.threads: List[threading.Thread] = []
+
+
+class StagePipeline:
+    """stages: [(name, workers, queue_size, fn)] in order; on_error(stage, item, exc) when fn raises."""
+
+    def __init__(self, stages: List[Tuple[str, int, int, Callable[[Any], Any]]],
+                 on_error: Optional[Callable[[str, Any, BaseException], None]] = None):
+        self._stages = [_Stage(*s) for s in stages]
+        self._on_error = on_error
+        self._lock = threading.Lock()
+        self.inflight = 0  # items accepted and not yet finished/dropped
+
+    def start(self) -> None:
+        for idx, st in enumerate(self._stages):
+            for n in range(st.workers):
+                t = threading.Thread(target=self._worker, args=(idx,), name=f"{st.name.title()}-{n}", daemon=True)
+                t.start()
+                st.threads.append(t)
+
+    @property
+    def entry_capacity(self) -> int:
+        """Items the first stage holds when saturated (workers + queue)."""
+        first = self._stages[0]
+        return first.workers + first.queue.maxsize
+
+    @property
+    def entry_load(self) -> int:
+        first = self._stages[0]
+        with self._lock:
+            return first.busy + first.queue.qsize()
+
+    def offer(self, item: Any) -> bool:
+        """Non-blocking submit to the first stage; False when its queue is full."""
+        with self._lock:
+            self.inflight += 1
+        try:
+            self._stages[0].queue.put_nowait(item)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.inflight -= 1
+            return False
+
+    def has_room(self) -> bool:
+        return not self._stages[0].queue.full()
+
+    def drain(self, name: str) -> List[Any]:
+        """Remove and return the items waiting in a stage's queue (not picked up by a worker yet)."""
+        st = next(x for x in self._stages if x.name == name)
+        items, stops = [], 0
+        while True:
+            try:
+                item = st.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stops += 1
+            else:
+                items.append(item)
+        for _ in range(stops):
+            st.queue.put(_STOP)
+        with self._lock:
+            self.inflight -= len(items)
+        return items
+
+    def depths(self) -> Dict[str, int]:
+        """Queued (waiting, not yet picked up) items per stage."""
+        return {st.name: st.queue.qsize() for st in self._stages}
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {st.name: {'queued': st.queue.qsize(), 'busy': st.busy, 'workers': st.workers,
+                              'processed': st.processed} for st in self._stages}
+
+    def _worker(self, idx: int) -> None:
+        st = self._stages[idx]
+        nxt = self._stages[idx + 1] if idx + 1 < len(self._stages) else None
+        while True:
+            item = st.queue.get()
+            if item is _STOP:
+                return
+            with self._lock:
+                st.busy += 1
+            out = None
+            try:
+                out = st.fn(item)
+            except Exception as e:
+                logger.error(f"[Pipeline] stage {st.name} error: {e}")
+                if self._on_error:
+                    try:
+                        self._on_error(st.name, item, e)
+                    except Exception as e2:
+                        logger.error(f"[Pipeline] on_error ({st.name}) failed: {e2}")
+            finally:
+                with self._lock:
+                    st.busy -= 1
+                    st.processed += 1
+                    if out is None or nxt is None:
+                        self.inflight -= 1
+            if out is not None and nxt is not None:
+                nxt.queue.put(out)  # blocks while the next stage is saturated (backpressure)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop stage by stage, front first, so queued items drain through the later stages."""
+        for st in self._stages:
+            for _ in st.threads:
+                st.queue.put(_STOP)
+            if wait:
+                for t in st.threads:
+                    t.join()
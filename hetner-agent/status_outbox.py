@@ -0,0 +1,210 @@
+"""
+Status outbox — takes job status/progress/checkpoint reports off the download/encode threads.
+
+Callers enqueue and return immediately; one background sender flushes on a time/size budget.
+Pending events for the same (kind, job) are coalesced to the latest, so ten progress ticks
+between flushes cost one request. With the Worker's /api/jobs/status-batch a whole flush is
+one request; against an older Worker it falls back to one call per surviving event.
+
+Terminal events (complete / fail / interrupt) go through deliver(): they are sent by the same
+sender in FIFO order, after the job's pending checkpoints and instead of its stale progress,
+and the caller gets the API result back.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = '/api/jobs/status-batch'
+ENDPOINTS = {'status': '/api/jobs/status', 'checkpoint': '/api/jobs/checkpoint'}
+# The Worker keeps only the first STATUS_BATCH_MAX_EVENTS (src/routes/videos.js) of a batch
+MAX_BATCH = 100
+
+
+class StatusOutbox:
+    """Coalescing, batching sender for job status events. send(method, endpoint, data) → dict | None.
+
+    last_status (endpoint → last HTTP status, the API client's map) tells a missing batch route
+    (404/405) apart from a transient failure; without it the batch route is never given up.
+    """
+
+    def __init__(self, send: Callable[[str, str, Optional[Dict]], Optional[Dict]], worker_id: str,
+                 flush_interval: float = 2.0, max_batch: int = 50, last_status: Optional[Dict[str, int]] = None):
+        self._send = send
+        self.worker_id = worker_id
+        self.flush_interval = flush_interval
+        self.max_batch = max(1, min(max_batch, MAX_BATCH))
+        self._last_status = last_status if last_status is not None else {}
+        self._pending: "OrderedDict[Tuple[str, int], Dict]" = OrderedDict()
+        self._terminal: List[Tuple[str, Dict, int, Future]] = []
+        self._closed_jobs = set()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.batch_supported = True
+        # Metrics
+        self.job_stats: Dict[int, Dict] = {}
+        self.api_calls = 0
+        self.blocked_seconds = 0.0
+
+    # ─── Lifecycle ───────────────────────────────────────────────────────────
+
+    def start(self) -> None:
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._loop, name="StatusOutbox", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Flush what is queued and stop the sender (shutdown path)."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    # ─── Producer side ───────────────────────────────────────────────────────
+
+    def _stats(self, job_id: int) -> Dict:
+        s = self.job_stats.get(job_id)
+        if s is None:
+            s = self.job_stats[job_id] = {'events': 0, 'coalesced': 0, 'api_calls': 0, 'blocked_seconds': 0.0}
+        return s
+
+    def open_job(self, job_id: int) -> None:
+        """A (re)claimed job accepts status events again and starts fresh counters."""
+        with self._cond:
+            self._closed_jobs.discard(job_id)
+            self.job_stats.pop(job_id, None)
+
+    def enqueue(self, kind: str, job_id: int, data: Dict) -> bool:
+        """Queue a 'status' or 'checkpoint' event; a newer event of the same kind replaces the pending one."""
+        t0 = time.monotonic()
+        with self._cond:
+            s = self._stats(job_id)
+            s['events'] += 1
+            if job_id in self._closed_jobs and kind == 'status':
+                s['coalesced'] += 1
+                return True
+            key = (kind, job_id)
+            if key in self._pending:
+                s['coalesced'] += 1
+                self._pending.pop(key)
+            self._pending[key] = dict(data)
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+            self._blocked(s, t0)
+        if not self._running:
+            self._flush_pending()
+        return True
+
+    def deliver(self, endpoint: str, data: Dict, job_id: int, timeout: float = 300.0) -> Optional[Dict]:
+        """Send a terminal event in order after the job's queued events; blocks for the API result."""
+        if not self._running:
+            self._flush_pending()
+            return self._call(endpoint, data, [job_id])
+        fut: Future = Future()
+        t0 = time.monotonic()
+        with self._cond:
+            self._closed_jobs.add(job_id)
+            s = self._stats(job_id)
+            s['events'] += 1
+            self._terminal.append((endpoint, data, job_id, fut))
+            self._cond.notify_all()
+        try:
+            return fut.result(timeout=timeout)
+        except Exception as e:
+            logger.error(f"[Outbox] {endpoint} job={job_id}: {e}")
+            return None
+        finally:
+            with self._cond:
+                self._blocked(s, t0)
+
+    def _blocked(self, s: Dict, t0: float) -> None:
+        dt = time.monotonic() - t0
+        s['blocked_seconds'] += dt
+        self.blocked_seconds += dt
+
+    def summary(self, job_id: int) -> Dict:
+        with self._cond:
+            return dict(self.job_stats.get(job_id) or {})
+
+    def finish_job(self, job_id: int) -> Dict:
+        """The job left this agent: drop its counters, closed mark and leftover events; returns the counters."""
+        with self._cond:
+            self._closed_jobs.discard(job_id)
+            for key in [k for k in self._pending if k[1] == job_id]:
+                del self._pending[key]
+            return self.job_stats.pop(job_id, None) or {}
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            return {'pending': len(self._pending), 'terminal': len(self._terminal), 'api_calls': self.api_calls,
+                    'blocked_seconds': round(self.blocked_seconds, 3)}
+
+    # ─── Sender ──────────────────────────────────────────────────────────────
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._terminal or len(self._pending) >= self.max_batch or not self._running,
+                    timeout=self.flush_interval,
+                )
+                terminal, self._terminal = self._terminal, []
+                running = self._running
+            self._flush_pending()
+            for endpoint, data, job_id, fut in terminal:
+                try:
+                    fut.set_result(self._call(endpoint, data, [job_id]))
+                except Exception as e:
+                    fut.set_exception(e)
+            if not running:
+                with self._cond:
+                    if not self._pending and not self._terminal:
+                        return
+
+    def _take_pending(self) -> List[Tuple[str, int, Dict]]:
+        with self._cond:
+            events = []
+            for (kind, job_id), data in self._pending.items():
+                if kind == 'status' and job_id in self._closed_jobs:
+                    self._stats(job_id)['coalesced'] += 1  # superseded by the terminal event
+                    continue
+                events.append((kind, job_id, data))
+            self._pending.clear()
+            return events
+
+    def _flush_pending(self) -> None:
+        events = self._take_pending()
+        for i in range(0, len(events), self.max_batch):
+            chunk = events[i:i + self.max_batch]
+            if self.batch_supported and len(chunk) > 1:
+                body = {
+                    'worker_id': self.worker_id,
+                    'events': [dict(data, type=kind, job_id=job_id) for kind, job_id, data in chunk],
+                }
+                if self._call(BATCH_ENDPOINT, body, [job_id for _, job_id, _ in chunk]) is not None:
+                    continue
+                if self._last_status.get(BATCH_ENDPOINT) in (404, 405):
+                    logger.info("[Outbox] Worker has no status-batch endpoint; sending events individually")
+                    self.batch_supported = False
+            for kind, job_id, data in chunk:
+                self._call(ENDPOINTS[kind], data, [job_id])
+
+    def _call(self, endpoint: str, data: Dict, job_ids: List[int]) -> Optional[Dict]:
+        with self._cond:
+            self.api_calls += 1
+            for job_id in set(job_ids):
+                self._stats(job_id)['api_calls'] += 1
+        try:
+            return self._send('POST', endpoint, data)
+        except Exception as e:
+            logger.debug(f"[Outbox] {endpoint} failed: {e}")
+            return None
@@ -0,0 +1,76 @@
+"""
+Thumbnail + storyboard outputs for the main FFmpeg pass.
+
+Both are extra outputs of the encode (extra filter graphs on the decoded input), so there is
+no second FFmpeg that re-opens the finished MP4. The storyboard is a set of tiled JPEG sprite
+sheets (one tile every `interval` seconds) plus a WebVTT index of `sheet.jpg#xywh=x,y,w,h` cues
+for player scrubbing previews.
+"""
+import math
+from pathlib import Path
+from typing import List, Tuple
+
+
+def thumbnail_time(duration_sec: float, preferred: float = 5.0) -> float:
+    """Frame time for the poster: 5 s in, or the middle of clips shorter than that."""
+    if duration_sec and duration_sec <= preferred:
+        return round(duration_sec / 2, 3)
+    return preferred
+
+
+def thumbnail_args(ffmpeg_input_index: int, at_sec: float, scale: str, out: Path) -> List[str]:
+    """Extra output: first frame at/after at_sec, scaled, one JPEG."""
+    graph = f"[{ffmpeg_input_index}:v]select='gte(t\\,{at_sec})',scale={scale}[thumb]"
+    return ['-filter_complex', graph, '-map', '[thumb]', '-frames:v', '1', '-q:v', '3', '-y', str(out)]
+
+
+def tile_size(resolution: str, tile_width: int) -> Tuple[int, int]:
+    """Tile (w, h) with the output's aspect ratio; height even for yuvj420p JPEG."""
+    try:
+        w, h = (int(x) for x in resolution.lower().split('x', 1))
+    except (ValueError, AttributeError):
+        w, h = 16, 9
+    if w <= 0 or h <= 0:
+        w, h = 16, 9
+    return tile_width, max(2, int(round(tile_width * h / w / 2)) * 2)
+
+
+def storyboard_args(ffmpeg_input_index: int, interval: int, tile_w: int, tile_h: int,
+                    cols: int, rows: int, pattern: Path) -> List[str]:
+    """Extra output: one tile per interval, cols×rows tiles per sheet, sheets written as pattern (%03d)."""
+    graph = (f"[{ffmpeg_input_index}:v]fps=1/{interval},scale={tile_w}:{tile_h},"
+             f"tile={cols}x{rows}[storyboard]")
+    return ['-filter_complex', graph, '-map', '[storyboard]', '-q:v', '5', '-y', str(pattern)]
+
+
+def _vtt_ts(sec: float) -> str:
+    ms = int(round(sec * 1000))
+    h, rem = divmod(ms, 3600000)
+    m, rem = divmod(rem, 60000)
+    s, ms = divmod(rem, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
+
+
+def build_vtt(duration_sec: float, interval: int, tile_w: int, tile_h: int,
+              cols: int, rows: int, sheet_names: List[str]) -> str:
+    """WebVTT index: cue i covers [i*interval, (i+1)*interval) → tile i of the sheets, in order."""
+    per_sheet = cols * rows
+    cues = min(int(math.ceil(duration_sec / interval)), per_sheet * len(sheet_names))
+    lines = ['WEBVTT', '']
+    for i in range(cues):
+        sheet, pos = divmod(i, per_sheet)
+        x, y = (pos % cols) * tile_w, (pos // cols) * tile_h
+        lines.append(f"{_vtt_ts(i * interval)} --> {_vtt_ts(min((i + 1) * interval, duration_sec))}")
+        lines.append(f"{sheet_names[sheet]}#xywh={x},{y},{tile_w},{tile_h}")
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def vtt_sheet_names(vtt: str) -> List[str]:
+    """Sprite sheet file names a WebVTT index refers to, in first-use order."""
+    names: List[str] = []
+    for line in vtt.splitlines():
+        name = line.strip().partition('#xywh=')[0]
+        if name and name != line.strip() and name not in names:
+            names.append(name)
+    return names
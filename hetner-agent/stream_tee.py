@@ -0,0 +1,181 @@
+"""
+Download tee — read a file while it is still being downloaded.
+
+One writer (the _download chunk loop) appends to the .part file and calls advance();
+any number of sequential readers (FFmpeg stdin feeder, ...) read [offset, written)
+from disk with short-lived handles, so the writer never waits on a slow consumer.
+Readers block until more bytes arrive or the download finishes.
+"""
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+# Top-level ISO-BMFF (MP4/MOV) box types that may appear before moov/mdat
+_ISO_TOP_LEVEL = (
+    b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'uuid',
+    b'pdin', b'moof', b'mfra', b'meta', b'styp', b'sidx', b'pnot',
+)
+
+MP4_HEAD_BYTES = 64 * 1024
+# Non-MP4 containers (mkv/webm/ts): bytes to buffer before ffprobe sees a usable header
+PROBE_HEAD_BYTES = 4 * 1024 * 1024
+# Max bytes per read() — the file is read under the tee lock, keep the writer's wait short
+READ_MAX_BYTES = 8 * 1024 * 1024
+
+
+class StreamAborted(Exception):
+    """Download failed or restarted; data already handed to readers is no longer valid."""
+
+
+def mp4_layout(head: bytes) -> Optional[Dict]:
+    """
+    Scan top-level boxes in the first bytes of a file.
+    Returns None when head is not ISO-BMFF (mkv, ts, webm: always progressive).
+    Otherwise {'progressive': bool, 'moov_end': Optional[int]}; progressive=False when
+    mdat precedes moov (moov-at-end) or the layout can't be decided from head.
+    """
+    if len(head) < 8 or head[4:8] not in _ISO_TOP_LEVEL:
+        return None
+    off = 0
+    while off + 8 <= len(head):
+        size, btype = struct.unpack('>I4s', head[off:off + 8])
+        hdr = 8
+        if size == 1:
+            if off + 16 > len(head):
+                break
+            size = struct.unpack('>Q', head[off + 8:off + 16])[0]
+            hdr = 16
+        if btype == b'moov':
+            return {'progressive': True, 'moov_end': (off + size) if size >= hdr else None}
+        if btype == b'mdat':
+            return {'progressive': False, 'moov_end': None}
+        if size < hdr:
+            break  # size 0 (box to EOF) or corrupt header
+        off += size
+    return {'progressive': False, 'moov_end': None}
+
+
+class StreamTee:
+    """Growing .part file shared between the download loop and streaming consumers."""
+
+    def __init__(self, part_path: Path, dest: Path):
+        self.part_path = part_path
+        self.dest = dest
+        self._path = part_path
+        self._cond = threading.Condition()
+        self.written = 0
+        self.total = 0
+        self.done = False
+        self.ok = False
+        self.aborted = False
+        self.cancelled = False
+        self.attached = False
+        self.probe_bytes = MP4_HEAD_BYTES
+
+    # ─── Writer side (download loop) ─────────────────────────────────────────
+
+    def set_total(self, total: int) -> None:
+        with self._cond:
+            self.total = int(total or 0)
+
+    def advance(self, written: int) -> None:
+        """Contiguous prefix [0, written) is flushed to disk and safe to read."""
+        with self._cond:
+            if written > self.written:
+                self.written = written
+                self._cond.notify_all()
+
+    def rename(self) -> None:
+        """Rename .part → dest while no reader holds a handle (Windows cannot rename open files)."""
+        with self._cond:
+            self.part_path.rename(self.dest)
+            self._path = self.dest
+
+    def abort(self) -> None:
+        """Bytes already read are invalid (e.g. Drive API failed mid-stream, gdown restarts)."""
+        with self._cond:
+            self.aborted = True
+            self._cond.notify_all()
+
+    def finish(self, ok: bool) -> None:
+        with self._cond:
+            self.done = True
+            self.ok = bool(ok)
+            if not ok:
+                self.aborted = True
+            self._cond.notify_all()
+
+    # ─── Reader side ─────────────────────────────────────────────────────────
+
+    def cancel(self) -> None:
+        """Consumer gave up (encode failed); the download loop stops at the next chunk."""
+        with self._cond:
+            self.cancelled = True
+            self._cond.notify_all()
+
+    def wait_for(self, nbytes: int, timeout: Optional[float] = None) -> bool:
+        """Block until nbytes are readable or the download ended. True if nbytes are available."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.written >= nbytes or self.done or self.aborted, timeout=timeout)
+            return self.written >= nbytes and not self.aborted
+
+    def read(self, offset: int, size: int) -> bytes:
+        """Read up to size bytes at offset; blocks for data. b'' = clean EOF, StreamAborted on failure."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.written > offset or self.done or self.aborted or self.cancelled)
+            if self.aborted or self.cancelled:
+                raise StreamAborted("download aborted")
+            n = min(size, self.written - offset, READ_MAX_BYTES)
+            if n <= 0:
+                return b''
+            with open(self._path, 'rb') as f:
+                f.seek(offset)
+                return f.read(n)
+
+    def pump(self, sink, chunk_size: int = 1024 * 1024) -> bool:
+        """Copy the whole stream into sink (e.g. FFmpeg stdin). True on clean EOF; sink closed only then."""
+        self.attached = True
+        offset = 0
+        try:
+            while True:
+                data = self.read(offset, chunk_size)
+                if not data:
+                    break
+                sink.write(data)
+                offset += len(data)
+            sink.flush()
+            sink.close()
+            return True
+        except (StreamAborted, BrokenPipeError, OSError, ValueError):
+            return False
+
+    def wait_streamable(self) -> bool:
+        """
+        Wait until enough head is on disk to probe, then decide whether the input can be decoded
+        progressively. False for moov-at-end MP4/MOV, aborted downloads, or downloads that already
+        finished (nothing to gain — caller uses the plain file path).
+        """
+        if not self.wait_for(MP4_HEAD_BYTES) or self.done:
+            return False
+        layout = mp4_layout(self.read(0, MP4_HEAD_BYTES))
+        if layout is None:
+            need = PROBE_HEAD_BYTES
+        elif not layout['progressive'] or not layout['moov_end']:
+            return False
+        else:
+            need = max(layout['moov_end'], MP4_HEAD_BYTES)
+        self.probe_bytes = need
+        return self.wait_for(need) and not self.done
+
+    def write_probe_head(self, path: Path) -> Path:
+        """Copy the readable prefix to path so ffprobe sees a stable file (stream info + moov)."""
+        offset = 0
+        with open(path, 'wb') as f:
+            while offset < self.probe_bytes:
+                data = self.read(offset, self.probe_bytes - offset)
+                if not data:
+                    break
+                f.write(data)
+                offset += len(data)
+        return path
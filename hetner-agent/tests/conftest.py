@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Agent modules are flat siblings of bk_agent_v2.py (no package)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,85 @@
+import pytest
+
+import admission
+from admission import AdmissionQueue, estimate_cost, percentile
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(admission.time, 'monotonic', c)
+    return c
+
+
+def test_estimate_cost_scales_with_duration_and_output_pixels():
+    short = estimate_cost({'duration': 30, 'resolution': '1920x1080', 'quality': '720p'})
+    assert estimate_cost({'duration': 60, 'resolution': '1920x1080', 'quality': '720p'}) == pytest.approx(2 * short)
+    assert estimate_cost({'duration': 30, 'resolution': '1920x1080', 'quality': '720p,1080p'}) > short
+    # Probe meta wins over claim metadata; without either, duration is guessed from the file size
+    assert estimate_cost({'duration': 999}, {'duration_sec': 30, 'width': 1920, 'height': 1080}) < \
+        estimate_cost({'duration': 999, 'resolution': '1920x1080'})
+    assert estimate_cost({'file_size_input': 8000 * 1000 // 8 * 30}) == pytest.approx(
+        estimate_cost({'duration': 30}))
+
+
+def test_shortest_expected_work_first(clock):
+    q = AdmissionQueue(aging=0.0)
+    q.add({'id': 1}, cost=500.0)
+    q.add({'id': 2}, cost=20.0)
+    q.add({'id': 3}, cost=80.0)
+    assert [q.pop()['id'] for _ in range(3)] == [2, 3, 1]
+    assert q.pop() is None
+    assert q.stats['reordered'] == 2  # 2 and 3 overtook job 1; job 1 was then the lowest id
+
+
+def test_aging_lets_a_long_job_overtake_newer_short_ones(clock):
+    q = AdmissionQueue(aging=2.0, max_hold=10_000)
+    q.add({'id': 1}, cost=300.0)
+    clock.now += 100  # job 1 priority 300 - 2*100 = 100
+    q.add({'id': 2}, cost=150.0)
+    assert q.pop()['id'] == 1
+
+
+def test_max_hold_goes_next_regardless_of_cost(clock):
+    q = AdmissionQueue(aging=0.0, max_hold=600)
+    q.add({'id': 1}, cost=1e9)
+    clock.now += 600
+    q.add({'id': 2}, cost=1.0)
+    job = q.pop()
+    assert job['id'] == 1
+    assert job['_admission'] == {'cost': 1e9, 'waited_sec': 600.0}
+
+
+def test_drain_hands_back_buffered_jobs_only(clock):
+    q = AdmissionQueue()
+    for i in (1, 2, 3):
+        q.add({'id': i}, cost=float(i))
+    started = q.pop()
+    assert sorted(j['id'] for j in q.drain()) == [2, 3]
+    assert len(q) == 0 and q.stats['handed_back'] == 2
+    assert q.finish(2) is None  # drained jobs have no turnaround
+    clock.now += 42
+    assert q.finish(started['id']) == pytest.approx(42)
+    assert q.room(running=0, pool_size=2) == 4
+
+
+def test_turnaround_percentiles(clock):
+    q = AdmissionQueue(lookahead=0)
+    for i in range(1, 21):
+        q.add({'id': i}, cost=1.0)
+    for i in range(1, 21):
+        clock.now += 1
+        q.finish(i)  # turnarounds 1..20 s
+    snap = q.snapshot()
+    assert (snap['turnaround_p50_sec'], snap['turnaround_p95_sec']) == (10.0, 19.0)
+    assert snap['finished'] == 20
+    assert percentile([], 50) == 0.0
+    assert percentile([5.0], 95) == 5.0
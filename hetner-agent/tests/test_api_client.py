@@ -0,0 +1,59 @@
+import requests
+
+from api_client import CircuitBreaker, WorkerApiClient
+
+
+class _Session:
+    """Stands in for requests.Session: raises `error` or answers with `status`."""
+
+    def __init__(self, error=None, status=200):
+        self.error = error
+        self.status = status
+        self.calls = 0
+
+    def post(self, url, json=None, timeout=None, allow_redirects=True):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        r = requests.Response()
+        r.status_code = self.status
+        r._content = b'{"ok": true}'
+        r.headers['Content-Type'] = 'application/json'
+        return r
+
+
+def _half_open_client(session):
+    breaker = CircuitBreaker(threshold=1, cooldown=0.0)
+    breaker.record_failure()  # open; cooldown 0 → next allow() is the half-open probe
+    client = WorkerApiClient('http://worker.test', 'token', 'w1', max_retries=0, breaker=breaker)
+    client.session = session
+    return client, breaker
+
+
+def test_failed_probe_with_broken_response_reopens_breaker():
+    client, breaker = _half_open_client(_Session(error=requests.exceptions.ChunkedEncodingError('cut')))
+    assert client.request('POST', '/api/jobs/claim', {}) is None
+    assert breaker.state == 'open'
+    assert breaker.allow()  # cooldown elapsed → a new probe goes out
+
+
+def test_probe_with_local_error_does_not_wedge_breaker():
+    client, breaker = _half_open_client(_Session(error=TypeError('Object of type set is not JSON serializable')))
+    assert client.request('POST', '/api/jobs/claim', {}) is None
+    assert breaker.state == 'half_open'
+    assert breaker.allow()  # probe released
+
+
+def test_successful_probe_closes_breaker():
+    session = _Session()
+    client, breaker = _half_open_client(session)
+    assert client.request('POST', '/api/jobs/claim', {}) == {'ok': True}
+    assert breaker.state == 'closed'
+
+
+def test_interrupt_is_not_retried():
+    session = _Session(status=503)
+    client = WorkerApiClient('http://worker.test', 'token', 'w1', max_retries=3, backoff_base=0.0)
+    client.session = session
+    assert client.request('POST', '/api/jobs/interrupt', {'job_id': 1}) is None
+    assert session.calls == 1
@@ -0,0 +1,62 @@
+import os
+import tempfile
+
+import pytest
+
+# bk_agent_v2 reads its CONFIG (log file included) from the environment at import
+_TMP = tempfile.mkdtemp(prefix='bk-agent-test-')
+os.environ.setdefault('LOG_FILE', os.path.join(_TMP, 'agent.log'))
+os.environ.setdefault('TEMP_DIR', os.path.join(_TMP, 'work'))
+os.environ.setdefault('BK_BEARER_TOKEN', 'test-token')
+os.environ.setdefault('BK_WORKER_ID', 'test-agent')
+
+import bk_agent_v2  # noqa: E402
+from mock_worker import MockWorker, serve  # noqa: E402
+
+JOBS = [{'id': i, 'clean_name': f'clip-{i}', 'quality': '720p'} for i in range(1, 6)]
+
+
+@pytest.fixture
+def agent_for():
+    started = []
+
+    def start(**mock_kw):
+        srv, mock = serve(port=0, mock=MockWorker(**mock_kw))
+        mock.add_jobs([dict(j) for j in JOBS])
+        bk_agent_v2.CONFIG['api_base_url'] = mock.base_url
+        agent = bk_agent_v2.BKVFAgentV2()
+        agent.api.max_retries = 0
+        started.append((srv, agent))
+        return agent, mock
+
+    yield start
+    for srv, agent in started:
+        agent.outbox.close(timeout=1)
+        srv.shutdown()
+
+
+def test_batch_claim(agent_for):
+    agent, mock = agent_for()
+    jobs = agent.claim_jobs(3)
+    assert [j['id'] for j in jobs] == [1, 2, 3]
+    assert agent._batch_claim is True
+    assert mock.calls.get('/api/jobs/claim-batch') == 1 and not mock.calls.get('/api/jobs/claim')
+
+
+def test_worker_without_batch_route_switches_to_single_claims(agent_for):
+    agent, mock = agent_for(batch_claim=False)
+    assert [j['id'] for j in agent.claim_jobs(2)] == [1, 2]
+    assert agent._batch_claim is False
+    assert [j['id'] for j in agent.claim_jobs(2)] == [3, 4]
+    assert mock.calls.get('/api/jobs/claim-batch') == 1  # not asked again
+    assert mock.calls.get('/api/jobs/claim') == 4
+
+
+def test_other_batch_errors_fall_back_for_this_call_only(agent_for):
+    agent, mock = agent_for(error_rate=1.0, error_paths=('/api/jobs/claim-batch',))
+    assert [j['id'] for j in agent.claim_jobs(2)] == [1, 2]
+    assert agent._batch_claim is None
+    mock.error_rate = 0.0
+    assert [j['id'] for j in agent.claim_jobs(2)] == [3, 4]
+    assert agent._batch_claim is True
+    assert mock.calls.get('/api/jobs/claim-batch') == 2
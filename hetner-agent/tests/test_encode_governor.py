@@ -0,0 +1,72 @@
+import pytest
+
+import encode_governor
+from encode_governor import PresetGovernor, parse_ladder
+
+LADDER = [('slow', 0), ('medium', 0), ('fast', 1)]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(encode_governor.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def _governor(min_hold_sec=0.0):
+    # Each job is 100 work units; slow measured at 10/s → drain ≈ 10 s per job (medium 6 s, fast 4.5 s)
+    g = PresetGovernor(LADDER, target_drain_sec=100, parallel=1, hysteresis=0.7, min_hold_sec=min_hold_sec,
+                       default_job_work=100.0)
+    g.observe_encode('slow', media_sec=10, out_pixels=10, wall_sec=10)
+    return g
+
+
+def _choose(g, backlog):
+    g.observe_backlog(backlog)
+    return g.choose(local_jobs=0)
+
+
+def test_parse_ladder_drops_unknown_presets_and_pads_offsets():
+    assert parse_ladder('slow,medium,fast', '0,0,1') == LADDER
+    assert parse_ladder(' Slow, turbo ,copy,fast', '0,2') == [('slow', 0), ('fast', 2)]
+    assert parse_ladder('slow,medium,fast', '0,x') == [('slow', 0), ('medium', 0), ('fast', 0)]
+    assert parse_ladder('', '') == [('slow', 0)]
+    assert parse_ladder('turbo', '1') == [('slow', 0)]
+
+
+def test_nothing_measured_stays_on_slow(clock):
+    g = PresetGovernor(LADDER, target_drain_sec=100, parallel=1, min_hold_sec=0.0)
+    g.observe_backlog(10_000)
+    assert g.choose(local_jobs=5) == ('slow', 0)
+
+
+def test_ladder_walk_picks_the_slowest_step_within_target(clock):
+    g = _governor()
+    assert _choose(g, 5) == ('slow', 0)  # 50 s
+    assert _choose(g, 15) == ('medium', 0)  # slow 150 s, medium 90 s
+    assert _choose(g, 30) == ('fast', 1)  # even fast (135 s) is over: the last step
+    assert g.snapshot()['changes'] == 2
+
+
+def test_hysteresis_before_stepping_back_to_a_slower_preset(clock):
+    g = _governor()
+    assert _choose(g, 15) == ('medium', 0)
+    assert _choose(g, 9) == ('medium', 0)  # slow 90 s ≤ target but not ≤ 0.7 × target
+    assert _choose(g, 7) == ('slow', 0)  # 70 s
+
+
+def test_min_hold_keeps_the_step_between_quick_changes(clock):
+    g = _governor(min_hold_sec=60)
+    assert _choose(g, 15) == ('medium', 0)
+    clock[0] += 30
+    assert _choose(g, 30) == ('medium', 0)  # would be fast, held
+    clock[0] += 30
+    assert _choose(g, 30) == ('fast', 1)
+
+
+def test_back_to_slow_when_the_backlog_drains(clock):
+    g = _governor(min_hold_sec=60)
+    assert _choose(g, 30) == ('fast', 1)
+    clock[0] += 60
+    assert _choose(g, 0) == ('slow', 0)
+    assert g.snapshot()['preset'] == 'slow'
@@ -0,0 +1,34 @@
+from pathlib import Path
+
+from encode_resume import ResumeManifest
+
+SIG = {'raw': 'raw/clip.mov', 'crf': 18, 'scales': ['scale=-2:720'], 'out_res': ['1280x720'], 'seg_sec': 30,
+       'outputs': 1}
+
+
+def _split(chunk_dir: Path, settings):
+    m = ResumeManifest.open(chunk_dir, SIG, settings)
+    (chunk_dir / 'src-0000.mp4').write_bytes(b'x')
+    (chunk_dir / 'src-0001.mp4').write_bytes(b'x')
+    m.set_cuts([(chunk_dir / 'src-0000.mp4', 0.0, 30.0), (chunk_dir / 'src-0001.mp4', 30.0, 60.0)], settings)
+    (chunk_dir / 'out0-0000.mp4').write_bytes(b'x')
+    m.mark_done(0, 750)
+
+
+def test_resume_keeps_recorded_settings_after_governor_step(tmp_path):
+    chunk_dir = tmp_path / '7'
+    _split(chunk_dir, {'preset': 'slow', 'crf': 18})
+    # Governor stepped to a faster preset with a CRF offset: same requested signature → resumed
+    m = ResumeManifest.open(chunk_dir, SIG, {'preset': 'veryfast', 'crf': 19})
+    assert m.resumed
+    assert m.settings == {'preset': 'slow', 'crf': 18}
+    assert m.usable(lambda i: [chunk_dir / f"out0-{i:04d}.mp4"]) == {0: 750}
+
+
+def test_other_requested_crf_starts_over(tmp_path):
+    chunk_dir = tmp_path / '7'
+    _split(chunk_dir, {'preset': 'slow', 'crf': 18})
+    m = ResumeManifest.open(chunk_dir, {**SIG, 'crf': 22}, {'preset': 'slow', 'crf': 22})
+    assert not m.resumed
+    assert m.settings == {'preset': 'slow', 'crf': 22}
+    assert not any(chunk_dir.iterdir())
@@ -0,0 +1,69 @@
+import threading
+
+from encode_scheduler import EncodeScheduler
+
+
+def _sched(cpu=None, **kw):
+    load = {'cpu': cpu}
+    s = EncodeScheduler(cores=16, max_jobs=kw.pop('max_jobs', 4), cpu_percent=lambda: load['cpu'],
+                        busy_cpu_percent=90.0, oversubscribe=1.5, **kw)
+    return s, load
+
+
+def test_lone_job_gets_its_full_cap():
+    s, _ = _sched(cpu=99.0)  # load does not gate the first encode
+    assert s.acquire(1, weight=1.0, cap=16) == 16
+    s.release(1)
+    assert s.acquire(2, weight=1.0, cap=8) == 8
+    assert s.acquire(3, weight=1.0, cap=64, abort=lambda: True) is None  # busy CPU gates the second one
+
+
+def test_second_job_gets_weighted_share_trimmed_to_the_room():
+    s, _ = _sched(cpu=50.0)
+    assert s.acquire(1, weight=1.0, cap=16) == 16
+    # Share round(16 × 3/4) = 12, but only 16 × 1.5 - 16 = 8 threads are left unallotted
+    assert s.acquire(2, weight=3.0, cap=16) == 8
+    assert s.snapshot()['threads_allotted'] == 24
+
+
+def test_equal_weights_split_the_cores():
+    s, _ = _sched(cpu=50.0)
+    s.acquire(1, weight=1.0, cap=8)
+    assert s.acquire(2, weight=1.0, cap=16) == 8
+
+
+def test_no_room_left_blocks_until_abort():
+    s, _ = _sched(cpu=10.0)
+    s.acquire(1, weight=1.0, cap=16)
+    s.acquire(2, weight=1.0, cap=16)  # 8 → room exhausted (24 allotted)
+    assert s.acquire(3, weight=1.0, cap=16, abort=lambda: True) is None
+    assert 3 not in s.active
+
+
+def test_max_jobs_blocks_until_a_release():
+    s, _ = _sched(cpu=10.0, max_jobs=1)
+    s.acquire(1, weight=1.0, cap=4)
+    assert s.acquire(2, weight=1.0, cap=4, abort=lambda: True) is None
+    got = []
+    t = threading.Thread(target=lambda: got.append(s.acquire(2, weight=1.0, cap=4)))
+    t.start()
+    t.join(timeout=0.2)
+    assert t.is_alive() and not got
+    s.release(1)
+    t.join(timeout=5)
+    assert got == [4]  # alone again: full cap
+
+
+def test_busy_cpu_blocks_new_encodes():
+    s, load = _sched(cpu=95.0)
+    s.acquire(1, weight=1.0, cap=4)
+    assert s.acquire(2, weight=1.0, cap=4, abort=lambda: True) is None
+    load['cpu'] = 60.0
+    assert s.acquire(2, weight=1.0, cap=4) == 4
+
+
+def test_static_mode_uses_fixed_threads_and_slots():
+    s, _ = _sched(cpu=99.0, adaptive=False, static_threads=6, max_jobs=2)
+    assert s.acquire(1, weight=1.0, cap=16) == 6
+    assert s.acquire(2, weight=5.0, cap=16) == 6  # CPU load is not consulted
+    assert s.acquire(3, weight=1.0, cap=16, abort=lambda: True) is None
@@ -0,0 +1,80 @@
+import hashlib
+import os
+
+from raw_cache import RawInputCache
+
+
+def _input(tmp_path, name, size):
+    p = tmp_path / name
+    p.write_bytes(os.urandom(size))
+    return p
+
+
+def _store(cache, tmp_path, key, size, age):
+    """Store a finished download whose work dir is already gone, last used `age` seconds ago."""
+    src = _input(tmp_path, key.replace("/", "-") + ".in", size)
+    assert cache.store(key, src)
+    src.unlink()
+    meta = cache._paths(key)[1]
+    os.utime(meta, (meta.stat().st_atime, meta.stat().st_mtime - age))
+
+
+def test_store_evicts_least_recently_used_down_to_the_budget(tmp_path):
+    cache = RawInputCache(tmp_path / 'cache', max_bytes=250)
+    _store(cache, tmp_path, 'raw/a', 100, age=30)
+    _store(cache, tmp_path, 'raw/b', 100, age=20)
+    assert cache.fetch('raw/a', tmp_path / 'a.mp4')  # a is now the most recently used
+    (tmp_path / 'a.mp4').unlink()
+    _store(cache, tmp_path, 'raw/c', 100, age=0)
+    assert cache.fetch('raw/b', tmp_path / 'b.mp4') is None
+    assert cache.total_bytes() == 200
+    assert cache.snapshot()['evicted'] == 1
+
+
+def test_entries_linked_into_a_work_dir_are_not_evicted(tmp_path):
+    cache = RawInputCache(tmp_path / 'cache', max_bytes=1000)
+    _store(cache, tmp_path, 'raw/a', 100, age=30)
+    _store(cache, tmp_path, 'raw/b', 100, age=20)
+    in_use = tmp_path / 'job-1' / 'input.mp4'
+    in_use.parent.mkdir()
+    assert cache.fetch('raw/a', in_use)  # hard link → links > 1
+    assert cache.evict(150) == 100  # only b could go
+    assert cache._paths('raw/a')[0].exists() and not cache._paths('raw/b')[0].exists()
+
+
+def test_fetch_drops_entries_failing_size_or_hash(tmp_path):
+    cache = RawInputCache(tmp_path / 'cache', max_bytes=1000)
+    _store(cache, tmp_path, 'raw/a', 100, age=0)
+    assert cache.fetch('raw/a', tmp_path / 'x.mp4', expected_size=99) is None
+    assert not cache._paths('raw/a')[1].exists()
+
+    _store(cache, tmp_path, 'raw/b', 100, age=0)
+    assert cache.fetch('raw/b', tmp_path / 'y.mp4', expected_sha256='0' * 64) is None
+    assert not cache._paths('raw/b')[0].exists()
+
+    _store(cache, tmp_path, 'raw/c', 100, age=0)
+    data = cache._paths('raw/c')[0]
+    data.write_bytes(os.urandom(100))  # same size, different bytes
+    assert cache.fetch('raw/c', tmp_path / 'z.mp4') is None
+    assert cache.snapshot()['rejected'] == 3
+
+
+def test_fetch_hit_links_the_verified_input(tmp_path):
+    cache = RawInputCache(tmp_path / 'cache', max_bytes=1000)
+    src = _input(tmp_path, 'in.mp4', 100)
+    digest = hashlib.sha256(src.read_bytes()).hexdigest()
+    assert cache.store('raw/a', src)
+    entry = cache.fetch('raw/a', tmp_path / 'retry.mp4', expected_size=100, expected_sha256=digest)
+    assert entry['sha256'] == digest
+    assert (tmp_path / 'retry.mp4').read_bytes() == src.read_bytes()
+
+
+def test_recover_removes_half_written_entries(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    cache = RawInputCache(cache_dir, max_bytes=1000)
+    _store(cache, tmp_path, 'raw/a', 100, age=0)
+    (cache_dir / 'deadbeef.raw').write_bytes(b'data without meta')
+    (cache_dir / 'cafebabe.json').write_text('{}')
+    (cache_dir / 'feedface.raw.tmp').write_bytes(b'partial')
+    RawInputCache(cache_dir, max_bytes=1000)
+    assert sorted(p.name for p in cache_dir.iterdir()) == sorted(p.name for p in cache._paths('raw/a'))
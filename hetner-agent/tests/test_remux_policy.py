@@ -0,0 +1,41 @@
+from remux_policy import reference_kbps, remux_reject_reason
+
+PHONE = {'codec': 'h264', 'profile': 'High', 'pix_fmt': 'yuv420p', 'width': 1920, 'height': 1080,
+         'fps': 30.0, 'bitrate': 8000}
+
+
+def _reason(target='1920x1080', ratio=1.5, **meta):
+    return remux_reject_reason(dict(PHONE, **meta), target, ratio)
+
+
+def test_compliant_source_at_or_below_target_is_remuxed():
+    assert _reason() is None
+    assert _reason(width=1280, height=720, bitrate=4000) is None
+    assert _reason(target='1080x1920', width=1080, height=1920) is None  # vertical at its own target
+
+
+def test_sources_above_target_are_encoded():
+    assert _reason(target='1280x720') == '1920x1080 above target 1280x720'
+    # A vertical source is measured against the target's long/short side, not its orientation
+    assert _reason(target='1280x720', width=1080, height=1920) == '1080x1920 above target 1280x720'
+    assert _reason(target='1280x720', width=720, height=1280, bitrate=4000) is None
+
+
+def test_profile_pix_fmt_and_fps_outside_the_spec_are_encoded():
+    assert _reason(profile='Main') == 'profile main'
+    assert _reason(codec='hevc') == 'codec hevc'
+    assert _reason(pix_fmt='yuv422p10le') == 'pix_fmt yuv422p10le'
+    assert _reason(fps=119.88) == 'fps 119.88'
+    assert _reason(fps=60.0, bitrate=16000) is None
+
+
+def test_bitrate_unknown_or_above_the_ratio_limit_is_encoded():
+    limit = int(reference_kbps(1920, 1080, 30.0) * 1.5)
+    assert _reason(bitrate=0) == 'bitrate unknown'
+    assert _reason(bitrate=limit) is None
+    assert _reason(bitrate=limit + 1) == f"bitrate {limit + 1} kbps > {limit} kbps"
+
+
+def test_zero_ratio_disables_the_bitrate_check():
+    assert _reason(ratio=0, bitrate=0) is None
+    assert _reason(ratio=0, bitrate=200000) is None
@@ -0,0 +1,109 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from mock_worker import serve
+from segmented_download import RangeNotSupported, SegmentedDownload, probe_range_support
+
+DATA = bytes(range(256)) * 1000  # 256 000 bytes
+PIECE = 40_000
+
+
+@pytest.fixture(scope='module')
+def object_url():
+    srv, mock = serve(port=0)
+    mock.objects[('raw', 'clip.mp4')] = DATA
+    yield mock.object_url('raw', 'clip.mp4')
+    srv.shutdown()
+
+
+class _ShortFirstRead(requests.Session):
+    """The first GET stops after `cut` bytes (connection dropped mid-piece); later ones are whole."""
+
+    def __init__(self, cut: int):
+        super().__init__()
+        self.cut = cut
+        self.ranges = []
+        self._lock = threading.Lock()
+
+    def get(self, url, **kw):
+        r = super().get(url, **kw)
+        with self._lock:
+            self.ranges.append((kw.get('headers') or {}).get('Range'))
+            first = len(self.ranges) == 1
+        if first:
+            body = r.raw.read(self.cut)
+            r.iter_content = lambda chunk_size=1: iter([body])
+        return r
+
+
+class _Follower:
+    """tee/hasher stand-in: checks every reported prefix is on disk and never moves backwards."""
+
+    def __init__(self, part_path):
+        self.part_path = part_path
+        self.prefixes = []
+        self.cancelled = False
+
+    def _check(self, prefix):
+        assert not self.prefixes or prefix >= self.prefixes[-1]
+        with open(self.part_path, 'rb') as f:
+            assert f.read(prefix) == DATA[:prefix]
+        self.prefixes.append(prefix)
+
+    def advance(self, prefix):
+        self._check(prefix)
+
+    def follow(self, path, prefix):
+        assert path == self.part_path
+        self._check(prefix)
+
+
+def _download(url, part, session=None, **kw):
+    return SegmentedDownload(session or requests.Session(), url, part, len(DATA), workers=kw.pop('workers', 4),
+                             piece_size=PIECE, host_slot=threading.Semaphore(4), retry_delay=0.01, **kw)
+
+
+def test_probe_reports_total_size(object_url):
+    assert probe_range_support(requests.Session(), object_url) == len(DATA)
+
+
+def test_pieces_land_in_place_and_prefix_is_reported_in_order(object_url, tmp_path):
+    part = tmp_path / 'input.mp4.part'
+    tee, hasher = _Follower(part), _Follower(part)
+    assert _download(object_url, part, tee=tee, hasher=hasher).run() is True
+    assert part.read_bytes() == DATA
+    assert tee.prefixes[-1] == hasher.prefixes[-1] == len(DATA)
+
+
+def test_short_read_resumes_the_piece_from_its_last_offset(object_url, tmp_path):
+    part = tmp_path / 'input.mp4.part'
+    session = _ShortFirstRead(cut=1000)
+    assert _download(object_url, part, session=session, workers=1).run() is True
+    assert part.read_bytes() == DATA
+    assert session.ranges[:2] == [f'bytes=0-{PIECE - 1}', f'bytes=1000-{PIECE - 1}']
+
+
+class _NoRange(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(DATA)))
+        self.end_headers()
+        self.wfile.write(DATA)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_server_ignoring_range_raises_range_not_supported(tmp_path):
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), _NoRange)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{srv.server_port}/clip.mp4"
+    try:
+        assert probe_range_support(requests.Session(), url) is None
+        with pytest.raises(RangeNotSupported):
+            _download(url, tmp_path / 'input.mp4.part').run()
+    finally:
+        srv.shutdown()
@@ -0,0 +1,58 @@
+from status_outbox import BATCH_ENDPOINT, MAX_BATCH, StatusOutbox
+
+
+class _Worker:
+    """send() for the outbox: records calls; the batch route answers with `batch_status`."""
+
+    def __init__(self, batch_status=200):
+        self.batch_status = batch_status
+        self.last_status = {}
+        self.calls = []
+
+    def send(self, method, endpoint, data):
+        self.calls.append(endpoint)
+        status = self.batch_status if endpoint == BATCH_ENDPOINT else 200
+        self.last_status[endpoint] = status
+        return {'success': True} if status == 200 else None
+
+
+def _outbox(worker, **kw):
+    # Not started: enqueue() flushes inline, which keeps these tests synchronous
+    return StatusOutbox(worker.send, 'w1', last_status=worker.last_status, **kw)
+
+
+def _two_events(outbox):
+    outbox._pending[('status', 1)] = {'job_id': 1, 'status': 'PROCESSING'}
+    outbox._pending[('status', 2)] = {'job_id': 2, 'status': 'PROCESSING'}
+    outbox._flush_pending()
+
+
+def test_missing_batch_route_switches_to_single_calls():
+    worker = _Worker(batch_status=404)
+    outbox = _outbox(worker)
+    _two_events(outbox)
+    assert outbox.batch_supported is False
+    assert worker.calls == [BATCH_ENDPOINT, '/api/jobs/status', '/api/jobs/status']
+
+
+def test_transient_batch_failure_keeps_batch_route():
+    worker = _Worker(batch_status=503)
+    outbox = _outbox(worker)
+    _two_events(outbox)
+    assert outbox.batch_supported is True
+    worker.batch_status = 200
+    _two_events(outbox)
+    assert worker.calls[-1] == BATCH_ENDPOINT
+
+
+def test_batch_size_is_capped_at_worker_limit():
+    assert _outbox(_Worker(), max_batch=500).max_batch == MAX_BATCH
+
+
+def test_finish_job_forgets_the_job():
+    outbox = _outbox(_Worker())
+    outbox.enqueue('status', 7, {'job_id': 7, 'status': 'PROCESSING'})
+    outbox._closed_jobs.add(7)
+    outbox._pending[('checkpoint', 7)] = {'job_id': 7}
+    assert outbox.finish_job(7)['events'] == 1
+    assert 7 not in outbox.job_stats and 7 not in outbox._closed_jobs and not outbox._pending
@@ -70,7 +70,7 @@ CREATE TABLE IF NOT EXISTS users (
 CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username);
 CREATE UNIQUE INDEX IF NOT EXISTS idx_users_api_token ON users(api_token) WHERE api_token IS NOT NULL;
 
--- conversion_jobs (migration 002 + 003 + 004 + 006 + 007 + 018 + 020)
+-- conversion_jobs (migration 002 + 003 + 004 + 006 + 007 + 011 + 017 + 018 + 020 + 0028 + 0029 + 0030 + 0033)
 CREATE TABLE IF NOT EXISTS conversion_jobs (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     original_name TEXT NOT NULL,
@@ -104,6 +104,10 @@ CREATE TABLE IF NOT EXISTS conversion_jobs (
     audio_codec TEXT,
     audio_bitrate INTEGER,
     thumbnail_key TEXT,
+    renditions TEXT,
+    storyboard_key TEXT,
+    source_sha256 TEXT,
+    output_cache_key TEXT,
     source_url TEXT,
     privacy TEXT DEFAULT 'public',
     allow_download INTEGER DEFAULT 1,
@@ -115,7 +119,15 @@ CREATE TABLE IF NOT EXISTS conversion_jobs (
     interrupted_at DATETIME,
     interrupted_stage TEXT,
     processing_checkpoint TEXT,
-    checkpoint_updated_at DATETIME
+    checkpoint_updated_at DATETIME,
+    upload_confirmed_at DATETIME,
+    download_progress INTEGER DEFAULT 0,
+    download_bytes INTEGER DEFAULT 0,
+    download_total INTEGER DEFAULT 0,
+    encode_progress INTEGER,
+    encode_fps REAL,
+    encode_speed REAL,
+    encode_eta_seconds INTEGER
 );
 
 CREATE INDEX IF NOT EXISTS idx_conversion_jobs_status ON conversion_jobs(status);
@@ -125,6 +137,7 @@ CREATE INDEX IF NOT EXISTS idx_conversion_jobs_clean_name ON conversion_jobs(cle
 CREATE INDEX IF NOT EXISTS idx_conversion_jobs_quality ON conversion_jobs(quality);
 CREATE INDEX IF NOT EXISTS idx_conversion_jobs_uploaded_by ON conversion_jobs(uploaded_by);
 CREATE INDEX IF NOT EXISTS idx_conversion_jobs_thumbnail ON conversion_jobs(thumbnail_key) WHERE thumbnail_key IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_conversion_jobs_output_cache_key ON conversion_jobs(output_cache_key) WHERE output_cache_key IS NOT NULL;
 CREATE INDEX IF NOT EXISTS idx_conversion_jobs_status_created_at ON conversion_jobs(status, created_at);
 CREATE INDEX IF NOT EXISTS idx_conversion_jobs_started_at ON conversion_jobs(started_at) WHERE status = 'PROCESSING';
 CREATE INDEX IF NOT EXISTS idx_conversion_jobs_deleted_folder_created ON conversion_jobs(deleted_at, folder_id, created_at);
@@ -161,7 +174,7 @@ CREATE TABLE IF NOT EXISTS daily_statistics (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
--- worker_heartbeats (migration 0025 FK)
+-- worker_heartbeats (migration 0025 FK + 0032 index)
 CREATE TABLE IF NOT EXISTS worker_heartbeats (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     worker_id TEXT NOT NULL,
@@ -172,6 +185,31 @@ CREATE TABLE IF NOT EXISTS worker_heartbeats (
     version TEXT,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
+CREATE INDEX IF NOT EXISTS idx_worker_heartbeats_worker_last ON worker_heartbeats(worker_id, last_heartbeat);
+
+-- segment_tasks (migration 0031) — keyframe chunks of one job encoded by peer agents
+CREATE TABLE IF NOT EXISTS segment_tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL REFERENCES conversion_jobs(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    owner_worker_id TEXT NOT NULL,
+    src_key TEXT NOT NULL,
+    out_keys TEXT NOT NULL,            -- JSON array, one R2 raw key per output (ladder renditions)
+    duration REAL NOT NULL DEFAULT 0,
+    packets INTEGER NOT NULL DEFAULT 0,
+    params TEXT NOT NULL,              -- JSON: crf, scales, out_res, width, height, fps
+    src_ready INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'PENDING',  -- PENDING | PROCESSING | DONE | FAILED
+    worker_id TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    frames INTEGER,
+    error TEXT,
+    claimed_at DATETIME,
+    done_at DATETIME,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (job_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_segment_tasks_claim ON segment_tasks(status, src_ready, job_id, seq);
 
 -- security_logs (migration 008 + 0025 FK)
 CREATE TABLE IF NOT EXISTS security_logs (
@@ -0,0 +1,3 @@
+-- 0028: Multi-rendition ladder output (agent encodes several qualities from one decode)
+-- renditions: JSON array [{quality, public_url, r2_key, resolution, file_size_output, bitrate}] or NULL (single output)
+ALTER TABLE conversion_jobs ADD COLUMN renditions TEXT;
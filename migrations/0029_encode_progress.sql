@@ -0,0 +1,5 @@
+-- 0029: Live FFmpeg progress while CONVERTING (agent parses -progress pipe:1, throttled status updates)
+ALTER TABLE conversion_jobs ADD COLUMN encode_progress INTEGER;
+ALTER TABLE conversion_jobs ADD COLUMN encode_fps REAL;
+ALTER TABLE conversion_jobs ADD COLUMN encode_speed REAL;
+ALTER TABLE conversion_jobs ADD COLUMN encode_eta_seconds INTEGER;
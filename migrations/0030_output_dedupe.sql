@@ -0,0 +1,4 @@
+-- 0030: Content-addressed output reuse (agent hashes the source while downloading)
+ALTER TABLE conversion_jobs ADD COLUMN source_sha256 TEXT;
+ALTER TABLE conversion_jobs ADD COLUMN output_cache_key TEXT;
+CREATE INDEX IF NOT EXISTS idx_conversion_jobs_output_cache_key ON conversion_jobs(output_cache_key) WHERE output_cache_key IS NOT NULL;
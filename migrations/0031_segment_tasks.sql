@@ -0,0 +1,23 @@
+-- 0031: Segment fan-out — keyframe chunks of one job encoded by peer agents
+CREATE TABLE IF NOT EXISTS segment_tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL REFERENCES conversion_jobs(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    owner_worker_id TEXT NOT NULL,
+    src_key TEXT NOT NULL,
+    out_keys TEXT NOT NULL,            -- JSON array, one R2 raw key per output (ladder renditions)
+    duration REAL NOT NULL DEFAULT 0,
+    packets INTEGER NOT NULL DEFAULT 0,
+    params TEXT NOT NULL,              -- JSON: crf, scales, out_res, width, height, fps
+    src_ready INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'PENDING',  -- PENDING | PROCESSING | DONE | FAILED
+    worker_id TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    frames INTEGER,
+    error TEXT,
+    claimed_at DATETIME,
+    done_at DATETIME,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (job_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_segment_tasks_claim ON segment_tasks(status, src_ready, job_id, seq);
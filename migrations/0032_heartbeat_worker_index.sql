@@ -0,0 +1,2 @@
+-- 0032: Zombie sweep skips jobs whose worker heartbeated recently (NOT EXISTS per job's worker_id)
+CREATE INDEX IF NOT EXISTS idx_worker_heartbeats_worker_last ON worker_heartbeats(worker_id, last_heartbeat);
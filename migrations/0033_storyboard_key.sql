@@ -0,0 +1,2 @@
+-- 0033: Storyboard WebVTT index (player scrubbing); sprite sheets sit next to it under thumbnails/<job>/
+ALTER TABLE conversion_jobs ADD COLUMN storyboard_key TEXT;
@@ -8,6 +8,17 @@ import { NotFoundError, ValidationError, AppError, BK_ERROR_CODES } from '../uti
 import { logger } from '../utils/logger.js';
 import { JOB_STATUS, PROCESSING_STATUSES } from '../config/BK_CONSTANTS.js';
 
+/** Progress columns the agent may set with a status update (column names are never taken from input) */
+const STATUS_PROGRESS_COLUMNS = [
+    'download_progress', 'download_bytes', 'download_total',
+    'encode_progress', 'encode_fps', 'encode_speed', 'encode_eta_seconds',
+];
+// Upper bound for one batch claim (agent lookahead + pool); keeps the UPDATE and response small
+export const CLAIM_BATCH_MAX = 20;
+/** PROCESSING jobs older than this are failed by the zombie sweep ... */
+export const ZOMBIE_TIMEOUT_MIN = 45;
+/** ... unless their worker sent a heartbeat this recently (agents heartbeat at least every 10 min). */
+export const ZOMBIE_HEARTBEAT_GRACE_MIN = 20;
 /** Whitelist for getJobs sort column (identifier only; values are bound). */
 const VALID_SORT_COLUMNS_JOBS = ['created_at', 'started_at', 'completed_at', 'file_size_input', 'processing_time_seconds', 'duration', 'quality', 'view_count'];
 /** Whitelist for getDeletedJobs sort column. */
@@ -153,27 +164,20 @@ export class JobRepository {
      * @param {number} jobId - Job ID
      * @param {string} workerId - Worker identifier
      * @param {string} status - DOWNLOADING | CONVERTING | UPLOADING
-     * @param {Object} [extras] - download_progress, download_bytes, download_total
+     * @param {Object} [extras] - download_progress, download_bytes, download_total,
+     *   encode_progress, encode_fps, encode_speed, encode_eta_seconds (live FFmpeg progress)
      * @returns {Promise<Object|null>} Updated job or null
      */
     async updateJobStatus(jobId, workerId, status, extras = {}) {
         const valid = [JOB_STATUS.DOWNLOADING, JOB_STATUS.CONVERTING, JOB_STATUS.UPLOADING];
         if (!valid.includes(status)) return null;
-        const { download_progress, download_bytes, download_total } = extras;
-        const hasExtras = download_progress != null || download_bytes != null || download_total != null;
         let sql = 'UPDATE conversion_jobs SET status = ?';
         const binds = [status];
-        if (hasExtras && download_progress != null) {
-            sql += ', download_progress = ?';
-            binds.push(download_progress);
-        }
-        if (hasExtras && download_bytes != null) {
-            sql += ', download_bytes = ?';
-            binds.push(download_bytes);
-        }
-        if (hasExtras && download_total != null) {
-            sql += ', download_total = ?';
-            binds.push(download_total);
+        for (const col of STATUS_PROGRESS_COLUMNS) {
+            if (extras[col] != null) {
+                sql += `, ${col} = ?`;
+                binds.push(extras[col]);
+            }
         }
         sql += ' WHERE id = ? AND worker_id = ? RETURNING *';
         binds.push(jobId, workerId);
@@ -208,6 +212,73 @@ export class JobRepository {
         return result || null;
     }
 
+    /**
+     * Claim up to `limit` pending jobs in one statement (agent batch claim). Same eligibility and
+     * order as claimPendingJob; each row is claimed at most once.
+     * @param {string} workerId - Worker identifier
+     * @param {number} limit - Maximum jobs to claim
+     * @returns {Promise<Array<Object>>} Claimed jobs (possibly empty), lowest id first
+     */
+    async claimPendingJobs(workerId, limit) {
+        const n = Math.min(Math.max(parseInt(limit, 10) || 1, 1), CLAIM_BATCH_MAX);
+        const result = await this.db.prepare(`
+            UPDATE conversion_jobs
+            SET 
+                status = ?,
+                worker_id = ?,
+                started_at = CURRENT_TIMESTAMP,
+                retry_count = 0
+            WHERE id IN (
+                SELECT id FROM conversion_jobs
+                WHERE ((status = ?) OR (status = ? AND upload_confirmed_at IS NOT NULL))
+                  AND deleted_at IS NULL
+                ORDER BY id ASC
+                LIMIT ?
+            )
+            RETURNING *
+        `).bind(JOB_STATUS.PROCESSING, workerId, JOB_STATUS.URL_IMPORT_QUEUED, JOB_STATUS.PENDING, n).all();
+        return (result?.results ?? []).sort((a, b) => a.id - b.id);
+    }
+
+    /**
+     * Number of jobs claimPendingJobs could still hand out (agent preset governor backlog).
+     * @returns {Promise<number>}
+     */
+    async countClaimable() {
+        const row = await this.db.prepare(`
+            SELECT COUNT(*) AS n FROM conversion_jobs
+            WHERE ((status = ?) OR (status = ? AND upload_confirmed_at IS NOT NULL))
+              AND deleted_at IS NULL
+        `).bind(JOB_STATUS.URL_IMPORT_QUEUED, JOB_STATUS.PENDING).first();
+        return Number(row?.n) || 0;
+    }
+
+    /**
+     * Zombie sweep: fail PROCESSING jobs claimed more than timeoutMin ago whose worker has gone quiet.
+     * A heartbeating agent still holds its claimed jobs, including ones parked in its prefetch/encode queues
+     * behind long encodes, so they are left alone. Timestamps are compared in SQLite's own format
+     * (started_at is CURRENT_TIMESTAMP, not ISO 8601).
+     * @param {number} [timeoutMin]
+     * @param {number} [graceMin]
+     * @returns {Promise<number[]>} ids of the jobs marked FAILED
+     */
+    async markZombieJobs(timeoutMin = ZOMBIE_TIMEOUT_MIN, graceMin = ZOMBIE_HEARTBEAT_GRACE_MIN) {
+        const result = await this.db.prepare(`
+            UPDATE conversion_jobs
+            SET status = ?
+            WHERE status = ?
+              AND datetime(started_at) < datetime('now', ?)
+              AND NOT EXISTS (
+                  SELECT 1 FROM worker_heartbeats wh
+                  WHERE wh.worker_id = conversion_jobs.worker_id
+                    AND datetime(wh.last_heartbeat) >= datetime('now', ?)
+              )
+            RETURNING id
+        `).bind(JOB_STATUS.FAILED, JOB_STATUS.PROCESSING, `-${Number(timeoutMin)} minutes`,
+            `-${Number(graceMin)} minutes`).all();
+        return (result?.results ?? []).map(r => r.id);
+    }
+
     /**
      * Update job after agent has uploaded URL-import file to R2 raw.
      * @param {number} jobId - Job ID
@@ -252,7 +323,11 @@ export class JobRepository {
             ffmpeg_command,
             ffmpeg_output,
             thumbnail_key,
+            storyboard_key,
             clean_name,
+            renditions,
+            source_sha256,
+            output_cache_key,
         } = resultData;
 
         const finalCleanName = clean_name || null;
@@ -274,7 +349,11 @@ export class JobRepository {
                 ffmpeg_command = ?,
                 ffmpeg_output = ?,
                 thumbnail_key = ?,
+                storyboard_key = ?,
                 clean_name = COALESCE(?, clean_name),
+                renditions = ?,
+                source_sha256 = ?,
+                output_cache_key = ?,
                 completed_at = CURRENT_TIMESTAMP
             WHERE id = ? AND worker_id = ?
             RETURNING *
@@ -293,7 +372,11 @@ export class JobRepository {
             ffmpeg_command || '',
             ffmpeg_output || '',
             thumbnail_key || null,
+            storyboard_key || null,
             finalCleanName,
+            Array.isArray(renditions) && renditions.length ? JSON.stringify(renditions) : null,
+            source_sha256 || null,
+            output_cache_key || null,
             jobId,
             workerId
         ).first();
@@ -305,6 +388,130 @@ export class JobRepository {
         return result;
     }
 
+    /**
+     * Latest completed, not deleted job whose output was produced from the same source bytes + settings.
+     * @param {string} outputCacheKey - Agent cache key (source SHA-256 + encode settings)
+     * @param {number} [excludeJobId] - The asking job itself
+     * @returns {Promise<Object|null>}
+     */
+    async findCompletedByOutputKey(outputCacheKey, excludeJobId = 0) {
+        if (!outputCacheKey) return null;
+        return await this.db.prepare(`
+            SELECT * FROM conversion_jobs
+            WHERE output_cache_key = ? AND status = ? AND deleted_at IS NULL AND id != ?
+            ORDER BY completed_at DESC
+            LIMIT 1
+        `).bind(outputCacheKey, JOB_STATUS.COMPLETED, parseInt(excludeJobId, 10) || 0).first();
+    }
+
+    /**
+     * Replace the segment tasks of a job (owner agent re-publishing after a retry starts over).
+     * @param {number} jobId - Job ID
+     * @param {string} ownerWorkerId - Agent that claimed the job and assembles the output
+     * @param {Object} params - Encode parameters shared by every segment (stored as JSON)
+     * @param {Array<{ seq: number, src_key: string, out_keys: string[], duration: number, packets: number }>} tasks
+     * @returns {Promise<number>} Tasks stored
+     */
+    async replaceSegmentTasks(jobId, ownerWorkerId, params, tasks) {
+        const paramsJson = JSON.stringify(params || {});
+        const statements = [this.db.prepare('DELETE FROM segment_tasks WHERE job_id = ?').bind(jobId)];
+        for (const t of tasks) {
+            statements.push(this.db.prepare(`
+                INSERT INTO segment_tasks (job_id, seq, owner_worker_id, src_key, out_keys, duration, packets, params)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            `).bind(jobId, t.seq, ownerWorkerId, t.src_key, JSON.stringify(t.out_keys), Number(t.duration) || 0,
+                parseInt(t.packets, 10) || 0, paramsJson));
+        }
+        await this.db.batch(statements);
+        return tasks.length;
+    }
+
+    /**
+     * Mark segment sources as uploaded (peers may claim them from now on).
+     * @param {number} jobId - Job ID
+     * @param {number[]} seqs - Segment numbers
+     */
+    async markSegmentSourcesReady(jobId, seqs) {
+        if (!seqs.length) return;
+        await this.db.prepare(`
+            UPDATE segment_tasks SET src_ready = 1
+            WHERE job_id = ? AND seq IN (${seqs.map(() => '?').join(',')})
+        `).bind(jobId, ...seqs).run();
+    }
+
+    /**
+     * Claim one segment task. With jobId (the owner encoding its own chunks) the lowest pending seq of
+     * that job, source upload not required; without, the highest ready seq of another agent's job, so
+     * owner and peers work from opposite ends. PROCESSING tasks older than staleMinutes are claimable again.
+     * @param {string} workerId - Claiming agent
+     * @param {number|null} jobId - Own job, or null for any peer job
+     * @param {number} staleMinutes - Reclaim tasks whose claimer went quiet
+     * @returns {Promise<Object|null>} Claimed task row
+     */
+    async claimSegmentTask(workerId, jobId, staleMinutes) {
+        const stale = `-${Math.max(1, parseInt(staleMinutes, 10) || 30)} minutes`;
+        const claimable = `(status = 'PENDING' OR (status = 'PROCESSING' AND claimed_at < datetime('now', ?)))`;
+        const pick = jobId
+            ? this.db.prepare(`
+                SELECT id FROM segment_tasks WHERE job_id = ? AND ${claimable}
+                ORDER BY seq ASC LIMIT 1
+            `).bind(jobId, stale)
+            : this.db.prepare(`
+                SELECT id FROM segment_tasks WHERE owner_worker_id != ? AND src_ready = 1 AND ${claimable}
+                ORDER BY job_id ASC, seq DESC LIMIT 1
+            `).bind(workerId, stale);
+        const row = await pick.first();
+        if (!row) return null;
+        // Conditional on the task still being claimable: a concurrent claimer loses and gets null
+        return await this.db.prepare(`
+            UPDATE segment_tasks
+            SET status = 'PROCESSING', worker_id = ?, claimed_at = CURRENT_TIMESTAMP, attempts = attempts + 1
+            WHERE id = ? AND ${claimable}
+            RETURNING *
+        `).bind(workerId, row.id, stale).first();
+    }
+
+    /**
+     * Finish a claimed segment task: DONE with the encoded frame count, or back to PENDING after a failure
+     * (FAILED once maxAttempts is reached).
+     * @param {number} taskId - Segment task ID
+     * @param {string} workerId - Agent holding the claim
+     * @param {boolean} ok - Encode + upload succeeded
+     * @param {{ frames?: number, error?: string, maxAttempts?: number }} [info]
+     * @returns {Promise<Object|null>} Updated row, null if the claim was lost
+     */
+    async finishSegmentTask(taskId, workerId, ok, { frames = 0, error = null, maxAttempts = 3 } = {}) {
+        if (ok) {
+            return await this.db.prepare(`
+                UPDATE segment_tasks SET status = 'DONE', frames = ?, error = NULL, done_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND worker_id = ? AND status = 'PROCESSING'
+                RETURNING *
+            `).bind(parseInt(frames, 10) || 0, taskId, workerId).first();
+        }
+        return await this.db.prepare(`
+            UPDATE segment_tasks
+            SET status = CASE WHEN attempts >= ? THEN 'FAILED' ELSE 'PENDING' END, worker_id = NULL, error = ?
+            WHERE id = ? AND worker_id = ? AND status = 'PROCESSING'
+            RETURNING *
+        `).bind(maxAttempts, String(error || '').slice(0, 1000), taskId, workerId).first();
+    }
+
+    /**
+     * @param {number} jobId - Job ID
+     * @returns {Promise<Object[]>} Segment tasks in seq order
+     */
+    async getSegmentTasks(jobId) {
+        const result = await this.db.prepare('SELECT * FROM segment_tasks WHERE job_id = ? ORDER BY seq ASC').bind(jobId).all();
+        return result?.results ?? [];
+    }
+
+    /**
+     * @param {number} jobId - Job ID
+     */
+    async deleteSegmentTasks(jobId) {
+        await this.db.prepare('DELETE FROM segment_tasks WHERE job_id = ?').bind(jobId).run();
+    }
+
     /**
      * Fail a job
      * @param {number} jobId - Job ID
@@ -469,7 +676,29 @@ export class JobRepository {
     }
 
     /**
-     * Mark a job as Interrupted (graceful shutdown: RAM/SIGTERM). Clears worker_id for recovery.
+     * Hand a claimed-but-not-started job back to the queue (agent prefetch/lookahead on pause or shutdown).
+     * URL imports go back to URL_IMPORT_QUEUED, uploads to PENDING; processing_checkpoint is kept so a
+     * raw copy already archived to R2 is not fetched from the source again.
+     * @param {number} jobId - Job ID
+     * @param {string} workerId - Worker that claimed the job
+     * @returns {Promise<Object|null>} Updated job or null (not claimed by this worker / already moved on)
+     */
+    async releaseClaimedJob(jobId, workerId) {
+        const result = await this.db.prepare(`
+            UPDATE conversion_jobs
+            SET status = CASE WHEN source_url IS NOT NULL AND source_url != '' THEN ? ELSE ? END,
+                worker_id = NULL,
+                started_at = NULL,
+                error_message = NULL
+            WHERE id = ? AND worker_id = ? AND status = ?
+            RETURNING *
+        `).bind(JOB_STATUS.URL_IMPORT_QUEUED, JOB_STATUS.PENDING, jobId, workerId, JOB_STATUS.PROCESSING).first();
+        return result || null;
+    }
+
+    /**
+     * Mark a job as Interrupted (graceful shutdown: RAM/SIGTERM). Clears worker_id for recovery;
+     * processing_checkpoint is kept (download_done / encode_segments:N/M let the retry resume).
      * @param {number} jobId - Job ID
      * @param {string} workerId - Worker that owned the job
      * @param {string} [stage] - Optional stage (e.g. 'download', 'convert', 'upload')
@@ -483,9 +712,7 @@ export class JobRepository {
                 interrupted_at = datetime('now'),
                 interrupted_stage = ?,
                 worker_id = NULL,
-                completed_at = NULL,
-                processing_checkpoint = NULL,
-                checkpoint_updated_at = NULL
+                completed_at = NULL
             WHERE id = ? AND worker_id = ?
             RETURNING *
         `).bind(JOB_STATUS.INTERRUPTED, stage || null, jobId, workerId).first();
@@ -494,7 +721,8 @@ export class JobRepository {
 
     /**
      * Update processing checkpoint (for resume-after-interrupt).
-     * Values: 'download_done' | 'converting' | 'upload_done'
+     * Values: 'download_done' | 'converting' | 'upload_done' | 'encode_segments:<done>/<total>'
+     * (chunks of a resumable chunked encode finished on the agent, see hetner-agent/encode_resume.py)
      * @param {number} jobId
      * @param {string} workerId
      * @param {string} checkpoint
@@ -528,7 +756,7 @@ export class JobRepository {
     }
 
     /**
-     * Set Interrupted jobs back to PENDING for retry (clear worker_id, error_message).
+     * Set Interrupted jobs back to PENDING for retry (clear worker_id, error_message; checkpoint kept for resume).
      * @param {number[]} jobIds - Job IDs to retry
      * @returns {Promise<number>} Count updated
      */
@@ -545,9 +773,7 @@ export class JobRepository {
                 interrupted_at = NULL,
                 interrupted_stage = NULL,
                 started_at = NULL,
-                completed_at = NULL,
-                processing_checkpoint = NULL,
-                checkpoint_updated_at = NULL
+                completed_at = NULL
             WHERE id IN (${placeholders}) AND status = ?
         `).bind(JOB_STATUS.PENDING, ...ids, JOB_STATUS.INTERRUPTED).run();
         return result?.meta?.changes ?? 0;
@@ -124,12 +124,26 @@ export async function handleVideoRoutes(request, env, ctx) {
         // ── Hetner agent endpoints ───────────────────────────────────────────
         if (path === '/api/jobs/release-stale-startup' && method === 'POST') return await routeReleaseStaleStartup(request, svc, env);
         if (path === '/api/jobs/claim' && method === 'POST') return await routeClaimJob(request, svc, env);
+        if (path === '/api/jobs/claim-batch' && method === 'POST') return await routeClaimJobBatch(request, svc, env);
         if (path === '/api/jobs/status' && method === 'POST') return await routeJobStatus(request, svc, env);
+        if (path === '/api/jobs/status-batch' && method === 'POST') return await routeJobStatusBatch(request, svc, env);
         if (path === '/api/jobs/presigned-upload' && method === 'POST') return await routePresignedUpload(request, svc, env);
+        if (path === '/api/jobs/multipart-complete' && method === 'POST') return await routeMultipartComplete(request, svc, env);
+        if (path === '/api/jobs/multipart-abort' && method === 'POST') return await routeMultipartAbort(request, svc, env);
         if (path === '/api/jobs/url-import-done' && method === 'POST') return await routeUrlImportDone(request, svc, env);
+        if (path === '/api/jobs/output-lookup' && method === 'POST') return await routeOutputLookup(request, svc, env);
+        if (path === '/api/jobs/copy-output' && method === 'POST') return await routeCopyOutput(request, svc, env);
+        if (path === '/api/jobs/segments/publish' && method === 'POST') return await routeSegmentsPublish(request, svc, env);
+        if (path === '/api/jobs/segments/ready' && method === 'POST') return await routeSegmentsReady(request, svc, env);
+        if (path === '/api/jobs/segments/claim' && method === 'POST') return await routeSegmentClaim(request, svc, env);
+        if (path === '/api/jobs/segments/complete' && method === 'POST') return await routeSegmentFinish(request, svc, env, true);
+        if (path === '/api/jobs/segments/fail' && method === 'POST') return await routeSegmentFinish(request, svc, env, false);
+        if (path === '/api/jobs/segments/status' && method === 'POST') return await routeSegmentsStatus(request, svc, env);
+        if (path === '/api/jobs/segments/clear' && method === 'POST') return await routeSegmentsClear(request, svc, env);
         if (path === '/api/jobs/complete' && method === 'POST') return await routeCompleteJob(request, svc, env);
         if (path === '/api/jobs/fail' && method === 'POST') return await routeFailJob(request, svc, env);
         if (path === '/api/jobs/interrupt' && method === 'POST') return await routeInterruptJob(request, svc, env);
+        if (path === '/api/jobs/release' && method === 'POST') return await routeReleaseJob(request, svc, env);
         if (path === '/api/jobs/interrupted' && method === 'GET') return await routeGetInterruptedJobs(request, svc, env);
         if (path === '/api/jobs/interrupted/retry' && method === 'POST') return await routeRetryInterruptedJobs(request, svc, env);
         if (path === '/api/jobs/reprocess' && method === 'POST') return await routeReprocessJobs(request, svc, env, ctx);
@@ -231,26 +245,175 @@ async function routeClaimJob(request, svc, env) {
     return jsonResponse({ ...job, download_url: downloadUrl, source_url: job.source_url || undefined });
 }
 
+async function routeClaimJobBatch(request, svc, env) {
+    assertWorkerAuth(request, env);
+    await updateAgentLastActivity(request, env);
+    const body = await request.json().catch(() => ({}));
+    const workerId = body.worker_id || request.headers.get('x-worker-id') || 'unknown';
+    const jobs = await svc.jobRepo.claimPendingJobs(workerId, body.max_jobs);
+    // Backlog left after this claim; the agent's preset governor sizes encode speed from it
+    const pending = await svc.jobRepo.countClaimable().catch(() => null);
+    if (jobs.length === 0) return jsonResponse({ jobs: [], count: 0, pending });
+    await svc.jobRepo.updateWorkerActivity(workerId, jobs[0].id, 'ACTIVE');
+    if (env.DB) {
+        try {
+            const processingLog = new ProcessingDetailLogRepository(env.DB);
+            for (const job of jobs) await processingLog.insert({ jobId: job.id, workerId, event: 'claimed' });
+        } catch (e) { logger.warn('ProcessingDetailLog insert (claim-batch)', { message: e?.message }); }
+    }
+    const out = await Promise.all(jobs.map(async (job) => {
+        let downloadUrl = null;
+        if (job.r2_raw_key && job.r2_raw_key !== 'url-import-pending') {
+            downloadUrl = await svc.getRawPresignedDownloadUrl(job.r2_raw_key, 3600);
+        }
+        return { ...job, download_url: downloadUrl, source_url: job.source_url || undefined };
+    }));
+    return jsonResponse({ jobs: out, count: out.length, pending });
+}
+
 async function routeJobStatus(request, svc, env) {
     assertWorkerAuth(request, env);
     await updateAgentLastActivity(request, env);
     const body = await request.json().catch(() => null);
-    const { job_id, worker_id, status, download_progress, download_bytes, download_total, checkpoint } = body;
+    const { job_id, worker_id, status, checkpoint, ...extras } = body;
     const workerId = worker_id || request.headers.get('x-worker-id') || '';
-    const job = await svc.jobRepo.updateJobStatus(job_id, workerId, status, { download_progress, download_bytes, download_total });
+    const job = await svc.jobRepo.updateJobStatus(job_id, workerId, status, extras);
     if (checkpoint) await svc.jobRepo.updateJobCheckpoint(job_id, workerId, checkpoint);
     await svc.jobRepo.updateWorkerActivity(workerId, job_id, status);
     return jsonResponse({ success: true, job_id: job.id, status: job.status });
 }
 
+// Agent status outbox: coalesced progress/status/checkpoint events flushed in one request
+const STATUS_BATCH_MAX_EVENTS = 100;
+
+async function routeJobStatusBatch(request, svc, env) {
+    assertWorkerAuth(request, env);
+    await updateAgentLastActivity(request, env);
+    const body = await request.json().catch(() => null);
+    const events = Array.isArray(body?.events) ? body.events.slice(0, STATUS_BATCH_MAX_EVENTS) : [];
+    const workerId = body?.worker_id || request.headers.get('x-worker-id') || '';
+    const results = [];
+    let last = null;
+    for (const ev of events) {
+        const { type, job_id, status, checkpoint, ...extras } = ev || {};
+        if (type === 'checkpoint') {
+            const updated = await svc.jobRepo.updateJobCheckpoint(job_id, workerId, checkpoint);
+            results.push({ job_id, ok: !!updated });
+            continue;
+        }
+        const job = await svc.jobRepo.updateJobStatus(job_id, workerId, status, extras);
+        if (checkpoint) await svc.jobRepo.updateJobCheckpoint(job_id, workerId, checkpoint);
+        results.push({ job_id, ok: !!job, status: job?.status ?? null });
+        if (job) last = job;
+    }
+    if (last) await svc.jobRepo.updateWorkerActivity(workerId, last.id, last.status);
+    return jsonResponse({ success: true, results });
+}
+
 async function routePresignedUpload(request, svc, env) {
     assertWorkerAuth(request, env);
     const body = await request.json().catch(() => null);
-    const { job_id, worker_id, bucket, key, content_type } = body;
-    const result = await svc.getPresignedUploadForAgent(job_id, worker_id, bucket, key, content_type || 'video/mp4');
+    const { job_id, worker_id, bucket, key, content_type, multipart, part_count, upload_id, part_numbers, metadata } = body;
+    if (multipart) {
+        const result = await svc.getPresignedMultipartForAgent(job_id, worker_id, bucket, key, content_type || 'video/mp4', {
+            uploadId: upload_id, partCount: part_count, partNumbers: part_numbers, metadata,
+        });
+        return jsonResponse(result);
+    }
+    const result = await svc.getPresignedUploadForAgent(job_id, worker_id, bucket, key, content_type || 'video/mp4', metadata);
+    return jsonResponse(result);
+}
+
+async function routeMultipartComplete(request, svc, env) {
+    assertWorkerAuth(request, env);
+    const body = await request.json().catch(() => null);
+    const { job_id, worker_id, bucket, key, upload_id, parts } = body;
+    const result = await svc.completeMultipartForAgent(job_id, worker_id, bucket, key, upload_id, parts);
+    return jsonResponse(result);
+}
+
+async function routeMultipartAbort(request, svc, env) {
+    assertWorkerAuth(request, env);
+    const body = await request.json().catch(() => null);
+    const { job_id, worker_id, bucket, key, upload_id } = body;
+    const result = await svc.abortMultipartForAgent(job_id, worker_id, bucket, key, upload_id);
+    return jsonResponse(result);
+}
+
+async function routeOutputLookup(request, svc, env) {
+    assertWorkerAuth(request, env);
+    const body = await request.json().catch(() => null);
+    const { job_id, worker_id, output_cache_key } = body || {};
+    if (!job_id || !worker_id || !output_cache_key) return jsonResponse({ error: 'job_id, worker_id and output_cache_key required' }, 400);
+    return jsonResponse(await svc.lookupOutputForAgent(job_id, worker_id, String(output_cache_key)));
+}
+
+async function routeCopyOutput(request, svc, env) {
+    assertWorkerAuth(request, env);
+    await updateAgentLastActivity(request, env);
+    const body = await request.json().catch(() => null);
+    const { job_id, worker_id, copies } = body || {};
+    const result = await svc.copyPublicObjectsForAgent(job_id, worker_id, copies);
+    if (result.ok && env.DB) {
+        try {
+            const storageLog = new StorageLifecycleLogRepository(env.DB);
+            await storageLog.insert({ jobId: job_id, eventType: 'r2_write', bucket: 'public', key: result.copied[0], sizeBytes: 0, reason: `Output reuse copy (${result.copied.length} objects)` });
+        } catch (e) { logger.warn('StorageLifecycleLog insert (copy-output)', { message: e?.message }); }
+    }
     return jsonResponse(result);
 }
 
+async function routeSegmentsPublish(request, svc, env) {
+    assertWorkerAuth(request, env);
+    await updateAgentLastActivity(request, env);
+    const body = await request.json().catch(() => null);
+    const { job_id, worker_id, params, segments } = body || {};
+    if (!job_id || !worker_id) return jsonResponse({ error: 'job_id and worker_id required' }, 400);
+    return jsonResponse(await svc.publishSegmentsForAgent(job_id, worker_id, params, segments));
+}
+
+async function routeSegmentsReady(request, svc, env) {
+    assertWorkerAuth(request, env);
+    const body = await request.json().catch(() => null);
+    const { job_id, worker_id, seqs } = body || {};
+    if (!job_id || !worker_id) return jsonResponse({ error: 'job_id and worker_id required' }, 400);
+    return jsonResponse(await svc.markSegmentsReadyForAgent(job_id, worker_id, seqs));
+}
+
+async function routeSegmentClaim(request, svc, env) {
+    assertWorkerAuth(request, env);
+    await updateAgentLastActivity(request, env);
+    const body = await request.json().catch(() => null);
+    const { worker_id, job_id } = body || {};
+    if (!worker_id) return jsonResponse({ error: 'worker_id required' }, 400);
+    return jsonResponse(await svc.claimSegmentForAgent(worker_id, job_id || null));
+}
+
+async function routeSegmentFinish(request, svc, env, ok) {
+    assertWorkerAuth(request, env);
+    await updateAgentLastActivity(request, env);
+    const body = await request.json().catch(() => null);
+    const { task_id, worker_id, frames, error } = body || {};
+    if (!task_id || !worker_id) return jsonResponse({ error: 'task_id and worker_id required' }, 400);
+    return jsonResponse(await svc.finishSegmentForAgent(task_id, worker_id, ok, { frames, error }));
+}
+
+async function routeSegmentsStatus(request, svc, env) {
+    assertWorkerAuth(request, env);
+    const body = await request.json().catch(() => null);
+    const { job_id, worker_id } = body || {};
+    if (!job_id || !worker_id) return jsonResponse({ error: 'job_id and worker_id required' }, 400);
+    return jsonResponse(await svc.segmentStatusForAgent(job_id, worker_id));
+}
+
+async function routeSegmentsClear(request, svc, env) {
+    assertWorkerAuth(request, env);
+    const body = await request.json().catch(() => null);
+    const { job_id, worker_id } = body || {};
+    if (!job_id || !worker_id) return jsonResponse({ error: 'job_id and worker_id required' }, 400);
+    return jsonResponse(await svc.clearSegmentsForAgent(job_id, worker_id));
+}
+
 async function routeUrlImportDone(request, svc, env) {
     assertWorkerAuth(request, env);
     await updateAgentLastActivity(request, env);
@@ -282,7 +445,12 @@ async function routeCompleteJob(request, svc, env) {
                 workerId: worker_id,
                 event: 'completed',
                 processingTimeSeconds: data?.processing_time_seconds ?? job.processing_time_seconds,
-                details: { file_size_output: data?.file_size_output ?? job.file_size_output, duration: data?.duration ?? job.duration }
+                details: {
+                    file_size_output: data?.file_size_output ?? job.file_size_output,
+                    duration: data?.duration ?? job.duration,
+                    // Agent encode path: x264 | chunked | copy (web_opt) | remux (compliant source, no re-encode)
+                    ...(data?.encode_path ? { encode_path: String(data.encode_path).slice(0, 20) } : {}),
+                }
             });
         } catch (e) { logger.warn('ProcessingDetailLog insert (complete)', { message: e?.message }); }
         try {
@@ -334,6 +502,16 @@ async function routeInterruptJob(request, svc, env) {
     return jsonResponse({ success: true, job_id: job.id, status: JOB_STATUS.INTERRUPTED });
 }
 
+async function routeReleaseJob(request, svc, env) {
+    assertWorkerAuth(request, env);
+    const data = await request.json().catch(() => null);
+    const { job_id, worker_id, reason } = data || {};
+    if (!job_id || !worker_id) return jsonResponse({ error: 'job_id and worker_id required' }, 400);
+    const job = await svc.jobRepo.releaseClaimedJob(job_id, worker_id);
+    if (job) logger.info('Job handed back by agent', { job_id, worker_id, reason: reason || null, status: job.status });
+    return jsonResponse({ success: true, released: !!job, job_id, status: job ? job.status : null });
+}
+
 async function routeGetInterruptedJobs(request, svc, env) {
     const url = new URL(request.url);
     const limit = Math.min(100, Math.max(1, parseInt(url.searchParams.get('limit') || '100', 10)));
@@ -368,7 +546,8 @@ async function routeHeartbeat(request, svc, env) {
     await updateAgentLastActivity(request, env);
     const data = await request.json().catch(() => ({}));
     const workerId = data.worker_id || request.headers.get('x-worker-id') || 'unknown';
-    const { status = 'ACTIVE', version, current_job_id, ip_address, disk_free_mb, ram_used_pct } = data;
+    const { status = 'ACTIVE', version, current_job_id, ip_address, disk_free_mb, ram_used_pct, buffered, turnaround_p50_sec, turnaround_p95_sec,
+        encode_preset, encode_crf_offset, backlog_drain_est_sec } = data;
     const heartbeatData = { status, current_job_id, ip_address, version };
     await svc.jobRepo.updateWorkerHeartbeat(workerId, heartbeatData);
     const ip = request.headers.get('CF-Connecting-IP') || 'unknown';
@@ -382,7 +561,18 @@ async function routeHeartbeat(request, svc, env) {
                 status,
                 diskFreeMb: disk_free_mb ?? null,
                 ramUsedPct: ram_used_pct ?? null,
-                details: { current_job_id: current_job_id ?? null, ip_address: ip_address || null },
+                details: {
+                    current_job_id: current_job_id ?? null,
+                    ip_address: ip_address || null,
+                    // Agent admission buffer + job turnaround percentiles (claim → finished)
+                    buffered: buffered ?? null,
+                    turnaround_p50_sec: turnaround_p50_sec ?? null,
+                    turnaround_p95_sec: turnaround_p95_sec ?? null,
+                    // Agent preset governor step + its backlog drain estimate
+                    encode_preset: encode_preset ?? null,
+                    encode_crf_offset: encode_crf_offset ?? null,
+                    backlog_drain_est_sec: backlog_drain_est_sec ?? null,
+                },
             });
         } catch (e) { logger.warn('AgentHealthLog insert (heartbeat)', { message: e?.message }); }
     }
@@ -410,10 +600,9 @@ async function routeGetAlerts(request, svc, env) {
 }
 
 async function routeMarkZombieJobs(request, svc, env) {
-    const ZOMBIE_TIMEOUT_MIN = 45;
-    const cutoff = new Date(Date.now() - ZOMBIE_TIMEOUT_MIN * 60 * 1000).toISOString();
-    const result = await env.DB.prepare('UPDATE conversion_jobs SET status = ? WHERE status = ? AND started_at < ? RETURNING id').bind(JOB_STATUS.FAILED, JOB_STATUS.PROCESSING, cutoff).all();
-    return jsonResponse({ success: true, marked: (result.results || []).length });
+    const ids = await svc.jobRepo.markZombieJobs();
+    if (ids.length) logger.warn('Zombie jobs marked FAILED', { job_ids: ids });
+    return jsonResponse({ success: true, marked: ids.length });
 }
 
 async function routeUpdateCheckpoint(request, svc, env) {
@@ -434,6 +623,8 @@ async function routeGetStatus(request, svc, env) {
 function normalizeQuality(q) {
     if (!q) return '';
     const s = String(q).toLowerCase();
+    // Ladder: "720p,1080p" → one decode, one rendition per quality (agent splits the list)
+    if (s.includes(',')) return [...new Set(s.split(',').map(p => normalizeQuality(p.trim())).filter(Boolean))].join(',');
     if (['720p', '720p_web'].includes(s)) return '720p';
     if (['1080p', '1080p_web'].includes(s)) return '1080p';
     return s;
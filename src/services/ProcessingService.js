@@ -11,6 +11,76 @@ import { validateR2Key } from '../utils/videoValidation.js';
 import { logger } from '../utils/logger.js';
 
 const RAW_BUCKET = 'R2_RAW_UPLOADS_BUCKET';
+const PUBLIC_BUCKET = 'R2_PUBLIC_BUCKET';
+const MULTIPART_MAX_PARTS = 10000;
+// Video + renditions + thumbnail + storyboard sheets of one job
+const OUTPUT_COPY_MAX = 200;
+// Segment fan-out: chunks per job, claims without a finish after this long go back to the pool
+const SEGMENT_TASKS_MAX = 2000;
+const SEGMENT_STALE_MINUTES = 30;
+const SEGMENT_MAX_ATTEMPTS = 3;
+
+/**
+ * Raw-bucket prefix holding a job's segment sources and encoded segments.
+ * @param {number} jobId
+ * @returns {string}
+ */
+export function segmentPrefix(jobId) {
+    return `segments/${parseInt(jobId, 10)}/`;
+}
+
+/**
+ * Agent object metadata (e.g. { sha256 }) → signed x-amz-meta-* headers. Unknown shapes are dropped.
+ * @param {Object} [metadata]
+ * @returns {Object<string, string>}
+ */
+export function agentMetadataHeaders(metadata) {
+    const headers = {};
+    if (!metadata || typeof metadata !== 'object') return headers;
+    for (const [name, value] of Object.entries(metadata).slice(0, 8)) {
+        const k = String(name).toLowerCase();
+        const v = String(value ?? '');
+        if (/^[a-z0-9-]{1,64}$/.test(k) && /^[A-Za-z0-9._:-]{1,256}$/.test(v)) headers[`x-amz-meta-${k}`] = v;
+    }
+    return headers;
+}
+
+/**
+ * True when an output key belongs to the given job (videos/<y>/<m>/<job>_… or thumbnails/<job>/…).
+ * @param {string} key
+ * @param {number} jobId
+ * @returns {boolean}
+ */
+export function isJobOutputKey(key, jobId) {
+    const k = String(key || '');
+    if (k.startsWith(`thumbnails/${jobId}/`)) return true;
+    return /^videos\/\d{4}\/\d{2}\/(\d+)_/.exec(k)?.[1] === String(jobId);
+}
+
+/**
+ * Parse CreateMultipartUpload XML → UploadId (null if missing).
+ * @param {string} xml
+ * @returns {string|null}
+ */
+export function parseInitiateMultipartUploadResponse(xml) {
+    return String(xml || '').match(/<UploadId>([^<]+)<\/UploadId>/)?.[1] ?? null;
+}
+
+/**
+ * Build CompleteMultipartUpload XML body from agent part list (sorted by part number).
+ * @param {Array<{ part_number: number, etag: string }>} parts
+ * @returns {string}
+ */
+export function buildCompleteMultipartUploadXml(parts) {
+    const body = [...parts]
+        .sort((a, b) => a.part_number - b.part_number)
+        .map(p => {
+            const etag = String(p.etag || '').replace(/"/g, '');
+            return `<Part><PartNumber>${parseInt(p.part_number, 10)}</PartNumber><ETag>"${etag}"</ETag></Part>`;
+        })
+        .join('');
+    return `<CompleteMultipartUpload>${body}</CompleteMultipartUpload>`;
+}
 
 export class ProcessingService {
     constructor(env, jobRepo) {
@@ -21,6 +91,14 @@ export class ProcessingService {
     async getRawPresignedDownloadUrl(r2RawKey, expiresInSeconds = 3600) {
         if (!r2RawKey || r2RawKey === 'url-import-pending') return null;
         validateR2Key(r2RawKey, ['raw-uploads/']);
+        return this._presignRawObject(r2RawKey, 'GET', expiresInSeconds);
+    }
+
+    /**
+     * Presigned GET/PUT URL for a raw-bucket key (null without R2 credentials). Callers validate the key.
+     * @returns {Promise<string|null>}
+     */
+    async _presignRawObject(key, method, expiresInSeconds = 3600) {
         const accountId = this.env.R2_ACCOUNT_ID;
         const accessKeyId = this.env.R2_ACCESS_KEY_ID;
         const secretKey = this.env.R2_SECRET_ACCESS_KEY;
@@ -28,42 +106,306 @@ export class ProcessingService {
         if (!accountId || !accessKeyId || !secretKey) return null;
         try {
             const client = new AwsClient({ accessKeyId, secretAccessKey: secretKey, region: 'auto', service: 's3' });
-            const url = `https://${accountId}.r2.cloudflarestorage.com/${bucketName}/${r2RawKey}?X-Amz-Expires=${expiresInSeconds}`;
-            const signed = await client.sign(new Request(url, { method: 'GET' }), { aws: { signQuery: true } });
+            const url = `https://${accountId}.r2.cloudflarestorage.com/${bucketName}/${key}?X-Amz-Expires=${expiresInSeconds}`;
+            const signed = await client.sign(new Request(url, { method }), { aws: { signQuery: true } });
             return signed.url;
         } catch (e) {
-            logger.error('R2 presigned GET failed', { message: e?.message || String(e) });
+            logger.error(`R2 presigned ${method} failed`, { message: e?.message || String(e) });
             return null;
         }
     }
 
-    async getPresignedUploadForAgent(jobId, workerId, bucket, key, contentType = 'video/mp4') {
+    /**
+     * Job claimed by this worker and still processing (agent-side writes are only allowed then).
+     * @returns {Promise<Object>}
+     */
+    async _agentJob(jobId, workerId) {
         const job = await this.jobRepo.getById(jobId);
         if (!job) throw new NotFoundError('Job', String(jobId));
         if (job.worker_id !== workerId) throw new ValidationError('Job not claimed by this worker');
         if (!PROCESSING_STATUSES.includes(job.status)) throw new ValidationError('Job must be in PROCESSING state');
-        const allowedPrefixes = bucket === 'raw' ? ['raw-uploads/'] : ['videos/', 'thumbnails/'];
+        return job;
+    }
+
+    /**
+     * Validate agent upload target (job claimed by worker, allowed key prefix) and return S3 client + object URL.
+     * @returns {Promise<{ client: AwsClient, objectUrl: string }>}
+     */
+    async _agentUploadTarget(jobId, workerId, bucket, key) {
+        await this._agentJob(jobId, workerId);
+        const allowedPrefixes = bucket === 'raw' ? ['raw-uploads/', segmentPrefix(jobId)] : ['videos/', 'thumbnails/'];
         validateR2Key(key, allowedPrefixes);
         const accountId = this.env.R2_ACCOUNT_ID;
         const accessKeyId = this.env.R2_ACCESS_KEY_ID;
         const secretKey = this.env.R2_SECRET_ACCESS_KEY;
         const bucketName = bucket === 'raw' ? (this.env.R2_RAW_BUCKET_NAME || 'bk-video-raw') : (this.env.R2_PUBLIC_BUCKET_NAME || 'bk-video-public');
-        if (accountId && accessKeyId && secretKey) {
-            try {
-                const client = new AwsClient({ accessKeyId, secretAccessKey: secretKey, region: 'auto', service: 's3' });
-                const expiresIn = 3600;
-                const url = `https://${accountId}.r2.cloudflarestorage.com/${bucketName}/${key}?X-Amz-Expires=${expiresIn}`;
-                const signed = await client.sign(new Request(url, { method: 'PUT' }), { aws: { signQuery: true } });
-                return { upload_url: signed.url, expires_in: expiresIn };
-            } catch (e) {
-                logger.error('R2 presigned upload failed', { message: e?.message || String(e) });
-            }
+        if (!accountId || !accessKeyId || !secretKey) {
+            const err = new ValidationError('R2 presigned upload URL could not be generated. Set R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY.');
+            err.errorCode = BK_ERROR_CODES.R2_BUCKET_NOT_FOUND;
+            throw err;
+        }
+        const client = new AwsClient({ accessKeyId, secretAccessKey: secretKey, region: 'auto', service: 's3' });
+        return { client, objectUrl: `https://${accountId}.r2.cloudflarestorage.com/${bucketName}/${key}` };
+    }
+
+    async getPresignedUploadForAgent(jobId, workerId, bucket, key, contentType = 'video/mp4', metadata = null) {
+        const { client, objectUrl } = await this._agentUploadTarget(jobId, workerId, bucket, key);
+        try {
+            const expiresIn = 3600;
+            const url = `${objectUrl}?X-Amz-Expires=${expiresIn}`;
+            // Metadata headers are part of the signature: the agent must send them with the PUT
+            const headers = agentMetadataHeaders(metadata);
+            const signed = await client.sign(new Request(url, { method: 'PUT', headers }), { aws: { signQuery: true } });
+            return Object.keys(headers).length
+                ? { upload_url: signed.url, headers, expires_in: expiresIn }
+                : { upload_url: signed.url, expires_in: expiresIn };
+        } catch (e) {
+            logger.error('R2 presigned upload failed', { message: e?.message || String(e) });
         }
         const err = new ValidationError('R2 presigned upload URL could not be generated. Set R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY.');
         err.errorCode = BK_ERROR_CODES.R2_BUCKET_NOT_FOUND;
         throw err;
     }
 
+    /**
+     * Agent multipart upload: create the upload (unless uploadId is given) and presign UploadPart URLs.
+     * Re-calling with uploadId + partNumbers re-signs only those parts (agent retry after URL expiry).
+     * @returns {Promise<{ upload_id: string, part_urls: Array<{ part_number: number, url: string }>, expires_in: number }>}
+     */
+    async getPresignedMultipartForAgent(jobId, workerId, bucket, key, contentType = 'video/mp4', { uploadId, partCount, partNumbers, metadata } = {}) {
+        const { client, objectUrl } = await this._agentUploadTarget(jobId, workerId, bucket, key);
+        let numbers = Array.isArray(partNumbers) && partNumbers.length
+            ? partNumbers.map(n => parseInt(n, 10))
+            : Array.from({ length: parseInt(partCount, 10) || 0 }, (_, i) => i + 1);
+        if (!numbers.length || numbers.some(n => isNaN(n) || n < 1 || n > MULTIPART_MAX_PARTS)) {
+            throw new ValidationError(`part_count must be 1..${MULTIPART_MAX_PARTS}`);
+        }
+        if (!uploadId) {
+            const createReq = new Request(`${objectUrl}?uploads`, {
+                method: 'POST',
+                headers: { 'Content-Type': contentType, ...agentMetadataHeaders(metadata) },
+            });
+            const res = await fetch(await client.sign(createReq));
+            const xml = await res.text();
+            uploadId = res.ok ? parseInitiateMultipartUploadResponse(xml) : null;
+            if (!uploadId) {
+                logger.error('R2 CreateMultipartUpload failed', { status: res.status, body: xml?.slice(0, 200) });
+                throw new ValidationError('R2 multipart upload could not be created');
+            }
+        }
+        const expiresIn = 3600;
+        const partUrls = [];
+        for (const n of numbers) {
+            const url = `${objectUrl}?partNumber=${n}&uploadId=${encodeURIComponent(uploadId)}&X-Amz-Expires=${expiresIn}`;
+            const signed = await client.sign(new Request(url, { method: 'PUT' }), { aws: { signQuery: true } });
+            partUrls.push({ part_number: n, url: signed.url });
+        }
+        return { upload_id: uploadId, part_urls: partUrls, expires_in: expiresIn };
+    }
+
+    async completeMultipartForAgent(jobId, workerId, bucket, key, uploadId, parts) {
+        if (!uploadId || !Array.isArray(parts) || !parts.length) throw new ValidationError('upload_id and parts are required');
+        const { client, objectUrl } = await this._agentUploadTarget(jobId, workerId, bucket, key);
+        const req = new Request(`${objectUrl}?uploadId=${encodeURIComponent(uploadId)}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/xml' },
+            body: buildCompleteMultipartUploadXml(parts),
+        });
+        const res = await fetch(await client.sign(req));
+        const text = await res.text();
+        // S3 may return 200 with an <Error> body for CompleteMultipartUpload
+        if (!res.ok || text.includes('<Error>')) {
+            logger.error('R2 CompleteMultipartUpload failed', { status: res.status, body: text?.slice(0, 200) });
+            throw new ValidationError('R2 multipart upload could not be completed');
+        }
+        return { ok: true };
+    }
+
+    async abortMultipartForAgent(jobId, workerId, bucket, key, uploadId) {
+        if (!uploadId) throw new ValidationError('upload_id is required');
+        const { client, objectUrl } = await this._agentUploadTarget(jobId, workerId, bucket, key);
+        const req = new Request(`${objectUrl}?uploadId=${encodeURIComponent(uploadId)}`, { method: 'DELETE' });
+        const res = await fetch(await client.sign(req));
+        return { ok: res.ok || res.status === 204 };
+    }
+
+    /**
+     * Output reuse: copy another job's public objects (same source SHA-256 + encode settings) to this job's keys.
+     * Targets must belong to the claimed job; a missing source rolls back the copies made so far.
+     * @param {Array<{ from_key: string, to_key: string }>} copies
+     * @returns {Promise<{ ok: boolean, copied: string[], missing?: string }>}
+     */
+    async copyPublicObjectsForAgent(jobId, workerId, copies) {
+        if (!Array.isArray(copies) || !copies.length || copies.length > OUTPUT_COPY_MAX) {
+            throw new ValidationError(`copies must hold 1..${OUTPUT_COPY_MAX} items`);
+        }
+        const job = await this._agentJob(jobId, workerId);
+        for (const c of copies) {
+            validateR2Key(c?.from_key, ['videos/', 'thumbnails/']);
+            validateR2Key(c?.to_key, ['videos/', 'thumbnails/']);
+            if (!isJobOutputKey(c.to_key, job.id)) throw new ValidationError(`to_key must belong to job ${job.id}`);
+        }
+        const bucket = this.env[PUBLIC_BUCKET];
+        if (!bucket) throw new ValidationError('R2 public bucket binding missing');
+        const copied = [];
+        for (const { from_key, to_key } of copies) {
+            const obj = await bucket.get(from_key);
+            if (!obj) {
+                await Promise.allSettled(copied.map(k => bucket.delete(k)));
+                return { ok: false, copied: [], missing: from_key };
+            }
+            await bucket.put(to_key, obj.body, {
+                httpMetadata: obj.httpMetadata || {},
+                customMetadata: { ...(obj.customMetadata || {}), copiedFrom: from_key },
+            });
+            copied.push(to_key);
+        }
+        return { ok: true, copied };
+    }
+
+    /**
+     * Completed output for an agent cache key (source SHA-256 + encode settings), or { found: false }.
+     * @returns {Promise<{ found: boolean, job_id?: number, result?: Object }>}
+     */
+    async lookupOutputForAgent(jobId, workerId, outputCacheKey) {
+        await this._agentJob(jobId, workerId);
+        const hit = await this.jobRepo.findCompletedByOutputKey(outputCacheKey, jobId);
+        if (!hit || !hit.public_url) return { found: false };
+        let renditions = [];
+        try {
+            renditions = hit.renditions ? JSON.parse(hit.renditions) : [];
+        } catch {
+            renditions = [];
+        }
+        return {
+            found: true,
+            job_id: hit.id,
+            result: {
+                public_url: hit.public_url,
+                file_size_output: hit.file_size_output,
+                duration: hit.duration,
+                processing_time_seconds: hit.processing_time_seconds,
+                resolution: hit.resolution,
+                bitrate: hit.bitrate,
+                codec: hit.codec,
+                frame_rate: hit.frame_rate,
+                audio_codec: hit.audio_codec,
+                audio_bitrate: hit.audio_bitrate,
+                thumbnail_key: hit.thumbnail_key,
+                storyboard_key: hit.storyboard_key || null,
+                renditions,
+            },
+        };
+    }
+
+    /**
+     * Segment fan-out: the owner agent publishes the keyframe chunks of its job as tasks for peer agents.
+     * Replaces earlier tasks of the job; every key must live under segments/<job>/ in the raw bucket.
+     * @param {Object} params - Encode parameters shared by all segments (crf, scales, out_res, ...)
+     * @param {Array<{ seq: number, src_key: string, out_keys: string[], duration?: number, packets?: number }>} segments
+     * @returns {Promise<{ ok: boolean, count: number }>}
+     */
+    async publishSegmentsForAgent(jobId, workerId, params, segments) {
+        if (!Array.isArray(segments) || !segments.length || segments.length > SEGMENT_TASKS_MAX) {
+            throw new ValidationError(`segments must hold 1..${SEGMENT_TASKS_MAX} items`);
+        }
+        const job = await this._agentJob(jobId, workerId);
+        const prefix = segmentPrefix(job.id);
+        const tasks = segments.map(s => {
+            const outKeys = Array.isArray(s?.out_keys) ? s.out_keys.map(String) : [];
+            if (!outKeys.length) throw new ValidationError('out_keys is required for every segment');
+            validateR2Key(s.src_key, [prefix]);
+            outKeys.forEach(k => validateR2Key(k, [prefix]));
+            const seq = parseInt(s.seq, 10);
+            if (!Number.isInteger(seq) || seq < 0) throw new ValidationError('seq must be a non-negative integer');
+            return { seq, src_key: s.src_key, out_keys: outKeys, duration: Number(s.duration) || 0, packets: parseInt(s.packets, 10) || 0 };
+        });
+        const count = await this.jobRepo.replaceSegmentTasks(job.id, workerId, params, tasks);
+        return { ok: true, count };
+    }
+
+    /**
+     * Owner uploaded these segment sources: peers may claim them now.
+     * @returns {Promise<{ ok: boolean }>}
+     */
+    async markSegmentsReadyForAgent(jobId, workerId, seqs) {
+        const job = await this._agentJob(jobId, workerId);
+        const list = (Array.isArray(seqs) ? seqs : []).map(n => parseInt(n, 10)).filter(n => Number.isInteger(n) && n >= 0);
+        await this.jobRepo.markSegmentSourcesReady(job.id, list.slice(0, SEGMENT_TASKS_MAX));
+        return { ok: true };
+    }
+
+    /**
+     * Claim a segment task. With jobId the owner takes a chunk of its own job (it has the source locally,
+     * keeps the output locally); without, a peer gets a presigned GET for the source and one PUT per output.
+     * @returns {Promise<{ task: Object|null }>}
+     */
+    async claimSegmentForAgent(workerId, jobId = null) {
+        if (jobId) await this._agentJob(jobId, workerId);
+        const row = await this.jobRepo.claimSegmentTask(workerId, jobId || null, SEGMENT_STALE_MINUTES);
+        if (!row) return { task: null };
+        const outKeys = JSON.parse(row.out_keys || '[]');
+        const task = {
+            id: row.id, job_id: row.job_id, seq: row.seq, duration: row.duration, packets: row.packets,
+            attempts: row.attempts, src_key: row.src_key, out_keys: outKeys, params: JSON.parse(row.params || '{}'),
+        };
+        if (!jobId) {
+            task.download_url = await this._presignRawObject(row.src_key, 'GET');
+            task.upload_urls = await Promise.all(outKeys.map(k => this._presignRawObject(k, 'PUT')));
+            if (!task.download_url || task.upload_urls.some(u => !u)) {
+                await this.jobRepo.finishSegmentTask(row.id, workerId, false, { error: 'presign failed', maxAttempts: SEGMENT_MAX_ATTEMPTS });
+                const err = new ValidationError('R2 presigned URL could not be generated. Set R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY.');
+                err.errorCode = BK_ERROR_CODES.R2_BUCKET_NOT_FOUND;
+                throw err;
+            }
+        }
+        return { task };
+    }
+
+    /**
+     * Finish a claimed segment: done (encoded frame count) or failed (back to the pool until attempts run out).
+     * @returns {Promise<{ ok: boolean, status: string|null }>}
+     */
+    async finishSegmentForAgent(taskId, workerId, ok, { frames = 0, error = null } = {}) {
+        const row = await this.jobRepo.finishSegmentTask(parseInt(taskId, 10), workerId, !!ok,
+            { frames, error, maxAttempts: SEGMENT_MAX_ATTEMPTS });
+        return { ok: !!row, status: row?.status ?? null };
+    }
+
+    /**
+     * Segment progress for the owner; chunks encoded by peers come with presigned GETs of their outputs.
+     * @returns {Promise<{ tasks: Object[] }>}
+     */
+    async segmentStatusForAgent(jobId, workerId) {
+        const job = await this._agentJob(jobId, workerId);
+        const rows = await this.jobRepo.getSegmentTasks(job.id);
+        const tasks = [];
+        for (const r of rows) {
+            const t = { id: r.id, seq: r.seq, status: r.status, worker_id: r.worker_id, attempts: r.attempts, frames: r.frames, error: r.error };
+            if (r.status === 'DONE' && r.worker_id !== r.owner_worker_id) {
+                t.download_urls = await Promise.all(JSON.parse(r.out_keys || '[]').map(k => this._presignRawObject(k, 'GET')));
+            }
+            tasks.push(t);
+        }
+        return { tasks };
+    }
+
+    /**
+     * Drop a job's segment tasks and their R2 objects (owner assembled the output, or gave up).
+     * @returns {Promise<{ ok: boolean, deleted: number }>}
+     */
+    async clearSegmentsForAgent(jobId, workerId) {
+        const job = await this._agentJob(jobId, workerId);
+        const rows = await this.jobRepo.getSegmentTasks(job.id);
+        const keys = rows.flatMap(r => [r.src_key, ...JSON.parse(r.out_keys || '[]')]);
+        const bucket = this.env[RAW_BUCKET];
+        if (bucket && keys.length) {
+            for (let i = 0; i < keys.length; i += 1000) await bucket.delete(keys.slice(i, i + 1000));
+        }
+        await this.jobRepo.deleteSegmentTasks(job.id);
+        return { ok: true, deleted: keys.length };
+    }
+
     async urlImportDone(jobId, workerId, r2RawKey, fileSizeInput) {
         validateR2Key(r2RawKey, ['raw-uploads/']);
         const updated = await this.jobRepo.updateJobRawKeyAfterUrlImport(jobId, workerId, r2RawKey, fileSizeInput);
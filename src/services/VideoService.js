@@ -51,8 +51,52 @@ export class VideoService {
         return this.processingService.getRawPresignedDownloadUrl(r2RawKey, expiresInSeconds);
     }
 
-    async getPresignedUploadForAgent(jobId, workerId, bucket, key, contentType = 'video/mp4') {
-        return this.processingService.getPresignedUploadForAgent(jobId, workerId, bucket, key, contentType);
+    async getPresignedUploadForAgent(jobId, workerId, bucket, key, contentType = 'video/mp4', metadata = null) {
+        return this.processingService.getPresignedUploadForAgent(jobId, workerId, bucket, key, contentType, metadata);
+    }
+
+    async getPresignedMultipartForAgent(jobId, workerId, bucket, key, contentType = 'video/mp4', opts = {}) {
+        return this.processingService.getPresignedMultipartForAgent(jobId, workerId, bucket, key, contentType, opts);
+    }
+
+    async completeMultipartForAgent(jobId, workerId, bucket, key, uploadId, parts) {
+        return this.processingService.completeMultipartForAgent(jobId, workerId, bucket, key, uploadId, parts);
+    }
+
+    async abortMultipartForAgent(jobId, workerId, bucket, key, uploadId) {
+        return this.processingService.abortMultipartForAgent(jobId, workerId, bucket, key, uploadId);
+    }
+
+    async copyPublicObjectsForAgent(jobId, workerId, copies) {
+        return this.processingService.copyPublicObjectsForAgent(jobId, workerId, copies);
+    }
+
+    async lookupOutputForAgent(jobId, workerId, outputCacheKey) {
+        return this.processingService.lookupOutputForAgent(jobId, workerId, outputCacheKey);
+    }
+
+    async publishSegmentsForAgent(jobId, workerId, params, segments) {
+        return this.processingService.publishSegmentsForAgent(jobId, workerId, params, segments);
+    }
+
+    async markSegmentsReadyForAgent(jobId, workerId, seqs) {
+        return this.processingService.markSegmentsReadyForAgent(jobId, workerId, seqs);
+    }
+
+    async claimSegmentForAgent(workerId, jobId) {
+        return this.processingService.claimSegmentForAgent(workerId, jobId);
+    }
+
+    async finishSegmentForAgent(taskId, workerId, ok, info) {
+        return this.processingService.finishSegmentForAgent(taskId, workerId, ok, info);
+    }
+
+    async segmentStatusForAgent(jobId, workerId) {
+        return this.processingService.segmentStatusForAgent(jobId, workerId);
+    }
+
+    async clearSegmentsForAgent(jobId, workerId) {
+        return this.processingService.clearSegmentsForAgent(jobId, workerId);
     }
 
     async urlImportDone(jobId, workerId, r2RawKey, fileSizeInput) {
@@ -31,6 +31,8 @@ const TRANSCODE_STATUS = {
 const QUALITY_PROFILE = {
     '720p':  { width: 1280, height: 720,  label: '720p HD',      rendition: 'hd' },
     '1080p': { width: 1920, height: 1080, label: '1080p Full HD', rendition: 'fhd' },
+    '2k':    { width: 2560, height: 1440, label: '1440p QHD',    rendition: 'qhd' },
+    '4k':    { width: 3840, height: 2160, label: '2160p 4K UHD', rendition: 'uhd' },
 };
 
 // ─── Utilities ────────────────────────────────────────────────────────────────
@@ -42,6 +44,43 @@ function formatBytes(bytes) {
     return `${(bytes / 1024 ** i).toFixed(1)} ${units[i]}`;
 }
 
+/** Ladder jobs: conversion_jobs.renditions JSON → array (empty for single-output jobs / bad JSON) */
+function parseRenditions(raw) {
+    if (!raw) return [];
+    try {
+        const list = typeof raw === 'string' ? JSON.parse(raw) : raw;
+        return Array.isArray(list) ? list.filter(r => r && r.public_url) : [];
+    } catch {
+        return [];
+    }
+}
+
+/** One entry of VideoDTO.files — rendition fields override the job row (single output: job row only) */
+function fileEntry(job, r, fallbackProfile) {
+    const profile = QUALITY_PROFILE[r.quality] || fallbackProfile;
+    const resolution = r.resolution || job.resolution;
+    const size = r.file_size_output ?? job.file_size_output;
+    return {
+        quality:       r.quality,
+        rendition:     profile.rendition,
+        type:          'video/mp4',
+        width:         resolution ? parseInt(resolution.split('x')[0]) : profile.width,
+        height:        resolution ? parseInt(resolution.split('x')[1]) : profile.height,
+        link:          normalizePublicUrl(r.public_url || ''),
+        link_expiry:   null,
+        created_time:  isoOrNull(job.completed_at),
+        fps:           job.frame_rate   || 30,
+        size:          size || 0,
+        size_short:    formatBytes(size),
+        md5:           null,
+        public_name:   profile.label,
+        codec:         job.codec        || 'h264',
+        audio_codec:   job.audio_codec  || 'aac',
+        bitrate:       r.bitrate ?? (job.bitrate || 0),
+        audio_bitrate: job.audio_bitrate || 128,
+    };
+}
+
 function isoOrNull(value) {
     if (!value) return null;
     try { return new Date(value).toISOString(); } catch { return null; }
@@ -64,6 +103,7 @@ export class VideoDTO {
         const profile    = QUALITY_PROFILE[job.quality] || QUALITY_PROFILE['720p'];
         const isComplete = job.status === JOB_STATUS.COMPLETED;
         const publicUrl  = normalizePublicUrl(job.public_url || '');
+        const renditions = parseRenditions(job.renditions);
         const compressionRatio =
             job.file_size_input && job.file_size_output
                 ? Math.round((1 - job.file_size_output / job.file_size_input) * 100)
@@ -101,25 +141,8 @@ export class VideoDTO {
             // ── Renditions / Files (R2 public bucket URL) ──────────────────────
             // Only present when transcode.status === 'complete'; PLAY_01: normalized URL
             files: isComplete && publicUrl
-                ? [{
-                    quality:       job.quality,
-                    rendition:     profile.rendition,
-                    type:          'video/mp4',
-                    width:         job.resolution ? parseInt(job.resolution.split('x')[0]) : profile.width,
-                    height:        job.resolution ? parseInt(job.resolution.split('x')[1]) : profile.height,
-                    link:          publicUrl,
-                    link_expiry:   null,
-                    created_time:  isoOrNull(job.completed_at),
-                    fps:           job.frame_rate   || 30,
-                    size:          job.file_size_output || 0,
-                    size_short:    formatBytes(job.file_size_output),
-                    md5:           null,
-                    public_name:   profile.label,
-                    codec:         job.codec        || 'h264',
-                    audio_codec:   job.audio_codec  || 'aac',
-                    bitrate:       job.bitrate       || 0,
-                    audio_bitrate: job.audio_bitrate || 128,
-                }]
+                ? (renditions.length ? renditions : [{ quality: job.quality, public_url: job.public_url }])
+                    .map(r => fileEntry(job, r, profile))
                 : [],
 
             // ── Thumbnail — set when Hetner agent uploads via POST /api/jobs/complete ──
@@ -161,6 +184,8 @@ export class VideoDTO {
 
             // ── Convenience URLs (derived from pictures.base_link) ────────────
             thumbnail_url: job.thumbnail_key ? `${cdnBase}/${job.thumbnail_key}` : null,
+            // WebVTT thumbnail track for player scrubbing (sprite sheet + #xywh per cue); null without storyboard
+            storyboard_url: job.storyboard_key ? `${cdnBase}/${job.storyboard_key}` : null,
 
             // ── BK Platform Extension ─────────────────────────────────────────
             bk: {
@@ -186,6 +211,7 @@ export class VideoDTO {
                 ffmpeg_command:          job.ffmpeg_command          || null,
                 thumbnail_key:           job.thumbnail_key           || null,
                 thumbnail_url:           job.thumbnail_key ? `${cdnBase}/${job.thumbnail_key}` : null, // mirrors root thumbnail_url
+                storyboard_key:          job.storyboard_key          || null,
                 deleted_at:              job.deleted_at              || null,
                 view_count:              job.view_count ?? 0,
                 processing_profile:      job.processing_profile      || '12',
@@ -193,6 +219,10 @@ export class VideoDTO {
                 download_progress:       job.download_progress ?? 0,
                 download_bytes:          job.download_bytes ?? 0,
                 download_total:          job.download_total ?? 0,
+                encode_progress:         job.encode_progress ?? null,
+                encode_fps:              job.encode_fps ?? null,
+                encode_speed:            job.encode_speed ?? null,
+                encode_eta_seconds:      job.encode_eta_seconds ?? null,
                 // Compression ratio in percent (e.g. 35 means 35% smaller)
                 compression_ratio:       compressionRatio,
                 folder_id:              job.folder_id ?? null,
@@ -0,0 +1,39 @@
+/**
+ * Unit tests: agent multipart upload — CreateMultipartUpload parser and CompleteMultipartUpload body
+ */
+import { describe, it, expect } from 'vitest';
+import { parseInitiateMultipartUploadResponse, buildCompleteMultipartUploadXml } from '../src/services/ProcessingService.js';
+
+describe('Agent multipart upload', () => {
+    describe('parseInitiateMultipartUploadResponse', () => {
+        it('extracts UploadId', () => {
+            const xml = `<?xml version="1.0" encoding="UTF-8"?>
+<InitiateMultipartUploadResult>
+<Bucket>bk-video-public</Bucket>
+<Key>videos/2026/02/1_clip-1080.mp4</Key>
+<UploadId>upload-abc-123</UploadId>
+</InitiateMultipartUploadResult>`;
+            expect(parseInitiateMultipartUploadResponse(xml)).toBe('upload-abc-123');
+        });
+
+        it('returns null for error body or empty input', () => {
+            expect(parseInitiateMultipartUploadResponse('<Error><Code>AccessDenied</Code></Error>')).toBeNull();
+            expect(parseInitiateMultipartUploadResponse(null)).toBeNull();
+        });
+    });
+
+    describe('buildCompleteMultipartUploadXml', () => {
+        it('sorts parts by number and quotes ETags once', () => {
+            const xml = buildCompleteMultipartUploadXml([
+                { part_number: 2, etag: '"bbb"' },
+                { part_number: 1, etag: 'aaa' },
+            ]);
+            expect(xml).toBe(
+                '<CompleteMultipartUpload>'
+                + '<Part><PartNumber>1</PartNumber><ETag>"aaa"</ETag></Part>'
+                + '<Part><PartNumber>2</PartNumber><ETag>"bbb"</ETag></Part>'
+                + '</CompleteMultipartUpload>'
+            );
+        });
+    });
+});
@@ -0,0 +1,74 @@
+/**
+ * Unit tests: JobRepository.claimPendingJobs (agent batch claim)
+ * One UPDATE … RETURNING for up to CLAIM_BATCH_MAX jobs, results ordered by id.
+ */
+import { describe, it, expect, vi } from 'vitest';
+import { JobRepository, CLAIM_BATCH_MAX, ZOMBIE_TIMEOUT_MIN, ZOMBIE_HEARTBEAT_GRACE_MIN } from '../src/repositories/JobRepository.js';
+
+function fakeDb(rows) {
+    const calls = [];
+    const db = {
+        prepare: vi.fn((sql) => ({
+            bind: vi.fn((...args) => {
+                calls.push({ sql, args });
+                return { all: vi.fn(async () => ({ results: rows })) };
+            }),
+        })),
+    };
+    return { db, calls };
+}
+
+describe('JobRepository.claimPendingJobs', () => {
+    it('claims in one statement and returns jobs lowest id first', async () => {
+        const { db, calls } = fakeDb([{ id: 12 }, { id: 10 }, { id: 11 }]);
+        const jobs = await new JobRepository({ DB: db }).claimPendingJobs('hetner-1', 3);
+        expect(db.prepare).toHaveBeenCalledTimes(1);
+        expect(calls[0].sql).toContain('RETURNING *');
+        expect(calls[0].args).toEqual(['PROCESSING', 'hetner-1', 'URL_IMPORT_QUEUED', 'PENDING', 3]);
+        expect(jobs.map(j => j.id)).toEqual([10, 11, 12]);
+    });
+
+    it('clamps the batch size to 1..CLAIM_BATCH_MAX', async () => {
+        for (const [limit, expected] of [[0, 1], [-4, 1], ['abc', 1], [500, CLAIM_BATCH_MAX], ['5', 5]]) {
+            const { db, calls } = fakeDb([]);
+            await new JobRepository({ DB: db }).claimPendingJobs('w', limit);
+            expect(calls[0].args.at(-1)).toBe(expected);
+        }
+    });
+
+    it('returns an empty list when nothing is pending', async () => {
+        const { db } = fakeDb(undefined);
+        expect(await new JobRepository({ DB: db }).claimPendingJobs('w', 4)).toEqual([]);
+    });
+});
+
+describe('JobRepository.countClaimable', () => {
+    it('counts with the claim filter', async () => {
+        const calls = [];
+        const db = {
+            prepare: vi.fn((sql) => ({
+                bind: vi.fn((...args) => {
+                    calls.push({ sql, args });
+                    return { first: vi.fn(async () => ({ n: 7 })) };
+                }),
+            })),
+        };
+        expect(await new JobRepository({ DB: db }).countClaimable()).toBe(7);
+        expect(calls[0].sql).toContain('COUNT(*)');
+        expect(calls[0].sql).toContain('upload_confirmed_at IS NOT NULL');
+        expect(calls[0].args).toEqual(['URL_IMPORT_QUEUED', 'PENDING']);
+    });
+});
+
+describe('JobRepository.markZombieJobs', () => {
+    it('fails old PROCESSING claims of workers without a recent heartbeat', async () => {
+        const { db, calls } = fakeDb([{ id: 4 }, { id: 9 }]);
+        expect(await new JobRepository({ DB: db }).markZombieJobs()).toEqual([4, 9]);
+        expect(calls[0].sql).toContain('NOT EXISTS');
+        expect(calls[0].sql).toContain('worker_heartbeats');
+        // SQLite datetime() on both sides: started_at is CURRENT_TIMESTAMP, not ISO 8601
+        expect(calls[0].sql).toContain("datetime(started_at) < datetime('now', ?)");
+        expect(calls[0].args).toEqual(['FAILED', 'PROCESSING', `-${ZOMBIE_TIMEOUT_MIN} minutes`,
+            `-${ZOMBIE_HEARTBEAT_GRACE_MIN} minutes`]);
+    });
+});
@@ -0,0 +1,39 @@
+/**
+ * Unit tests: processing_checkpoint survives interrupt and retry (agent resumes download / encode segments)
+ */
+import { describe, it, expect, vi } from 'vitest';
+import { JobRepository } from '../src/repositories/JobRepository.js';
+
+function fakeDb() {
+    const calls = [];
+    const db = {
+        prepare: vi.fn((sql) => ({
+            bind: vi.fn((...args) => {
+                calls.push({ sql, args });
+                return { first: vi.fn(async () => ({ id: 1 })), run: vi.fn(async () => ({ meta: { changes: 1 } })) };
+            }),
+        })),
+    };
+    return { db, calls };
+}
+
+describe('processing_checkpoint on interrupt', () => {
+    it('setJobInterrupted keeps the checkpoint', async () => {
+        const { db, calls } = fakeDb();
+        await new JobRepository({ DB: db }).setJobInterrupted(1, 'w1', 'ram_critical');
+        expect(calls[0].sql).toContain('worker_id = NULL');
+        expect(calls[0].sql).not.toContain('processing_checkpoint');
+    });
+
+    it('retryInterruptedJobIds keeps the checkpoint', async () => {
+        const { db, calls } = fakeDb();
+        expect(await new JobRepository({ DB: db }).retryInterruptedJobIds([1, 2])).toBe(1);
+        expect(calls[0].sql).not.toContain('processing_checkpoint');
+    });
+
+    it('stores encode segment checkpoints as given', async () => {
+        const { db, calls } = fakeDb();
+        await new JobRepository({ DB: db }).updateJobCheckpoint(1, 'w1', 'encode_segments:3/10');
+        expect(calls[0].args).toEqual(['encode_segments:3/10', 1, 'w1']);
+    });
+});
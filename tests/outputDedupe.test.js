@@ -0,0 +1,88 @@
+/**
+ * Unit tests: agent output reuse — metadata headers, output key ownership, Worker-side R2 copy
+ */
+import { describe, it, expect, vi } from 'vitest';
+import { ProcessingService, agentMetadataHeaders, isJobOutputKey } from '../src/services/ProcessingService.js';
+
+function fakeBucket(objects) {
+    const store = new Map(Object.entries(objects));
+    return {
+        store,
+        get: vi.fn(async (key) => (store.has(key) ? { body: store.get(key), httpMetadata: { contentType: 'video/mp4' } } : null)),
+        put: vi.fn(async (key, body) => { store.set(key, body); }),
+        delete: vi.fn(async (key) => { store.delete(key); }),
+    };
+}
+
+function service(bucket, job = { id: 7, worker_id: 'w1', status: 'PROCESSING' }) {
+    const jobRepo = { getById: vi.fn(async () => job) };
+    return new ProcessingService({ R2_PUBLIC_BUCKET: bucket }, jobRepo);
+}
+
+describe('agentMetadataHeaders', () => {
+    it('maps safe metadata to x-amz-meta-* and drops the rest', () => {
+        expect(agentMetadataHeaders({ sha256: 'ab12', 'Source-SHA256': 'cd34', 'bad key': 'x', note: 'a b' }))
+            .toEqual({ 'x-amz-meta-sha256': 'ab12', 'x-amz-meta-source-sha256': 'cd34' });
+        expect(agentMetadataHeaders(null)).toEqual({});
+    });
+});
+
+describe('isJobOutputKey', () => {
+    it('accepts only keys under the job', () => {
+        expect(isJobOutputKey('videos/2026/10/7_clip-720.mp4', 7)).toBe(true);
+        expect(isJobOutputKey('thumbnails/7/clip-720-thumb.jpg', 7)).toBe(true);
+        expect(isJobOutputKey('videos/2026/10/70_clip-720.mp4', 7)).toBe(false);
+        expect(isJobOutputKey('thumbnails/8/clip.jpg', 7)).toBe(false);
+    });
+});
+
+describe('ProcessingService.copyPublicObjectsForAgent', () => {
+    it('copies every object to the claimed job', async () => {
+        const bucket = fakeBucket({ 'videos/2026/09/3_a-720.mp4': 'v', 'thumbnails/3/a-720-thumb.jpg': 't' });
+        const res = await service(bucket).copyPublicObjectsForAgent(7, 'w1', [
+            { from_key: 'videos/2026/09/3_a-720.mp4', to_key: 'videos/2026/10/7_a-720.mp4' },
+            { from_key: 'thumbnails/3/a-720-thumb.jpg', to_key: 'thumbnails/7/a-720-thumb.jpg' },
+        ]);
+        expect(res).toEqual({ ok: true, copied: ['videos/2026/10/7_a-720.mp4', 'thumbnails/7/a-720-thumb.jpg'] });
+        expect(bucket.store.get('videos/2026/10/7_a-720.mp4')).toBe('v');
+    });
+
+    it('rolls back partial copies when a source is gone', async () => {
+        const bucket = fakeBucket({ 'videos/2026/09/3_a-720.mp4': 'v' });
+        const res = await service(bucket).copyPublicObjectsForAgent(7, 'w1', [
+            { from_key: 'videos/2026/09/3_a-720.mp4', to_key: 'videos/2026/10/7_a-720.mp4' },
+            { from_key: 'thumbnails/3/a-720-thumb.jpg', to_key: 'thumbnails/7/a-720-thumb.jpg' },
+        ]);
+        expect(res).toEqual({ ok: false, copied: [], missing: 'thumbnails/3/a-720-thumb.jpg' });
+        expect(bucket.store.has('videos/2026/10/7_a-720.mp4')).toBe(false);
+    });
+
+    it('refuses targets outside the job and jobs of other workers', async () => {
+        const bucket = fakeBucket({ 'videos/2026/09/3_a-720.mp4': 'v' });
+        await expect(service(bucket).copyPublicObjectsForAgent(7, 'w1', [
+            { from_key: 'videos/2026/09/3_a-720.mp4', to_key: 'videos/2026/10/3_a-720.mp4' },
+        ])).rejects.toThrow(/belong to job 7/);
+        await expect(service(bucket).copyPublicObjectsForAgent(7, 'w2', [
+            { from_key: 'videos/2026/09/3_a-720.mp4', to_key: 'videos/2026/10/7_a-720.mp4' },
+        ])).rejects.toThrow(/not claimed/);
+        expect(bucket.put).not.toHaveBeenCalled();
+    });
+});
+
+describe('ProcessingService.lookupOutputForAgent', () => {
+    it('returns the earlier job outputs including the storyboard index', async () => {
+        const jobRepo = {
+            getById: vi.fn(async () => ({ id: 7, worker_id: 'w1', status: 'PROCESSING' })),
+            findCompletedByOutputKey: vi.fn(async () => ({
+                id: 3, public_url: 'https://cdn.bilgekarga.tr/videos/2026/09/3_a-720.mp4',
+                thumbnail_key: 'thumbnails/3/a-720-thumb.jpg', storyboard_key: 'thumbnails/3/a-720-storyboard.vtt',
+                renditions: null,
+            })),
+        };
+        const res = await new ProcessingService({}, jobRepo).lookupOutputForAgent(7, 'w1', 'key');
+        expect(res.found).toBe(true);
+        expect(res.job_id).toBe(3);
+        expect(res.result).toMatchObject({ thumbnail_key: 'thumbnails/3/a-720-thumb.jpg',
+            storyboard_key: 'thumbnails/3/a-720-storyboard.vtt', renditions: [] });
+    });
+});
@@ -0,0 +1,101 @@
+/**
+ * Unit tests: segment fan-out — task claim/finish SQL, owner-side publish validation
+ */
+import { describe, it, expect, vi } from 'vitest';
+import { JobRepository } from '../src/repositories/JobRepository.js';
+import { ProcessingService, segmentPrefix } from '../src/services/ProcessingService.js';
+
+function fakeDb(firstResults) {
+    const calls = [];
+    const queue = [...firstResults];
+    const db = {
+        prepare: vi.fn((sql) => ({
+            bind: vi.fn((...args) => {
+                calls.push({ sql, args });
+                return { first: vi.fn(async () => queue.shift() ?? null), run: vi.fn(async () => ({})) };
+            }),
+        })),
+    };
+    return { db, calls };
+}
+
+describe('JobRepository.claimSegmentTask', () => {
+    it('peer claims the highest ready seq of another agent\'s job', async () => {
+        const { db, calls } = fakeDb([{ id: 5 }, { id: 5, status: 'PROCESSING', worker_id: 'w2' }]);
+        const task = await new JobRepository({ DB: db }).claimSegmentTask('w2', null, 30);
+        expect(task).toEqual({ id: 5, status: 'PROCESSING', worker_id: 'w2' });
+        expect(calls[0].sql).toContain('owner_worker_id != ?');
+        expect(calls[0].sql).toContain('src_ready = 1');
+        expect(calls[0].sql).toContain('seq DESC');
+        expect(calls[0].args).toEqual(['w2', '-30 minutes']);
+        expect(calls[1].sql).toContain('RETURNING *');
+        expect(calls[1].args).toEqual(['w2', 5, '-30 minutes']);
+    });
+
+    it('owner claims its own job from the lowest seq, source upload not required', async () => {
+        const { db, calls } = fakeDb([{ id: 9 }, { id: 9 }]);
+        await new JobRepository({ DB: db }).claimSegmentTask('w1', 42, 0);
+        expect(calls[0].sql).toContain('job_id = ?');
+        expect(calls[0].sql).not.toContain('src_ready');
+        expect(calls[0].sql).toContain('seq ASC');
+        expect(calls[0].args).toEqual([42, '-30 minutes']);
+    });
+
+    it('returns null when nothing is claimable or a concurrent claimer won', async () => {
+        expect(await new JobRepository({ DB: fakeDb([]).db }).claimSegmentTask('w2', null, 30)).toBeNull();
+        expect(await new JobRepository({ DB: fakeDb([{ id: 3 }, null]).db }).claimSegmentTask('w2', null, 30)).toBeNull();
+    });
+});
+
+describe('JobRepository.finishSegmentTask', () => {
+    it('marks DONE with the frame count for the claim holder only', async () => {
+        const { db, calls } = fakeDb([{ id: 5, status: 'DONE' }]);
+        await new JobRepository({ DB: db }).finishSegmentTask(5, 'w2', true, { frames: '3000' });
+        expect(calls[0].sql).toContain("status = 'DONE'");
+        expect(calls[0].args).toEqual([3000, 5, 'w2']);
+    });
+
+    it('puts a failed task back until attempts run out', async () => {
+        const { db, calls } = fakeDb([{ id: 5, status: 'PENDING' }]);
+        await new JobRepository({ DB: db }).finishSegmentTask(5, 'w2', false, { error: 'x'.repeat(2000), maxAttempts: 3 });
+        expect(calls[0].sql).toContain("WHEN attempts >= ? THEN 'FAILED' ELSE 'PENDING'");
+        expect(calls[0].args[0]).toBe(3);
+        expect(calls[0].args[1]).toHaveLength(1000);
+    });
+});
+
+describe('ProcessingService.publishSegmentsForAgent', () => {
+    function service(job = { id: 42, worker_id: 'w1', status: 'PROCESSING' }) {
+        const jobRepo = {
+            getById: vi.fn(async () => job),
+            replaceSegmentTasks: vi.fn(async (_id, _w, _p, tasks) => tasks.length),
+        };
+        return { svc: new ProcessingService({}, jobRepo), jobRepo };
+    }
+    const seg = (seq, job = 42) => ({
+        seq, src_key: `segments/${job}/src-${seq}.mkv`, out_keys: [`segments/${job}/out0-${seq}.mp4`], duration: 120, packets: 3000,
+    });
+
+    it('stores the tasks of the owner\'s job', async () => {
+        const { svc, jobRepo } = service();
+        expect(await svc.publishSegmentsForAgent(42, 'w1', { crf: 14 }, [seg(0), seg(1)])).toEqual({ ok: true, count: 2 });
+        expect(jobRepo.replaceSegmentTasks).toHaveBeenCalledWith(42, 'w1', { crf: 14 }, [
+            { seq: 0, src_key: 'segments/42/src-0.mkv', out_keys: ['segments/42/out0-0.mp4'], duration: 120, packets: 3000 },
+            { seq: 1, src_key: 'segments/42/src-1.mkv', out_keys: ['segments/42/out0-1.mp4'], duration: 120, packets: 3000 },
+        ]);
+        expect(segmentPrefix('42')).toBe('segments/42/');
+    });
+
+    it('rejects keys outside the job, missing outputs and empty lists', async () => {
+        const { svc, jobRepo } = service();
+        await expect(svc.publishSegmentsForAgent(42, 'w1', {}, [seg(0, 41)])).rejects.toThrow();
+        await expect(svc.publishSegmentsForAgent(42, 'w1', {}, [{ ...seg(0), out_keys: [] }])).rejects.toThrow('out_keys');
+        await expect(svc.publishSegmentsForAgent(42, 'w1', {}, [])).rejects.toThrow('segments');
+        expect(jobRepo.replaceSegmentTasks).not.toHaveBeenCalled();
+    });
+
+    it('refuses jobs claimed by another agent', async () => {
+        const { svc } = service({ id: 42, worker_id: 'w9', status: 'PROCESSING' });
+        await expect(svc.publishSegmentsForAgent(42, 'w1', {}, [seg(0)])).rejects.toThrow();
+    });
+});
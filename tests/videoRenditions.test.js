@@ -0,0 +1,56 @@
+/**
+ * Unit tests: VideoDTO.files for ladder jobs (conversion_jobs.renditions JSON)
+ * Single-output jobs keep one file built from the job row.
+ */
+import { describe, it, expect } from 'vitest';
+import { VideoDTO } from '../src/utils/dto.js';
+
+const baseJob = {
+    id: 7,
+    status: 'COMPLETED',
+    quality: '720p,1080p',
+    public_url: 'https://cdn.bilgekarga.tr/videos/2026/10/7_clip-1080.mp4',
+    resolution: '1920x1080',
+    file_size_output: 2000,
+    bitrate: 4000,
+    frame_rate: 25,
+    completed_at: '2026-10-01T10:00:00Z',
+};
+
+describe('VideoDTO renditions', () => {
+    it('lists one file per rendition', () => {
+        const job = {
+            ...baseJob,
+            renditions: JSON.stringify([
+                { quality: '720p', public_url: 'https://cdn.bilgekarga.tr/videos/2026/10/7_clip-720.mp4', resolution: '1280x720', file_size_output: 900, bitrate: 1800 },
+                { quality: '1080p', public_url: baseJob.public_url, resolution: '1920x1080', file_size_output: 2000, bitrate: 4000 },
+            ]),
+        };
+        const files = VideoDTO.fromJob(job).files;
+        expect(files).toHaveLength(2);
+        expect(files[0]).toMatchObject({ quality: '720p', rendition: 'hd', width: 1280, height: 720, size: 900, bitrate: 1800 });
+        expect(files[1]).toMatchObject({ quality: '1080p', rendition: 'fhd', width: 1920, height: 1080, size: 2000 });
+        expect(files[0].link).toContain('7_clip-720.mp4');
+    });
+
+    it('falls back to the job row when renditions is empty or invalid', () => {
+        for (const renditions of [null, '', 'not json', '[]']) {
+            const files = VideoDTO.fromJob({ ...baseJob, quality: '1080p', renditions }).files;
+            expect(files).toHaveLength(1);
+            expect(files[0]).toMatchObject({ quality: '1080p', width: 1920, height: 1080, size: 2000, bitrate: 4000 });
+        }
+    });
+
+    it('has no files until the job is complete', () => {
+        expect(VideoDTO.fromJob({ ...baseJob, status: 'CONVERTING' }).files).toEqual([]);
+    });
+});
+
+describe('VideoDTO storyboard', () => {
+    it('exposes the WebVTT thumbnail track when the job has one', () => {
+        const dto = VideoDTO.fromJob({ ...baseJob, storyboard_key: 'thumbnails/7/clip-1080-storyboard.vtt' });
+        expect(dto.storyboard_url).toBe('https://cdn.bilgekarga.tr/thumbnails/7/clip-1080-storyboard.vtt');
+        expect(dto.bk.storyboard_key).toBe('thumbnails/7/clip-1080-storyboard.vtt');
+        expect(VideoDTO.fromJob(baseJob).storyboard_url).toBeNull();
+    });
+});